@@ -1,8 +1,19 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Dict, Any
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing
+from typing import Dict, Any, Iterator, AsyncIterator, List
+import asyncio
+import json
 import logging
+import os
+import time
 from src.rag_system import RAGSystem
+from src.generation.llm_client import LLMError
+from src.utils.metrics import render_prometheus
+from src.utils.tracing import tracer
+from src.utils.concurrency import QueryLimiter, QueueFullError
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -11,6 +22,19 @@ logger = logging.getLogger(__name__)
 app = FastAPI(title="RAG API")
 
 rag = RAGSystem(config_path="config.yaml")
+
+# Thread pool cho phần CPU-bound (embedding + FAISS search), giải phóng GIL trong torch/faiss
+executor = ThreadPoolExecutor(
+    max_workers=rag.config.get('api.worker_threads', min(4, os.cpu_count() or 1)),
+    thread_name_prefix="rag-worker"
+)
+# Giới hạn số query đồng thời, phần dư xếp hàng, quá hàng đợi thì trả 429
+limiter = QueryLimiter(
+    max_concurrent=rag.config.get('api.max_concurrent_queries', 4),
+    max_queue=rag.config.get('api.max_queue_size', 32),
+    queue_timeout_sec=rag.config.get('api.queue_timeout_sec', 30)
+)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -20,29 +44,113 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Deadline mặc định / tối đa cho một request (giây), client có thể gửi `timeout_sec` nhỏ hơn
+DEFAULT_REQUEST_TIMEOUT = float(rag.config.get('api.request_timeout_sec', 60))
+MAX_REQUEST_TIMEOUT = float(rag.config.get('api.max_request_timeout_sec', 120))
+
+@app.on_event("startup")
+async def startup():
+    # Load reranker trước khi nhận request để query đầu tiên không phải chờ tải model
+    if rag.retriever.reranker.enabled:
+        await asyncio.get_running_loop().run_in_executor(executor, rag.retriever.reranker.warm_up)
+
+@app.on_event("shutdown")
+async def shutdown():
+    executor.shutdown(wait=False)
+    if rag.embedder.coalescer is not None:
+        rag.embedder.coalescer.close()
+    await rag.response_generator.async_llm_client.aclose()
+
+def _request_deadline(body: Dict[Any, Any]) -> float:
+    """Deadline (time.monotonic) tính từ lúc nhận request, gồm cả thời gian chờ hàng đợi"""
+    try:
+        timeout = float((body or {}).get("timeout_sec") or DEFAULT_REQUEST_TIMEOUT)
+    except (TypeError, ValueError):
+        raise HTTPException(400, "'timeout_sec' must be a number")
+    if timeout <= 0:
+        raise HTTPException(400, "'timeout_sec' must be positive")
+    return time.monotonic() + min(timeout, MAX_REQUEST_TIMEOUT)
+
+def _llm_http_error(e: LLMError) -> HTTPException:
+    """Map LLMError sang HTTP status: hết deadline/timeout → 504, rate limit → 429, còn lại → 502"""
+    detail = {"detail": str(e), **e.to_dict()}
+    if e.kind in ("deadline", "timeout"):
+        return HTTPException(504, detail)
+    if e.kind == "rate_limited":
+        return HTTPException(429, detail, headers={"Retry-After": str(int(e.retry_after or 1))})
+    return HTTPException(502, detail)
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
+@app.get("/metrics/queue")
+def queue_metrics():
+    return limiter.get_stats()
+
+@app.get("/metrics/llm")
+def llm_metrics():
+    return rag.response_generator.async_llm_client.get_stats()
+
+def _render_metrics() -> str:
+    """Prometheus text exposition of stage spans, admission queue, LLM client and embedding cache"""
+    llm = rag.response_generator.async_llm_client
+    queue = limiter.get_stats()
+    parts = [
+        render_prometheus("rag_stage_duration_seconds", "histogram", "Latency of each query/ingest stage span",
+                          [({"stage": name}, h) for name, h in sorted(tracer.histograms.items())]),
+        render_prometheus("rag_stage_errors_total", "counter", "Stage spans that raised",
+                          [({"stage": name}, n) for name, n in sorted(tracer.errors.items())]),
+        render_prometheus("rag_queue_wait_seconds", "histogram", "Time spent waiting for a query slot",
+                          [({}, limiter.wait_time)]),
+        render_prometheus("rag_queue_in_flight", "gauge", "Queries currently running", [({}, queue["in_flight"])]),
+        render_prometheus("rag_queue_depth", "gauge", "Queries waiting for a slot", [({}, queue["queue_depth"])]),
+        render_prometheus("rag_queue_rejected_total", "counter", "Queries rejected with 429", [({}, queue["rejected"])]),
+        render_prometheus("rag_queue_completed_total", "counter", "Queries completed", [({}, queue["completed"])]),
+        render_prometheus("rag_llm_request_duration_seconds", "histogram",
+                          "LLM call latency including retries and hedging", [({}, llm.latency)]),
+        render_prometheus("rag_llm_attempt_duration_seconds", "histogram",
+                          "Latency of successful individual LLM HTTP attempts", [({}, llm.attempt_latency)]),
+        render_prometheus("rag_llm_requests_total", "counter", "LLM calls", [({}, llm.stats["requests"])]),
+        render_prometheus("rag_llm_retries_total", "counter", "LLM retries", [({}, llm.stats["retries"])]),
+        render_prometheus("rag_llm_hedged_total", "counter", "Hedged LLM requests sent", [({}, llm.stats["hedged"])]),
+        render_prometheus("rag_llm_errors_total", "counter", "Failed LLM calls by kind",
+                          [({"kind": kind}, n) for kind, n in sorted(llm.stats["errors_by_kind"].items())]),
+    ]
+    cache = rag.embedder.cache
+    if cache is not None:
+        parts.append(render_prometheus("rag_embedding_cache_lookups_total", "counter", "Embedding cache lookups",
+                                       [({"result": "hit"}, cache.hits), ({"result": "miss"}, cache.misses)]))
+    return "".join(parts)
+
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(_render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.post("/query")
 async def query(body: Dict[Any, Any]):
     try:
         # Log the incoming request
         logger.debug(f"Received request body: {body}")
-        
+
         q = (body or {}).get("question")
         if not q:
             raise HTTPException(400, "Missing 'question' in body")
-            
+        deadline = _request_deadline(body)
+
         # Log the question
         logger.debug(f"Processing question: {q}")
-        
+
         # Your RAG system query
-        result = rag.query(q)
-        
+        received = time.perf_counter()
+        async with limiter.slot():
+            queue_ms = round((time.perf_counter() - received) * 1000, 2)
+            result = await rag.aquery(q, executor=executor, deadline=deadline)
+        result["timings"] = {"queue_ms": queue_ms, **result.get("timings", {})}
+
         # Log the result
         logger.debug(f"Query result: {result}")
-        
+
         return {
             "status": "success",
             "query": q,
@@ -50,7 +158,144 @@ async def query(body: Dict[Any, Any]):
             "contexts": result.get("contexts", []),
             "meta": {k: v for k, v in result.items() if k not in ["response", "contexts"]},
         }
+    except HTTPException:
+        raise
+    except QueueFullError as e:
+        logger.warning(f"Rejecting query: {e}")
+        raise HTTPException(429, str(e), headers={"Retry-After": "1"})
+    except LLMError as e:
+        logger.error(f"LLM error for query: {e.to_dict()}")
+        raise _llm_http_error(e)
     except Exception as e:
         # Log the full error
         logger.error(f"Query error: {str(e)}", exc_info=True)
-        raise HTTPException(500, f"Query error: {str(e)}")
\ No newline at end of file
+        raise HTTPException(500, f"Query error: {str(e)}")
+
+def _close_iterator(iterator: Iterator[Any]):
+    try:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            close()
+    except Exception as e:
+        logger.warning(f"Failed to close streamed iterator: {e}")
+
+async def _iterate_in_executor(iterator: Iterator[Any]) -> AsyncIterator[Any]:
+    """Drive a blocking iterator from the worker pool, one item at a time.
+
+    Consumer dừng sớm (client ngắt kết nối) → iterator được close() ngay khi item
+    đang chạy trong worker xong, nên worker ngừng đọc stream LLM và đóng kết nối.
+    """
+    sentinel = object()
+    future = None
+    try:
+        while True:
+            future = executor.submit(next, iterator, sentinel)
+            item = await asyncio.wrap_future(future)
+            if item is sentinel:
+                break
+            yield item
+    finally:
+        if future is not None and not future.done():
+            # Generator đang chạy trong worker, không close() được từ đây: close sau item hiện tại
+            future.add_done_callback(lambda _: _close_iterator(iterator))
+        else:
+            _close_iterator(iterator)
+
+class _SlotStreamingResponse(StreamingResponse):
+    """StreamingResponse holding a limiter slot until the response ends.
+
+    Slot được lấy trước khi trả response (để còn trả 429) và được release khi
+    response kết thúc vì bất kỳ lý do gì, kể cả client ngắt trước khi body bắt đầu
+    (lúc đó generator của body chưa chạy nên finally của nó không bao giờ chạy).
+    """
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            try:
+                # Client ngắt giữa chừng: đóng body generator ngay để dừng worker / huỷ lời gọi LLM
+                aclose = getattr(self.body_iterator, "aclose", None)
+                if aclose is not None:
+                    await aclose()
+            finally:
+                limiter.release()
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/query/stream")
+async def query_stream(body: Dict[Any, Any]):
+    q = (body or {}).get("question")
+    if not q:
+        raise HTTPException(400, "Missing 'question' in body")
+    deadline = _request_deadline(body)
+
+    try:
+        await limiter.acquire()
+    except QueueFullError as e:
+        logger.warning(f"Rejecting streamed query: {e}")
+        raise HTTPException(429, str(e), headers={"Retry-After": "1"})
+
+    async def event_stream():
+        try:
+            async with aclosing(_iterate_in_executor(rag.query_stream(q, deadline=deadline))) as events:
+                async for event in events:
+                    name = event.pop("event")
+                    yield _sse(name, event)
+        except LLMError as e:
+            logger.error(f"LLM error for streamed query: {e.to_dict()}")
+            yield _sse("error", {"detail": str(e), **e.to_dict()})
+        except Exception as e:
+            logger.error(f"Streamed query error: {str(e)}", exc_info=True)
+            yield _sse("error", {"detail": f"Query error: {str(e)}"})
+
+    return _SlotStreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _batch_line(item: Dict[str, Any]) -> str:
+    """One NDJSON line per question, same shape as the /query response"""
+    if item["status"] == "error":
+        line = {"index": item["index"], "status": "error", "query": item["question"], "error": item["error"]}
+    else:
+        result = item["result"]
+        line = {
+            "index": item["index"],
+            "status": "success",
+            "query": item["question"],
+            "response": result.get("response", ""),
+            "contexts": result.get("contexts", []),
+            "meta": {k: v for k, v in result.items() if k not in ["response", "contexts"]},
+        }
+    return json.dumps(line, ensure_ascii=False) + "\n"
+
+@app.post("/query/batch")
+async def query_batch(body: Dict[Any, Any]):
+    questions: List[Any] = (body or {}).get("questions")
+    if not isinstance(questions, list) or not questions:
+        raise HTTPException(400, "Missing 'questions' (non-empty list) in body")
+    if len(questions) > rag.batch_max_size:
+        raise HTTPException(413, f"Too many questions: {len(questions)} > {rag.batch_max_size}")
+    deadline = _request_deadline(body)
+
+    # Cả batch chiếm một slot; song song bên trong ≤ api.max_concurrent_queries (rag.batch_concurrency),
+    # tốc độ gọi LLM của mọi batch dùng chung rag.batch_bucket
+    try:
+        await limiter.acquire()
+    except QueueFullError as e:
+        logger.warning(f"Rejecting query batch: {e}")
+        raise HTTPException(429, str(e), headers={"Retry-After": "1"})
+
+    async def ndjson_stream():
+        try:
+            async with aclosing(rag.aquery_batch(questions, executor=executor, deadline=deadline)) as items:
+                async for item in items:
+                    yield _batch_line(item)
+        except Exception as e:
+            logger.error(f"Query batch error: {str(e)}", exc_info=True)
+            yield json.dumps({"status": "error", "error": f"Query batch error: {str(e)}"}, ensure_ascii=False) + "\n"
+
+    return _SlotStreamingResponse(ndjson_stream(), media_type="application/x-ndjson")
@@ -19,6 +19,7 @@ def main():
     # Ingest command
     ingest_parser = subparsers.add_parser('ingest', help='Ingest documents')
     ingest_parser.add_argument('files', nargs='+', help='Files to ingest')
+    ingest_parser.add_argument('--workers', type=int, default=None, help='Parallel parsing processes')
 
     # Query command
     query_parser = subparsers.add_parser('query', help='Query the system')
@@ -41,12 +42,17 @@ def main():
 
     if args.command == 'ingest':
         logger.info(f"Ingesting {len(args.files)} files")
-        results = rag_system.ingest_multiple_documents(args.files)
+        results = rag_system.ingest_multiple_documents(args.files, workers=args.workers)
         for result in results:
             if 'error' in result:
                 print(f"❌ {result.get('file_path')}: {result['error']}")
+            elif result.get('skipped'):
+                print(f"⏭️  {result.get('file_path')}: không thay đổi, bỏ qua")
             else:
-                print(f"✅ {result.get('file_path')}: {result.get('chunks_created')} chunks")
+                print(f"✅ {result.get('file_path')}: +{result.get('chunks_created')} / "
+                      f"-{result.get('chunks_removed')} chunks ({result.get('chunks_unchanged')} giữ nguyên)")
+        timings = rag_system.last_ingestion_stats.get('timings_sec', {})
+        print("⏱️  " + ", ".join(f"{stage}: {sec:.2f}s" for stage, sec in timings.items()))
 
     elif args.command == 'query':
         logger.info(f"Processing query: {args.question}")
@@ -72,6 +78,8 @@ def main():
         print(f"  • Tổng chunks: {stats['retriever_stats']['total_chunks']}")
         print(f"  • Kích thước index: {stats['retriever_stats']['index_size']}")
         print(f"  • Embedding model: {stats['config']['embedding_model']}")
+        print(f"  • Embedding load time: {stats['embedder_stats']['load_time_sec']}s "
+              f"(~{stats['embedder_stats']['memory_mb']} MB)")
         print(f"  • LLM model: {stats['config']['llm_model']}")
 
 if __name__ == "__main__":
@@ -11,7 +11,7 @@ from src.utils.logger import setup_logger
 
 logger = setup_logger(__name__)
 
-def batch_ingest_documents(input_dir: str, config_path: str = None):
+def batch_ingest_documents(input_dir: str, config_path: str = None, workers: int = None):
     """Batch ingest all documents in a directory"""
     
     # Initialize RAG system
@@ -19,7 +19,7 @@ def batch_ingest_documents(input_dir: str, config_path: str = None):
     
     # Find all supported documents
     input_path = Path(input_dir)
-    supported_extensions = ['.docx', '.txt', '.json']
+    supported_extensions = ['.docx', '.pdf', '.txt', '.json']
     
     document_files = []
     for ext in supported_extensions:
@@ -32,7 +32,7 @@ def batch_ingest_documents(input_dir: str, config_path: str = None):
     logger.info(f"Found {len(document_files)} documents to process")
     
     # Process documents
-    results = rag_system.ingest_multiple_documents([str(f) for f in document_files])
+    results = rag_system.ingest_multiple_documents([str(f) for f in document_files], workers=workers)
     
     # Summary
     successful = len([r for r in results if 'error' not in r])
@@ -46,6 +46,9 @@ def batch_ingest_documents(input_dir: str, config_path: str = None):
             logger.error(f"Failed: {result['file_path']} - {result['error']}")
         else:
             logger.info(f"Success: {result['file_path']} - {result['chunks_created']} chunks")
+
+    # Per-stage timing
+    logger.info(f"Ingestion timings (sec): {rag_system.last_ingestion_stats.get('timings_sec')}")
     
     # Print system stats
     stats = rag_system.get_system_stats()
@@ -55,7 +58,9 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Batch ingest documents into RAG system')
     parser.add_argument('input_dir', help='Directory containing documents to ingest')
     parser.add_argument('--config', help='Path to config file', default=None)
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Parallel parsing processes (default: ingestion.workers)')
     
     args = parser.parse_args()
     
-    batch_ingest_documents(args.input_dir, args.config)
\ No newline at end of file
+    batch_ingest_documents(args.input_dir, args.config, args.workers)
\ No newline at end of file
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""Recall-vs-latency benchmark of ANN index types against the Flat baseline.
+
+Vector lấy từ FAISS index của BIDV (reconstruct), query là chính các vector đó
+cộng nhiễu Gaussian. Có thể nhân bản corpus bằng --synthetic để mô phỏng
+kho dữ liệu lớn hơn.
+
+Ví dụ:
+    python scripts/bench_ann_index.py --synthetic 20000 --k 5
+"""
+import os
+import sys
+import time
+import argparse
+import faiss
+import numpy as np
+from typing import Dict, Any, List, Optional
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BASE_DIR)
+sys.path.append(ROOT_DIR)
+
+from src.retrieval.index_factory import build_index, search_params
+
+DEFAULT_INDEX = os.path.join(ROOT_DIR, "data", "processed", "embeddings", "faiss_index.faiss")
+
+
+def load_vectors(path: str, synthetic: int, noise: float, rng: np.random.Generator) -> np.ndarray:
+    index = faiss.read_index(path)
+    base = index.reconstruct_n(0, index.ntotal).astype('float32')
+    if synthetic > 0:
+        # Nhân bản các vector thật + nhiễu để có corpus lớn hơn nhưng cùng phân bố
+        picks = base[rng.integers(0, len(base), synthetic)]
+        extra = picks + rng.normal(0, noise, picks.shape).astype('float32')
+        base = np.vstack([base, extra])
+    faiss.normalize_L2(base)
+    return base
+
+
+def make_queries(vectors: np.ndarray, n: int, noise: float, rng: np.random.Generator) -> np.ndarray:
+    picks = vectors[rng.integers(0, len(vectors), n)]
+    queries = (picks + rng.normal(0, noise, picks.shape)).astype('float32')
+    faiss.normalize_L2(queries)
+    return queries
+
+
+def evaluate(index: faiss.Index, queries: np.ndarray, truth: np.ndarray, k: int,
+             params: Optional[faiss.SearchParameters] = None) -> Dict[str, Any]:
+    latencies: List[float] = []
+    found = np.empty_like(truth)
+    for i, q in enumerate(queries):
+        t0 = time.perf_counter()
+        _, ids = index.search(q.reshape(1, -1), k, params=params)
+        latencies.append(time.perf_counter() - t0)
+        found[i] = ids[0]
+
+    recall = np.mean([len(set(found[i]) & set(truth[i])) / k for i in range(len(truth))])
+    arr = np.array(latencies) * 1000
+    return {"recall": recall, "p50_ms": np.percentile(arr, 50), "p99_ms": np.percentile(arr, 99)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ANN index recall/latency benchmark")
+    parser.add_argument("--index", default=DEFAULT_INDEX, help="FAISS index chứa vector BIDV")
+    parser.add_argument("--synthetic", type=int, default=0, help="Số vector tổng hợp thêm vào corpus")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--noise", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    vectors = load_vectors(args.index, args.synthetic, args.noise, rng)
+    queries = make_queries(vectors, args.queries, args.noise, rng)
+    dim = vectors.shape[1]
+    k = min(args.k, len(vectors))
+
+    flat = build_index('flat', dim, vectors)
+    _, truth = flat.search(queries, k)
+
+    print(f"corpus={len(vectors)} dim={dim} queries={len(queries)} k={k}")
+    print(f"{'index':<12}{'param':<16}{'build s':>9}{'recall':>9}{'p50 ms':>9}{'p99 ms':>9}")
+
+    configs = [
+        ('flat', {}, [('-', None, None)]),
+        ('ivf_flat', {}, [(f'nprobe={p}', p, None) for p in (1, 4, 8, 16, 32)]),
+        ('ivf_pq', {'pq_m': 48}, [(f'nprobe={p}', p, None) for p in (1, 4, 8, 16, 32)]),
+        ('hnsw', {'hnsw_m': 32}, [(f'efSearch={e}', None, e) for e in (16, 32, 64, 128)]),
+    ]
+    for index_type, params, sweeps in configs:
+        try:
+            t0 = time.perf_counter()
+            index = build_index(index_type, dim, vectors, params=params)
+            build_sec = time.perf_counter() - t0
+        except Exception as e:
+            print(f"{index_type:<12}skipped: {e}")
+            continue
+        for label, nprobe, ef_search in sweeps:
+            r = evaluate(index, queries, truth, k, search_params(index, nprobe=nprobe, ef_search=ef_search))
+            print(f"{index_type:<12}{label:<16}{build_sec:>9.2f}{r['recall']:>9.3f}"
+                  f"{r['p50_ms']:>9.3f}{r['p99_ms']:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
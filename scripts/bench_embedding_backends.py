@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Benchmark CPU embedding throughput, memory and fp32 agreement of each embedding backend.
+
+Ví dụ:
+    python scripts/bench_embedding_backends.py --backends torch onnx onnx_int8 --threads 2
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from typing import List
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BASE_DIR)
+sys.path.append(ROOT_DIR)
+
+from src.utils.config import Config
+from src.ingestion.embedder import Embedder
+from src.ingestion.embedding_backends import EMBEDDING_BACKENDS
+
+DEFAULT_CHUNKS = os.path.join(ROOT_DIR, "data", "processed", "chunks", "BIDV_chunks.json")
+
+
+def load_texts(embedder: Embedder, path: str) -> List[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        chunks = json.load(f)
+    return [embedder.chunk_to_text(c) for c in chunks]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark embedding backends (torch / onnx, fp32 / int8)")
+    parser.add_argument("--config", default="configs/config.yaml")
+    parser.add_argument("--chunks", default=DEFAULT_CHUNKS, help="JSON chunks dùng làm dữ liệu embed")
+    parser.add_argument("--backends", nargs="+", default=list(EMBEDDING_BACKENDS), choices=EMBEDDING_BACKENDS)
+    parser.add_argument("--threads", type=int, default=2, help="Số thread CPU (khớp giới hạn container)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    os.environ.setdefault("OMP_NUM_THREADS", str(args.threads))
+    import torch
+    torch.set_num_threads(args.threads)
+
+    results = {}
+    reference = None
+    for backend in args.backends:
+        config = Config(args.config)
+        config.config.setdefault('models', {})['device'] = 'cpu'
+        config.config['models']['embedding_backend'] = backend
+        config.config['models']['onnx_threads'] = args.threads
+        config.config.setdefault('embedding', {})['cache'] = {'enabled': False}  # đo model, không đo cache
+        embedder = Embedder(config)
+        texts = load_texts(embedder, args.chunks)
+
+        # Warm-up để loại bỏ chi phí lần gọi đầu
+        embedder.embed_texts(texts[:8], show_progress_bar=False)
+        timings = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            embeddings = embedder.embed_texts(texts, show_progress_bar=False)
+            timings.append(time.perf_counter() - t0)
+
+        if reference is None:
+            reference = embeddings  # backend đầu tiên (mặc định torch fp32) làm chuẩn
+        cosines = np.sum(embeddings * reference, axis=1)
+        best = min(timings)
+        results[backend] = {
+            "texts": len(texts),
+            "texts_per_sec": len(texts) / best,
+            "load_sec": embedder.load_time_sec,
+            "memory_mb": embedder.memory_bytes / 1024 ** 2,
+            "cos_mean": float(cosines.mean()),
+            "cos_min": float(cosines.min()),
+        }
+
+    print(f"threads={args.threads} repeat={args.repeat} reference={args.backends[0]}")
+    print(f"{'backend':<12}{'texts':>8}{'texts/s':>10}{'load s':>9}{'MB':>9}{'cos mean':>10}{'cos min':>10}")
+    for name, r in results.items():
+        print(f"{name:<12}{r['texts']:>8}{r['texts_per_sec']:>10.1f}{r['load_sec']:>9.2f}"
+              f"{r['memory_mb']:>9.1f}{r['cos_mean']:>10.4f}{r['cos_min']:>10.4f}")
+
+
+if __name__ == "__main__":
+    main()
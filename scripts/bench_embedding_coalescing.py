@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Benchmark query embedding latency/throughput with and without request coalescing.
+
+Ví dụ:
+    python scripts/bench_embedding_coalescing.py --threads 16 --queries 50 --window-ms 5
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import numpy as np
+from typing import List, Callable
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BASE_DIR)
+sys.path.append(ROOT_DIR)
+
+from src.utils.config import Config
+from src.ingestion.embedder import get_embedder
+from src.ingestion.embedding_coalescer import EmbeddingCoalescer
+
+DEFAULT_CHUNKS = os.path.join(ROOT_DIR, "data", "processed", "chunks", "BIDV_chunks.json")
+
+
+def load_queries(path: str) -> List[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        chunks = json.load(f)
+    queries = [c.get("title", "") for c in chunks if c.get("title")]
+    return queries or ["Lãi suất vay mua nhà tại BIDV là bao nhiêu?"]
+
+
+def run(embed_fn: Callable[[str], np.ndarray], queries: List[str], threads: int, per_thread: int):
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    def worker(offset: int):
+        local = []
+        for i in range(per_thread):
+            q = queries[(offset + i) % len(queries)]
+            t0 = time.perf_counter()
+            embed_fn(q)
+            local.append(time.perf_counter() - t0)
+        with lock:
+            latencies.extend(local)
+
+    pool = [threading.Thread(target=worker, args=(t * per_thread,)) for t in range(threads)]
+    t0 = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    arr = np.array(latencies) * 1000
+    return {
+        "requests": len(latencies),
+        "throughput_qps": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(arr, 50)),
+        "p99_ms": float(np.percentile(arr, 99)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark query embedding coalescing")
+    parser.add_argument("--config", default="configs/config.yaml")
+    parser.add_argument("--chunks", default=DEFAULT_CHUNKS, help="JSON chunks dùng làm nguồn query")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--queries", type=int, default=50, help="Số query mỗi thread")
+    parser.add_argument("--window-ms", type=float, default=5.0)
+    parser.add_argument("--max-batch", type=int, default=32)
+    args = parser.parse_args()
+
+    embedder = get_embedder(Config(args.config))
+    queries = load_queries(args.chunks)
+
+    # Warm-up để loại bỏ chi phí lần gọi đầu
+    embedder.embed_texts(queries[:8], show_progress_bar=False)
+
+    direct = lambda q: embedder.embed_texts([q], show_progress_bar=False)[0]
+    coalescer = EmbeddingCoalescer(embedder, window_ms=args.window_ms, max_batch=args.max_batch)
+
+    results = {
+        "coalescing=off": run(direct, queries, args.threads, args.queries),
+        "coalescing=on": run(coalescer.embed, queries, args.threads, args.queries),
+    }
+
+    print(f"threads={args.threads} queries/thread={args.queries} "
+          f"window_ms={args.window_ms} max_batch={args.max_batch}")
+    print(f"{'mode':<16}{'requests':>10}{'qps':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, r in results.items():
+        print(f"{name:<16}{r['requests']:>10}{r['throughput_qps']:>10.1f}"
+              f"{r['p50_ms']:>10.2f}{r['p99_ms']:>10.2f}")
+    print(f"coalescer stats: {coalescer.get_stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""Recall benchmark: dense-only vs BM25 vs hybrid (RRF / weighted) retrieval.
+
+Mặc định bộ query được sinh từ chính các chunk trong store: mỗi query là một
+cụm 4-8 từ liên tiếp chứa "từ khoá cứng" (số tiền, mã sản phẩm, tên thẻ viết
+hoa...), đáp án là chunk chứa cụm đó. Có thể truyền bộ query có nhãn bằng
+--queries (JSONL, mỗi dòng {"question": ..., "relevant_ids": [...]}).
+
+Ví dụ:
+    python scripts/bench_hybrid_retrieval.py --config configs/config.yaml --k 2 5
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import numpy as np
+from typing import List, Dict, Any, Set, Tuple
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BASE_DIR)
+sys.path.append(ROOT_DIR)
+
+from src.utils.config import Config
+from src.ingestion.embedder import get_embedder
+from src.retrieval.vector_store import VectorStore
+from src.retrieval.bm25 import chunk_text
+from src.retrieval.fusion import reciprocal_rank_fusion, weighted_fusion
+
+_HARD_TERM = re.compile(r"\d|[A-Z]{2,}|[A-Z][a-z]+\s[A-Z][a-z]+")
+
+
+def make_queries(vs: VectorStore, n: int, rng: random.Random) -> List[Tuple[str, Set[int]]]:
+    """Cụm từ chứa từ khoá cứng lấy từ các chunk còn sống"""
+    queries = []
+    ids = [i for i in range(len(vs.chunks)) if not vs.chunks.is_deleted(i)]
+    rng.shuffle(ids)
+    for idx in ids:
+        words = chunk_text(vs.chunks[idx]).split()
+        anchors = [i for i, w in enumerate(words) if _HARD_TERM.search(w)]
+        if not anchors:
+            continue
+        anchor = rng.choice(anchors)
+        length = rng.randint(4, 8)
+        start = max(0, anchor - rng.randint(0, length - 1))
+        queries.append((" ".join(words[start:start + length]), {idx}))
+        if len(queries) >= n:
+            break
+    return queries
+
+
+def load_queries(path: str) -> List[Tuple[str, Set[int]]]:
+    with open(path, 'r', encoding='utf-8') as f:
+        items = [json.loads(line) for line in f if line.strip()]
+    return [(item['question'], set(item['relevant_ids'])) for item in items]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dense vs hybrid retrieval recall benchmark")
+    parser.add_argument("--config", default=None, help="Path to config file")
+    parser.add_argument("--queries", default=None, help="JSONL bộ query có nhãn")
+    parser.add_argument("--n", type=int, default=200, help="Số query tự sinh")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 2, 5])
+    parser.add_argument("--candidates", type=int, default=20)
+    parser.add_argument("--threshold", type=float, default=None, help="Mặc định: retrieval.score_threshold")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    config = Config(args.config)
+    threshold = args.threshold if args.threshold is not None else config.get('retrieval.score_threshold', 0.5)
+    vs = VectorStore(config)
+    if not vs.load_index() or vs.bm25 is None:
+        sys.exit("Vector store (with BM25 enabled) not found, ingest documents first")
+    embedder = get_embedder(config)
+
+    queries = load_queries(args.queries) if args.queries else make_queries(vs, args.n, random.Random(args.seed))
+    embeddings = embedder.embed_texts([q for q, _ in queries], show_progress_bar=False)
+    max_k = max(args.k)
+
+    hits: Dict[str, Dict[int, List[float]]] = {}
+    bm25_ms: List[float] = []
+    for (question, relevant), embedding in zip(queries, embeddings):
+        dense_all = vs.search_ids(embedding, args.candidates)
+        dense = [(i, s) for i, s in dense_all if s >= threshold]
+
+        t0 = time.perf_counter()
+        lexical = vs.lexical_search(question, args.candidates)
+        bm25_ms.append((time.perf_counter() - t0) * 1000)
+
+        rankings = {
+            "dense": dense,
+            "bm25": lexical,
+            "hybrid_rrf": reciprocal_rank_fusion([dense, lexical]),
+            "hybrid_weighted": weighted_fusion([dense, lexical], [0.5, 0.5]),
+        }
+        for name, ranking in rankings.items():
+            found = [i for i, _ in ranking[:max_k]]
+            for k in args.k:
+                hits.setdefault(name, {}).setdefault(k, []).append(float(bool(relevant & set(found[:k]))))
+
+    print(f"chunks={vs.chunks.live_count()} queries={len(queries)} threshold={threshold} "
+          f"candidates={args.candidates}")
+    print(f"{'method':<18}" + "".join(f"{'recall@' + str(k):>12}" for k in args.k))
+    for name, per_k in hits.items():
+        print(f"{name:<18}" + "".join(f"{np.mean(per_k[k]):>12.3f}" for k in args.k))
+    arr = np.array(bm25_ms)
+    print(f"BM25 query latency: p50={np.percentile(arr, 50):.3f}ms p99={np.percentile(arr, 99):.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Microbenchmark TextCleaner.clean_text on ~4,000-character prompts.
+
+So sánh bản cũ (duyệt từng ký tự, dùng làm oracle trong tests/test_text_cleaner.py) với bản
+translate-table + regex gộp, và system message qua clean_text_cached.
+
+Ví dụ:
+    python scripts/bench_text_cleaner.py --prompts 200 --chars 4000
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from typing import List, Callable
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BASE_DIR)
+sys.path.append(ROOT_DIR)
+
+from src.generation.text_cleaner import TextCleaner
+from src.generation.prompt_template import PromptTemplate
+from tests.test_text_cleaner import reference_clean_text
+
+DEFAULT_CHUNKS = os.path.join(ROOT_DIR, "data", "processed", "chunks", "BIDV_chunks.json")
+
+
+def build_prompts(path: str, n: int, chars: int, seed: int = 0) -> List[str]:
+    """Prompt giống thật: ghép ngẫu nhiên nội dung chunk tới khi đủ `chars` ký tự"""
+    texts = ["Lãi suất tiền gửi “Tiết kiệm” kỳ hạn 12 tháng là 4,8 %/năm ( áp dụng từ 01/2024 ) …\n\n\n"]
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            texts = [c.get("content", "") for c in json.load(f) if c.get("content")] or texts
+    rng = random.Random(seed)
+    prompts = []
+    for _ in range(n):
+        parts, size = [], 0
+        while size < chars:
+            part = rng.choice(texts)
+            parts.append(part)
+            size += len(part) + 2
+        prompts.append("\n\n".join(parts)[:chars])
+    return prompts
+
+
+def bench(fn: Callable[[str], str], prompts: List[str], repeat: int) -> float:
+    """Thời gian trung bình (µs) mỗi prompt, lấy lần chạy nhanh nhất"""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for p in prompts:
+            fn(p)
+        best = min(best, time.perf_counter() - t0)
+    return best / len(prompts) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark TextCleaner on prompt-sized text")
+    parser.add_argument("--chunks", default=DEFAULT_CHUNKS, help="JSON chunks dùng làm nội dung prompt")
+    parser.add_argument("--prompts", type=int, default=200)
+    parser.add_argument("--chars", type=int, default=4000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    prompts = build_prompts(args.chunks, args.prompts, args.chars)
+    mismatches = sum(TextCleaner.clean_text(p) != reference_clean_text(p) for p in prompts)
+    system_message = PromptTemplate().system_message
+
+    results = {
+        "legacy clean_text": bench(reference_clean_text, prompts, args.repeat),
+        "clean_text": bench(TextCleaner.clean_text, prompts, args.repeat),
+        "system legacy": bench(reference_clean_text, [system_message] * args.prompts, args.repeat),
+        "system cached": bench(TextCleaner.clean_text_cached, [system_message] * args.prompts, args.repeat),
+    }
+
+    print(f"{args.prompts} prompts x {args.chars} chars | mismatches vs legacy: {mismatches}")
+    print(f"{'variant':<20}{'us/prompt':>12}{'speedup':>10}")
+    for name, us in results.items():
+        baseline = results["system legacy" if name.startswith("system") else "legacy clean_text"]
+        print(f"{name:<20}{us:>12.1f}{baseline / us:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""Benchmark TextSplitter chunking on the largest DOCX.
+
+So sánh packer cũ (đếm lại token của overlap mỗi chunk, oracle trong
+tests/test_text_splitter.py) với packer prefix-sum ở chế độ đếm theo từ, và
+tuỳ chọn budget theo tokenizer subword (--tokenizer-path tokenizer.json).
+Không có DOCX trong data/ thì tạo một file từ nội dung chunk đã xử lý.
+
+Ví dụ:
+    python scripts/bench_text_splitter.py --max-tokens 400 --overlap 50
+    python scripts/bench_text_splitter.py --docx data/raw/BIDV.docx --tokenizer-path tokenizer.json
+"""
+import os
+import sys
+import json
+import time
+import glob
+import argparse
+import tempfile
+from typing import List, Dict, Any, Callable, Optional
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BASE_DIR)
+sys.path.append(ROOT_DIR)
+
+from docx import Document
+from src.utils.config import Config
+from src.ingestion.docx_reader import iter_docx_blocks
+from src.ingestion.text_splitter import TextSplitter
+from tests.test_text_splitter import reference_split_paragraph
+
+DATA_DIR = os.path.join(ROOT_DIR, "data")
+CHUNKS_GLOB = os.path.join(DATA_DIR, "processed", "chunks", "*.json")
+
+
+class LegacyTextSplitter(TextSplitter):
+    """TextSplitter với packer trước khi dùng prefix sums"""
+
+    def split_paragraph(self, text: str) -> List[str]:
+        return reference_split_paragraph(text, self.max_tokens, self.overlap)
+
+
+def largest_docx() -> Optional[str]:
+    paths = glob.glob(os.path.join(DATA_DIR, "**", "*.docx"), recursive=True)
+    return max(paths, key=os.path.getsize) if paths else None
+
+
+def synthesize_docx(path: str, paragraphs: int) -> None:
+    """DOCX giả lập từ nội dung chunk: mỗi mục một heading + 20 đoạn"""
+    texts = []
+    for chunks_path in glob.glob(CHUNKS_GLOB):
+        with open(chunks_path, "r", encoding="utf-8") as f:
+            texts += [c.get("content", "") for c in json.load(f) if isinstance(c, dict) and c.get("content")]
+    texts = texts or ["Phí thường niên thẻ Visa Platinum là 1.000.000 VND. Miễn phí năm đầu! Hạn mức 500 triệu?"]
+    doc = Document()
+    for i in range(paragraphs):
+        if i % 20 == 0:
+            doc.add_heading(f"Mục {i // 20 + 1}", level=1)
+        doc.add_paragraph(texts[i % len(texts)])
+    doc.save(path)
+
+
+def bench(fn: Callable[[], Any], repeat: int) -> float:
+    """Thời gian (ms) lần chạy nhanh nhất"""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1e3
+
+
+def make_splitter(cls, args, tokenizer: Optional[Dict[str, str]] = None) -> TextSplitter:
+    config = Config("nonexistent.yaml")
+    config.config["chunking"] = {"max_tokens": args.max_tokens, "overlap": args.overlap}
+    if tokenizer:
+        config.config["chunking"]["tokenizer"] = tokenizer
+    return cls(config)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark TextSplitter on a DOCX")
+    parser.add_argument("--docx", default=None, help="File DOCX (mặc định: file lớn nhất trong data/)")
+    parser.add_argument("--paragraphs", type=int, default=20000, help="Số đoạn khi phải tạo DOCX giả lập")
+    parser.add_argument("--max-tokens", type=int, default=400)
+    parser.add_argument("--overlap", type=int, default=50)
+    parser.add_argument("--tokenizer-path", default=None, help="tokenizer.json cho chế độ subword")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.docx or largest_docx()
+        if path is None:
+            path = os.path.join(tmp, "synthetic.docx")
+            synthesize_docx(path, args.paragraphs)
+        blocks = list(iter_docx_blocks(path))
+        size_mb = os.path.getsize(path) / 1e6
+
+    legacy = make_splitter(LegacyTextSplitter, args)
+    splitter = make_splitter(TextSplitter, args)
+    variants = {"legacy words": legacy, "prefix-sum words": splitter}
+    if args.tokenizer_path:
+        variants["prefix-sum hf"] = make_splitter(TextSplitter, args, {"backend": "hf", "path": args.tokenizer_path})
+    variants["prefix-sum estimate"] = make_splitter(TextSplitter, args, {"backend": "estimate"})
+
+    expected = legacy._split_docx_blocks(blocks, {})
+    same = splitter._split_docx_blocks(blocks, {}) == expected
+    n_chars = sum(len(b.get("text", "")) for b in blocks)
+
+    print(f"{os.path.basename(path)} ({size_mb:.1f} MB, {len(blocks)} blocks, {n_chars / 1e6:.1f}M chars) | "
+          f"max_tokens={args.max_tokens} overlap={args.overlap} | word-mode chunks identical: {same}")
+    print(f"{'variant':<22}{'chunks':>8}{'ms':>10}{'speedup':>10}")
+    baseline = None
+    for name, variant in variants.items():
+        chunks = variant._split_docx_blocks(blocks, {})
+        ms = bench(lambda: variant._split_docx_blocks(blocks, {}), args.repeat)
+        baseline = baseline or ms
+        print(f"{name:<22}{len(chunks):>8}{ms:>10.1f}{baseline / ms:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
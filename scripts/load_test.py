@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""Replay JSONL traffic against the running API and report throughput and per-stage latency.
+
+Mỗi dòng của file traffic là một JSON có `question` (hoặc `query` / `title`).
+Stage latency lấy từ `meta.timings` của /query (queue, cache, embed, retrieve, llm, total),
+cộng với end-to-end đo ở phía client.
+
+Ví dụ (API trỏ vào scripts/mock_llm_server.py qua GEMINI_BASE_URL):
+    python scripts/load_test.py --url http://localhost:8000 --traffic data/eval/traffic.jsonl \\
+        --concurrency 16 --total 500
+    python scripts/load_test.py --rate 20 --duration 60
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+import numpy as np
+from collections import Counter, defaultdict
+from typing import List, Dict, Any, Optional
+
+import httpx
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BASE_DIR)
+DEFAULT_TRAFFIC = os.path.join(ROOT_DIR, "data", "eval", "traffic.jsonl")
+
+
+def load_traffic(path: str) -> List[str]:
+    questions = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            question = record.get("question") or record.get("query") or record.get("title")
+            if question:
+                questions.append(question)
+    if not questions:
+        raise ValueError(f"No questions found in {path}")
+    return questions
+
+
+class LoadResult:
+    """Gom latency end-to-end và theo stage của các request"""
+
+    def __init__(self):
+        self.statuses: Counter = Counter()
+        self.cache: Counter = Counter()
+        self.stages: Dict[str, List[float]] = defaultdict(list)
+
+    def record(self, status: int, elapsed_ms: float, payload: Optional[Dict[str, Any]]):
+        self.statuses[status] += 1
+        self.stages["client_e2e_ms"].append(elapsed_ms)
+        if status != 200 or not payload:
+            return
+        meta = payload.get("meta") or {}
+        self.cache[meta.get("cache") or "miss"] += 1
+        for stage, value in (meta.get("timings") or {}).items():
+            self.stages[stage].append(float(value))
+
+    def report(self, elapsed_sec: float) -> Dict[str, Any]:
+        total = sum(self.statuses.values())
+        ok = self.statuses.get(200, 0)
+        return {
+            "requests": total,
+            "elapsed_sec": round(elapsed_sec, 2),
+            "throughput_rps": round(total / elapsed_sec, 2) if elapsed_sec else 0.0,
+            "success_rps": round(ok / elapsed_sec, 2) if elapsed_sec else 0.0,
+            "statuses": dict(self.statuses),
+            "cache": dict(self.cache),
+            "stages": {
+                stage: {
+                    "count": len(values),
+                    "p50_ms": round(float(np.percentile(values, 50)), 2),
+                    "p95_ms": round(float(np.percentile(values, 95)), 2),
+                    "p99_ms": round(float(np.percentile(values, 99)), 2),
+                    "max_ms": round(float(np.max(values)), 2),
+                }
+                for stage, values in self.stages.items() if values
+            }
+        }
+
+
+async def send(client: httpx.AsyncClient, question: str, timeout_sec: float, result: LoadResult):
+    start = time.perf_counter()
+    try:
+        response = await client.post("/query", json={"question": question, "timeout_sec": timeout_sec})
+        status = response.status_code
+        payload = response.json() if status == 200 else None
+    except httpx.HTTPError as e:
+        status, payload = type(e).__name__, None
+    result.record(status, (time.perf_counter() - start) * 1000, payload)
+
+
+async def run(args) -> Dict[str, Any]:
+    questions = load_traffic(args.traffic)
+    result = LoadResult()
+    # Open loop không giới hạn connection phía client, nếu không request sẽ xếp hàng ngay trong load generator
+    limits = httpx.Limits(max_connections=None if args.rate > 0 else args.concurrency,
+                          max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout + 5) as client:
+        start = time.perf_counter()
+        if args.rate > 0:
+            # Open loop: request đến theo lịch cố định, không chờ request trước xong (lộ queueing thật)
+            tasks, i = [], 0
+            while time.perf_counter() - start < args.duration:
+                tasks.append(asyncio.ensure_future(send(client, questions[i % len(questions)], args.timeout, result)))
+                i += 1
+                await asyncio.sleep(max(0.0, start + i / args.rate - time.perf_counter()))
+            await asyncio.gather(*tasks)
+        else:
+            # Closed loop: `concurrency` worker, mỗi worker gửi request kế tiếp khi request trước xong
+            counter = iter(range(args.total))
+
+            async def worker():
+                for i in counter:
+                    await send(client, questions[i % len(questions)], args.timeout, result)
+
+            await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+
+        report = result.report(elapsed)
+        for name in ("queue", "llm"):
+            try:
+                report[f"server_{name}"] = (await client.get(f"/metrics/{name}")).json()
+            except (httpx.HTTPError, ValueError):
+                pass
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the RAG API with replayed traffic")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--traffic", default=DEFAULT_TRAFFIC, help="File JSONL câu hỏi")
+    parser.add_argument("--concurrency", type=int, default=8, help="Số worker (closed loop)")
+    parser.add_argument("--total", type=int, default=200, help="Tổng số request (closed loop)")
+    parser.add_argument("--rate", type=float, default=0.0, help="Request/giây (open loop, 0 = closed loop)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Thời gian chạy open loop (giây)")
+    parser.add_argument("--timeout", type=float, default=30.0, help="timeout_sec gửi kèm mỗi request")
+    parser.add_argument("--output", help="Ghi report JSON ra file")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+
+    mode = f"rate={args.rate}/s duration={args.duration}s" if args.rate > 0 else \
+        f"concurrency={args.concurrency} total={args.total}"
+    print(f"{mode} | {report['requests']} requests in {report['elapsed_sec']}s "
+          f"| {report['throughput_rps']} req/s ({report['success_rps']} ok/s)")
+    print(f"statuses: {report['statuses']} | cache: {report['cache']}")
+    print(f"{'stage':<16}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for stage, s in report["stages"].items():
+        print(f"{stage:<16}{s['count']:>8}{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}{s['p99_ms']:>10.1f}{s['max_ms']:>10.1f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Report saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
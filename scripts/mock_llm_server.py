@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""OpenAI-compatible mock LLM server for load testing without Gemini quota.
+
+Trả completion cố định theo nội dung câu hỏi (cùng câu hỏi → cùng câu trả lời),
+latency lấy mẫu theo phân phối cấu hình, stream SSE theo nhịp chunk và trả lỗi
+429/5xx theo tỉ lệ. Trỏ API vào server này bằng GEMINI_BASE_URL:
+
+    python scripts/mock_llm_server.py --port 8001 --latency lognormal:0.8,0.3 --error-rate 0.02
+    GEMINI_BASE_URL=http://localhost:8001/v1 GEMINI_API_KEY=mock uvicorn app_api:app --port 8000
+
+Phân phối latency (giây): fixed:S | uniform:A,B | normal:MEAN,STD | lognormal:MEDIAN,SIGMA
+"""
+import json
+import math
+import time
+import uuid
+import random
+import asyncio
+import hashlib
+import argparse
+import threading
+from typing import List, Dict, Any, Callable, Sequence
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+ANSWERS = [
+    "BIDV cung cấp nhiều sản phẩm phù hợp với nhu cầu của quý khách.",
+    "Quý khách vui lòng liên hệ chi nhánh BIDV gần nhất để được tư vấn chi tiết.",
+    "Lãi suất và biểu phí có thể thay đổi theo từng thời kỳ và kỳ hạn.",
+    "Thủ tục đăng ký có thể thực hiện trực tuyến qua ứng dụng BIDV SmartBanking.",
+    "Hồ sơ cần chuẩn bị gồm giấy tờ tuỳ thân và các chứng từ liên quan.",
+]
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """Build a sampler (seconds) from `kind:params`"""
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v.strip()] if params else []
+    kind = kind.strip().lower()
+    if kind == "fixed":
+        value = values[0] if values else 0.0
+        return lambda rng: value
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "normal" and len(values) == 2:
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal" and len(values) == 2:
+        mu = math.log(max(values[0], 1e-6))
+        return lambda rng: rng.lognormvariate(mu, values[1])
+    raise ValueError(f"Invalid latency spec: {spec!r}")
+
+
+def completion_text(messages: List[Dict[str, Any]]) -> str:
+    """Deterministic answer derived from the last user message"""
+    question = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+    digest = int(hashlib.sha1(question.encode("utf-8")).hexdigest(), 16)
+    picked = [ANSWERS[(digest >> (8 * i)) % len(ANSWERS)] for i in range(3)]
+    return " ".join(dict.fromkeys(picked))
+
+
+def create_app(latency: str = "fixed:0", error_rate: float = 0.0, error_statuses: Sequence[int] = (503,),
+               chunk_interval_ms: float = 20.0, chunk_chars: int = 16, seed: int = 0) -> FastAPI:
+    """Build the mock server app (cũng dùng trực tiếp qua httpx.ASGITransport trong test)"""
+    app = FastAPI(title="Mock LLM")
+    sample_latency = parse_latency(latency)
+    rng = random.Random(seed)
+    rng_lock = threading.Lock()
+    stats = {"requests": 0, "streamed": 0, "errors": 0}
+
+    def draw():
+        with rng_lock:
+            return sample_latency(rng), rng.random() < error_rate, rng.choice(list(error_statuses))
+
+    def usage(messages, text):
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in messages)
+        completion_tokens = len(text.split())
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens}
+
+    async def chat_completions(request: Request):
+        body = await request.json()
+        messages = body.get("messages") or []
+        model = body.get("model", "mock")
+        delay, failed, status = draw()
+        stats["requests"] += 1
+
+        await asyncio.sleep(delay)
+        if failed:
+            stats["errors"] += 1
+            return JSONResponse({"error": {"message": f"mock error {status}", "code": status}}, status_code=status)
+
+        text = completion_text(messages)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+
+        if not body.get("stream"):
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": usage(messages, text)
+            }
+
+        stats["streamed"] += 1
+
+        def event(delta: Dict[str, Any], finish_reason=None) -> str:
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            }
+            return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+
+        async def stream():
+            yield event({"role": "assistant", "content": ""})
+            for i in range(0, len(text), chunk_chars):
+                if i:
+                    await asyncio.sleep(chunk_interval_ms / 1000)
+                yield event({"content": text[i:i + chunk_chars]})
+            yield event({}, finish_reason="stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    # Hỗ trợ cả base_url có và không có /v1
+    app.add_api_route("/v1/chat/completions", chat_completions, methods=["POST"])
+    app.add_api_route("/chat/completions", chat_completions, methods=["POST"])
+
+    @app.get("/stats")
+    def get_stats():
+        return stats
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible mock LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", default="lognormal:0.8,0.3", help="Phân phối latency trước byte đầu tiên (giây)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Tỉ lệ request trả lỗi (0-1)")
+    parser.add_argument("--error-statuses", default="503,429", help="Các HTTP status lỗi, chọn ngẫu nhiên")
+    parser.add_argument("--chunk-interval-ms", type=float, default=20.0, help="Nhịp giữa các chunk khi stream")
+    parser.add_argument("--chunk-chars", type=int, default=16, help="Số ký tự mỗi chunk khi stream")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    import uvicorn
+    app = create_app(
+        latency=args.latency,
+        error_rate=args.error_rate,
+        error_statuses=[int(s) for s in args.error_statuses.split(",") if s.strip()],
+        chunk_interval_ms=args.chunk_interval_ms,
+        chunk_chars=args.chunk_chars,
+        seed=args.seed
+    )
+    print(f"Mock LLM on http://{args.host}:{args.port}/v1 (latency={args.latency}, error_rate={args.error_rate})")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,14 @@
 import os
 import time
-import re
-import unicodedata
-from typing import List, Dict, Any, Union
+import random
+import asyncio
+import importlib.util
+from typing import List, Dict, Any, Union, Iterator, Optional
+import httpx
 from openai import OpenAI
 from dotenv import load_dotenv
+from src.utils.metrics import LatencyHistogram
+from src.generation.text_cleaner import TextCleaner  # re-export: vẫn import được từ llm_client
 from src.utils.logger import setup_logger
 
 logger = setup_logger(__name__)
@@ -19,93 +23,23 @@ def _cfg(d: Any, path: str, default: Any = None) -> Any:
             return default
     return cur
 
-class TextCleaner:
-    """Class để làm sạch văn bản trước khi gửi tới LLM."""
-    
-    SMART_MAP = {
-        "\u2018": "'", "\u2019": "'", "\u201A": "'", "\u201B": "'",
-        "\u201C": '"', "\u201D": '"', "\u201E": '"',
-        "\u2013": "-", "\u2014": "-", "\u2212": "-",  # en/em dash, minus
-        "\u00A0": " ",  # non-breaking space
-        "\u2026": "..." # ellipsis
-    }
-    
-    ZERO_WIDTH = {
-        "\u200B", "\u200C", "\u200D", "\u2060", "\uFEFF"  # ZWSP, ZWNJ, ZWJ, WJ, BOM
-    }
-    
-    @classmethod
-    def replace_smart_chars(cls, s: str) -> str:
-        """Thay thế các ký tự thông minh bằng ASCII tương đương."""
-        return "".join(cls.SMART_MAP.get(ch, ch) for ch in s)
-    
-    @classmethod
-    def remove_zero_width_and_controls(cls, s: str) -> str:
-        """Xóa zero-width chars và control chars, giữ lại \n, \t."""
-        out = []
-        for ch in s:
-            if ch in cls.ZERO_WIDTH:
-                continue
-            cat = unicodedata.category(ch)
-            # Bỏ control chars (Cc) và format (Cf), nhưng giữ \n, \t thủ công
-            if ch in ("\n", "\t"):
-                out.append(ch)
-            elif cat in ("Cc", "Cf"):
-                continue
-            else:
-                out.append(ch)
-        return "".join(out)
-    
-    @classmethod
-    def unescape_common_sequences(cls, s: str) -> str:
-        """Unescape các chuỗi thoát thường gặp."""
-        # Chỉ thay khi có backslash thật (\\n → \n). Nếu đã là newline thật thì không bị ảnh hưởng.
-        s = s.replace("\\n", "\n")
-        s = s.replace("\\t", "\t")
-        s = s.replace("\r\n", "\n").replace("\r", "\n")
-        return s
-    
-    @classmethod
-    def normalize_spaces_and_punct(cls, s: str) -> str:
-        """Chuẩn hóa khoảng trắng và dấu câu."""
-        # Nén nhiều khoảng trắng
-        s = re.sub(r"[ \t]+", " ", s)
-        # Xoá khoảng trắng trước dấu câu , . ; : % ) ?
-        s = re.sub(r"\s+([,.;:%\)\?])", r"\1", s)
-        # Xoá khoảng trắng sau ( và trước mở ngoặc
-        s = re.sub(r"(\()\s+", r"\1", s)
-        # Chuẩn hoá dòng trống: tối đa 1 dòng trống liên tiếp
-        s = re.sub(r"\n{3,}", "\n\n", s)
-        # Trim từng dòng
-        s = "\n".join(ln.rstrip() for ln in s.splitlines())
-        return s.strip()
-    
-    @classmethod
-    def clean_text(cls, s: str) -> str:
-        """Làm sạch văn bản hoàn chỉnh."""
-        if not s:
-            return s
-        # 1) Chuẩn hoá Unicode
-        s = unicodedata.normalize("NFKC", s)
-        # 2) Unescape các chuỗi thoát thường gặp
-        s = cls.unescape_common_sequences(s)
-        # 3) Thay ký tự "thông minh" → ASCII
-        s = cls.replace_smart_chars(s)
-        # 4) Bỏ zero-width, BOM, control chars (trừ \n, \t)
-        s = cls.remove_zero_width_and_controls(s)
-        # 5) Chuẩn hoá khoảng trắng & dấu câu
-        s = cls.normalize_spaces_and_punct(s)
-        return s
-
-class GeminiLLMClient:
-    """OpenAI-compatible client for Google AI Studio (Gemini)."""
+class FallbackResponse(str):
+    """Apology text returned in place of an answer when the LLM fails or answers nothing.
+
+    Là str nên dùng được như câu trả lời bình thường; caller nhận biết bằng
+    isinstance() thay vì so chuỗi (ví dụ để không cache câu xin lỗi).
+    """
+
+
+class _BaseLLMClient:
+    """Config và chuẩn hoá messages dùng chung cho client sync và async."""
     def __init__(self, config: Dict[str, Any]):
         load_dotenv()
 
-        api_key = os.getenv("GEMINI_API_KEY") or _cfg(config, "providers.gemini.GEMINI_API_KEY")
-        base_url = os.getenv("GEMINI_BASE_URL") or _cfg(config, "providers.gemini.GEMINI_BASE_URL")
+        self.api_key = os.getenv("GEMINI_API_KEY") or _cfg(config, "providers.gemini.GEMINI_API_KEY")
+        self.base_url = os.getenv("GEMINI_BASE_URL") or _cfg(config, "providers.gemini.GEMINI_BASE_URL")
 
-        if not api_key:
+        if not self.api_key:
             raise RuntimeError("Thiếu GEMINI_API_KEY")
 
         self.model_name = _cfg(config, "models.llm_model", "gemini-2.5-flash")
@@ -118,33 +52,49 @@ class GeminiLLMClient:
         # Khởi tạo text cleaner
         self.text_cleaner = TextCleaner()
 
-        t0 = time.time()
-        self.client = OpenAI(api_key=api_key, base_url=base_url, timeout=self.timeout)
-        logger.info(f"Gemini client ready in {time.time()-t0:.2f}s | model={self.model_name}")
-
     def _clean_messages(self, messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
         """Làm sạch nội dung các messages trước khi gửi."""
         clean_messages = []
         for msg in messages:
-            clean_content = self.text_cleaner.clean_text(msg['content'])
+            # System message giống hệt nhau mỗi request → dùng bản đã làm sạch có memo
+            if msg['role'] == 'system':
+                clean_content = self.text_cleaner.clean_text_cached(msg['content'])
+            else:
+                clean_content = self.text_cleaner.clean_text(msg['content'])
             clean_messages.append({'role': msg['role'], 'content': clean_content})
         return clean_messages
 
-    def generate(self, prompt_or_messages: Union[str, List[Dict[str, str]]], language: str = "vi") -> str:
-        """Sinh câu trả lời từ Gemini với text cleaning."""
-        fallback = (
+    def _prepare_messages(self, prompt_or_messages: Union[str, List[Dict[str, str]]]) -> List[Dict[str, str]]:
+        """Chuẩn hoá input thành danh sách messages đã làm sạch."""
+        if isinstance(prompt_or_messages, str):
+            # Làm sạch prompt string
+            clean_prompt = self.text_cleaner.clean_text(prompt_or_messages)
+            return [{"role": "user", "content": clean_prompt}]
+        # Làm sạch tất cả messages
+        return self._clean_messages(prompt_or_messages)
+
+    @staticmethod
+    def _fallback(language: str) -> FallbackResponse:
+        return FallbackResponse(
             "Xin lỗi, tôi không thể tạo câu trả lời cho câu hỏi này."
             if language == "vi"
             else "Sorry, I couldn't generate a response for this query."
         )
+
+class GeminiLLMClient(_BaseLLMClient):
+    """OpenAI-compatible client for Google AI Studio (Gemini)."""
+    def __init__(self, config: Dict[str, Any]):
+        super().__init__(config)
+
+        t0 = time.time()
+        self.client = OpenAI(api_key=self.api_key, base_url=self.base_url, timeout=self.timeout)
+        logger.info(f"Gemini client ready in {time.time()-t0:.2f}s | model={self.model_name}")
+
+    def generate(self, prompt_or_messages: Union[str, List[Dict[str, str]]], language: str = "vi") -> str:
+        """Sinh câu trả lời từ Gemini với text cleaning."""
+        fallback = self._fallback(language)
         try:
-            if isinstance(prompt_or_messages, str):
-                # Làm sạch prompt string
-                clean_prompt = self.text_cleaner.clean_text(prompt_or_messages)
-                messages = [{"role": "user", "content": clean_prompt}]
-            else:
-                # Làm sạch tất cả messages
-                messages = self._clean_messages(prompt_or_messages)
+            messages = self._prepare_messages(prompt_or_messages)
 
             logger.debug(f"Cleaned messages: {messages}")
 
@@ -181,4 +131,300 @@ class GeminiLLMClient:
 
         except Exception as e:
             logger.error(f"Lỗi khi gọi Gemini: {e}")
-            return fallback
\ No newline at end of file
+            return fallback
+
+    def generate_stream(self, prompt_or_messages: Union[str, List[Dict[str, str]]], language: str = "vi",
+                        deadline: Optional[float] = None) -> Iterator[str]:
+        """Sinh câu trả lời dạng stream, yield từng delta ngay khi nhận được.
+
+        `deadline` (time.monotonic) giới hạn cả request lẫn thời gian đọc stream;
+        quá hạn thì dừng đọc và raise LLMError(kind="deadline").
+        """
+        emitted = False
+        expired = False
+        timeout = self.timeout
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.monotonic())
+            if timeout <= 0:
+                raise LLMError("deadline", "Request deadline exceeded before the LLM call", attempts=0)
+        try:
+            messages = self._prepare_messages(prompt_or_messages)
+
+            logger.debug(f"Cleaned messages: {messages}")
+
+            resp = self.client.chat.completions.create(
+                model=self.model_name,
+                messages=messages,
+                temperature=self.temperature,
+                top_p=self.top_p,
+                max_tokens=self.max_tokens,
+                stream=True,
+                timeout=timeout
+            )
+
+            try:
+                for chunk in resp:
+                    if deadline is not None and time.monotonic() >= deadline:
+                        expired = True
+                        break
+                    if not chunk.choices:
+                        continue
+                    delta = getattr(chunk.choices[0].delta, "content", None)
+                    if delta:
+                        emitted = True
+                        yield delta
+            finally:
+                # Đóng kết nối HTTP khi dừng sớm (quá hạn hoặc consumer ngừng đọc)
+                resp.close()
+
+        except Exception as e:
+            logger.error(f"Lỗi khi stream từ Gemini: {e}")
+            expired = deadline is not None and time.monotonic() >= deadline
+
+        if expired:
+            raise LLMError("deadline", "Request deadline exceeded while streaming")
+        if not emitted:
+            yield self._fallback(language)
+
+
+DEFAULT_GEMINI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/openai/"
+
+
+class LLMError(Exception):
+    """Structured LLM call failure.
+
+    kind: timeout | deadline | rate_limited | server | client | transport | invalid_response
+    """
+    RETRYABLE_KINDS = {"timeout", "rate_limited", "server", "transport"}
+
+    def __init__(self, kind: str, message: str, status: Optional[int] = None,
+                 attempts: int = 1, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.kind = kind
+        self.status = status
+        self.attempts = attempts
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        return self.kind in self.RETRYABLE_KINDS
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"kind": self.kind, "message": str(self), "status": self.status,
+                "attempts": self.attempts, "retryable": self.retryable}
+
+
+class AsyncGeminiLLMClient(_BaseLLMClient):
+    """Async Gemini client (OpenAI-compatible REST) on a pooled httpx connection.
+
+    - Một httpx.AsyncClient dùng chung (HTTP/2 nếu có package `h2`), giữ keep-alive
+    - Retry 429/5xx/timeout/lỗi kết nối với exponential backoff + jitter, tôn trọng Retry-After
+    - `deadline` (time.monotonic()) giới hạn tổng thời gian kể cả retry; timeout mỗi lần gọi
+      không vượt quá thời gian còn lại
+    - Hedging (tuỳ chọn): chưa có kết quả sau p95 latency thì gửi thêm một request, lấy
+      kết quả về trước và huỷ request còn lại
+    - Lỗi trả về cho caller dưới dạng LLMError, không nuốt thành câu xin lỗi
+    """
+    def __init__(self, config: Dict[str, Any], transport: Optional[httpx.AsyncBaseTransport] = None):
+        super().__init__(config)
+        self.base_url = (self.base_url or DEFAULT_GEMINI_BASE_URL).rstrip("/") + "/"
+        self.transport = transport  # thay transport mạng (vd. httpx.MockTransport trong test)
+
+        self.http2 = bool(_cfg(config, "llm.http2", True))
+        if self.http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("Package 'h2' is not installed, LLM client falls back to HTTP/1.1")
+            self.http2 = False
+        self.max_connections = int(_cfg(config, "llm.max_connections", 20))
+        self.max_keepalive = int(_cfg(config, "llm.max_keepalive_connections", 10))
+        self.keepalive_expiry = float(_cfg(config, "llm.keepalive_expiry_sec", 30))
+        self.connect_timeout = float(_cfg(config, "llm.connect_timeout_sec", 5))
+
+        self.max_retries = int(_cfg(config, "llm.max_retries", 3))
+        self.backoff_base = float(_cfg(config, "llm.backoff_base_sec", 0.25))
+        self.backoff_max = float(_cfg(config, "llm.backoff_max_sec", 4.0))
+
+        self.hedge_enabled = bool(_cfg(config, "llm.hedge.enabled", False))
+        self.hedge_percentile = float(_cfg(config, "llm.hedge.percentile", 95))
+        self.hedge_min_samples = int(_cfg(config, "llm.hedge.min_samples", 20))
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop = None
+
+        # latency: cả lời gọi (kể cả retry/hedge); attempt_latency: từng HTTP request thành công
+        self.latency = LatencyHistogram()
+        self.attempt_latency = LatencyHistogram()
+        self.stats = {"requests": 0, "attempts": 0, "retries": 0, "hedged": 0, "hedge_wins": 0,
+                      "errors": 0, "errors_by_kind": {}}
+
+    # ---------- connection pool ----------
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # httpx.AsyncClient gắn với event loop tạo ra nó: đổi loop (vd. asyncio.run trong script) thì tạo lại
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._client_loop is not loop:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                http2=self.http2,
+                transport=self.transport,
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive,
+                    keepalive_expiry=self.keepalive_expiry
+                ),
+                timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout)
+            )
+            self._client_loop = loop
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+    # ---------- request ----------
+
+    @staticmethod
+    def _retry_after(response: httpx.Response) -> Optional[float]:
+        value = response.headers.get("retry-after")
+        try:
+            return max(0.0, float(value)) if value is not None else None
+        except ValueError:
+            return None
+
+    async def _attempt(self, payload: Dict[str, Any], deadline: float) -> str:
+        """One HTTP call, bounded by the remaining time before `deadline`"""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise LLMError("deadline", "Deadline exceeded before calling the LLM")
+
+        timeout = min(self.timeout, remaining)
+        self.stats["attempts"] += 1
+        start = time.perf_counter()
+        try:
+            # Timeout của httpx tính theo từng pha (connect/read giữa các byte), wait_for giới hạn tổng thời gian
+            response = await asyncio.wait_for(
+                self._get_client().post(
+                    "chat/completions", json=payload,
+                    timeout=httpx.Timeout(timeout, connect=min(self.connect_timeout, timeout))
+                ),
+                timeout
+            )
+        except (httpx.TimeoutException, asyncio.TimeoutError) as e:
+            raise LLMError("timeout", f"LLM request timed out after {timeout:.1f}s: {e!r}")
+        except httpx.TransportError as e:
+            raise LLMError("transport", f"LLM transport error: {e!r}")
+
+        if response.status_code == 429:
+            raise LLMError("rate_limited", "LLM rate limited (429)", status=429,
+                           retry_after=self._retry_after(response))
+        if response.status_code >= 500:
+            raise LLMError("server", f"LLM server error ({response.status_code})", status=response.status_code,
+                           retry_after=self._retry_after(response))
+        if response.status_code >= 400:
+            raise LLMError("client", f"LLM request rejected ({response.status_code}): {response.text[:200]}",
+                           status=response.status_code)
+
+        try:
+            content = response.json()["choices"][0]["message"].get("content") or ""
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            raise LLMError("invalid_response", f"Unexpected LLM response: {e!r}", status=response.status_code)
+        self.attempt_latency.observe(time.perf_counter() - start)
+        return content
+
+    async def _call_with_retries(self, payload: Dict[str, Any], deadline: float) -> str:
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return await self._attempt(payload, deadline)
+            except LLMError as e:
+                e.attempts = attempt
+                if not e.retryable or attempt > self.max_retries:
+                    raise
+                # Full jitter; Retry-After của server được ưu tiên nếu lớn hơn
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+                if e.retry_after is not None:
+                    delay = max(delay, e.retry_after)
+                if time.monotonic() + delay >= deadline:
+                    raise LLMError("deadline", f"Deadline exceeded after {attempt} attempts (last: {e})",
+                                   status=e.status, attempts=attempt) from e
+                self.stats["retries"] += 1
+                logger.warning(f"LLM call failed ({e.kind}), retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    def _hedge_delay(self) -> Optional[float]:
+        if not self.hedge_enabled or self.attempt_latency.count < self.hedge_min_samples:
+            return None
+        return self.attempt_latency.percentile(self.hedge_percentile)
+
+    async def _call_hedged(self, payload: Dict[str, Any], deadline: float) -> str:
+        delay = self._hedge_delay()
+        if delay is None:
+            return await self._call_with_retries(payload, deadline)
+
+        primary = asyncio.ensure_future(self._call_with_retries(payload, deadline))
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done and time.monotonic() < deadline:
+                self.stats["hedged"] += 1
+                tasks.add(asyncio.ensure_future(self._call_with_retries(payload, deadline)))
+
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.stats["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks | {primary}:
+                if not task.done():
+                    task.cancel()
+
+    async def agenerate(self, prompt_or_messages: Union[str, List[Dict[str, str]]], language: str = "vi",
+                        deadline: Optional[float] = None) -> str:
+        """Sinh câu trả lời; `deadline` là mốc time.monotonic() mà caller không chờ quá.
+
+        Raises LLMError khi hết retry, hết deadline hoặc request bị từ chối.
+        """
+        messages = self._prepare_messages(prompt_or_messages)
+        logger.debug(f"Cleaned messages: {messages}")
+        payload = {
+            "model": self.model_name,
+            "messages": messages,
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+            "max_tokens": self.max_tokens
+        }
+        if deadline is None:
+            deadline = time.monotonic() + self.timeout * (self.max_retries + 1)
+
+        self.stats["requests"] += 1
+        start = time.perf_counter()
+        try:
+            content = await self._call_hedged(payload, deadline)
+        except LLMError as e:
+            self.stats["errors"] += 1
+            self.stats["errors_by_kind"][e.kind] = self.stats["errors_by_kind"].get(e.kind, 0) + 1
+            logger.error(f"Lỗi khi gọi Gemini: {e}")
+            raise
+        self.latency.observe(time.perf_counter() - start)
+        return content.strip() or self._fallback(language)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get LLM client statistics and latency histograms"""
+        return {
+            "model": self.model_name,
+            "http2": self.http2,
+            "max_connections": self.max_connections,
+            "hedge_enabled": self.hedge_enabled,
+            "hedge_delay_ms": round(self._hedge_delay() * 1000, 2) if self._hedge_delay() is not None else None,
+            "latency": self.latency.snapshot(),
+            "attempt_latency": self.attempt_latency.snapshot(),
+            **self.stats
+        }
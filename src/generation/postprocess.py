@@ -0,0 +1,185 @@
+import re
+from typing import List, Iterable, Iterator, Callable, Tuple
+from src.utils.tracing import tracer
+
+# Các cụm nói về thiếu thông tin (cũng dùng để trừ điểm chất lượng)
+INCOMPLETE_INFO_PATTERNS = [
+    r"không được cung cấp đầy đủ",
+    r"thông tin không đầy đủ",
+    r"thiếu thông tin",
+    r"chưa có thông tin cụ thể"
+]
+CONTACT_MESSAGE = "Quý khách vui lòng liên hệ chi nhánh để được tư vấn chi tiết."
+
+# Response chào hỏi / từ chối giữ nguyên, không qua pipeline
+SKIP_CLEAN_MARKERS = (
+    "Tôi không tìm thấy thông tin phù hợp",
+    "Chào quý khách",
+    "Xin chào",
+    "Cảm ơn"
+)
+
+# Một regex gộp cho 4 cụm (câu thay thế không chứa cụm nào nên gộp không đổi kết quả)
+_INCOMPLETE_INFO_RE = re.compile("|".join(INCOMPLETE_INFO_PATTERNS), re.I)
+
+_CUSTOMER_RE = re.compile(r'\bquý khách hàng\b', re.I)
+# Xoá lần lượt (xoá cụm trước có thể làm lộ cụm sau)
+_REDUNDANT_OPENING_RES = [
+    re.compile(r"quý khách hàng có thể tham khảo\s*", re.I),
+    re.compile(r"theo thông tin từ tài liệu\s*,?\s*", re.I),
+    re.compile(r"dựa trên thông tin được cung cấp\s*,?\s*", re.I)
+]
+
+_BULLET_RE = re.compile(r'^\s*[•*]\s+', re.M)
+_LINE_BULLET_RE = re.compile(r'^[•*]\s+')
+_SPACE_BEFORE_PUNCT_RE = re.compile(r'\s+([,.;:!?])')
+_PUNCT_BEFORE_UPPER_RE = re.compile(r'([,.;:!?])([A-ZÁĂÂÉÊÍÓÔƠÚƯÝ])')
+_SPACES_RE = re.compile(r'[ \t]+')
+_BLANK_LINES_RE = re.compile(r'\n{3,}')
+
+# Dòng câu hỏi tự sinh (4 dấu hiệu gộp thành một regex) hoặc dòng đáp án a) b) c) d)
+_QUESTION_LINE_RE = re.compile(
+    r'\?$'                                          # Ends with ?
+    r'|^(?:có bao nhiêu|hãy|liệt kê|mô tả|tại sao)'
+    r'|(?:là gì|như thế nào|ra sao)\?'
+    r'|^(?:what|how|why|when|where)\b',
+    re.I
+)
+_DROP_LINE_RE = re.compile(_QUESTION_LINE_RE.pattern + r'|^[a-dA-D][).]', re.I)
+
+_BOLD_RE = re.compile(r"\*\*(.*?)\*\*")
+_EMPTY_BULLET_RE = re.compile(r'^\s*-\s*$', re.M)
+_EMPTY_BULLET_LINE_RE = re.compile(r'^\s*-\s*$')
+_WORD_END_RE = re.compile(r"[A-Za-zÀ-ỹ0-9]$")
+NESTED_NUMBERING_RE = re.compile(r'\d+\.\s+.*\d+\.\s+')
+
+
+def _bold_to_line(match: re.Match) -> str:
+    return "\n" + match.group(1).strip()
+
+
+def should_clean(response: str) -> bool:
+    """Kiểm tra xem có nên làm sạch response hay không."""
+    return not any(marker in response for marker in SKIP_CLEAN_MARKERS)
+
+
+def is_question_line(line: str) -> bool:
+    """Kiểm tra dòng câu hỏi."""
+    return _QUESTION_LINE_RE.search(line) is not None
+
+
+def fix_incomplete_info_statements(text: str) -> str:
+    """Xử lý các câu nói về thông tin không đầy đủ."""
+    # Đa số response không có cụm nào → trả về ngay
+    if not _INCOMPLETE_INFO_RE.search(text):
+        return text
+    # Cả câu (tới dấu chấm) chứa cụm → thay bằng CONTACT_MESSAGE; đoạn cuối chưa có dấu chấm giữ nguyên.
+    # Tách theo '.' cho kết quả như re.sub(r"[^.]*(cụm)[^.]*\.") nhưng tuyến tính thay vì backtrack O(n^2)
+    sentences = text.split('.')
+    replacement = CONTACT_MESSAGE[:-1]
+    for i in range(len(sentences) - 1):
+        if _INCOMPLETE_INFO_RE.search(sentences[i]):
+            sentences[i] = replacement
+    return '.'.join(sentences)
+
+
+def reduce_redundant_phrases(text: str) -> str:
+    """Giảm redundancy trong cách diễn đạt."""
+    # Giảm "Quý khách hàng" lặp lại: giữ ở câu đầu, các câu sau (sau '. ' đầu tiên) đổi thành "bạn"
+    first_break = text.find('. ')
+    if first_break >= 0:
+        head, tail = text[:first_break + 2], text[first_break + 2:]
+        text = head + _CUSTOMER_RE.sub('bạn', tail)
+
+    # Remove redundant opening phrases
+    for pattern in _REDUNDANT_OPENING_RES:
+        text = pattern.sub("", text)
+    return text
+
+
+def improve_formatting(text: str) -> str:
+    """Cải thiện formatting tổng thể."""
+    text = _BULLET_RE.sub('- ', text)
+    text = _SPACE_BEFORE_PUNCT_RE.sub(r'\1', text)
+    text = _PUNCT_BEFORE_UPPER_RE.sub(r'\1 \2', text)
+    text = _SPACES_RE.sub(' ', text)
+    return _BLANK_LINES_RE.sub('\n\n', text)
+
+
+def remove_generated_questions(text: str) -> str:
+    """Xóa các câu hỏi được tạo tự động và options (một lượt qua các dòng)."""
+    search = _DROP_LINE_RE.search
+    return '\n'.join(line for line in (ln.strip() for ln in text.split('\n')) if not search(line))
+
+
+def final_polish(text: str) -> str:
+    """Polish cuối cùng."""
+    text = text.strip()
+
+    # Thay **...** bằng xuống dòng
+    text = _BOLD_RE.sub(_bold_to_line, text)
+
+    # Remove empty bullets
+    text = _EMPTY_BULLET_RE.sub('', text)
+
+    # Ensure proper sentence endings (chỉ thêm . nếu kết thúc bằng chữ/số)
+    if _WORD_END_RE.search(text) and not text.endswith((':', '-', '\n')):
+        text += "."
+
+    # Clean up whitespace (xóa dòng trống thừa)
+    return '\n'.join(line.rstrip() for line in text.splitlines() if line.strip())
+
+
+# Thứ tự pipeline; mỗi bước được đo bằng span "generate.postprocess.<tên>"
+STEPS: List[Tuple[str, Callable[[str], str]]] = [
+    ("incomplete_info", fix_incomplete_info_statements),
+    ("redundant_phrases", reduce_redundant_phrases),
+    ("formatting", improve_formatting),
+    ("remove_questions", remove_generated_questions),
+    ("final_polish", final_polish),
+]
+_STEP_SPANS = [(f"generate.postprocess.{name}", step) for name, step in STEPS]
+
+
+def clean_response(raw_response: str) -> str:
+    """Enhanced response cleaning pipeline."""
+    text = raw_response.strip()
+    for span_name, step in _STEP_SPANS:
+        with tracer.span(span_name):
+            text = step(text)
+    return text.strip()
+
+
+def clean_line(line: str) -> str:
+    """Line-local subset of the cleaning pipeline (safe to run before the full text is known)."""
+    line = line.strip()
+    if not line or _DROP_LINE_RE.search(line):
+        return ""
+
+    line = _LINE_BULLET_RE.sub('- ', line)
+    line = _SPACE_BEFORE_PUNCT_RE.sub(r'\1', line)
+    line = _PUNCT_BEFORE_UPPER_RE.sub(r'\1 \2', line)
+    line = _SPACES_RE.sub(' ', line)
+    line = _BOLD_RE.sub(_bold_to_line, line)
+
+    # Bỏ dòng rỗng và bullet rỗng sinh ra sau khi thay **...**
+    return "\n".join(ln.rstrip() for ln in line.splitlines()
+                     if ln.strip() and not _EMPTY_BULLET_LINE_RE.match(ln))
+
+
+def clean_stream(deltas: Iterable[str]) -> Iterator[str]:
+    """Incremental cleaning: buffer deltas into lines and emit each cleaned line once complete."""
+    buffer = ""
+    for delta in deltas:
+        buffer += delta
+        if "\n" not in delta:
+            continue
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            cleaned = clean_line(line)
+            if cleaned:
+                yield cleaned + "\n"
+
+    cleaned = clean_line(buffer)
+    if cleaned:
+        yield cleaned
@@ -1,12 +1,53 @@
 from textwrap import dedent
-from typing import List
+from typing import List, Dict, Any, Union, Tuple, FrozenSet, Optional
+from src.generation.tokenizer import TokenCounter
+# re-export: vẫn import được từ prompt_template
+from src.utils.context_text import (
+    STOPWORDS, CONTEXT_CLEAN_FIELD, CONTEXT_TOKENS_FIELD, clean_context, tokenize, prepare_context,
+    prepared_context
+)
 from src.utils.logger import setup_logger
 import re
 
 logger = setup_logger(__name__)
 
+
+def token_similarity(ta: FrozenSet[str], tb: FrozenSet[str]) -> float:
+    """Improved similarity calculation."""
+    if not ta or not tb:
+        return 0.0
+
+    intersection = len(ta & tb)
+    union = len(ta) + len(tb) - intersection
+
+    # Jaccard + length penalty cho contexts quá khác biệt về độ dài
+    jaccard = intersection / union
+    len_ratio = min(len(ta), len(tb)) / max(len(ta), len(tb))
+
+    return jaccard * (0.7 + 0.3 * len_ratio)  # Weight by length similarity
+
+# Template user message (format sau khi dedent nên context nhiều dòng không lệch thụt lề)
+CONTEXT_PROMPT = dedent("""\
+    CÂU HỎI: {query}
+
+    THÔNG TIN TÀI LIỆU BIDV:
+    {context_text}
+
+    Trả lời theo ĐỊNH DẠNG CHUẨN. Tập trung vào thông tin quan trọng nhất cho câu hỏi.
+""").strip()
+
+NO_CONTEXT_PROMPT = dedent("""\
+    CÂU HỎI: {query}
+
+    THÔNG TIN TÀI LIỆU: Không có thông tin liên quan
+
+    Hãy trả lời theo quy tắc khi thiếu thông tin.
+""").strip()
+
+
 class PromptTemplate:
-    def __init__(self):
+    def __init__(self, max_input_contexts: int = 5, max_contexts: int = 3,
+                 token_counter: Optional[TokenCounter] = None, token_budget: int = 1200):
         # Enhanced system message với better instructions
         self.system_message = dedent("""
             Bạn là Trợ lý AI chuyên nghiệp của Ngân hàng BIDV.
@@ -27,7 +68,14 @@ class PromptTemplate:
             """).strip()
 
 
-        self.max_chars = 4000
+        # Budget token cho user message (câu hỏi + context), đếm bằng tokenizer của LLM
+        self.token_counter = token_counter or TokenCounter('estimate')
+        self.token_budget = token_budget
+        # Phần budget còn lại ít hơn mức này thì không chèn thêm context bị cắt
+        self.min_context_tokens = 32
+        # Số context retrieve được xét dedup và số context tối đa đưa vào prompt
+        self.max_input_contexts = max_input_contexts
+        self.max_contexts = max_contexts
 
         # Patterns cho greeting detection
         self.greeting_patterns = [
@@ -43,9 +91,6 @@ class PromptTemplate:
             re.compile(r"\btạm biệt\b|\bbye\b", re.IGNORECASE),
         ]
 
-        # Stopwords cho deduplication
-        self._stop = set("và hoặc là của các những được từ cho với tại trên dưới trong khi nếu hoặc hay một số".split())
-
     def _is_greeting(self, query: str) -> bool:
         q = (query or "").strip().lower()
         return any(pat.match(q) for pat in self.greeting_patterns)
@@ -54,79 +99,91 @@ class PromptTemplate:
         q = (query or "").strip().lower()
         return any(pat.search(q) for pat in self.simple_patterns)
 
-    def _enhanced_clean_context(self, text: str) -> str:
-        """Enhanced context cleaning."""
-        if not text:
-            return ""
-        
-        t = text
-        
-        # Remove citations
-        t = re.sub(r"\[\s*\d+\s*\]", " ", t)
-        t = re.sub(r"\(\s*\d+\s*\)", " ", t)
-        
-        # Remove standalone reference numbers (careful with years)
-        t = re.sub(r"(?:(?<=\s)|(?<=\.|,|;|:))\d{1,2}(?=\s|$)", " ", t)
-        
-        # Better space normalization
-        t = re.sub(r"[ \t]+", " ", t)
-        t = re.sub(r"\s+([,.;:%\)\?])", r"\1", t)
-        t = re.sub(r"(\()\s+", r"\1", t)
-        
-        # Better line break handling
-        t = re.sub(r"\n{3,}", "\n\n", t)
-        t = "\n".join(ln.rstrip() for ln in t.splitlines())
-        
-        return t.strip()
-
-    def _tokenize(self, s: str) -> List[str]:
-        return [w for w in re.findall(r"\w+", s.lower()) if w not in self._stop]
-
-    def _similarity_score(self, a: str, b: str) -> float:
-        """Improved similarity calculation."""
-        ta, tb = set(self._tokenize(a)), set(self._tokenize(b))
-        if not ta or not tb:
-            return 0.0
-        
-        intersection = len(ta & tb)
-        union = len(ta | tb)
-        
-        # Jaccard + length penalty cho contexts quá khác biệt về độ dài
-        jaccard = intersection / union
-        len_ratio = min(len(ta), len(tb)) / max(len(ta), len(tb))
-        
-        return jaccard * (0.7 + 0.3 * len_ratio)  # Weight by length similarity
-
-    def _optimize_context(self, contexts: List[str]) -> List[str]:
-        """Enhanced context optimization."""
+    @staticmethod
+    def _prepared(ctx: Union[str, Dict[str, Any]]) -> Tuple[str, FrozenSet[str]]:
+        """(cleaned text, token set) of a context; chunks carry them precomputed from ingest"""
+        if isinstance(ctx, dict):
+            # Chunk cũ chưa có field precompute thì clean từ text của chunk
+            return prepared_context(ctx)
+        clean = clean_context(ctx)
+        return clean, frozenset(tokenize(clean))
+
+    def _optimize_context(self, contexts: List[Union[str, Dict[str, Any]]]) -> List[str]:
+        """Enhanced context optimization.
+
+        `contexts` là text thô hoặc chunk đã có field từ prepare_context(); context
+        chỉ được clean khi cần (dừng khi đủ max_contexts) và so trùng bằng tập token.
+        """
         if not contexts:
             return []
 
-        # Clean all contexts first
-        cleaned = []
-        for ctx in contexts[:5]:  # Limit input contexts
-            clean_ctx = self._enhanced_clean_context(ctx)
-            if clean_ctx and len(clean_ctx.strip()) > 20:  # Filter too short
-                cleaned.append(clean_ctx)
+        unique: List[Tuple[str, FrozenSet[str]]] = []
+        for ctx in contexts[:self.max_input_contexts]:  # Limit input contexts
+            clean_ctx, tokens = self._prepared(ctx)
+            if not clean_ctx or len(clean_ctx.strip()) <= 20:  # Filter too short
+                continue
 
-        # Enhanced deduplication
-        unique = []
-        for ctx in cleaned:
             # Check similarity with existing contexts
             is_duplicate = any(
-                self._similarity_score(ctx, existing) > 0.75 
-                for existing in unique
+                token_similarity(tokens, existing) > 0.75
+                for _, existing in unique
             )
-            
+
             if not is_duplicate:
-                unique.append(ctx)
-                
-            if len(unique) >= 3:  # Max 3 contexts
+                unique.append((clean_ctx, tokens))
+
+            if len(unique) >= self.max_contexts:
+                break
+
+        return [clean_ctx for clean_ctx, _ in unique]
+
+    def _pack_contexts(self, query: str, contexts: List[str]) -> Tuple[str, List[str]]:
+        """Greedily fill the token budget with `[Nguồn i]` blocks in relevance order.
+
+        Context đầu tiên không còn vừa budget được cắt tại ranh giới câu (thêm "...")
+        và dừng ở đó; context tiếp theo ít liên quan hơn nên không chen vào phần còn lại.
+        Câu hỏi quá dài được cắt để luôn chừa chỗ cho ít nhất một context; trả về
+        (câu hỏi đưa vào prompt, các block).
+        """
+        counter = self.token_counter
+        ellipsis_tokens = counter.count("...")
+        overhead = counter.count(CONTEXT_PROMPT.format(query="", context_text=""))
+        if contexts:
+            # Giữ tối thiểu min_context_tokens cho [Nguồn 1], phần còn lại mới dành cho câu hỏi
+            query_budget = self.token_budget - overhead - counter.count("[Nguồn 1]: ") - self.min_context_tokens
+            query_tokens = counter.count(query)
+            if query_tokens > query_budget:
+                trimmed, _ = counter.trim(query, max(query_budget - ellipsis_tokens, 1))
+                logger.warning(f"Query of {query_tokens} tokens exceeds the prompt budget, "
+                               f"trimmed to {counter.count(trimmed)} tokens")
+                query = trimmed + "..."
+
+        remaining = self.token_budget - counter.count(CONTEXT_PROMPT.format(query=query, context_text=""))
+        blocks: List[str] = []
+        for i, ctx in enumerate(contexts, 1):
+            prefix = f"[Nguồn {i}]: "
+            available = remaining - counter.count(prefix) - (counter.count("\n\n") if blocks else 0)
+            if available < self.min_context_tokens:
+                break
+            ctx_tokens = counter.count(ctx)
+            truncated = ctx_tokens > available
+            if truncated:
+                ctx, ctx_tokens = counter.trim(ctx, available - ellipsis_tokens)
+                if not ctx:
+                    break
+                ctx += "..."
+                ctx_tokens += ellipsis_tokens
+            blocks.append(prefix + ctx)
+            remaining = available - ctx_tokens
+            if truncated:
                 break
+        return query, blocks
 
-        return unique
+    def count_tokens(self, messages: List[dict]) -> int:
+        """Prompt tokens of built messages, as counted by the configured tokenizer"""
+        return self.token_counter.count_messages(messages)
 
-    def build_messages(self, query: str, contexts: List[str]) -> List[dict]:
+    def build_messages(self, query: str, contexts: List[Union[str, Dict[str, Any]]]) -> List[dict]:
         """Enhanced message building."""
         query = (query or "").strip()
 
@@ -144,74 +201,14 @@ class PromptTemplate:
                 {"role": "user", "content": query}
             ]
 
-        # Optimize contexts
-        optimized = self._optimize_context(contexts)
+        # Optimize contexts, then pack them into the token budget
+        query, blocks = self._pack_contexts(query, self._optimize_context(contexts))
 
         # Build user message với better structure
-        if not optimized:
-            user_content = dedent(f"""\
-                CÂU HỎI: {query}
-
-                THÔNG TIN TÀI LIỆU: Không có thông tin liên quan
-
-                Hãy trả lời theo quy tắc khi thiếu thông tin.
-            """).strip()
+        if not blocks:
+            user_content = NO_CONTEXT_PROMPT.format(query=query)
         else:
-            # Better context formatting
-            context_blocks = []
-            for i, ctx in enumerate(optimized, 1):
-                # Smart truncation - keep important parts
-                if len(ctx) > 600:
-                    # Try to truncate at sentence boundary
-                    truncated = ctx[:600]
-                    last_period = truncated.rfind('.')
-                    if last_period > 400:  # If we can find a good break point
-                        ctx = truncated[:last_period + 1] + "..."
-                    else:
-                        ctx = truncated.rstrip() + "..."
-                
-                context_blocks.append(f"[Nguồn {i}]: {ctx}")
-            
-            context_text = "\n\n".join(context_blocks)
-            
-            user_content = dedent(f"""\
-                CÂU HỎI: {query}
-
-                THÔNG TIN TÀI LIỆU BIDV:
-                {context_text}
-
-                Trả lời theo ĐỊNH DẠNG CHUẨN. Tập trung vào thông tin quan trọng nhất cho câu hỏi.
-            """).strip()
-
-        # Length safety check
-        if len(user_content) > self.max_chars:
-            logger.warning("Prompt length (%d) exceeds limit, truncating...", len(user_content))
-            
-            # Smart truncation strategy
-            header = f"CÂU HỎI: {query}\n\nTHÔNG TIN TÀI LIỆU BIDV:\n"
-            footer = "\n\nTrả lời theo ĐỊNH DẠNG CHUẨN, tập trung vào thông tin quan trọng nhất."
-            
-            available_space = self.max_chars - len(header) - len(footer) - 50
-            
-            if optimized:
-                # Truncate contexts proportionally
-                total_ctx_len = sum(len(ctx) for ctx in optimized)
-                truncated_contexts = []
-                
-                for i, ctx in enumerate(optimized):
-                    target_len = int((len(ctx) / total_ctx_len) * available_space)
-                    target_len = max(100, min(target_len, len(ctx)))  # Min 100, max original
-                    
-                    if len(ctx) > target_len:
-                        ctx = ctx[:target_len].rstrip() + "..."
-                    
-                    truncated_contexts.append(f"[Nguồn {i+1}]: {ctx}")
-                
-                context_text = "\n\n".join(truncated_contexts)
-            else:
-                context_text = "Không có thông tin liên quan"
-            
-            user_content = header + context_text + footer
+            user_content = CONTEXT_PROMPT.format(query=query, context_text="\n\n".join(blocks))
 
         return [
             {"role": "system", "content": self.system_message},
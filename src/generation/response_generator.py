@@ -1,8 +1,10 @@
-from typing import List, Dict, Any
-import re
-from src.generation.llm_client import GeminiLLMClient
+from typing import List, Dict, Any, Iterator, Iterable, Optional, Union
+from src.generation import postprocess
+from src.generation.llm_client import GeminiLLMClient, AsyncGeminiLLMClient, FallbackResponse
 from src.generation.prompt_template import PromptTemplate
+from src.generation.tokenizer import get_token_counter
 from src.utils.config import Config
+from src.utils.tracing import tracer
 from src.utils.logger import setup_logger
 
 logger = setup_logger(__name__)
@@ -11,29 +13,109 @@ class ResponseGenerator:
     def __init__(self, config: Config):
         self.config = config
         self.llm_client = GeminiLLMClient(config)
-        self.prompt_template = PromptTemplate()
-        
+        # Client async (httpx pool, retry, deadline, hedging) cho API server
+        self.async_llm_client = AsyncGeminiLLMClient(config)
+        # Dedup context dùng token set tính sẵn lúc ingest nên có thể xét nhiều context hơn top 5
+        self.prompt_template = PromptTemplate(
+            max_input_contexts=config.get('generation.max_input_contexts', 5),
+            max_contexts=config.get('generation.max_prompt_contexts', 3),
+            token_counter=get_token_counter(config),
+            token_budget=config.get('generation.prompt_token_budget', 1200)
+        )
+        # "none": chuyển nguyên delta (mặc định, không giữ lại chữ nào),
+        # "line": làm sạch từng dòng, client chỉ thấy chữ khi hết dòng
+        self.stream_clean = config.get('generation.stream_clean', 'none')
+
         # Enhanced patterns for better processing
-        self.incomplete_info_patterns = [
-            r"không được cung cấp đầy đủ",
-            r"thông tin không đầy đủ", 
-            r"thiếu thông tin",
-            r"chưa có thông tin cụ thể"
-        ]
+        self.incomplete_info_patterns = postprocess.INCOMPLETE_INFO_PATTERNS
 
-    def generate_response(self, query: str, contexts: List[str]) -> Dict[str, Any]:
+    def generate_response(self, query: str, contexts: List[Union[str, Dict[str, Any]]]) -> Dict[str, Any]:
         """Tạo phản hồi với enhanced processing."""
         logger.info(f"Generating response for query with {len(contexts)} contexts")
 
         # Build messages
-        messages = self.prompt_template.build_messages(query, contexts)
-        
+        messages, prompt_tokens = self._build_messages(query, contexts)
+
         # Generate response
-        raw_response = self.llm_client.generate(messages)
+        with tracer.span("generate.llm", prompt_tokens=prompt_tokens):
+            raw_response = self.llm_client.generate(messages)
+
+        return self._build_result(query, contexts, raw_response, prompt_tokens)
+
+    async def agenerate_response(self, query: str, contexts: List[Union[str, Dict[str, Any]]],
+                                 deadline: Optional[float] = None) -> Dict[str, Any]:
+        """Async version of generate_response; raises LLMError when the LLM call fails or misses `deadline`."""
+        logger.info(f"Generating response (async) for query with {len(contexts)} contexts")
+
+        messages, prompt_tokens = self._build_messages(query, contexts)
+        with tracer.span("generate.llm", prompt_tokens=prompt_tokens):
+            raw_response = await self.async_llm_client.agenerate(messages, deadline=deadline)
+
+        return self._build_result(query, contexts, raw_response, prompt_tokens)
+
+    def generate_response_stream(self, query: str, contexts: List[Union[str, Dict[str, Any]]],
+                                 deadline: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """Stream response: yield `delta` events as the LLM produces text, then one `done` event.
+
+        Raises LLMError(kind="deadline") when the stream runs past `deadline`.
+
+        Deltas đi qua bộ làm sạch incremental theo dòng (nếu bật); event `done`
+        chứa response đã qua toàn bộ pipeline giống generate_response().
+        """
+        logger.info(f"Generating streamed response for query with {len(contexts)} contexts")
+
+        messages, prompt_tokens = self._build_messages(query, contexts)
+
+        raw_parts = []
+        fallback = False
+
+        def _collect(deltas: Iterable[str]) -> Iterator[str]:
+            nonlocal fallback
+            for delta in deltas:
+                fallback = fallback or isinstance(delta, FallbackResponse)
+                raw_parts.append(delta)
+                yield delta
+
+        deltas = _collect(self.llm_client.generate_stream(messages, deadline=deadline))
+        if self.stream_clean == "line":
+            deltas = self.clean_stream(deltas)
+
+        for delta in deltas:
+            yield {"event": "delta", "content": delta}
+
+        raw_response = "".join(raw_parts).strip()
+        yield {"event": "done", **self._build_result(query, contexts, raw_response, prompt_tokens, fallback=fallback)}
+
+    def _build_messages(self, query: str, contexts: List[Union[str, Dict[str, Any]]]):
+        """Build prompt messages and count their tokens (báo cáo theo request để đối chiếu latency/chi phí)"""
+        with tracer.span("generate.prompt_build") as span:
+            messages = self.prompt_template.build_messages(query, contexts)
+            prompt_tokens = self.prompt_template.count_tokens(messages)
+            span.set_attribute("prompt_tokens", prompt_tokens)
+        return messages, prompt_tokens
+
+    def clean_stream(self, deltas: Iterable[str]) -> Iterator[str]:
+        """Incremental cleaning: buffer deltas into lines and emit each cleaned line once complete."""
+        return postprocess.clean_stream(deltas)
+
+    def _build_result(self, query: str, contexts: List[Union[str, Dict[str, Any]]], raw_response: str,
+                      prompt_tokens: Optional[int] = None, fallback: Optional[bool] = None) -> Dict[str, Any]:
+        """Post-process raw LLM output into the response payload.
+
+        metadata["fallback"] là True khi LLM client trả câu xin lỗi thay cho câu trả lời.
+        """
+        if fallback is None:
+            fallback = isinstance(raw_response, FallbackResponse)
+        with tracer.span("generate.postprocess"):
+            result = self._postprocess(query, contexts, raw_response, prompt_tokens)
+        result["metadata"]["fallback"] = fallback
+        return result
 
+    def _postprocess(self, query: str, contexts: List[Union[str, Dict[str, Any]]], raw_response: str,
+                     prompt_tokens: Optional[int] = None) -> Dict[str, Any]:
         # Enhanced cleaning
-        if self._should_clean_response(raw_response):
-            cleaned_response = self._enhanced_clean_response(raw_response)
+        if postprocess.should_clean(raw_response):
+            cleaned_response = postprocess.clean_response(raw_response)
         else:
             cleaned_response = raw_response
 
@@ -47,188 +129,14 @@ class ResponseGenerator:
                 "query_type": self._classify_query(query),
                 "response_cleaned": cleaned_response != raw_response,
                 "quality_score": quality_score,
-                "word_count": len(cleaned_response.split())
+                "word_count": len(cleaned_response.split()),
+                "prompt_tokens": prompt_tokens
             }
         }
         
         logger.info(f"Response generated - Quality: {quality_score:.2f}")
         return result
 
-    def _should_clean_response(self, response: str) -> bool:
-        """Kiểm tra xem có nên làm sạch response hay không."""
-        skip_patterns = [
-            "Tôi không tìm thấy thông tin phù hợp",
-            "Chào quý khách",
-            "Xin chào",
-            "Cảm ơn"
-        ]
-        
-        return not any(pattern in response for pattern in skip_patterns)
-
-    def _enhanced_clean_response(self, raw_response: str) -> str:
-        """Enhanced response cleaning pipeline."""
-        text = raw_response.strip()
-        
-        # Pipeline theo thứ tự ưu tiên
-        text = self._fix_incomplete_info_statements(text)
-        # text = self._fix_nested_numbering_issues(text)
-        text = self._reduce_redundant_phrases(text)
-        text = self._improve_formatting(text)
-        text = self._remove_generated_questions(text)
-        text = self._final_polish(text)
-        
-        return text.strip()
-
-    def _fix_incomplete_info_statements(self, text: str) -> str:
-        """Xử lý các câu nói về thông tin không đầy đủ."""
-        for pattern in self.incomplete_info_patterns:
-            # Nếu cả câu chỉ nói về thiếu thông tin
-            sentence_pattern = f"[^.]*{pattern}[^.]*\\."
-            if re.search(sentence_pattern, text, re.I):
-                # Thay bằng professional message
-                text = re.sub(sentence_pattern, 
-                             "Quý khách vui lòng liên hệ chi nhánh để được tư vấn chi tiết.", 
-                             text, flags=re.I)
-        
-        return text
-
-    # def _fix_nested_numbering_issues(self, text: str) -> str:
-    #     """Fix vấn đề đánh số lồng nhau confusing."""
-    #     # Tìm pattern: "1. Title: 1. SubItem 2. SubItem"
-    #     # Chuyển thành: "**Title:** - SubItem - SubItem"
-        
-    #     lines = text.split('\n')
-    #     processed = []
-    #     in_numbered_section = False
-        
-    #     for line in lines:
-    #         line = line.strip()
-    #         if not line:
-    #             processed.append('')
-    #             continue
-            
-    #         # Main section: "1. Title:"
-    #         main_match = re.match(r'^(\d+)\.\s+([^:]+):\s*(.*)', line)
-    #         if main_match:
-    #             title = main_match.group(2)
-    #             remainder = main_match.group(3)
-    #             processed.append(f"**{title}:**")
-    #             if remainder.strip():
-    #                 processed.append(remainder)
-    #             in_numbered_section = True
-    #             continue
-            
-    #         # Sub-items: "1. Content 2. Content" trong cùng dòng
-    #         if in_numbered_section and re.search(r'\d+\.\s+', line):
-    #             # Split multiple numbered items trong 1 dòng
-    #             parts = re.split(r'(\d+\.\s+)', line)
-    #             for i in range(1, len(parts), 2):
-    #                 if i+1 < len(parts):
-    #                     content = parts[i+1].strip()
-    #                     if content:
-    #                         processed.append(f"- {content}")
-    #             continue
-            
-    #         # Regular line
-    #         processed.append(line)
-    #         if not re.search(r'^\s*-', line):  # Reset if not bullet
-    #             in_numbered_section = False
-        
-    #     return '\n'.join(processed)
-
-    def _reduce_redundant_phrases(self, text: str) -> str:
-        """Giảm redundancy trong cách diễn đạt."""
-        # Giảm "Quý khách hàng" lặp lại
-        sentences = text.split('. ')
-        for i in range(1, len(sentences)):
-            sentences[i] = re.sub(r'\bquý khách hàng\b', 'bạn', sentences[i], flags=re.I)
-        
-        text = '. '.join(sentences)
-        
-        # Remove redundant opening phrases
-        redundant_openings = [
-            r"quý khách hàng có thể tham khảo\s*",
-            r"theo thông tin từ tài liệu\s*,?\s*",
-            r"dựa trên thông tin được cung cấp\s*,?\s*"
-        ]
-        
-        for pattern in redundant_openings:
-            text = re.sub(pattern, "", text, flags=re.I)
-        
-        return text
-
-    def _improve_formatting(self, text: str) -> str:
-        """Cải thiện formatting tổng thể."""
-        # Standardize bullet points
-        text = re.sub(r'^\s*[•*]\s+', '- ', text, flags=re.M)
-        
-        # Fix spacing issues
-        text = re.sub(r'\s+([,.;:!?])', r'\1', text)
-        text = re.sub(r'([,.;:!?])([A-ZÁĂÂÉÊÍÓÔƠÚƯÝ])', r'\1 \2', text)
-        
-        # Normalize spaces
-        text = re.sub(r'[ \t]+', ' ', text)
-        
-        # Better section breaks
-        text = re.sub(r'\n{3,}', '\n\n', text)
-        
-        return text
-
-    def _remove_generated_questions(self, text: str) -> str:
-        """Xóa các câu hỏi được tạo tự động và options."""
-        lines = text.split('\n')
-        filtered_lines = []
-        
-        for line in lines:
-            line = line.strip()
-            
-            # Skip question lines
-            if self._is_question_line(line):
-                continue
-                
-            # Skip option lines (a), b), c), d)
-            if re.match(r'^[a-dA-D][).]', line):
-                continue
-                
-            filtered_lines.append(line)
-        
-        return '\n'.join(filtered_lines)
-
-    def _is_question_line(self, line: str) -> bool:
-        """Kiểm tra dòng câu hỏi."""
-        question_indicators = [
-            r'\?$',  # Ends with ?
-            r'^(có bao nhiêu|hãy|liệt kê|mô tả|tại sao)',
-            r'(là gì|như thế nào|ra sao)\?',
-            r'^(what|how|why|when|where)\b'
-        ]
-        
-        return any(re.search(pattern, line, re.I) for pattern in question_indicators)
-
-    def _final_polish(self, text: str) -> str:
-        """Polish cuối cùng."""
-
-        text = text.strip()
-
-        # Thay **...** bằng xuống dòng
-        def replacer(match):
-            content = match.group(1).strip()
-            return f"\n{content}"
-        text = re.sub(r"\*\*(.*?)\*\*", replacer, text)
-
-        # Remove empty bullets
-        text = re.sub(r'^\s*-\s*$', '', text, flags=re.M)
-
-        # Ensure proper sentence endings (chỉ thêm . nếu kết thúc bằng chữ/số)
-        if re.search(r"[A-Za-zÀ-ỹ0-9]$", text) and not text.endswith((':', '-', '\n')):
-            text += "."
-
-        # Clean up whitespace (xóa dòng trống thừa)
-        lines = [line.rstrip() for line in text.splitlines() if line.strip()]
-        text = '\n'.join(lines)
-
-        return text
-
     def _assess_response_quality(self, response: str, query: str) -> float:
         """Đánh giá chất lượng response (0-1)."""
         score = 1.0
@@ -240,7 +148,7 @@ class ResponseGenerator:
         if response.count("quý khách hàng") > 2:
             score -= 0.2
             
-        if re.search(r'\d+\.\s+.*\d+\.\s+', response):  # Nested numbering
+        if postprocess.NESTED_NUMBERING_RE.search(response):  # Nested numbering
             score -= 0.2
             
         word_count = len(response.split())
@@ -0,0 +1,128 @@
+import re
+import unicodedata
+from functools import lru_cache
+
+
+def _char_class(codes) -> str:
+    """Gộp danh sách code point (đã sắp xếp) thành nội dung character class của regex"""
+    parts, start, prev = [], None, None
+    for code in codes:
+        if start is None:
+            start = prev = code
+        elif code == prev + 1:
+            prev = code
+        else:
+            parts.append((start, prev))
+            start = prev = code
+    if start is not None:
+        parts.append((start, prev))
+    return "".join(f"\\U{a:08x}-\\U{b:08x}" if a != b else f"\\U{a:08x}" for a, b in parts)
+
+
+class _CharTable(dict):
+    """Translation table for str.translate, filled lazily per code point.
+
+    Bảng đầy đủ cho toàn bộ Unicode tốn ~1 triệu lần gọi unicodedata.category, nên mỗi
+    code point chỉ được phân loại một lần (khi gặp lần đầu), các lần sau là dict lookup trong C.
+    Các code point < `scan_below` (ASCII, Latin, tiếng Việt, dấu tổ hợp) được phân loại sẵn để
+    translate() bỏ qua các đoạn không cần đổi bằng regex thay vì tra bảng từng ký tự.
+    """
+
+    def __init__(self, fixed, keep=(), scan_below: int = 0x2000):
+        super().__init__({ord(k): v for k, v in fixed.items()})
+        self._keep = frozenset(ord(ch) for ch in keep)
+        unchanged = [code for code in range(scan_below) if self[code] == code]
+        self._changed_re = re.compile(f"[^{_char_class(unchanged)}]+")
+
+    def __missing__(self, code: int):
+        # Bỏ control chars (Cc) và format (Cf), trừ các ký tự được giữ (\n, \t)
+        value = code if code in self._keep or unicodedata.category(chr(code)) not in ("Cc", "Cf") else None
+        self[code] = value
+        return value
+
+    def translate(self, s: str) -> str:
+        """Same result as s.translate(self), translating only the runs that may change"""
+        return self._changed_re.sub(lambda m: m.group().translate(self), s)
+
+
+class TextCleaner:
+    """Class để làm sạch văn bản trước khi gửi tới LLM."""
+
+    SMART_MAP = {
+        "\u2018": "'", "\u2019": "'", "\u201A": "'", "\u201B": "'",
+        "\u201C": '"', "\u201D": '"', "\u201E": '"',
+        "\u2013": "-", "\u2014": "-", "\u2212": "-",  # en/em dash, minus
+        "\u00A0": " ",  # non-breaking space
+        "\u2026": "..." # ellipsis
+    }
+
+    ZERO_WIDTH = {
+        "\u200B", "\u200C", "\u200D", "\u2060", "\uFEFF"  # ZWSP, ZWNJ, ZWJ, WJ, BOM
+    }
+
+    _SMART_TABLE = str.maketrans(SMART_MAP)
+    _CONTROL_TABLE = _CharTable(dict.fromkeys(ZERO_WIDTH), keep="\n\t")
+    # Bảng gộp cho clean_text: smart chars + zero-width/control trong một lần translate.
+    # Tab đổi luôn thành space vì bước gộp khoảng trắng biến mọi [ \t]+ thành " "
+    _CLEAN_TABLE = _CharTable({**SMART_MAP, **dict.fromkeys(ZERO_WIDTH), "\t": " "}, keep="\n")
+
+    # Một regex cho cả 4 bước chuẩn hoá; mọi nhánh bắt đầu bằng một khoảng trắng chung để regex
+    # lướt nhanh qua phần chữ (thứ tự nhánh quyết định ưu tiên):
+    #   khoảng trắng trước , . ; : % ) ?  → xoá
+    #   khoảng trắng sau (                → xoá
+    #   nhiều space liên tiếp             → một space
+    #   từ 3 newline trở lên              → 2 newline
+    # Group không khớp được thay bằng chuỗi rỗng nên template r"\1\2" xử lý được cả 4 nhánh
+    _NORMALIZE_RE = re.compile(r"\s(?:\s*(?=[,.;:%\)\?])|(?<=\(\s)\s*|(?<= )( ) *|(?<=\n)(\n\n)\n*)")
+
+    @classmethod
+    def replace_smart_chars(cls, s: str) -> str:
+        """Thay thế các ký tự thông minh bằng ASCII tương đương."""
+        return s.translate(cls._SMART_TABLE)
+
+    @classmethod
+    def remove_zero_width_and_controls(cls, s: str) -> str:
+        """Xóa zero-width chars và control chars, giữ lại \n, \t."""
+        return cls._CONTROL_TABLE.translate(s)
+
+    @classmethod
+    def unescape_common_sequences(cls, s: str) -> str:
+        """Unescape các chuỗi thoát thường gặp."""
+        # Chỉ thay khi có backslash thật (\\n → \n). Nếu đã là newline thật thì không bị ảnh hưởng.
+        s = s.replace("\\n", "\n")
+        s = s.replace("\\t", "\t")
+        s = s.replace("\r\n", "\n").replace("\r", "\n")
+        return s
+
+    @classmethod
+    def _normalize(cls, s: str) -> str:
+        # Input không còn tab (đã đổi thành space)
+        s = cls._NORMALIZE_RE.sub(r"\1\2", s)
+        # Trim từng dòng
+        s = "\n".join(ln.rstrip() for ln in s.splitlines())
+        return s.strip()
+
+    @classmethod
+    def normalize_spaces_and_punct(cls, s: str) -> str:
+        """Chuẩn hóa khoảng trắng và dấu câu."""
+        return cls._normalize(s.replace("\t", " "))
+
+    @classmethod
+    def clean_text(cls, s: str) -> str:
+        """Làm sạch văn bản hoàn chỉnh."""
+        if not s:
+            return s
+        # 1) Chuẩn hoá Unicode
+        s = unicodedata.normalize("NFKC", s)
+        # 2) Unescape các chuỗi thoát thường gặp
+        s = cls.unescape_common_sequences(s)
+        # 3+4) Smart chars → ASCII, bỏ zero-width, BOM, control chars (trừ \n)
+        s = cls._CLEAN_TABLE.translate(s)
+        # 5) Chuẩn hoá khoảng trắng & dấu câu
+        return cls._normalize(s)
+
+    @staticmethod
+    @lru_cache(maxsize=32)
+    def clean_text_cached(s: str) -> str:
+        """clean_text có memo, dùng cho nội dung tĩnh lặp lại mỗi request (system message)."""
+        return TextCleaner.clean_text(s)
@@ -0,0 +1,143 @@
+import re
+import threading
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from src.utils.config import Config
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+TOKENIZER_BACKENDS = ('hf', 'estimate')
+
+_PIECE_RE = re.compile(r"\w+|[^\w\s]")
+# Ranh giới câu: sau dấu kết câu (trước khoảng trắng/cuối chuỗi) hoặc sau xuống dòng
+_SENTENCE_END_RE = re.compile(r"[.!?;…]+(?=\s|$)|\n+")
+
+
+def _estimate_piece(piece: str) -> int:
+    # Ước lượng kiểu SentencePiece: từ ASCII ~6 ký tự/token, âm tiết tiếng Việt có dấu ~4 ký tự/token
+    return 1 + (len(piece) - 1) // (6 if piece.isascii() else 4)
+
+
+class TokenCounter:
+    """Count and trim text in LLM tokens.
+
+    backend "hf" dùng tokenizer `tokenizers` (file tokenizer.json hoặc tên trên Hub) giống
+    tokenizer của LLM; "estimate" là ước lượng theo từ khi không có tokenizer. Số token được
+    nhớ theo text (LRU) vì context chunk và system message lặp lại giữa các request.
+    """
+
+    def __init__(self, backend: str = 'estimate', name: Optional[str] = None,
+                 path: Optional[str] = None, cache_size: int = 8192):
+        if backend not in TOKENIZER_BACKENDS:
+            raise ValueError(f"Unknown tokenizer backend '{backend}', expected one of {TOKENIZER_BACKENDS}")
+        self.backend = backend
+        self.name = path or name
+        self._tokenizer = None
+        if backend == 'hf':
+            from tokenizers import Tokenizer
+            self._tokenizer = Tokenizer.from_file(path) if path else Tokenizer.from_pretrained(name)
+        self.count = lru_cache(maxsize=cache_size)(self._count)
+
+    def _count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._tokenizer is not None:
+            return len(self._tokenizer.encode(text, add_special_tokens=False).ids)
+        return sum(_estimate_piece(piece) for piece in _PIECE_RE.findall(text))
+
+    def count_batch(self, texts: List[str]) -> List[int]:
+        """Uncached counts for many texts (backend hf encode cả lô một lần)"""
+        if self._tokenizer is not None:
+            return [len(e.ids) for e in self._tokenizer.encode_batch(texts, add_special_tokens=False)]
+        return [self._count(text) for text in texts]
+
+    def count_messages(self, messages: List[Dict[str, str]]) -> int:
+        """Tokens of the message contents (không tính token định dạng chat của provider)"""
+        return sum(self.count(m.get('content') or '') for m in messages)
+
+    def _cut(self, text: str, max_tokens: int) -> str:
+        """Longest prefix of at most `max_tokens` tokens, cut at a token/word boundary"""
+        if max_tokens <= 0:
+            return ""
+        if self._tokenizer is not None:
+            encoding = self._tokenizer.encode(text, add_special_tokens=False)
+            if len(encoding.ids) <= max_tokens:
+                return text
+            return text[:encoding.offsets[max_tokens - 1][1]]
+        used, end = 0, 0
+        for match in _PIECE_RE.finditer(text):
+            used += _estimate_piece(match.group())
+            if used > max_tokens:
+                break
+            end = match.end()
+        else:
+            return text
+        return text[:end]
+
+    @staticmethod
+    def sentences(text: str) -> List[str]:
+        """Split text into sentences, keeping the original separators so pieces join back to `text`"""
+        pieces, start = [], 0
+        for match in _SENTENCE_END_RE.finditer(text):
+            pieces.append(text[start:match.end()])
+            start = match.end()
+        if start < len(text):
+            pieces.append(text[start:])
+        return pieces
+
+    def trim(self, text: str, max_tokens: int) -> Tuple[str, int]:
+        """Trim `text` to `max_tokens` at a sentence boundary; returns (text, tokens).
+
+        Lấy các câu trọn vẹn từ đầu; nếu ngay câu đầu đã vượt budget thì cắt theo token.
+        """
+        tokens = self.count(text)
+        if tokens <= max_tokens:
+            return text, tokens
+
+        kept, used = [], 0
+        for sentence in self.sentences(text):
+            sentence_tokens = self.count(sentence)
+            if used + sentence_tokens > max_tokens:
+                break
+            kept.append(sentence)
+            used += sentence_tokens
+        if kept:
+            trimmed = "".join(kept).rstrip()
+        else:
+            trimmed = self._cut(text, max_tokens).rstrip()
+        return trimmed, self.count(trimmed)
+
+    def get_stats(self) -> Dict[str, object]:
+        info = self.count.cache_info()
+        return {'backend': self.backend, 'name': self.name,
+                'cache_hits': info.hits, 'cache_misses': info.misses, 'cache_size': info.currsize}
+
+
+# Registry dùng chung trong process: tokenizer chỉ load một lần cho mỗi cấu hình
+_COUNTER_REGISTRY: Dict[Tuple[str, Optional[str], Optional[str]], TokenCounter] = {}
+_COUNTER_REGISTRY_LOCK = threading.Lock()
+
+
+def get_token_counter(config: Config) -> TokenCounter:
+    """Return the process-wide TokenCounter for `generation.tokenizer.*`"""
+    key = (
+        config.get('generation.tokenizer.backend', 'estimate'),
+        config.get('generation.tokenizer.name'),
+        config.get('generation.tokenizer.path')
+    )
+    with _COUNTER_REGISTRY_LOCK:
+        counter = _COUNTER_REGISTRY.get(key)
+        if counter is None:
+            backend, name, path = key
+            try:
+                counter = TokenCounter(backend, name=name, path=path)
+            except Exception as e:
+                if backend != 'hf':
+                    raise
+                # Không load được tokenizer (offline, thiếu file...) → vẫn chạy bằng ước lượng
+                logger.warning(f"Could not load tokenizer {path or name}: {e}; falling back to estimate")
+                counter = TokenCounter('estimate')
+            logger.info(f"Prompt token counter: backend={counter.backend} name={counter.name}")
+            _COUNTER_REGISTRY[key] = counter
+        return counter
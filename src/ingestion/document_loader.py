@@ -1,10 +1,10 @@
 import os
 import json
 from pdb import main
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, Tuple
 from pathlib import Path
-from docx import Document
 import PyPDF2
+from src.ingestion.docx_reader import iter_docx_blocks
 from src.utils.logger import setup_logger
 
 logger = setup_logger(__name__)
@@ -12,8 +12,12 @@ logger = setup_logger(__name__)
 class DocumentLoader:
     """Enhanced document loader with error handling"""
     
+    # Đọc một lần tối đa chừng này ký tự khi stream file text không có dòng trống
+    TXT_BLOCK_CHARS = 64 * 1024
+
     def __init__(self):
         self.supported_formats = {'.docx', '.pdf', '.txt', '.json'}
+        self.streaming_formats = {'.pdf', '.txt'}
     
     def load_document(self, file_path: str) -> Dict[str, Any]:
         """Load document from file with proper error handling"""
@@ -46,26 +50,96 @@ class DocumentLoader:
             }
         }
     
+    def supports_streaming(self, file_path: str) -> bool:
+        return Path(file_path).suffix.lower() in self.streaming_formats
+
+    def stream_document(self, file_path: str) -> Tuple[Dict[str, Any], Iterator[Dict[str, Any]]]:
+        """Open a PDF/TXT file lazily; returns (metadata, records).
+
+        `records` là generator các record {'type', 'text', ...} (trang PDF hoặc
+        đoạn văn bản). Nối `text` của mọi record cho đúng chuỗi `content` mà
+        load_document() trả về, nhưng không bao giờ giữ cả file trong bộ nhớ.
+        """
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"File not found: {file_path}")
+
+        file_ext = Path(file_path).suffix.lower()
+        if file_ext == '.pdf':
+            return self._stream_pdf(file_path)
+        if file_ext == '.txt':
+            return self._stream_txt(file_path)
+        raise ValueError(f"Streaming is not supported for: {file_ext}")
+
+    def _stream_pdf(self, file_path: str) -> Tuple[Dict[str, Any], Iterator[Dict[str, Any]]]:
+        file = open(file_path, 'rb')
+        try:
+            pdf_reader = PyPDF2.PdfReader(file)
+            pages_count = len(pdf_reader.pages)
+        except Exception:
+            file.close()
+            raise
+
+        def records() -> Iterator[Dict[str, Any]]:
+            with file:
+                for i, page in enumerate(pdf_reader.pages):
+                    # Trang được nối bằng '\n' như _load_pdf
+                    text = page.extract_text()
+                    yield {'type': 'page', 'page': i + 1, 'text': text if i == 0 else '\n' + text}
+
+        metadata = {
+            'file_path': file_path,
+            'file_type': 'pdf',
+            'pages_count': pages_count
+        }
+        return metadata, records()
+
+    def _stream_txt(self, file_path: str) -> Tuple[Dict[str, Any], Iterator[Dict[str, Any]]]:
+        def records() -> Iterator[Dict[str, Any]]:
+            with open(file_path, 'r', encoding='utf-8') as file:
+                lines, size = [], 0
+                for line in file:
+                    lines.append(line)
+                    size += len(line)
+                    # Cắt ở dòng trống (hết đoạn) hoặc khi block quá lớn
+                    if not line.strip() or size >= self.TXT_BLOCK_CHARS:
+                        yield {'type': 'paragraph', 'text': ''.join(lines)}
+                        lines, size = [], 0
+                if lines:
+                    yield {'type': 'paragraph', 'text': ''.join(lines)}
+
+        metadata = {
+            'file_path': file_path,
+            'file_type': 'txt',
+            'length': self._text_length(file_path)
+        }
+        return metadata, records()
+
+    def _text_length(self, file_path: str) -> int:
+        """Character count of a text file (same as _load_txt's `length`), read in blocks"""
+        # Metadata được gắn vào mọi chunk nên cần biết trước khi stream: đọc một lượt, không giữ nội dung
+        length = 0
+        with open(file_path, 'r', encoding='utf-8') as file:
+            while True:
+                block = file.read(self.TXT_BLOCK_CHARS)
+                if not block:
+                    return length
+                length += len(block)
+    
     def _load_docx(self, file_path: str) -> Dict[str, Any]:
-        """Load DOCX file"""
-        doc = Document(file_path)
+        """Load DOCX file in a single pass; `blocks` keeps headings/paragraphs/tables in order"""
+        blocks = list(iter_docx_blocks(file_path))
         
         # Extract paragraphs
-        paragraphs = [p.text.strip() for p in doc.paragraphs if p.text.strip()]
+        paragraphs = [b['text'] for b in blocks if b['type'] != 'table']
         
         # Extract tables
-        tables = []
-        for table in doc.tables:
-            table_data = []
-            for row in table.rows:
-                row_data = [cell.text.strip() for cell in row.cells]
-                table_data.append(row_data)
-            tables.append(table_data)
+        tables = [b['rows'] for b in blocks if b['type'] == 'table']
         
         return {
             'content': '\n'.join(paragraphs),
             'paragraphs': paragraphs,
             'tables': tables,
+            'blocks': blocks,
             'metadata': {
                 'file_path': file_path,
                 'file_type': 'docx',
@@ -0,0 +1,54 @@
+import re
+from typing import Dict, Any, Iterator
+from docx import Document
+from docx.enum.style import WD_STYLE_TYPE
+from docx.oxml.ns import qn
+from docx.table import Table
+from docx.text.paragraph import Paragraph
+
+_NUMBERED_HEADING = re.compile(r'^\d+(\.\d+)*\s')
+
+_P_TAG = qn('w:p')
+_TBL_TAG = qn('w:tbl')
+
+
+def is_heading(text: str, style_name: str) -> bool:
+    """Phát hiện tiêu đề: đánh số (1.2 ...), viết hoa toàn bộ hoặc style Heading"""
+    return bool(_NUMBERED_HEADING.match(text)) or text.isupper() or style_name.startswith("Heading")
+
+
+def iter_docx_blocks(file_path: str) -> Iterator[Dict[str, Any]]:
+    """Read a DOCX once and yield its body blocks in document order.
+
+    Mỗi block là một trong:
+      - {"type": "heading", "text": ...}
+      - {"type": "paragraph", "text": ...}
+      - {"type": "table", "rows": [[cell, ...], ...]}
+
+    Đoạn trống bị bỏ qua. Chỉ duyệt các phần tử trực tiếp của body (giống
+    `Document.paragraphs` / `Document.tables`).
+    """
+    doc = Document(file_path)
+    body = doc.element.body
+
+    # Tên style tra một lần theo styleId, không resolve lại cho từng đoạn
+    style_names = {
+        style.style_id: style.name
+        for style in doc.styles if style.type == WD_STYLE_TYPE.PARAGRAPH
+    }
+    default_style = doc.styles.default(WD_STYLE_TYPE.PARAGRAPH)
+    default_name = default_style.name if default_style is not None else "Normal"
+
+    for element in body.iterchildren():
+        if element.tag == _P_TAG:
+            text = Paragraph(element, doc).text.strip()
+            if not text:
+                continue
+            style_name = style_names.get(element.style, default_name) or ""
+            yield {"type": "heading" if is_heading(text, style_name) else "paragraph", "text": text}
+        elif element.tag == _TBL_TAG:
+            table = Table(element, doc)
+            yield {
+                "type": "table",
+                "rows": [[cell.text.strip() for cell in row.cells] for row in table.rows]
+            }
@@ -1,8 +1,12 @@
-import torch
 import numpy as np
 import json
-from typing import List, Dict, Any
-from sentence_transformers import SentenceTransformer
+import time
+import threading
+from typing import List, Dict, Any, Tuple, Optional
+from src.ingestion.embedding_backends import create_backend
+from src.ingestion.embedding_cache import EmbeddingCache
+from src.ingestion.embedding_coalescer import EmbeddingCoalescer
+from src.utils.context_text import prepare_context, format_table, chunk_context
 from src.utils.config import Config
 from src.utils.logger import setup_logger
 
@@ -12,85 +16,155 @@ class Embedder:
     def __init__(self, config: Config):
         self.model_name = config.get('models.embedding_model', 'bkai-foundation-models/vietnamese-bi-encoder')
         self.device = config.get('models.device', 'cpu')
+        # torch (fp32) | torch_int8 | onnx | onnx_int8 — các backend int8/onnx chỉ chạy CPU
+        self.backend_name = config.get('models.embedding_backend', 'torch')
         
-        logger.info(f"Loading embedding model: {self.model_name}")
-        self.model = SentenceTransformer(self.model_name)
-        self.model.to(self.device)
+        logger.info(f"Loading embedding model: {self.model_name} ({self.backend_name})")
+        t0 = time.time()
+        self.backend = create_backend(
+            self.backend_name,
+            self.model_name,
+            device=self.device,
+            onnx_dir=config.get('models.onnx_dir'),
+            num_threads=config.get('models.onnx_threads', 0)
+        )
+        # Giữ self.model cho code dùng trực tiếp SentenceTransformer (chỉ có với backend torch)
+        self.model = getattr(self.backend, 'model', None)
+        self.load_time_sec = time.time() - t0
         
-        self.dimension = self.model.get_sentence_embedding_dimension()
-        logger.info(f"Embedding dimension: {self.dimension}")
+        self.dimension = self.backend.dimension
+        self.memory_bytes = self.backend.memory_bytes()
+        logger.info(
+            f"Embedding dimension: {self.dimension} | loaded in {self.load_time_sec:.2f}s "
+            f"| ~{self.memory_bytes / 1024 ** 2:.1f} MB"
+        )
+
+        self.batch_size = config.get('embedding.batch_size', 32)
+
+        # Cache embedding trên đĩa theo (model, backend, sha1 text): chỉ gọi model cho text chưa có
+        self.cache = None
+        if config.get('embedding.cache.enabled', True):
+            self.cache = EmbeddingCache(
+                config.get('embedding.cache.path', 'data/processed/embeddings/embedding_cache'),
+                namespace=EmbeddingCache.namespace_for(self.model_name, self.backend_name),
+                dimension=self.dimension,
+                max_entries=config.get('embedding.cache.max_entries', 1_000_000)
+            )
+
+        # Gom query embedding của các request đồng thời thành một batch
+        self.coalescer = None
+        if config.get('embedding.coalesce.enabled', False):
+            self.coalescer = EmbeddingCoalescer(
+                self,
+                window_ms=config.get('embedding.coalesce.window_ms', 5),
+                max_batch=config.get('embedding.coalesce.max_batch', 32)
+            )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get embedder statistics"""
+        return {
+            'model_name': self.model_name,
+            'device': self.device,
+            'backend': self.backend_name,
+            'dimension': self.dimension,
+            'load_time_sec': round(self.load_time_sec, 3),
+            'memory_mb': round(self.memory_bytes / 1024 ** 2, 1),
+            'coalescer': self.coalescer.get_stats() if self.coalescer else None,
+            'cache': self.cache.get_stats() if self.cache else None
+        }
     
-    def embed_texts(self, texts: List[str]) -> np.ndarray:
-        """Generate embeddings for a list of texts"""
+    def embed_texts(self, texts: List[str], show_progress_bar: Optional[bool] = None) -> np.ndarray:
+        """Generate embeddings for a list of texts, computing only those missing from the disk cache"""
         if not texts:
             logger.warning("No texts provided for embedding.")
             return np.array([])
-        
-        logger.info(f"Generating embeddings for {len(texts)} texts")
-        
-        with torch.no_grad():
-            embeddings = self.model.encode(
-                texts,
-                batch_size=32,
-                show_progress_bar=True,
-                convert_to_numpy=True,
-                normalize_embeddings=True
-            )
-        
+
+        if self.cache is None:
+            return self._encode(texts, show_progress_bar)
+
+        keys = [EmbeddingCache.key(text) for text in texts]
+        embeddings, missing = self.cache.get(keys)
+        if not missing:
+            logger.debug(f"Embedding cache hit for all {len(texts)} texts")
+            return embeddings
+
+        # Text trùng nhau trong cùng batch chỉ encode một lần
+        first_index: Dict[bytes, int] = {}
+        for i in missing:
+            first_index.setdefault(keys[i], i)
+        unique = list(first_index.values())
+        computed = self._encode([texts[i] for i in unique], show_progress_bar)
+        self.cache.put([keys[i] for i in unique], computed)
+
+        rows = {keys[i]: row for i, row in zip(unique, computed)}
+        for i in missing:
+            embeddings[i] = rows[keys[i]]
+        if len(missing) < len(texts):
+            logger.debug(f"Embedding cache: {len(texts) - len(missing)}/{len(texts)} hits")
         return embeddings
 
+    def _encode(self, texts: List[str], show_progress_bar: Optional[bool] = None) -> np.ndarray:
+        """Run the embedding model on `texts`"""
+        if show_progress_bar is None:
+            # Progress bar chỉ có ý nghĩa với batch lớn (ingestion), không phải query đơn lẻ
+            show_progress_bar = len(texts) > self.batch_size
+
+        if show_progress_bar:
+            logger.info(f"Generating embeddings for {len(texts)} texts")
+        else:
+            logger.debug(f"Generating embeddings for {len(texts)} texts")
+        
+        return self.backend.encode(texts, self.batch_size, show_progress_bar)
+
+    def embed_query(self, text: str) -> np.ndarray:
+        """Embed a single query, micro-batched with concurrent callers when coalescing is enabled"""
+        if self.coalescer is not None:
+            return self.coalescer.embed(text)
+        return self.embed_texts([text], show_progress_bar=False)[0]
+
     def _format_table_content(self, chunk):
         """Format table content into readable text for embedding"""
-        title = chunk.get("title", "")
-        columns = chunk.get("columns", [])
-        rows = chunk.get("rows", [])
-
-        lines = [f"Bảng: {title}"]
-        if columns:
-            lines.append(f"Các cột: {', '.join(columns)}")
-        if rows:
-            lines.append("Dữ liệu:")
-            for row in rows:  # Assuming row is a list or dict
-                if isinstance(row, list):
-                    lines.append(" | ".join(str(cell) for cell in row))
-                elif isinstance(row, dict):
-                    lines.append(" | ".join(f"{k}: {v}" for k, v in row.items()))
-        return "\n".join(lines)
+        return format_table(chunk)
+
+    def chunk_to_text(self, chunk: Dict[str, Any]) -> str:
+        """Text that is embedded for a chunk (table chunks are flattened first)"""
+        # Handle different chunk types
+        if chunk.get("type") == "table":
+            # Format table content for embedding
+            return self._format_table_content(chunk)
+
+        # Handle text chunks
+        title = chunk.get('title', '')
+        content = chunk.get('content', '')
+
+        if title and content:
+            return f"{title}\n{content}"
+        if title:
+            return title
+        if content:
+            return content
+        logger.warning(f"Empty chunk found: {chunk}")
+        return ""
+
+    def chunk_to_context(self, chunk: Dict[str, Any]) -> str:
+        """Text that goes into the prompt for a retrieved chunk"""
+        return chunk_context(chunk)
 
     def embed_chunks(self, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Add embeddings to a list of chunks with flexible structure"""
-        texts = []
-        
+        texts = [self.chunk_to_text(chunk) for chunk in chunks]
+
+        # Clean + tokenize context cho prompt một lần lúc ingest (lưu cùng chunk)
         for chunk in chunks:
-            # Handle different chunk types
-            if chunk.get("type") == "table":
-                # Format table content for embedding
-                text_to_embed = self._format_table_content(chunk)
-            else:
-                # Handle text chunks
-                title = chunk.get('title', '')
-                content = chunk.get('content', '')
-                
-                if title and content:
-                    text_to_embed = f"{title}\n{content}"
-                elif title:
-                    text_to_embed = title
-                elif content:
-                    text_to_embed = content
-                else:
-                    logger.warning(f"Empty chunk found: {chunk}")
-                    text_to_embed = ""
-            
-            texts.append(text_to_embed)
+            prepare_context(chunk, self.chunk_to_context(chunk))
         
         # Generate embeddings
         embeddings = self.embed_texts(texts)
         
-        # Add embeddings to each chunk
+        # Add embeddings to each chunk (numpy row view, không box thành list float)
         for i, chunk in enumerate(chunks):
             if i < len(embeddings):  # Safety check
-                chunk['embedding'] = embeddings[i].tolist()
-                chunk['embedding_dimension'] = self.dimension
+                chunk['embedding'] = embeddings[i]
         
         logger.info(f"Added embeddings to {len(chunks)} chunks")
         return chunks
@@ -123,4 +197,30 @@ class Embedder:
             else:
                 logger.warning(f"Skipping empty chunk {i}: {chunk}")
         
-        return valid_chunks
\ No newline at end of file
+        return valid_chunks
+
+
+# Registry dùng chung trong process: mỗi (model_name, device, backend) chỉ load model một lần
+_EMBEDDER_REGISTRY: Dict[Tuple[str, str, str], Embedder] = {}
+_EMBEDDER_REGISTRY_LOCK = threading.Lock()
+
+
+def get_embedder(config: Config) -> Embedder:
+    """Return the process-wide Embedder for the configured model, loading it on first use"""
+    key = (
+        config.get('models.embedding_model', 'bkai-foundation-models/vietnamese-bi-encoder'),
+        config.get('models.device', 'cpu'),
+        config.get('models.embedding_backend', 'torch')
+    )
+    embedder = _EMBEDDER_REGISTRY.get(key)
+    if embedder is not None:
+        return embedder
+
+    with _EMBEDDER_REGISTRY_LOCK:
+        embedder = _EMBEDDER_REGISTRY.get(key)
+        if embedder is None:
+            embedder = Embedder(config)
+            _EMBEDDER_REGISTRY[key] = embedder
+        else:
+            logger.debug(f"Reusing shared embedder for {key}")
+    return embedder
@@ -0,0 +1,208 @@
+import os
+import json
+import inspect
+import numpy as np
+from typing import List, Optional
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+EMBEDDING_BACKENDS = ('torch', 'torch_int8', 'onnx', 'onnx_int8')
+
+
+def _normalize(embeddings: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+class TorchBackend:
+    """SentenceTransformer on PyTorch, fp32 or dynamically int8-quantised Linear layers (CPU)"""
+
+    def __init__(self, model_name: str, device: str = 'cpu', quantize: bool = False):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        self._torch = torch
+        self.model = SentenceTransformer(model_name)
+        self.model.to(device)
+        if quantize:
+            if device != 'cpu':
+                raise ValueError("torch_int8 embedding backend only runs on CPU")
+            self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.dimension = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: List[str], batch_size: int, show_progress_bar: bool) -> np.ndarray:
+        with self._torch.no_grad():
+            return self.model.encode(
+                texts,
+                batch_size=batch_size,
+                show_progress_bar=show_progress_bar,
+                convert_to_numpy=True,
+                normalize_embeddings=True
+            )
+
+    def memory_bytes(self) -> int:
+        """Ước lượng bộ nhớ của model (parameters + buffers) theo byte."""
+        total = 0
+        for tensor in list(self.model.parameters()) + list(self.model.buffers()):
+            total += tensor.numel() * tensor.element_size()
+        # Trọng số int8 của quantize_dynamic là packed params, không nằm trong parameters()
+        for module in self.model.modules():
+            packed = getattr(module, '_packed_params', None)
+            if packed is not None and hasattr(packed, '_weight_bias'):
+                weight, bias = packed._weight_bias()
+                total += weight.numel() * weight.element_size()
+                if bias is not None:
+                    total += bias.numel() * bias.element_size()
+        return total
+
+
+def _pooling_mode(pooling) -> str:
+    # sentence-transformers mới: chuỗi `pooling_mode`; bản cũ: các cờ pooling_mode_*_token(s)
+    mode = getattr(pooling, 'pooling_mode', None)
+    if isinstance(mode, str):
+        mode = mode.lower()
+    elif getattr(pooling, 'pooling_mode_cls_token', False):
+        mode = 'cls'
+    elif getattr(pooling, 'pooling_mode_max_tokens', False):
+        mode = 'max'
+    else:
+        mode = 'mean'
+    if mode not in ('cls', 'max', 'mean'):
+        raise ValueError(f"Unsupported pooling mode for ONNX export: {mode}")
+    return mode
+
+
+def export_onnx(model_name: str, output_dir: str, quantize: bool = False) -> str:
+    """Export the transformer of a SentenceTransformer to ONNX (+ tokenizer, pooling config).
+
+    Chỉ cần torch lúc export; khi chạy, OnnxBackend chỉ dùng onnxruntime + tokenizer.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    os.makedirs(output_dir, exist_ok=True)
+    fp32_path = os.path.join(output_dir, 'model.onnx')
+    int8_path = os.path.join(output_dir, 'model_int8.onnx')
+
+    # pooling.json được ghi sau cùng: thiếu file này nghĩa là lần export trước chưa hoàn tất
+    if not os.path.exists(os.path.join(output_dir, 'pooling.json')):
+        logger.info(f"Exporting {model_name} to ONNX: {fp32_path}")
+        st_model = SentenceTransformer(model_name, device='cpu')
+        transformer, pooling = st_model[0], st_model[1]
+        tokenizer = transformer.tokenizer
+        hf_model = transformer.auto_model.eval()
+
+        dummy = tokenizer(["xin chào BIDV"], return_tensors='pt', padding=True)
+        input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in dummy]
+        dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+        dynamic_axes['last_hidden_state'] = {0: 'batch', 1: 'sequence'}
+
+        class _Encoder(torch.nn.Module):
+            # Gọi forward bằng keyword: thứ tự tham số positional khác nhau giữa các bản transformers
+            def __init__(self, model):
+                super().__init__()
+                self.model = model
+
+            def forward(self, *inputs):
+                return self.model(**dict(zip(input_names, inputs)), return_dict=True).last_hidden_state
+
+        kwargs = {}
+        if 'dynamo' in inspect.signature(torch.onnx.export).parameters:
+            kwargs['dynamo'] = False  # exporter TorchScript: ổn định với dynamic_axes
+        with torch.no_grad():
+            torch.onnx.export(
+                _Encoder(hf_model), tuple(dummy[name] for name in input_names), fp32_path,
+                input_names=input_names, output_names=['last_hidden_state'],
+                dynamic_axes=dynamic_axes, opset_version=14, **kwargs
+            )
+
+        mode = _pooling_mode(pooling)
+        tokenizer.save_pretrained(output_dir)
+        with open(os.path.join(output_dir, 'pooling.json'), 'w', encoding='utf-8') as f:
+            json.dump({
+                'model_name': model_name,
+                'pooling': mode,
+                'max_seq_length': st_model.max_seq_length,
+                'input_names': input_names,
+                'dimension': st_model.get_sentence_embedding_dimension()
+            }, f, indent=2)
+
+    if quantize and not os.path.exists(int8_path):
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        logger.info(f"Quantizing ONNX model to int8: {int8_path}")
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+
+    return int8_path if quantize else fp32_path
+
+
+class OnnxBackend:
+    """ONNX Runtime inference of an exported transformer with SentenceTransformer pooling"""
+
+    def __init__(self, model_name: str, model_dir: str, quantize: bool = False, num_threads: int = 0):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        model_path = os.path.join(model_dir, 'model_int8.onnx' if quantize else 'model.onnx')
+        if not os.path.exists(model_path) or not os.path.exists(os.path.join(model_dir, 'pooling.json')):
+            model_path = export_onnx(model_name, model_dir, quantize=quantize)
+
+        with open(os.path.join(model_dir, 'pooling.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('model_name') != model_name:
+            raise ValueError(f"ONNX export in {model_dir} is for {meta.get('model_name')}, not {model_name}")
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = int(num_threads)
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.model_path = model_path
+        self.pooling = meta['pooling']
+        self.max_seq_length = meta['max_seq_length']
+        self.input_names = meta['input_names']
+        self.dimension = meta['dimension']
+
+    def _pool(self, hidden: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        if self.pooling == 'cls':
+            return hidden[:, 0]
+        mask = attention_mask[..., None].astype(hidden.dtype)
+        if self.pooling == 'max':
+            return np.where(mask > 0, hidden, -1e9).max(axis=1)
+        return (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+
+    def encode(self, texts: List[str], batch_size: int, show_progress_bar: bool) -> np.ndarray:
+        # Sắp theo độ dài để mỗi batch ít padding, trả về đúng thứ tự ban đầu
+        order = np.argsort([-len(t) for t in texts], kind='stable')
+        out = np.empty((len(texts), self.dimension), dtype='float32')
+        batches = range(0, len(texts), batch_size)
+        if show_progress_bar:
+            from tqdm import tqdm
+            batches = tqdm(batches, desc="Batches")
+        for start in batches:
+            idx = order[start:start + batch_size]
+            encoded = self.tokenizer(
+                [texts[i] for i in idx], padding=True, truncation=True,
+                max_length=self.max_seq_length, return_tensors='np'
+            )
+            feeds = {name: encoded[name].astype('int64') for name in self.input_names}
+            hidden = self.session.run(None, feeds)[0]
+            out[idx] = self._pool(hidden, encoded['attention_mask'])
+        return _normalize(out)
+
+    def memory_bytes(self) -> int:
+        return os.path.getsize(self.model_path)
+
+
+def create_backend(backend: str, model_name: str, device: str = 'cpu',
+                   onnx_dir: Optional[str] = None, num_threads: int = 0):
+    """Instantiate the embedding backend named by models.embedding_backend"""
+    backend = (backend or 'torch').lower()
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unsupported models.embedding_backend: {backend} (expected one of {EMBEDDING_BACKENDS})")
+    if backend in ('torch', 'torch_int8'):
+        return TorchBackend(model_name, device, quantize=backend == 'torch_int8')
+    if device != 'cpu':
+        logger.warning(f"{backend} embedding backend runs on CPU (models.device={device} ignored)")
+    model_dir = onnx_dir or os.path.join('data', 'models', 'onnx', model_name.replace('/', '__'))
+    return OnnxBackend(model_name, model_dir, quantize=backend == 'onnx_int8', num_threads=num_threads)
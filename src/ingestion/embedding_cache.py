@@ -0,0 +1,172 @@
+import os
+import hashlib
+import threading
+import unicodedata
+import numpy as np
+from typing import List, Dict, Any, Optional, Tuple
+from src.utils.logger import setup_logger
+
+try:
+    import fcntl
+except ImportError:  # Windows: chỉ khoá trong process
+    fcntl = None
+
+logger = setup_logger(__name__)
+
+
+class EmbeddingCache:
+    """Append-only, memory-mapped cache of embeddings keyed by text hash.
+
+    Mỗi (model, backend) có một namespace gồm hai file:
+      - `<namespace>.f32`: ma trận float32 (rows × dimension), ghi nối tiếp
+      - `<namespace>.keys`: sha1 (20 byte) của text đã chuẩn hoá, cùng thứ tự với các hàng
+
+    Reader chỉ mmap `.f32` và giữ dict sha1 → hàng trong bộ nhớ; hàng mới của
+    process khác được nạp lại khi gặp cache miss. Writer giữ flock trên
+    `<namespace>.lock`, ghi `.f32` trước `.keys` nên reader không bao giờ thấy
+    key trỏ tới vector chưa ghi xong.
+    """
+
+    KEY_SIZE = 20
+
+    def __init__(self, path: str, namespace: str, dimension: int, max_entries: int = 1_000_000):
+        self.path = path
+        self.namespace = namespace
+        self.dimension = dimension
+        self.max_entries = max_entries
+
+        base = os.path.join(path, namespace)
+        self.vec_path = f"{base}.f32"
+        self.keys_path = f"{base}.keys"
+        self.lock_path = f"{base}.lock"
+        self.row_bytes = dimension * 4
+
+        self._index: Dict[bytes, int] = {}
+        self._vectors: Optional[np.memmap] = None
+        self._rows = 0
+        self._lock = threading.Lock()
+        self.writable = True
+        self.hits = 0
+        self.misses = 0
+
+        try:
+            os.makedirs(path, exist_ok=True)
+        except OSError as e:
+            logger.warning(f"Embedding cache directory {path} is not writable: {e}")
+            self.writable = False
+        self.refresh()
+
+    @staticmethod
+    def namespace_for(model_name: str, backend: str = 'torch') -> str:
+        return f"{model_name.replace('/', '__')}.{backend}"
+
+    @staticmethod
+    def key(text: str) -> bytes:
+        """sha1 of the NFC, whitespace-collapsed text (tokenizer coi mọi khoảng trắng như nhau)"""
+        normalized = ' '.join(unicodedata.normalize('NFC', text).split())
+        return hashlib.sha1(normalized.encode('utf-8')).digest()
+
+    # ---------- đọc ----------
+
+    def refresh(self):
+        """Map rows appended since the last refresh (possibly by another process)"""
+        try:
+            rows = os.path.getsize(self.keys_path) // self.KEY_SIZE
+        except OSError:
+            return
+        if rows <= self._rows:
+            return
+
+        with open(self.keys_path, 'rb') as f:
+            f.seek(self._rows * self.KEY_SIZE)
+            data = f.read((rows - self._rows) * self.KEY_SIZE)
+        rows = self._rows + len(data) // self.KEY_SIZE
+
+        # Gán memmap mới trước khi thêm key: reader thấy key thì hàng đã có trong map
+        self._vectors = np.memmap(self.vec_path, dtype='float32', mode='r', shape=(rows, self.dimension))
+        for i in range(rows - self._rows):
+            self._index.setdefault(data[i * self.KEY_SIZE:(i + 1) * self.KEY_SIZE], self._rows + i)
+        self._rows = rows
+
+    def get(self, keys: List[bytes]) -> Tuple[np.ndarray, List[int]]:
+        """Look up `keys`; returns (embeddings, positions of misses) with zero rows for misses"""
+        rows = [self._index.get(k) for k in keys]
+        if None in rows:
+            with self._lock:
+                self.refresh()
+            rows = [self._index.get(k) for k in keys]
+
+        embeddings = np.zeros((len(keys), self.dimension), dtype='float32')
+        missing = [i for i, row in enumerate(rows) if row is None]
+        hit_positions = [i for i, row in enumerate(rows) if row is not None]
+        if hit_positions:
+            vectors = self._vectors
+            embeddings[hit_positions] = vectors[[rows[i] for i in hit_positions]]
+
+        self.hits += len(hit_positions)
+        self.misses += len(missing)
+        return embeddings, missing
+
+    # ---------- ghi ----------
+
+    def put(self, keys: List[bytes], embeddings: np.ndarray):
+        """Append embeddings whose keys are not cached yet"""
+        if not self.writable:
+            return
+        with self._lock:
+            try:
+                with open(self.lock_path, 'a') as lock_file:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                    try:
+                        self._append_locked(keys, embeddings)
+                    finally:
+                        if fcntl is not None:
+                            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            except OSError as e:
+                logger.warning(f"Disabling embedding cache writes ({self.path}): {e}")
+                self.writable = False
+
+    def _append_locked(self, keys: List[bytes], embeddings: np.ndarray):
+        self.refresh()  # process khác có thể vừa ghi cùng key
+        new_keys, new_rows, seen = [], [], set()
+        for key, vector in zip(keys, embeddings):
+            if key not in self._index and key not in seen:
+                seen.add(key)
+                new_keys.append(key)
+                new_rows.append(vector)
+        room = self.max_entries - self._rows
+        if room < len(new_keys):
+            if room <= 0:
+                logger.debug(f"Embedding cache {self.namespace} is full ({self._rows} entries)")
+                return
+            new_keys, new_rows = new_keys[:room], new_rows[:room]
+        if not new_keys:
+            return
+
+        with open(self.vec_path, 'ab') as vec:
+            # Cắt phần .f32 dư của lần ghi bị gián đoạn (vector đã ghi nhưng key thì chưa)
+            vec.truncate(self._rows * self.row_bytes)
+            vec.write(np.asarray(new_rows, dtype='float32').tobytes())
+            vec.flush()
+            os.fsync(vec.fileno())
+        with open(self.keys_path, 'ab') as keys_file:
+            keys_file.truncate(self._rows * self.KEY_SIZE)
+            keys_file.write(b''.join(new_keys))
+            keys_file.flush()
+            os.fsync(keys_file.fileno())
+        self.refresh()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get embedding cache statistics"""
+        lookups = self.hits + self.misses
+        return {
+            'namespace': self.namespace,
+            'entries': self._rows,
+            'max_entries': self.max_entries,
+            'size_mb': round(self._rows * self.row_bytes / 1024 ** 2, 2),
+            'writable': self.writable,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else None
+        }
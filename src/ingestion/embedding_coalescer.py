@@ -0,0 +1,123 @@
+import queue
+import threading
+import time
+import numpy as np
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class EmbeddingCoalescer:
+    """Gom các query đến gần nhau thành một batch `model.encode` duy nhất.
+
+    Request đầu tiên mở một cửa sổ `window_ms`; mọi request đến trong cửa sổ đó
+    (tối đa `max_batch`) được embed chung, mỗi caller nhận lại đúng dòng của mình.
+    """
+
+    # Đặt vào queue bởi close(): worker trả lời nốt các request trước nó rồi dừng
+    _STOP = object()
+
+    def __init__(self, embedder, window_ms: float = 5.0, max_batch: int = 32):
+        self.embedder = embedder
+        self.window_sec = max(0.0, float(window_ms)) / 1000.0
+        self.max_batch = max(1, int(max_batch))
+
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self._closed = False
+
+        self.batches = 0
+        self.items = 0
+        self.max_batch_seen = 0
+
+    def _ensure_worker(self):
+        # Gọi khi đang giữ _worker_lock
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(
+                target=self._run, name="embedding-coalescer", daemon=True
+            )
+            self._worker.start()
+
+    def embed(self, text: str) -> np.ndarray:
+        """Embed one text, blocking until its batch has been encoded"""
+        future: Future = Future()
+        # Kiểm tra _closed và put trong cùng lock: không request nào nằm sau _STOP
+        with self._worker_lock:
+            if self._closed:
+                raise RuntimeError("EmbeddingCoalescer is closed")
+            self._ensure_worker()
+            self._queue.put((text, future))
+        return future.result()
+
+    def close(self, timeout: Optional[float] = 5.0):
+        """Stop the worker once every request already queued has been answered"""
+        with self._worker_lock:
+            if self._closed:
+                return
+            self._closed = True
+            worker = self._worker
+            if worker is not None and worker.is_alive():
+                self._queue.put(self._STOP)
+        if worker is not None:
+            worker.join(timeout)
+
+    def _collect_batch(self) -> Tuple[List[Tuple[str, Future]], bool]:
+        """Next batch and whether close() was requested after it"""
+        item = self._queue.get()
+        if item is self._STOP:
+            return [], True
+        batch = [item]
+        deadline = time.perf_counter() + self.window_sec
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    # Hết cửa sổ: vẫn lấy nốt các request đã nằm sẵn trong queue
+                    item = self._queue.get_nowait()
+                else:
+                    item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is self._STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        stop = False
+        while not stop:
+            batch, stop = self._collect_batch()
+            if batch:
+                self._encode_batch(batch)
+
+    def _encode_batch(self, batch: List[Tuple[str, Future]]):
+        texts = [text for text, _ in batch]
+        try:
+            embeddings = self.embedder.embed_texts(texts, show_progress_bar=False)
+            if len(embeddings) != len(batch):
+                raise RuntimeError(f"Embedder returned {len(embeddings)} vectors for {len(batch)} texts")
+        except Exception as e:
+            logger.error(f"Coalesced embedding failed for {len(texts)} texts: {e}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.items += len(batch)
+        self.max_batch_seen = max(self.max_batch_seen, len(batch))
+        for (_, future), embedding in zip(batch, embeddings):
+            future.set_result(embedding)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get coalescer statistics"""
+        return {
+            'window_ms': self.window_sec * 1000,
+            'max_batch': self.max_batch,
+            'batches': self.batches,
+            'items': self.items,
+            'avg_batch_size': round(self.items / self.batches, 2) if self.batches else 0.0,
+            'max_batch_seen': self.max_batch_seen
+        }
@@ -0,0 +1,94 @@
+import os
+import json
+import hashlib
+from typing import Dict, Any, Optional
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Các field quyết định nội dung được embed; metadata (số đoạn, đường dẫn...) không tính
+CHUNK_HASH_FIELDS = ('type', 'title', 'content', 'text', 'columns', 'rows')
+# Metadata được hiển thị cùng chunk (trang, tiêu đề mục): đổi thì chunk phải được cập nhật
+CHUNK_METADATA_HASH_FIELDS = ('page', 'title')
+
+
+def chunk_hash(chunk: Dict[str, Any]) -> str:
+    """Content hash of a chunk, stable across re-ingests of the same text"""
+    payload = {field: chunk[field] for field in CHUNK_HASH_FIELDS if field in chunk}
+    metadata = chunk.get('metadata') or {}
+    shown = {field: metadata[field] for field in CHUNK_METADATA_HASH_FIELDS if field in metadata}
+    if shown:
+        payload['metadata'] = shown
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def file_sha256(file_path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IngestionManifest:
+    """Record of ingested source files: fingerprint + {chunk_hash: chunk_id} per file.
+
+    Lưu ở `<index_path>.manifest.json`, cạnh FAISS index và chunk store.
+    """
+
+    # v2: chunk_hash tính cả metadata hiển thị. Manifest v1 bị bỏ qua, chunk đã index được
+    # nhận lại qua metadata.file_path với hash mới nên không phải embed lại
+    VERSION = 2
+
+    def __init__(self, path: str):
+        self.path = path
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.load()
+
+    @staticmethod
+    def key(file_path: str) -> str:
+        return os.path.normpath(os.path.abspath(file_path))
+
+    def load(self):
+        if not os.path.exists(self.path):
+            self.files = {}
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != self.VERSION:
+            logger.warning(f"Ignoring manifest {self.path} with unsupported version {data.get('version')}")
+            self.files = {}
+            return
+        self.files = data.get('files', {})
+
+    def save(self):
+        """Write the manifest atomically"""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': self.VERSION, 'files': self.files}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def get(self, file_path: str) -> Optional[Dict[str, Any]]:
+        return self.files.get(self.key(file_path))
+
+    def fingerprint(self, file_path: str, known: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """mtime/size/sha256 of a file; reuses the known hash when mtime and size match"""
+        st = os.stat(file_path)
+        if known and known.get('mtime_ns') == st.st_mtime_ns and known.get('size') == st.st_size:
+            sha = known['sha256']
+        else:
+            sha = file_sha256(file_path)
+        return {'mtime_ns': st.st_mtime_ns, 'size': st.st_size, 'sha256': sha}
+
+    def is_unchanged(self, file_path: str, fingerprint: Dict[str, Any]) -> bool:
+        entry = self.get(file_path)
+        return entry is not None and entry.get('sha256') == fingerprint['sha256']
+
+    def update(self, file_path: str, fingerprint: Dict[str, Any], chunks: Dict[str, int]):
+        self.files[self.key(file_path)] = {**fingerprint, 'chunks': chunks}
+
+    def clear(self):
+        self.files = {}
+        if os.path.exists(self.path):
+            os.remove(self.path)
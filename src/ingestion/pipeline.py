@@ -0,0 +1,224 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Dict, Any, Optional, Tuple
+from src.utils.config import Config
+from src.utils.logger import setup_logger
+from src.ingestion.document_loader import DocumentLoader
+from src.ingestion.text_splitter import TextSplitter
+
+logger = setup_logger(__name__)
+
+STAGES = ('fingerprint', 'parse', 'embed', 'index', 'stream', 'persist')
+
+# Loader/splitter riêng cho từng worker process, khởi tạo một lần
+_worker_components: Optional[Tuple[DocumentLoader, TextSplitter]] = None
+
+
+def load_and_split(loader: DocumentLoader, splitter: TextSplitter,
+                   file_path: str) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """Load one file and split it into chunks; returns (document, chunks)"""
+    document = loader.load_document(file_path)
+    doc_for_splitter = {
+        "file_path": file_path,
+        "content": document.get("content", ""),
+        "blocks": document.get("blocks"),
+        "metadata": document.get("metadata", {"source": "BIDV.docx"})
+    }
+    return document, splitter.split_document(doc_for_splitter)
+
+
+def _init_worker(config: Config):
+    global _worker_components
+    _worker_components = (DocumentLoader(), TextSplitter(config))
+
+
+def _parse_worker(file_path: str) -> Dict[str, Any]:
+    """Process-pool entry point: parse + split one file"""
+    loader, splitter = _worker_components
+    start = time.perf_counter()
+    document, chunks = load_and_split(loader, splitter, file_path)
+    return {
+        'file_path': file_path,
+        'metadata': document.get('metadata', {}),
+        'chunks': chunks,
+        'parse_sec': time.perf_counter() - start
+    }
+
+
+class IngestionPipeline:
+    """Multi-document ingestion: parallel parse/split, cross-file embedding, one index commit.
+
+    Các stage:
+      1. fingerprint: bỏ qua file không đổi (manifest)
+      2. parse: load + split trong process pool (`ingestion.workers`)
+      3. embed: gom chunk mới của nhiều file thành batch đầy (`ingestion.embed_batch_size`),
+         chạy song song với stage parse khi kết quả về dần
+      4. index: thêm/xoá chunk trong vector store theo thứ tự file; file PDF/TXT
+         (`ingestion.streaming`) được đọc, chia, embed và index theo batch ngay tại đây
+         (stage "stream") thay vì nạp cả file ở stage 2
+      5. persist: save_index() + manifest một lần duy nhất
+    """
+
+    def __init__(self, rag_system, workers: Optional[int] = None):
+        self.rag = rag_system
+        config = rag_system.config
+        self.workers = max(1, int(workers or config.get('ingestion.workers', min(4, os.cpu_count() or 1))))
+        self.embed_batch_size = int(rag_system.ingest_batch_size)
+        self.stats: Dict[str, Any] = {}
+
+    def run(self, file_paths: List[str]) -> List[Dict[str, Any]]:
+        """Ingest all files; returns one result per file, in input order"""
+        rag = self.rag
+        file_paths = list(dict.fromkeys(file_paths))
+        timings = {stage: 0.0 for stage in STAGES}
+        results: Dict[str, Dict[str, Any]] = {}
+        total = len(file_paths)
+        run_start = time.perf_counter()
+
+        # Stage 1: fingerprint, bỏ qua file không đổi
+        start = time.perf_counter()
+        pending_files, fingerprints = [], {}
+        manifest_touched = False
+        for file_path in file_paths:
+            try:
+                entry = rag.manifest.get(file_path)
+                fingerprint = rag.manifest.fingerprint(file_path, known=entry)
+            except Exception as e:
+                logger.error(f"Error ingesting {file_path}: {e}")
+                results[file_path] = {'file_path': file_path, 'error': str(e)}
+                continue
+            if rag.manifest.is_unchanged(file_path, fingerprint):
+                if entry.get('mtime_ns') != fingerprint['mtime_ns']:
+                    rag.manifest.update(file_path, fingerprint, entry['chunks'])
+                    manifest_touched = True
+                results[file_path] = {
+                    'file_path': file_path,
+                    'chunks_created': 0,
+                    'chunks_removed': 0,
+                    'chunks_unchanged': len(entry['chunks']),
+                    'skipped': True
+                }
+            else:
+                fingerprints[file_path] = fingerprint
+                pending_files.append(file_path)
+        # PDF/TXT không qua process pool: stream trong process chính ở stage 4
+        parse_files = [f for f in pending_files if not rag.streams_file(f)]
+        timings['fingerprint'] = time.perf_counter() - start
+        logger.info(f"[ingest] {total - len(pending_files)}/{total} files unchanged or failed fingerprinting, "
+                    f"{len(parse_files)} to parse with {self.workers} worker(s), "
+                    f"{len(pending_files) - len(parse_files)} to stream")
+
+        # Stage 2 + 3: parse song song, embed theo batch khi đủ chunk
+        parsed: Dict[str, Dict[str, Any]] = {}
+        embed_queue: List[Dict[str, Any]] = []
+        embedded_count = 0
+
+        def embed_pending(force: bool = False):
+            nonlocal embed_queue, embedded_count
+            while embed_queue and (force or len(embed_queue) >= self.embed_batch_size):
+                batch, embed_queue = embed_queue[:self.embed_batch_size], embed_queue[self.embed_batch_size:]
+                t = time.perf_counter()
+                rag.embedder.embed_chunks(batch)
+                timings['embed'] += time.perf_counter() - t
+                embedded_count += len(batch)
+                logger.info(f"[ingest] embedded {embedded_count} new chunks")
+
+        def on_parsed(item: Dict[str, Any]):
+            file_path = item['file_path']
+            timings['parse'] += item['parse_sec']
+            item['plan'] = rag._plan_chunk_delta(file_path, item['chunks'])
+            parsed[file_path] = item
+            embed_queue.extend(item['plan']['to_add'])
+            logger.info(f"[ingest] parsed {len(parsed)}/{len(parse_files)}: {file_path} "
+                        f"({len(item['chunks'])} chunks, {len(item['plan']['to_add'])} new)")
+            embed_pending()
+
+        def on_failed(file_path: str, error: Exception):
+            logger.error(f"Error ingesting {file_path}: {error}")
+            results[file_path] = {'file_path': file_path, 'error': str(error)}
+
+        parse_start = time.perf_counter()
+        if self.workers == 1 or len(parse_files) <= 1:
+            # Không đáng để spawn process: parse ngay trong process hiện tại
+            for file_path in parse_files:
+                try:
+                    t = time.perf_counter()
+                    document, chunks = load_and_split(rag.document_loader, rag.text_splitter, file_path)
+                    on_parsed({
+                        'file_path': file_path,
+                        'metadata': document.get('metadata', {}),
+                        'chunks': chunks,
+                        'parse_sec': time.perf_counter() - t
+                    })
+                except Exception as e:
+                    on_failed(file_path, e)
+        else:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(parse_files)),
+                                     initializer=_init_worker, initargs=(rag.config,)) as pool:
+                futures = {pool.submit(_parse_worker, file_path): file_path for file_path in parse_files}
+                for future in as_completed(futures):
+                    try:
+                        on_parsed(future.result())
+                    except Exception as e:
+                        on_failed(futures[future], e)
+        embed_pending(force=True)
+        parse_wall = time.perf_counter() - parse_start
+
+        # Stage 4: cập nhật vector store theo thứ tự file đầu vào (id ổn định giữa các lần chạy)
+        start = time.perf_counter()
+        changed = False
+        streamed = 0
+        for file_path in pending_files:
+            if rag.streams_file(file_path):
+                t = time.perf_counter()
+                try:
+                    result = rag._ingest_document_stream(file_path, fingerprints[file_path])
+                except Exception as e:
+                    on_failed(file_path, e)
+                    continue
+                finally:
+                    timings['stream'] += time.perf_counter() - t
+                results[file_path] = result
+                streamed += 1
+                changed = changed or bool(result['chunks_created'] or result['chunks_removed'])
+                continue
+
+            item = parsed.get(file_path)
+            if item is None:
+                continue
+            plan = item['plan']
+            try:
+                result = rag._index_chunk_delta(file_path, fingerprints[file_path], plan, plan['to_add'])
+            except Exception as e:
+                on_failed(file_path, e)
+                continue
+            result['document_metadata'] = item['metadata']
+            results[file_path] = result
+            changed = changed or bool(result['chunks_created'] or result['chunks_removed'])
+        timings['index'] = time.perf_counter() - start - timings['stream']
+
+        # Stage 5: một lần commit index + manifest cho cả batch
+        start = time.perf_counter()
+        if changed or parsed or streamed or manifest_touched:
+            rag._persist_ingestion(changed=changed)
+        for file_path, item in parsed.items():
+            if 'error' not in results[file_path]:
+                rag._save_chunks(item['chunks'], file_path)
+        timings['persist'] = time.perf_counter() - start
+
+        ordered = [results[file_path] for file_path in file_paths]
+        self.stats = {
+            'files': total,
+            'processed': len(parsed) + streamed,
+            'skipped': sum(1 for r in ordered if r.get('skipped')),
+            'failed': sum(1 for r in ordered if 'error' in r),
+            'chunks_embedded': embedded_count,
+            'workers': self.workers,
+            # parse/embed là tổng thời gian CPU của stage, parse_wall là thời gian thực (chồng lấp embed)
+            'timings_sec': {**{k: round(v, 3) for k, v in timings.items()},
+                            'parse_wall': round(parse_wall, 3),
+                            'total': round(time.perf_counter() - run_start, 3)}
+        }
+        logger.info(f"[ingest] done: {self.stats}")
+        return ordered
@@ -1,64 +1,124 @@
 import json
 import re
-from typing import List, Dict, Any
-from docx import Document
+from bisect import bisect_left
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
 from pathlib import Path
 from src.utils.config import Config
+from src.ingestion.docx_reader import iter_docx_blocks
+from src.generation.tokenizer import TokenCounter
 from src.utils.logger import setup_logger
 
 logger = setup_logger(__name__)
 
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?]) +')
+# Cùng ranh giới nhưng không dùng lookbehind (nhanh ~2x): dấu câu được bắt lại rồi gắn vào câu
+_SENTENCE_END_RE = re.compile(r'([.!?]) +')
+
+
+def split_sentences(text: str) -> List[str]:
+    """Same result as SENTENCE_BOUNDARY.split(text)."""
+    parts = _SENTENCE_END_RE.split(text)  # [câu, dấu, câu, dấu, ..., câu cuối]
+    sentences = [s + p for s, p in zip(parts[::2], parts[1::2])]
+    sentences.append(parts[-1])
+    return sentences
+
+
 class TextSplitter:
     def __init__(self, config: Config):
         self.config = config
         self.max_tokens = config.get('chunking.max_tokens', 400)
         self.overlap = config.get('chunking.overlap', 50)
+
+        # Mặc định đếm theo từ (giữ nguyên ranh giới chunk của index cũ); có thể dùng
+        # tokenizer subword của LLM/embedding cho budget qua chunking.tokenizer.*
+        self.token_counter: Optional[TokenCounter] = None
+        backend = config.get('chunking.tokenizer.backend')
+        if backend:
+            self.token_counter = TokenCounter(
+                backend,
+                name=config.get('chunking.tokenizer.name'),
+                path=config.get('chunking.tokenizer.path'),
+                cache_size=0  # câu lúc ingest hầu như không lặp lại
+            )
         
-        logger.info(f"TextSplitter initialized with max_tokens={self.max_tokens}, overlap={self.overlap}")
+        logger.info(f"TextSplitter initialized with max_tokens={self.max_tokens}, overlap={self.overlap}, "
+                    f"tokenizer={backend or 'words'}")
 
     @staticmethod
     def count_tokens(text: str) -> int:
         """Đếm token cơ bản (ước lượng theo từ)."""
         return len(text.split())
 
+    def _count_sentence(self, sentence: str) -> int:
+        if self.token_counter is not None:
+            return self.token_counter.count(sentence)
+        return len(sentence.split())
+
+    def _count_sentences(self, sentences: List[str]) -> List[int]:
+        if self.token_counter is not None:
+            return self.token_counter.count_batch(sentences)
+        return [len(s.split()) for s in sentences]
+
     def split_paragraph(self, text: str) -> List[str]:
         """Tách đoạn dài thành các chunk nhỏ dựa trên số token."""
-        sentences = re.split(r'(?<=[.!?]) +', text)
-        chunks, current = [], []
-        token_count = 0
+        sentences = split_sentences(text)
+        return list(self._pack_counted(zip(sentences, self._count_sentences(sentences))))
+
+    def _pack_sentences(self, sentences: Iterable[str]) -> Iterator[str]:
+        """Gom các câu thành chunk không quá max_tokens, có overlap giữa các chunk."""
+        return self._pack_counted((s, self._count_sentence(s)) for s in sentences)
+
+    def _pack_counted(self, counted: Iterable[Tuple[str, int]]) -> Iterator[str]:
+        """Pack (sentence, tokens) pairs; mỗi câu chỉ được đếm token một lần.
+
+        prefix[i] là tổng token (cộng dồn từ đầu luồng) trước window[i], nên số token
+        của chunk hiện tại là prefix[-1] - prefix[0] và phần overlap (đuôi dài nhất có
+        tổng <= overlap) tìm bằng bisect thay vì đếm lại từng câu.
+        """
+        window: List[str] = []
+        prefix = [0]
         
-        for sentence in sentences:
-            sentence_tokens = self.count_tokens(sentence)
-            
-            if token_count + sentence_tokens > self.max_tokens and current:
+        for sentence, sentence_tokens in counted:
+            if prefix[-1] - prefix[0] + sentence_tokens > self.max_tokens and window:
                 # Add current chunk
-                chunks.append(" ".join(current))
+                yield " ".join(window)
                 
                 # Start new chunk with overlap if configured
-                if self.overlap > 0 and len(current) > 1:
+                if self.overlap > 0 and len(window) > 1:
                     # Keep last few sentences for overlap
-                    overlap_sentences = []
-                    overlap_tokens = 0
-                    for s in reversed(current):
-                        s_tokens = self.count_tokens(s)
-                        if overlap_tokens + s_tokens <= self.overlap:
-                            overlap_sentences.insert(0, s)
-                            overlap_tokens += s_tokens
-                        else:
-                            break
-                    current = overlap_sentences + [sentence]
-                    token_count = overlap_tokens + sentence_tokens
+                    start = bisect_left(prefix, prefix[-1] - self.overlap)
+                    window = window[start:]
+                    prefix = prefix[start:]
                 else:
-                    current = [sentence]
-                    token_count = sentence_tokens
-            else:
-                current.append(sentence)
-                token_count += sentence_tokens
+                    window = []
+                    prefix = prefix[-1:]
+            window.append(sentence)
+            prefix.append(prefix[-1] + sentence_tokens)
         
-        if current:
-            chunks.append(" ".join(current))
-        
-        return chunks
+        if window:
+            yield " ".join(window)
+
+    @staticmethod
+    def iter_sentences(texts: Iterable[str]) -> Iterator[str]:
+        """Tách câu trên một chuỗi được đưa vào từng phần.
+
+        Cho cùng kết quả với SENTENCE_BOUNDARY.split("".join(texts)) nhưng chỉ
+        giữ lại phần đuôi chưa chắc đã hết câu giữa các phần.
+        """
+        carry = ''
+        for text in texts:
+            buffer = carry + text
+            # Ranh giới chạm cuối buffer có thể còn kéo dài sang phần sau → chưa dùng
+            last = None
+            for match in _SENTENCE_END_RE.finditer(buffer):
+                if match.end() < len(buffer):
+                    last = match
+            if last is None:
+                carry = buffer
+                continue
+            yield from split_sentences(buffer[:last.start() + 1])
+            carry = buffer[last.end():]
+        yield from split_sentences(carry)
 
     @staticmethod
     def parse_table(table, context_title=None) -> Dict[str, Any]:
@@ -68,6 +128,11 @@ class TextSplitter:
             row_data = [cell.text.strip() for cell in row.cells]
             rows.append(row_data)
         
+        return TextSplitter.table_chunk(rows, context_title)
+
+    @staticmethod
+    def table_chunk(rows: List[List[str]], context_title=None) -> Dict[str, Any]:
+        """Chuyển các dòng của bảng (dòng đầu là header) thành chunk dạng bảng."""
         return {
             "type": "table",
             "title": context_title if context_title else "Unknown Table",
@@ -82,7 +147,7 @@ class TextSplitter:
 
         if file_extension == '.docx':
             logger.info("[INFO] Using DOCX splitter based on file_path")
-            return self._split_docx_document(file_path, metadata)
+            return self._split_docx_document(file_path, metadata, blocks=document.get('blocks'))
         
         content = document.get('content', '')
         if file_extension == '.json':
@@ -90,56 +155,13 @@ class TextSplitter:
         else:
             return self._split_text_document(content, metadata)
 
-    def _split_docx_document(self, file_path: str, metadata: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """Split DOCX document into chunks"""
+    def _split_docx_document(self, file_path: str, metadata: Dict[str, Any],
+                             blocks: Optional[Iterable[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        """Split DOCX document into chunks; reuses the loader's blocks instead of re-parsing the file"""
         try:
-            doc = Document(file_path)
-            chunks = []
-            current_title = None
-            buffer = []
-
-            for para in doc.paragraphs:
-                text = para.text.strip()
-                if not text:
-                    continue
-
-                # Phát hiện tiêu đề
-                if (re.match(r'^\d+(\.\d+)*\s', text) or 
-                    text.isupper() or 
-                    para.style.name.startswith("Heading")):
-                    
-                    # Flush buffer trước đó
-                    if buffer:
-                        joined_text = " ".join(buffer)
-                        for chunk_content in self.split_paragraph(joined_text):
-                            chunks.append({
-                                "type": "text",
-                                "title": current_title or "Untitled",
-                                "content": chunk_content,
-                                "metadata": {**metadata, "title": current_title}
-                            })
-                        buffer = []
-                    current_title = text
-                else:
-                    buffer.append(text)
-
-            # Flush cuối cùng
-            if buffer:
-                joined_text = " ".join(buffer)
-                for chunk_content in self.split_paragraph(joined_text):
-                    chunks.append({
-                        "type": "text",
-                        "title": current_title or "Untitled",
-                        "content": chunk_content,
-                        "metadata": {**metadata, "title": current_title}
-                    })
-
-            # Xử lý bảng
-            for table in doc.tables:
-                table_chunk = self.parse_table(table, context_title=current_title)
-                table_chunk["metadata"] = {**metadata, "title": current_title}
-                chunks.append(table_chunk)
-
+            if blocks is None:
+                blocks = iter_docx_blocks(file_path)
+            chunks = self._split_docx_blocks(blocks, metadata)
             logger.info(f"Split DOCX document into {len(chunks)} chunks")
             return chunks
 
@@ -147,6 +169,62 @@ class TextSplitter:
             logger.error(f"Error splitting DOCX document: {e}")
             raise
 
+    def _split_docx_blocks(self, blocks: Iterable[Dict[str, Any]], metadata: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Split a stream of DOCX blocks (see iter_docx_blocks) into chunks"""
+        chunks = []
+        table_rows = []
+        current_title = None
+        buffer = []
+
+        def flush_buffer():
+            joined_text = " ".join(buffer)
+            for chunk_content in self.split_paragraph(joined_text):
+                chunks.append({
+                    "type": "text",
+                    "title": current_title or "Untitled",
+                    "content": chunk_content,
+                    "metadata": {**metadata, "title": current_title}
+                })
+            buffer.clear()
+
+        for block in blocks:
+            if block["type"] == "heading":
+                # Flush buffer trước đó
+                if buffer:
+                    flush_buffer()
+                current_title = block["text"]
+            elif block["type"] == "paragraph":
+                buffer.append(block["text"])
+            elif block["type"] == "table":
+                table_rows.append(block["rows"])
+
+        # Flush cuối cùng
+        if buffer:
+            flush_buffer()
+
+        # Xử lý bảng: gắn tiêu đề cuối cùng của tài liệu, đặt sau các chunk văn bản
+        for rows in table_rows:
+            table_chunk = self.table_chunk(rows, context_title=current_title)
+            table_chunk["metadata"] = {**metadata, "title": current_title}
+            chunks.append(table_chunk)
+
+        return chunks
+
+    def split_records(self, records: Iterable[Dict[str, Any]], metadata: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """Streaming counterpart of _split_text_document for DocumentLoader.stream_document records"""
+        sentences = self.iter_sentences(record['text'] for record in records)
+        i = 0
+        for chunk_content in self._pack_sentences(sentences):
+            if not chunk_content.strip():
+                continue
+            yield {
+                "type": "text",
+                "title": f"Text Chunk {i+1}",
+                "content": chunk_content,
+                "metadata": {**metadata, "chunk_id": i}
+            }
+            i += 1
+
     def _split_json_document(self, content: str, metadata: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Split JSON document (already chunked)"""
         try:
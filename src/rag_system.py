@@ -1,120 +1,570 @@
 import os
 import json
-from typing import List, Dict, Any
+import asyncio
+import contextvars
+import numpy as np
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple, Iterator, AsyncIterator
 from pathlib import Path
 from src.utils.config import Config
 from src.utils.logger import setup_logger
 from src.ingestion.document_loader import DocumentLoader
 from src.ingestion.text_splitter import TextSplitter
-from src.ingestion.embedder import Embedder
+from src.ingestion.embedder import get_embedder
+from src.ingestion.manifest import IngestionManifest, chunk_hash
+from src.ingestion.pipeline import IngestionPipeline, load_and_split
 from src.retrieval.retriever import Retriever
+from src.retrieval.query_cache import QueryCache
 from src.generation.response_generator import ResponseGenerator
+from src.utils.context_text import CONTEXT_CLEAN_FIELD, CONTEXT_TOKENS_FIELD
+from src.generation.llm_client import LLMError
+from src.utils.concurrency import TokenBucket
+from src.utils.tracing import tracer
 
 logger = setup_logger(__name__)
 
 class RAGSystem:
     def __init__(self, config_path: str = None):
         self.config = Config(config_path)
+        # Span theo từng stage của query/ingest → histogram (/metrics), tuỳ chọn export OTLP
+        tracer.configure(self.config)
         
         # Initialize components
         self.document_loader = DocumentLoader()
         self.text_splitter = TextSplitter(self.config)
-        self.embedder = Embedder(self.config)
+        self.embedder = get_embedder(self.config)
         self.retriever = Retriever(self.config)
         logger.debug(f"Config for LLM generation: {self.config.get('generation')}")
         self.response_generator = ResponseGenerator(self.config)
+        self.query_cache = QueryCache(self.config)
         
         # Try to load existing vector store
         self.retriever.load_vector_store()
+        self.manifest = IngestionManifest(self.retriever.vector_store.manifest_path)
+        self.last_ingestion_stats: Dict[str, Any] = {}
+        # PDF/TXT được đọc, chia và embed theo từng batch thay vì nạp cả file
+        self.stream_ingestion = self.config.get('ingestion.streaming', True)
+        self.ingest_batch_size = self.config.get('ingestion.embed_batch_size', self.embedder.batch_size * 8)
+        # query_batch: số câu hỏi tối đa mỗi batch, số lời gọi LLM song song và rate limit (request/giây)
+        self.batch_max_size = self.config.get('query_batch.max_size', 256)
+        # Một batch chỉ chiếm một slot của API limiter nhưng gọi LLM song song: giới hạn
+        # fan-out không vượt api.max_concurrent_queries để một batch không đè các query khác
+        batch_concurrency = self.config.get('query_batch.max_concurrency', 8)
+        max_concurrent_queries = max(1, self.config.get('api.max_concurrent_queries', 4))
+        self.batch_concurrency = min(batch_concurrency, max_concurrent_queries)
+        if self.batch_concurrency < batch_concurrency:
+            logger.warning(f"query_batch.max_concurrency={batch_concurrency} capped to "
+                           f"api.max_concurrent_queries={max_concurrent_queries}")
+        self.batch_rate_limit = self.config.get('query_batch.rate_limit_per_sec', 10)
+        # Rate limit dùng chung cho mọi batch (kể cả các batch chạy đồng thời), không tạo lại mỗi lần gọi
+        self.batch_bucket = TokenBucket(self.batch_rate_limit)
         
         logger.info("RAG System initialized successfully")
     
     def ingest_document(self, file_path: str) -> Dict[str, Any]:
-        """Complete document ingestion pipeline"""
+        """Complete document ingestion pipeline (incremental: only changed chunks are embedded)"""
         logger.info(f"Starting document ingestion: {file_path}")
-        
-        # Load document
-        document = self.document_loader.load_document(file_path)
+        with tracer.span("ingest", file=os.path.basename(file_path)) as span:
+            result = self._ingest_document(file_path)
+            span.set_attribute("chunks_created", result['chunks_created'])
+            return result
 
-        doc_for_splitter = {
-            "file_path": file_path,
-            "metadata": document.get("metadata", {"source": "BIDV.docx"})
-        }
+    def _ingest_document(self, file_path: str) -> Dict[str, Any]:
+        # File không đổi nội dung → bỏ qua hoàn toàn
+        with tracer.span("ingest.fingerprint"):
+            entry = self.manifest.get(file_path)
+            fingerprint = self.manifest.fingerprint(file_path, known=entry)
+        if self.manifest.is_unchanged(file_path, fingerprint):
+            if entry.get('mtime_ns') != fingerprint['mtime_ns']:
+                self.manifest.update(file_path, fingerprint, entry['chunks'])
+                self.manifest.save()
+            logger.info(f"Document unchanged since last ingestion, skipping: {file_path}")
+            return {
+                'file_path': file_path,
+                'chunks_created': 0,
+                'chunks_removed': 0,
+                'chunks_unchanged': len(entry['chunks']),
+                'skipped': True
+            }
         
-        # Split into chunks
-        chunks = self.text_splitter.split_document(doc_for_splitter)
+        if self.streams_file(file_path):
+            result = self._ingest_document_stream(file_path, fingerprint)
+            self._persist_ingestion(changed=bool(result['chunks_created'] or result['chunks_removed']))
+            logger.info(f"Streamed document ingestion completed: {result}")
+            return result
 
-        # Generate embeddings
-        chunks_with_embeddings = self.embedder.embed_chunks(chunks)
-        
-        # Add to vector store
-        self.retriever.vector_store.add_chunks(chunks_with_embeddings)
-        
-        # Save vector store
-        self.retriever.vector_store.save_index()
+        # Load + split into chunks
+        with tracer.span("ingest.load_split"):
+            document, chunks = load_and_split(self.document_loader, self.text_splitter, file_path)
+
+        # Embed + index only the delta
+        plan = self._plan_chunk_delta(file_path, chunks)
+        with tracer.span("ingest.embed", chunks=len(plan['to_add'])):
+            embedded = self.embedder.embed_chunks(plan['to_add']) if plan['to_add'] else []
+        with tracer.span("ingest.index"):
+            result = self._index_chunk_delta(file_path, fingerprint, plan, embedded)
+        self._persist_ingestion(changed=bool(result['chunks_created'] or result['chunks_removed']))
         
         # Save processed chunks
-        self._save_chunks(chunks_with_embeddings, file_path)
+        with tracer.span("ingest.save_chunks"):
+            self._save_chunks(chunks, file_path)
         
-        result = {
-            'file_path': file_path,
-            'chunks_created': len(chunks_with_embeddings),
-            'document_metadata': document['metadata']
-        }
+        result['document_metadata'] = document['metadata']
         
         logger.info(f"Document ingestion completed: {result}")
         return result
+
+    def streams_file(self, file_path: str) -> bool:
+        """True when the file is ingested batch by batch (PDF/TXT) instead of loaded whole"""
+        return self.stream_ingestion and self.document_loader.supports_streaming(file_path)
+
+    def _existing_chunk_ids(self, file_path: str) -> Tuple[Dict[str, int], List[int]]:
+        """Indexed chunks of a file as ({chunk_hash: chunk_id}, duplicate ids to drop)"""
+        entry = self.manifest.get(file_path)
+        duplicate_ids = []
+        if entry is not None:
+            return dict(entry['chunks']), duplicate_ids
+
+        # Store cũ chưa có manifest: nhận diện chunk đã ingest theo metadata.file_path
+        existing = {}
+        for chunk_id, chunk in self.retriever.vector_store.find_ids_by_source(file_path).items():
+            h = chunk_hash(chunk)
+            if h in existing:
+                duplicate_ids.append(chunk_id)
+            else:
+                existing[h] = chunk_id
+        return existing, duplicate_ids
+
+    def _plan_chunk_delta(self, file_path: str, chunks: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Compare a file's fresh chunks with what is indexed: which to keep, add and remove"""
+        existing, duplicate_ids = self._existing_chunk_ids(file_path)
+
+        # Hash các chunk mới; chunk trùng nội dung trong cùng file chỉ giữ một bản
+        new_chunks: Dict[str, Dict[str, Any]] = {}
+        for chunk in chunks:
+            new_chunks.setdefault(chunk_hash(chunk), chunk)
+
+        kept = {h: existing[h] for h in new_chunks if h in existing}
+        to_add = [(h, chunk) for h, chunk in new_chunks.items() if h not in existing]
+        return {
+            'kept': kept,
+            'to_add_hashes': [h for h, _ in to_add],
+            'to_add': [chunk for _, chunk in to_add],
+            'stale_ids': [chunk_id for h, chunk_id in existing.items() if h not in kept] + duplicate_ids
+        }
+
+    def _ingest_document_stream(self, file_path: str, fingerprint: Dict[str, Any]) -> Dict[str, Any]:
+        """Streaming ingestion for PDF/TXT: chunks are embedded and indexed batch by batch.
+
+        Chỉ một batch chunk (`ingestion.embed_batch_size`) nằm trong bộ nhớ tại một
+        thời điểm; metadata của batch được append vào chunk store ngay sau khi index.
+        Index + manifest chưa được lưu (caller gọi _persist_ingestion); nếu lỗi giữa
+        chừng, các chunk đã thêm của file bị rollback khỏi index và chunk store.
+        """
+        vector_store = self.retriever.vector_store
+        metadata, records = self.document_loader.stream_document(file_path)
+        existing, duplicate_ids = self._existing_chunk_ids(file_path)
+        checkpoint = len(vector_store.chunks)
+
+        kept: Dict[str, int] = {}
+        added: Dict[str, int] = {}
+        batch: List[Tuple[str, Dict[str, Any]]] = []
+        batch_hashes = set()
+
+        def flush_batch():
+            with tracer.span("ingest.embed", chunks=len(batch)):
+                chunks = self.embedder.embed_chunks([chunk for _, chunk in batch])
+            with tracer.span("ingest.index"):
+                ids = vector_store.add_chunks(chunks)
+                added.update(zip((h for h, _ in batch), ids))
+                vector_store.chunks.flush()
+            batch.clear()
+            batch_hashes.clear()
+
+        try:
+            with open(self._chunks_output_path(file_path), 'w', encoding='utf-8') as out:
+                count = 0
+                for chunk in self.text_splitter.split_records(records, metadata):
+                    self._write_chunk_json(out, chunk, first=count == 0)
+                    count += 1
+
+                    h = chunk_hash(chunk)
+                    # Chunk trùng nội dung trong cùng file chỉ giữ một bản
+                    if h in kept or h in added or h in batch_hashes:
+                        continue
+                    if h in existing:
+                        kept[h] = existing[h]
+                        continue
+                    batch.append((h, chunk))
+                    batch_hashes.add(h)
+                    if len(batch) >= self.ingest_batch_size:
+                        flush_batch()
+                if batch:
+                    flush_batch()
+                out.write("\n]" if count else "[]")
+        except BaseException:
+            # FAISS/manifest chưa lưu các chunk này → bỏ chúng khỏi chunk store đã flush
+            vector_store.rollback(checkpoint)
+            # Slot id vừa rollback sẽ được cấp lại cho chunk khác
+            self.retriever.reranker.clear_cache()
+            raise
+
+        stale_ids = [chunk_id for h, chunk_id in existing.items() if h not in kept] + duplicate_ids
+        if stale_ids:
+            vector_store.remove_ids(stale_ids)
+        self.manifest.update(file_path, fingerprint, {**kept, **added})
+
+        return {
+            'file_path': file_path,
+            'chunks_created': len(added),
+            'chunks_removed': len(stale_ids),
+            'chunks_unchanged': len(kept),
+            'skipped': False,
+            'document_metadata': metadata
+        }
+
+    def _index_chunk_delta(self, file_path: str, fingerprint: Dict[str, Any], plan: Dict[str, Any],
+                           embedded_chunks: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Apply a planned delta to the vector store and manifest (in memory, not persisted)"""
+        vector_store = self.retriever.vector_store
+
+        added = {}
+        if embedded_chunks:
+            ids = vector_store.add_chunks(embedded_chunks)
+            added = dict(zip(plan['to_add_hashes'], ids))
+        if plan['stale_ids']:
+            vector_store.remove_ids(plan['stale_ids'])
+
+        self.manifest.update(file_path, fingerprint, {**plan['kept'], **added})
+        return {
+            'file_path': file_path,
+            'chunks_created': len(added),
+            'chunks_removed': len(plan['stale_ids']),
+            'chunks_unchanged': len(plan['kept']),
+            'skipped': False
+        }
+
+    def _persist_ingestion(self, changed: bool):
+        """Persist index + manifest once after one or more documents were indexed"""
+        with tracer.span("ingest.persist"):
+            self._persist_index(changed)
+
+    def _persist_index(self, changed: bool):
+        if changed:
+            # Save vector store (chunk store chỉ append phần thay đổi)
+            self.retriever.vector_store.save_index()
+
+            # Index đã thay đổi → các câu trả lời và điểm rerank đã cache không còn đúng
+            self.query_cache.invalidate()
+            self.retriever.reranker.clear_cache()
+        self.manifest.save()
     
-    def ingest_multiple_documents(self, file_paths: List[str]) -> List[Dict[str, Any]]:
-        """Ingest multiple documents"""
-        results = []
-        for file_path in file_paths:
-            try:
-                result = self.ingest_document(file_path)
-                results.append(result)
-            except Exception as e:
-                logger.error(f"Error ingesting {file_path}: {e}")
-                results.append({
-                    'file_path': file_path,
-                    'error': str(e)
-                })
+    def ingest_multiple_documents(self, file_paths: List[str], workers: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Ingest multiple documents (parallel parsing, cross-file embedding, one index commit)"""
+        pipeline = IngestionPipeline(self, workers=workers)
+        with tracer.span("ingest.batch", files=len(file_paths)):
+            results = pipeline.run(file_paths)
+        self.last_ingestion_stats = pipeline.stats
         return results
     
+    def _retrieve_contents(self, question: str, query_embedding: Optional[np.ndarray] = None) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """Retrieve chunks and format them as context strings for the prompt"""
+        contexts = self.retriever.retrieve(question, query_embedding=query_embedding)
+        with tracer.span("query.format_contexts"):
+            return contexts, self._format_contents(contexts)
+
+    def _format_contents(self, contexts: List[Dict[str, Any]]) -> List[str]:
+        return [self.embedder.chunk_to_context(ctx) for ctx in contexts]
+
+    @staticmethod
+    def _prompt_contexts(state: Dict[str, Any]) -> List[Any]:
+        """Contexts for the prompt: the retrieved chunks (prompt template cleans any without ingest-time fields)"""
+        return state["contexts"]
+
+    def _lookup_or_retrieve(self, question: str,
+                            timings: Optional[Dict[str, float]] = None) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+        """Return (cached_result, None) on a cache hit, otherwise (None, retrieval state).
+
+        `timings` (nếu có) nhận thời gian từng stage theo ms: cache_ms, embed_ms, retrieve_ms.
+        """
+        timings = {} if timings is None else timings
+        # Lấy trước khi retrieve: nếu index đổi giữa chừng thì kết quả không được cache
+        generation = self.query_cache.generation
+        with tracer.span("query.cache_lookup") as span:
+            cached = self.query_cache.get(question)
+        timings["cache_ms"] = span.duration_ms
+        if cached is not None:
+            return {**cached, "cache": "exact"}, None
+
+        with tracer.span("query.embed") as span:
+            query_embedding = self.embedder.embed_query(question)
+        timings["embed_ms"] = span.duration_ms
+
+        with tracer.span("query.semantic_cache") as span:
+            cached = self.query_cache.get_semantic(query_embedding)
+        timings["cache_ms"] = round(timings["cache_ms"] + span.duration_ms, 2)
+        if cached is not None:
+            return {**cached, "cache": "semantic"}, None
+
+        with tracer.span("query.retrieve") as span:
+            contexts, contents = self._retrieve_contents(question, query_embedding)
+        timings["retrieve_ms"] = span.duration_ms
+        return None, {"embedding": query_embedding, "contexts": contexts, "contents": contents,
+                      "cache_generation": generation}
+
+    def _finish_query(self, question: str, state: Dict[str, Any], response: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the query result and store it in the cache"""
+        contexts = state["contexts"]
+        result = {
+            "retrieval_score": contexts[0]["retrieval_score"] if contexts else 0,
+            "response": response["response"],
+            "contexts": state["contents"]  # thêm dòng này để debug context
+        }
+
+        # Không cache câu xin lỗi khi LLM lỗi
+        if not response.get("metadata", {}).get("fallback"):
+            self.query_cache.put(question, state["embedding"], result, generation=state.get("cache_generation"))
+        # prompt_tokens chỉ gắn cho request thật sự gọi LLM (không lưu vào cache)
+        return {**result, "cache": None, "prompt_tokens": response.get("metadata", {}).get("prompt_tokens")}
+
     def query(self, question: str) -> Dict[str, Any]:
         logger.info(f"Processing query: {question}")
-        contexts = self.retriever.retrieve(question)
-        contents = [
-            self.embedder._format_table_content(ctx) if ctx.get("type") == "table"
-            else (ctx.get("content") or ctx.get("text", ""))
-            for ctx in contexts
-        ]
+        with tracer.span("query") as root:
+            timings = {}
+            cached, state = self._lookup_or_retrieve(question, timings)
+            if cached is not None:
+                root.set_attribute("cache", cached["cache"])
+                timings["total_ms"] = root.duration_ms
+                return {**cached, "timings": timings}
 
-        response = self.response_generator.generate_response(question, contents)
+            with tracer.span("query.generate") as span:
+                response = self.response_generator.generate_response(question, self._prompt_contexts(state))
+            timings["llm_ms"] = span.duration_ms
+            result = self._finish_query(question, state, response)
+            timings["total_ms"] = root.duration_ms
+            return {**result, "timings": timings}
 
-        return {
+    def query_stream(self, question: str, deadline: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """Streaming query: yield a `metadata` event after retrieval, then LLM `delta` events and a final `done`"""
+        logger.info(f"Processing streamed query: {question}")
+        cached, state = self._lookup_or_retrieve(question)
+
+        if cached is not None:
+            yield {
+                "event": "metadata",
+                "retrieval_score": cached["retrieval_score"],
+                "contexts": cached["contexts"],
+                "cache": cached["cache"]
+            }
+            yield {"event": "delta", "content": cached["response"]}
+            yield {"event": "done", "response": cached["response"], "metadata": {"cache": cached["cache"]}}
+            return
+
+        contexts = state["contexts"]
+        yield {
+            "event": "metadata",
             "retrieval_score": contexts[0]["retrieval_score"] if contexts else 0,
-            "response": response["response"],
-            "contexts": contents  # thêm dòng này để debug context
+            "contexts": state["contents"],
+            "cache": None
         }
 
-    
-    def _save_chunks(self, chunks: List[Dict[str, Any]], file_path: str):
-        """Save processed chunks to JSON file"""
+        for event in self.response_generator.generate_response_stream(question, self._prompt_contexts(state),
+                                                                      deadline=deadline):
+            if event["event"] == "done":
+                self._finish_query(question, state, event)
+                yield {
+                    "event": "done",
+                    "response": event["response"],
+                    "metadata": event["metadata"]
+                }
+            else:
+                yield event
+
+    async def aquery(self, question: str, executor: Optional[Executor] = None,
+                     deadline: Optional[float] = None) -> Dict[str, Any]:
+        """Async query: embedding + FAISS search run in `executor`, the LLM call is awaited until `deadline`"""
+        logger.info(f"Processing query (async): {question}")
+        loop = asyncio.get_running_loop()
+        with tracer.span("query") as root:
+            timings = {}
+            # run_in_executor không mang contextvars sang thread: copy để span con gắn vào span "query"
+            context = contextvars.copy_context()
+            cached, state = await loop.run_in_executor(
+                executor, context.run, self._lookup_or_retrieve, question, timings
+            )
+            if cached is not None:
+                root.set_attribute("cache", cached["cache"])
+                timings["total_ms"] = root.duration_ms
+                return {**cached, "timings": timings}
+
+            with tracer.span("query.generate") as span:
+                response = await self.response_generator.agenerate_response(
+                    question, self._prompt_contexts(state), deadline=deadline
+                )
+            timings["llm_ms"] = span.duration_ms
+            result = self._finish_query(question, state, response)
+            timings["total_ms"] = root.duration_ms
+            return {**result, "timings": timings}
+
+    def _prepare_batch(self, questions: List[str]) -> List[Any]:
+        """Cache lookup + one embedding call + one FAISS search for a batch of questions.
+
+        Mỗi phần tử: (cached_result, None), (None, retrieval state) như
+        _lookup_or_retrieve, hoặc Exception nếu câu hỏi đó lỗi.
+        """
+        prepared: List[Any] = [None] * len(questions)
+        generation = self.query_cache.generation
+        pending = []
+        for i, question in enumerate(questions):
+            if not isinstance(question, str) or not question.strip():
+                prepared[i] = ValueError("Question must be a non-empty string")
+                continue
+            cached = self.query_cache.get(question)
+            if cached is not None:
+                prepared[i] = ({**cached, "cache": "exact"}, None)
+            else:
+                pending.append(i)
+        if not pending:
+            return prepared
+
+        try:
+            embeddings = self.embedder.embed_texts([questions[i] for i in pending], show_progress_bar=False)
+            to_search = []
+            for i, embedding in zip(pending, embeddings):
+                cached = self.query_cache.get_semantic(embedding)
+                if cached is not None:
+                    prepared[i] = ({**cached, "cache": "semantic"}, None)
+                else:
+                    to_search.append((i, embedding))
+
+            if to_search:
+                batch_contexts = self.retriever.retrieve_batch(
+                    [questions[i] for i, _ in to_search],
+                    np.vstack([embedding for _, embedding in to_search])
+                )
+                for (i, embedding), contexts in zip(to_search, batch_contexts):
+                    if isinstance(contexts, Exception):
+                        prepared[i] = contexts
+                    else:
+                        prepared[i] = (None, {"embedding": embedding, "contexts": contexts,
+                                              "contents": self._format_contents(contexts),
+                                              "cache_generation": generation})
+        except Exception as e:
+            logger.error(f"Batched retrieval failed: {e}", exc_info=True)
+            for i in pending:
+                if prepared[i] is None:
+                    prepared[i] = e
+        return prepared
+
+    @staticmethod
+    def _batch_item(index: int, question: str, outcome: Any) -> Dict[str, Any]:
+        if isinstance(outcome, Exception):
+            item = {"index": index, "question": question, "status": "error", "error": str(outcome)}
+            if isinstance(outcome, LLMError):
+                item["error_kind"] = outcome.kind
+            return item
+        return {"index": index, "question": question, "status": "success", "result": outcome}
+
+    def query_batch(self, questions: List[str]) -> Iterator[Dict[str, Any]]:
+        """Answer many questions: one embedding call, one FAISS search, concurrent rate-limited LLM calls.
+
+        Yield lần lượt theo thứ tự đầu vào {"index", "question", "status", "result" | "error"};
+        câu hỏi lỗi không làm hỏng cả batch.
+        """
+        logger.info(f"Processing query batch of {len(questions)} questions")
+        prepared = self._prepare_batch(questions)
+
+        def answer(question: str, state: Dict[str, Any]) -> Dict[str, Any]:
+            self.batch_bucket.acquire()
+            response = self.response_generator.generate_response(question, self._prompt_contexts(state))
+            return self._finish_query(question, state, response)
+
+        pool = ThreadPoolExecutor(max_workers=max(1, self.batch_concurrency), thread_name_prefix="rag-batch")
+        try:
+            futures = [
+                pool.submit(answer, questions[i], item[1])
+                if isinstance(item, tuple) and item[1] is not None else None
+                for i, item in enumerate(prepared)
+            ]
+            for i, (item, future) in enumerate(zip(prepared, futures)):
+                if future is None:
+                    outcome = item if isinstance(item, Exception) else item[0]
+                else:
+                    try:
+                        outcome = future.result()
+                    except Exception as e:
+                        logger.error(f"Batch query {i} failed: {e}")
+                        outcome = e
+                yield self._batch_item(i, questions[i], outcome)
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    async def aquery_batch(self, questions: List[str], executor: Optional[Executor] = None,
+                           deadline: Optional[float] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Async query_batch: retrieval runs in `executor`, LLM calls are awaited concurrently until `deadline`.
+
+        Tối đa batch_concurrency (≤ api.max_concurrent_queries) lời gọi LLM song song mỗi batch;
+        tốc độ gọi của mọi batch cộng lại bị giới hạn bởi batch_bucket.
+        """
+        logger.info(f"Processing query batch (async) of {len(questions)} questions")
+        loop = asyncio.get_running_loop()
+        prepared = await loop.run_in_executor(executor, self._prepare_batch, questions)
+        semaphore = asyncio.Semaphore(max(1, self.batch_concurrency))
+
+        async def answer(question: str, state: Dict[str, Any]) -> Dict[str, Any]:
+            async with semaphore:
+                await self.batch_bucket.aacquire()
+                response = await self.response_generator.agenerate_response(
+                    question, self._prompt_contexts(state), deadline=deadline
+                )
+            return self._finish_query(question, state, response)
+
+        tasks = [
+            asyncio.ensure_future(answer(questions[i], item[1]))
+            if isinstance(item, tuple) and item[1] is not None else None
+            for i, item in enumerate(prepared)
+        ]
+        try:
+            for i, (item, task) in enumerate(zip(prepared, tasks)):
+                if task is None:
+                    outcome = item if isinstance(item, Exception) else item[0]
+                else:
+                    try:
+                        outcome = await task
+                    except Exception as e:
+                        logger.error(f"Batch query {i} failed: {e}")
+                        outcome = e
+                yield self._batch_item(i, questions[i], outcome)
+        finally:
+            # Client ngắt giữa chừng: huỷ các lời gọi LLM chưa xong
+            for task in tasks:
+                if task is not None and not task.done():
+                    task.cancel()
+
+    @staticmethod
+    def _chunks_output_path(file_path: str) -> str:
         output_dir = "data/processed/chunks"
         os.makedirs(output_dir, exist_ok=True)
         
         file_name = Path(file_path).stem
-        output_path = os.path.join(output_dir, f"{file_name}_chunks.json")
-        
+        return os.path.join(output_dir, f"{file_name}_chunks.json")
+
+    @staticmethod
+    def _write_chunk_json(out, chunk: Dict[str, Any], first: bool):
+        """Write one element of the chunks JSON array (same layout as json.dump(..., indent=2))"""
         # Remove embeddings for JSON serialization (they're stored in vector store)
-        chunks_for_save = []
-        for chunk in chunks:
-            chunk_copy = chunk.copy()
-            chunk_copy.pop('embedding', None)
-            chunks_for_save.append(chunk_copy)
+        chunk_copy = {k: v for k, v in chunk.items() if k not in ('embedding', CONTEXT_CLEAN_FIELD, CONTEXT_TOKENS_FIELD)}
+        body = json.dumps(chunk_copy, ensure_ascii=False, indent=2).replace("\n", "\n  ")
+        out.write(("[\n  " if first else ",\n  ") + body)
+
+    def _save_chunks(self, chunks: List[Dict[str, Any]], file_path: str):
+        """Save processed chunks to JSON file"""
+        output_path = self._chunks_output_path(file_path)
         
         with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(chunks_for_save, f, ensure_ascii=False, indent=2)
+            for i, chunk in enumerate(chunks):
+                self._write_chunk_json(f, chunk, first=i == 0)
+            f.write("\n]" if chunks else "[]")
         
         logger.info(f"Saved chunks to: {output_path}")
     
@@ -122,6 +572,8 @@ class RAGSystem:
         """Get system statistics"""
         return {
             'retriever_stats': self.retriever.get_stats(),
+            'embedder_stats': self.embedder.get_stats(),
+            'cache_stats': self.query_cache.get_stats(),
             'config': {
                 'embedding_model': self.config.get('models.embedding_model'),
                 'llm_model': self.config.get('models.llm_model'),
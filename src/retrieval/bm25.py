@@ -0,0 +1,222 @@
+import os
+import re
+import json
+import math
+import heapq
+import unicodedata
+from collections import Counter
+from typing import List, Dict, Any, Tuple, Iterable
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Token: chữ/số, giữ nguyên các ký tự nối bên trong như 1.000.000, 0,5%, BIDV-VISA, 24/7
+_TOKEN = re.compile(r"\w+(?:[.,/%\-]\w+)*%?", re.UNICODE)
+_NUMBER_SEPARATORS = re.compile(r"[.,]")
+
+
+def tokenize(text: str) -> List[str]:
+    """Vietnamese-aware BM25 tokens: syllables, syllable bigrams and normalised numbers.
+
+    Tiếng Việt viết tách âm tiết ("thẻ tín dụng"), nên ngoài từng âm tiết còn
+    thêm bigram liền kề ("thẻ_tín", "tín_dụng") để ưu tiên cụm từ đúng thứ tự.
+    Văn bản được chuẩn hoá NFC (dấu tổ hợp vs dựng sẵn) và viết thường; số có
+    dấu phân cách hàng nghìn được thêm dạng chỉ chữ số (1.000.000 → 1000000).
+    """
+    text = unicodedata.normalize('NFC', text or '').lower()
+    syllables = _TOKEN.findall(text)
+
+    tokens = list(syllables)
+    for token in syllables:
+        if token[0].isdigit() and _NUMBER_SEPARATORS.search(token):
+            digits = _NUMBER_SEPARATORS.sub('', token)
+            if digits.isdigit():
+                tokens.append(digits)
+    tokens.extend(f"{a}_{b}" for a, b in zip(syllables, syllables[1:]))
+    return tokens
+
+
+def chunk_text(chunk: Dict[str, Any]) -> str:
+    """Text of a chunk as it is indexed for lexical search"""
+    parts = [chunk.get('title', '')]
+    if chunk.get('type') == 'table':
+        parts.append(' '.join(str(c) for c in chunk.get('columns', [])))
+        parts.extend(' '.join(str(c) for c in row) for row in chunk.get('rows', []))
+    else:
+        parts.append(chunk.get('content') or chunk.get('text', ''))
+    return '\n'.join(p for p in parts if p)
+
+
+class BM25Index:
+    """In-process inverted index with Okapi BM25 scoring.
+
+    Id của document trùng với id chunk trong FAISS index / chunk store.
+    Lưu dạng log JSON Lines `<index_path>.bm25.jsonl` cạnh file FAISS: dòng đầu
+    là header, mỗi dòng sau là một thao tác {"add": id, "tf": {...}} hoặc
+    {"remove": id}. save() chỉ append các thao tác từ lần lưu trước (không làm gì
+    nếu index không đổi); log được ghi lại gọn khi số dòng vượt quá
+    COMPACT_RATIO lần số document. Load vẫn đọc lại toàn bộ log và dựng posting list.
+    """
+
+    VERSION = 2
+    # Ghi lại toàn bộ log khi số thao tác đã lưu > COMPACT_RATIO * số document
+    COMPACT_RATIO = 2
+
+    def __init__(self, path: str, k1: float = 1.5, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.doc_terms: Dict[int, Dict[str, int]] = {}
+        self.doc_len: Dict[int, int] = {}
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.total_len = 0
+        # Thao tác chưa ghi xuống log; _rewrite: log trên đĩa không còn khớp, phải ghi lại từ đầu
+        self._pending: List[Dict[str, Any]] = []
+        self._log_records = 0
+        self._rewrite = True
+
+    @property
+    def dirty(self) -> bool:
+        """Whether the in-memory index differs from the saved log"""
+        return self._rewrite or bool(self._pending)
+
+    def __len__(self) -> int:
+        return len(self.doc_terms)
+
+    def __contains__(self, doc_id: int) -> bool:
+        return doc_id in self.doc_terms
+
+    # ---------- cập nhật ----------
+
+    def add(self, doc_id: int, text: str):
+        if doc_id in self.doc_terms:
+            self.remove(doc_id)
+        tf = dict(Counter(tokenize(text)))
+        self._index(doc_id, tf)
+        self._pending.append({'add': doc_id, 'tf': tf})
+
+    def add_chunks(self, ids: Iterable[int], chunks: Iterable[Dict[str, Any]]):
+        for doc_id, chunk in zip(ids, chunks):
+            self.add(int(doc_id), chunk_text(chunk))
+
+    def _index(self, doc_id: int, tf: Dict[str, int]):
+        self.doc_terms[doc_id] = tf
+        self.doc_len[doc_id] = sum(tf.values())
+        self.total_len += self.doc_len[doc_id]
+        for term, count in tf.items():
+            self.postings.setdefault(term, {})[doc_id] = count
+
+    def remove(self, doc_id: int):
+        tf = self.doc_terms.pop(doc_id, None)
+        if tf is None:
+            return
+        self._pending.append({'remove': doc_id})
+        self.total_len -= self.doc_len.pop(doc_id)
+        for term in tf:
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self.postings[term]
+
+    def clear(self):
+        self.doc_terms = {}
+        self.doc_len = {}
+        self.postings = {}
+        self.total_len = 0
+        self._pending = []
+        self._rewrite = True
+
+    # ---------- tìm kiếm ----------
+
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[int, float]]:
+        """Top-k (doc_id, bm25_score) for a query; documents without any query term are skipped"""
+        n = len(self.doc_terms)
+        if n == 0 or top_k <= 0:
+            return []
+
+        avgdl = self.total_len / n
+        k1, b = self.k1, self.b
+        doc_len = self.doc_len
+        scores: Dict[int, float] = {}
+        for term, qtf in Counter(tokenize(query)).items():
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_id, tf in posting.items():
+                norm = tf + k1 * (1 - b + b * doc_len[doc_id] / avgdl)
+                scores[doc_id] = scores.get(doc_id, 0.0) + qtf * idf * tf * (k1 + 1) / norm
+
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+
+    # ---------- lưu trữ ----------
+
+    def save(self):
+        """Persist changes since the last save: append them to the log, or compact it when it has grown"""
+        if not self.dirty:
+            return
+        if self._rewrite or self._log_records + len(self._pending) > self.COMPACT_RATIO * max(len(self), 1):
+            self._write_all()
+        else:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.writelines(self._dumps(op) for op in self._pending)
+            self._log_records += len(self._pending)
+        self._pending = []
+
+    def _write_all(self):
+        """Rewrite the log atomically with one `add` per live document"""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self._dumps({'version': self.VERSION, 'k1': self.k1, 'b': self.b}))
+            f.writelines(self._dumps({'add': doc_id, 'tf': tf}) for doc_id, tf in self.doc_terms.items())
+        os.replace(tmp_path, self.path)
+        self._log_records = len(self.doc_terms)
+        self._rewrite = False
+
+    @staticmethod
+    def _dumps(record: Dict[str, Any]) -> str:
+        return json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+    def load(self) -> bool:
+        """Replay a saved log; returns False when it is missing or in an unsupported format"""
+        self.clear()
+        if not os.path.exists(self.path):
+            return False
+        records, truncated = 0, False
+        with open(self.path, 'r', encoding='utf-8') as f:
+            try:
+                header = json.loads(f.readline() or '{}')
+            except json.JSONDecodeError:
+                header = {}
+            if header.get('version') != self.VERSION:
+                logger.warning(f"Ignoring BM25 index {self.path} with unsupported version {header.get('version')}")
+                return False
+            for line in f:
+                try:
+                    op = json.loads(line)
+                except json.JSONDecodeError:
+                    # Dòng cuối ghi dở (crash giữa lúc append): dừng ở đây, caller kiểm tra độ khớp
+                    logger.warning(f"Truncated record in BM25 index {self.path}; ignoring the rest")
+                    truncated = True
+                    break
+                records += 1
+                if 'add' in op:
+                    doc_id = int(op['add'])
+                    self.remove(doc_id)
+                    self._index(doc_id, op['tf'])
+                else:
+                    self.remove(int(op['remove']))
+        self._pending = []
+        self._log_records = records
+        # Không append sau một dòng hỏng: lần save tới ghi lại toàn bộ
+        self._rewrite = truncated
+        logger.info(f"Loaded BM25 index with {len(self)} documents and {len(self.postings)} terms")
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'documents': len(self.doc_terms),
+            'terms': len(self.postings),
+            'avg_doc_len': round(self.total_len / len(self.doc_terms), 1) if self.doc_terms else 0
+        }
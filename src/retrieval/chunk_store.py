@@ -0,0 +1,245 @@
+import os
+import json
+import mmap
+import struct
+from typing import List, Dict, Any, Iterable, Iterator, Optional
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+def _json_default(obj: Any) -> Any:
+    """Cho phép serialize numpy scalar/array mà không import numpy."""
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class ChunkStore:
+    """Append-only, memory-mapped chunk metadata store.
+
+    Hai file cạnh FAISS index:
+      - `<path>.idx`: header 16 byte + mỗi chunk một record cố định (offset, length, flags)
+      - `<path>.dat`: các chunk nối tiếp nhau dưới dạng UTF-8 JSON
+
+    Mở store chỉ cần mmap hai file (O(1) theo số chunk); chunk chỉ được decode
+    khi truy cập theo index. Chunk mới nằm trong bộ nhớ cho tới khi flush(),
+    lúc đó chỉ phần mới được append vào cuối file.
+    """
+
+    MAGIC = b'BIDVCHNK'
+    VERSION = 1
+    HEADER = struct.Struct('<8sII')    # magic, version, số chunk đã xoá
+    RECORD = struct.Struct('<QII')     # offset trong .dat, length, flags
+    FLAG_DELETED = 1
+
+    def __init__(self, path: str):
+        self.path = path
+        self.idx_path = f"{path}.idx"
+        self.dat_path = f"{path}.dat"
+
+        self._idx_map: Optional[mmap.mmap] = None
+        self._dat_map: Optional[mmap.mmap] = None
+        self._persisted = 0
+        self._pending: List[Dict[str, Any]] = []
+        self._deleted_count = 0
+        self._pending_deletes: set = set()
+        # True khi store phản ánh đúng file trên đĩa (đã load hoặc đã ghi)
+        self._attached = False
+
+    @classmethod
+    def exists(cls, path: str) -> bool:
+        return os.path.exists(f"{path}.idx") and os.path.exists(f"{path}.dat")
+
+    # ---------- đọc ----------
+
+    def load(self) -> bool:
+        """Memory-map the store files; returns False when they do not exist"""
+        self._close_maps()
+        if not self.exists(self.path):
+            return False
+
+        with open(self.idx_path, 'rb') as f:
+            header = f.read(self.HEADER.size)
+        if len(header) < self.HEADER.size:
+            raise ValueError(f"Corrupted chunk store header: {self.idx_path}")
+        magic, version, deleted_count = self.HEADER.unpack(header)
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError(f"Unsupported chunk store format in {self.idx_path}")
+
+        self._idx_map = self._map(self.idx_path)
+        self._dat_map = self._map(self.dat_path)
+        idx_size = len(self._idx_map) if self._idx_map is not None else 0
+        self._persisted = (idx_size - self.HEADER.size) // self.RECORD.size
+        self._pending = []
+        self._pending_deletes = set()
+        self._deleted_count = deleted_count
+        self._attached = True
+        return True
+
+    @staticmethod
+    def _map(path: str) -> Optional[mmap.mmap]:
+        if os.path.getsize(path) == 0:
+            return None
+        with open(path, 'rb') as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _close_maps(self):
+        for m in (self._idx_map, self._dat_map):
+            if m is not None:
+                m.close()
+        self._idx_map = self._dat_map = None
+
+    def _read_record(self, i: int) -> Dict[str, Any]:
+        offset, length, _ = self.RECORD.unpack_from(self._idx_map, self.HEADER.size + i * self.RECORD.size)
+        return json.loads(self._dat_map[offset:offset + length].decode('utf-8'))
+
+    def is_deleted(self, i: int) -> bool:
+        """True when chunk slot `i` has been tombstoned"""
+        if i in self._pending_deletes:
+            return True
+        if i < self._persisted:
+            _, _, flags = self.RECORD.unpack_from(self._idx_map, self.HEADER.size + i * self.RECORD.size)
+            return bool(flags & self.FLAG_DELETED)
+        return False
+
+    def live_count(self) -> int:
+        """Number of chunks that have not been deleted"""
+        return len(self) - self._deleted_count - len(self._pending_deletes)
+
+    def __len__(self) -> int:
+        return self._persisted + len(self._pending)
+
+    def __getitem__(self, i: int) -> Dict[str, Any]:
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError(f"Chunk index {i} out of range ({n} chunks)")
+        if i < self._persisted:
+            return self._read_record(i)
+        return self._pending[i - self._persisted]
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for i in range(len(self)):
+            yield self[i]
+
+    # ---------- ghi ----------
+
+    def append(self, chunk: Dict[str, Any]):
+        self._pending.append(chunk)
+
+    def extend(self, chunks: Iterable[Dict[str, Any]]):
+        self._pending.extend(chunks)
+
+    def delete(self, i: int):
+        """Tombstone chunk slot `i`.
+
+        Id đã commit không bao giờ được cấp lại nên FAISS id ổn định; chỉ slot chưa
+        commit (bị truncate() khi rollback) mới có thể được dùng lại.
+        """
+        if not 0 <= i < len(self):
+            raise IndexError(f"Chunk index {i} out of range ({len(self)} chunks)")
+        if not self.is_deleted(i):
+            self._pending_deletes.add(i)
+
+    def flush(self):
+        """Persist pending chunks, appending only the new records"""
+        if not self._attached:
+            # Store chưa gắn với file nào: ghi lại từ đầu (ghi đè file cũ nếu có)
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.idx_path, 'wb') as f:
+                f.write(self.HEADER.pack(self.MAGIC, self.VERSION, 0))
+            open(self.dat_path, 'wb').close()
+            self._attached = True
+
+        if not self._pending and not self._pending_deletes:
+            return
+
+        with open(self.dat_path, 'ab') as dat:
+            offset = dat.tell()
+            records = []
+            for chunk in self._pending:
+                payload = json.dumps(chunk, ensure_ascii=False, default=_json_default).encode('utf-8')
+                dat.write(payload)
+                records.append(self.RECORD.pack(offset, len(payload), 0))
+                offset += len(payload)
+            dat.flush()
+            os.fsync(dat.fileno())
+
+        # Ghi .dat trước .idx: reader không bao giờ thấy record trỏ tới dữ liệu chưa ghi
+        with open(self.idx_path, 'r+b') as idx:
+            idx.seek(0, os.SEEK_END)
+            idx.write(b''.join(records))
+
+            # Tombstone: sửa tại chỗ field flags của từng record và bộ đếm trong header
+            for i in sorted(self._pending_deletes):
+                idx.seek(self.HEADER.size + i * self.RECORD.size + 12)
+                idx.write(struct.pack('<I', self.FLAG_DELETED))
+            idx.seek(0)
+            idx.write(self.HEADER.pack(
+                self.MAGIC, self.VERSION, self._deleted_count + len(self._pending_deletes)
+            ))
+            idx.flush()
+            os.fsync(idx.fileno())
+
+        written, deleted = len(self._pending), len(self._pending_deletes)
+        self.load()
+        logger.info(f"Chunk store {self.path}: +{written} / -{deleted} chunks (live {self.live_count()})")
+
+    def truncate(self, n: int):
+        """Drop every chunk from slot `n` on, in memory and on disk.
+
+        Dùng để huỷ các chunk của một lần ingest chưa commit (FAISS index không có
+        id của chúng); các slot < n và tombstone đang chờ của chúng được giữ nguyên.
+        """
+        if not 0 <= n <= len(self):
+            raise IndexError(f"Cannot truncate to {n} ({len(self)} chunks)")
+        pending_deletes = {i for i in self._pending_deletes if i < n}
+        if n >= self._persisted:
+            del self._pending[n - self._persisted:]
+            self._pending_deletes = pending_deletes
+            return
+
+        # Tombstone đã ghi của các slot bị cắt không còn được tính trong header
+        dropped_deleted = sum(
+            1 for i in range(n, self._persisted)
+            if self.RECORD.unpack_from(self._idx_map, self.HEADER.size + i * self.RECORD.size)[2] & self.FLAG_DELETED
+        )
+        dat_end = self.RECORD.unpack_from(self._idx_map, self.HEADER.size + n * self.RECORD.size)[0]
+        self._close_maps()
+
+        # Cắt .idx trước .dat: reader không bao giờ thấy record trỏ tới dữ liệu đã bị cắt
+        with open(self.idx_path, 'r+b') as idx:
+            idx.truncate(self.HEADER.size + n * self.RECORD.size)
+            idx.seek(0)
+            idx.write(self.HEADER.pack(self.MAGIC, self.VERSION, self._deleted_count - dropped_deleted))
+            idx.flush()
+            os.fsync(idx.fileno())
+        with open(self.dat_path, 'r+b') as dat:
+            dat.truncate(dat_end)
+            dat.flush()
+            os.fsync(dat.fileno())
+
+        dropped = len(self) - n
+        self.load()
+        self._pending_deletes = pending_deletes
+        logger.info(f"Chunk store {self.path}: truncated {dropped} uncommitted chunks (live {self.live_count()})")
+
+    def detach(self):
+        """Forget the on-disk files; the next flush() rewrites them from scratch"""
+        self._close_maps()
+        self._persisted = 0
+        self._pending = []
+        self._deleted_count = 0
+        self._pending_deletes = set()
+        self._attached = False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get chunk store statistics"""
+        return {
+            'persisted_chunks': self._persisted,
+            'pending_chunks': len(self._pending),
+            'deleted_chunks': self._deleted_count + len(self._pending_deletes),
+            'data_bytes': len(self._dat_map) if self._dat_map is not None else 0
+        }
@@ -0,0 +1,34 @@
+from typing import List, Dict, Tuple, Sequence
+
+FUSION_METHODS = ('rrf', 'weighted')
+
+
+def reciprocal_rank_fusion(rankings: Sequence[List[Tuple[int, float]]], k: int = 60,
+                           weights: Sequence[float] = None) -> List[Tuple[int, float]]:
+    """Fuse ranked (id, score) lists: score(id) = sum_i w_i / (k + rank_i(id)), rank bắt đầu từ 1"""
+    weights = weights or [1.0] * len(rankings)
+    fused: Dict[int, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, (doc_id, _) in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + weight / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+def _max_normalize(ranking: List[Tuple[int, float]]) -> Dict[int, float]:
+    """Chia cho điểm cao nhất của list: hạng đầu = 1, giữ tỉ lệ giữa các điểm"""
+    if not ranking:
+        return {}
+    hi = max(score for _, score in ranking)
+    if hi <= 0:
+        return {doc_id: 0.0 for doc_id, _ in ranking}
+    return {doc_id: max(score, 0.0) / hi for doc_id, score in ranking}
+
+
+def weighted_fusion(rankings: Sequence[List[Tuple[int, float]]],
+                    weights: Sequence[float]) -> List[Tuple[int, float]]:
+    """Fuse lists by a weighted sum of max-normalised scores (thiếu trong một list = 0)"""
+    fused: Dict[int, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for doc_id, score in _max_normalize(ranking).items():
+            fused[doc_id] = fused.get(doc_id, 0.0) + weight * score
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,160 @@
+import math
+import faiss
+import numpy as np
+from typing import Dict, Any, Optional, Tuple
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+INDEX_TYPES = ('flat', 'ivf_flat', 'ivf_pq', 'hnsw')
+
+# 'faiss' là giá trị cũ của vector_store.type, tương đương Flat
+_ALIASES = {'faiss': 'flat', 'ivfflat': 'ivf_flat', 'ivfpq': 'ivf_pq'}
+
+
+def normalize_index_type(index_type: str) -> str:
+    """Map config values (including legacy aliases) onto INDEX_TYPES"""
+    name = (index_type or 'flat').lower().replace('-', '_')
+    name = _ALIASES.get(name, name)
+    if name not in INDEX_TYPES:
+        raise ValueError(f"Unsupported vector_store.type: {index_type} (expected one of {INDEX_TYPES})")
+    return name
+
+
+def ideal_nlist(n: int) -> int:
+    """Number of IVF lists for n vectors: ~4*sqrt(n), with at least 39 training points per list"""
+    return max(1, min(int(4 * math.sqrt(max(n, 1))), n // 39))
+
+
+def index_type_of(index: faiss.Index) -> str:
+    """Detect the INDEX_TYPES name of an existing (possibly wrapped) index"""
+    index = unwrap_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return 'hnsw'
+    if isinstance(index, faiss.IndexIVFPQ):
+        return 'ivf_pq'
+    if isinstance(index, faiss.IndexIVF):
+        return 'ivf_flat'
+    return 'flat'
+
+
+def unwrap_index(index: faiss.Index) -> faiss.Index:
+    """Strip IndexIDMap wrappers and downcast to the concrete index class"""
+    index = faiss.downcast_index(index)
+    while isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        index = faiss.downcast_index(index.index)
+    return index
+
+
+def build_index(index_type: str, dimension: int, vectors: Optional[np.ndarray] = None,
+                params: Optional[Dict[str, Any]] = None, ids: Optional[np.ndarray] = None) -> faiss.Index:
+    """Create (and train, for IVF) an inner-product index addressed by external int64 ids.
+
+    Flat/HNSW được bọc trong IndexIDMap2; IVF tự lưu id trong inverted list.
+    Nếu không truyền `ids`, vector được đánh id 0..n-1.
+    """
+    index_type = normalize_index_type(index_type)
+    params = params or {}
+    n = 0 if vectors is None else len(vectors)
+
+    if index_type == 'flat':
+        index = faiss.IndexIDMap2(faiss.IndexFlatIP(dimension))
+
+    elif index_type == 'hnsw':
+        hnsw = faiss.IndexHNSWFlat(dimension, int(params.get('hnsw_m', 32)), faiss.METRIC_INNER_PRODUCT)
+        hnsw.hnsw.efConstruction = int(params.get('ef_construction', 200))
+        hnsw.hnsw.efSearch = int(params.get('ef_search', 64))
+        index = faiss.IndexIDMap2(hnsw)
+
+    else:
+        if n == 0:
+            raise ValueError(f"{index_type} index needs training vectors")
+        nlist = int(params.get('nlist') or ideal_nlist(n))
+        quantizer = faiss.IndexFlatIP(dimension)
+        if index_type == 'ivf_flat':
+            index = faiss.IndexIVFFlat(quantizer, dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+        else:
+            m = int(params.get('pq_m', 48))
+            if dimension % m != 0:
+                raise ValueError(f"vector_store.pq_m={m} must divide dimension {dimension}")
+            index = faiss.IndexIVFPQ(quantizer, dimension, nlist, m, int(params.get('pq_nbits', 8)),
+                                     faiss.METRIC_INNER_PRODUCT)
+        logger.info(f"Training {index_type} index (nlist={nlist}) on {n} vectors")
+        index.train(vectors)
+        index.nprobe = int(params.get('nprobe', 8))
+        # Direct map dạng hashtable: reconstruct()/remove_ids() theo id tuỳ ý
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)
+
+    if n:
+        if ids is None:
+            ids = np.arange(n, dtype='int64')
+        index.add_with_ids(vectors, np.ascontiguousarray(ids, dtype='int64'))
+    return index
+
+
+def has_id_mapping(index: faiss.Index) -> bool:
+    """True when the index stores external ids that can be reconstructed and removed"""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexIDMap2):
+        return True
+    return isinstance(index, faiss.IndexIVF) and index.direct_map.type == faiss.DirectMap.Hashtable
+
+
+def index_ids(index: faiss.Index) -> np.ndarray:
+    """External ids of every vector stored in the index (không reconstruct vector)"""
+    index = faiss.downcast_index(index)
+    if index.ntotal == 0:
+        return np.empty(0, dtype='int64')
+    if isinstance(index, faiss.IndexIDMap2):
+        return faiss.vector_to_array(index.id_map).astype('int64')
+    if isinstance(index, faiss.IndexIVF) and has_id_mapping(index):
+        invlists = index.invlists
+        return np.concatenate([
+            faiss.rev_swig_ptr(invlists.get_ids(l), invlists.list_size(l)).copy()
+            for l in range(index.nlist) if invlists.list_size(l) > 0
+        ]).astype('int64')
+    # Index cũ không có id: vị trí chính là id
+    return np.arange(index.ntotal, dtype='int64')
+
+
+def export_vectors(index: faiss.Index) -> Tuple[np.ndarray, np.ndarray]:
+    """Return (ids, vectors) for every vector stored in the index"""
+    index = faiss.downcast_index(index)
+    n = index.ntotal
+    if n == 0:
+        return np.empty(0, dtype='int64'), np.empty((0, index.d), dtype='float32')
+
+    ids = index_ids(index)
+    if isinstance(index, faiss.IndexIDMap2):
+        # Thứ tự trong index con khớp với id_map
+        return ids, index.index.reconstruct_n(0, n)
+    if isinstance(index, faiss.IndexIVF) and has_id_mapping(index):
+        return ids, np.vstack([index.reconstruct(int(i)) for i in ids])
+    return ids, index.reconstruct_n(0, n)
+
+
+def search_params(index: faiss.Index, nprobe: Optional[int] = None,
+                  ef_search: Optional[int] = None) -> Optional[faiss.SearchParameters]:
+    """Per-call query-time knobs for index.search(..., params=...).
+
+    Không sửa nprobe/efSearch của index dùng chung: các thread search đồng thời
+    với tham số khác nhau không ghi đè lẫn nhau.
+    """
+    base = unwrap_index(index)
+    if nprobe is not None and isinstance(base, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(nprobe=int(nprobe))
+    if ef_search is not None and isinstance(base, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(efSearch=int(ef_search))
+    return None
+
+
+def min_training_size(index_type: str, params: Optional[Dict[str, Any]] = None) -> int:
+    """Smallest corpus an index type can be trained on (39 điểm cho mỗi centroid k-means)"""
+    index_type = normalize_index_type(index_type)
+    params = params or {}
+    if index_type == 'ivf_pq':
+        # Codebook PQ có 2**nbits centroid mỗi sub-quantizer: 8 bit cần 9,984 vector
+        return 39 * max(2 ** int(params.get('pq_nbits', 8)), int(params.get('nlist') or 1))
+    if index_type == 'ivf_flat':
+        return 39 * int(params.get('nlist') or 1)
+    return 0
@@ -0,0 +1,173 @@
+import time
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+from src.generation.text_cleaner import TextCleaner
+from src.utils.config import Config
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class QueryCache:
+    """Two-tier answer cache in front of RAGSystem.query.
+
+    - Exact tier: key là câu hỏi đã chuẩn hoá bằng TextCleaner (lowercase, gộp khoảng trắng).
+    - Semantic tier: trả kết quả đã cache nếu cosine(query mới, query cũ) >= threshold.
+    Eviction theo LRU (max_entries) và TTL; invalidate() xoá toàn bộ khi index thay đổi.
+
+    Semantic tier mặc định tắt: câu hỏi gần giống nhưng khác số liệu/sản phẩm có thể
+    nhận nhầm câu trả lời. Mỗi invalidate() tăng `generation`; put() với generation
+    cũ (kết quả tính trên index trước khi invalidate) bị bỏ qua.
+    """
+
+    def __init__(self, config: Config):
+        self.enabled = config.get('cache.enabled', True)
+        self.max_entries = max(1, int(config.get('cache.max_entries', 1024)))
+        self.ttl_sec = float(config.get('cache.ttl_sec', 3600))
+        self.semantic_enabled = config.get('cache.semantic.enabled', False)
+        self.semantic_threshold = float(config.get('cache.semantic.threshold', 0.95))
+
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Tăng mỗi lần invalidate(); caller lấy trước khi retrieve rồi truyền lại cho put()
+        self.generation = 0
+
+        # Ma trận embedding cấp phát sẵn theo slot, tránh np.stack mỗi lần lookup
+        self._matrix: Optional[np.ndarray] = None
+        self._slot_keys: list = [None] * self.max_entries
+        self._free_slots = list(range(self.max_entries - 1, -1, -1))
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def normalize(question: str) -> str:
+        """Normalise question text for the exact tier"""
+        text = TextCleaner.clean_text(question or "").lower()
+        return " ".join(text.split())
+
+    def _is_expired(self, entry: Dict[str, Any], now: float) -> bool:
+        return self.ttl_sec > 0 and now - entry['created'] > self.ttl_sec
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None and entry['slot'] is not None:
+            self._matrix[entry['slot']] = 0.0
+            self._slot_keys[entry['slot']] = None
+            self._free_slots.append(entry['slot'])
+
+    def get(self, question: str) -> Optional[Dict[str, Any]]:
+        """Exact-tier lookup"""
+        if not self.enabled:
+            return None
+        key = self.normalize(question)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self._is_expired(entry, now):
+                self._remove(key)
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+            return entry['result']
+
+    def get_semantic(self, query_embedding: np.ndarray) -> Optional[Dict[str, Any]]:
+        """Semantic-tier lookup; counts a miss when nothing is close enough"""
+        if not self.enabled:
+            return None
+        query = np.asarray(query_embedding, dtype='float32').ravel()
+        norm = np.linalg.norm(query)
+
+        now = time.time()
+        with self._lock:
+            # Kiểm tra _matrix trong lock: invalidate() ở thread khác có thể đặt lại về None
+            if not self.semantic_enabled or self._matrix is None or norm == 0:
+                self.misses += 1
+                return None
+            query = query / norm
+            scores = self._matrix @ query
+            # Slot trống có vector 0 → score 0, không bao giờ vượt threshold > 0
+            best = int(np.argmax(scores))
+            key = self._slot_keys[best]
+            if key is None or scores[best] < self.semantic_threshold:
+                self.misses += 1
+                return None
+
+            entry = self._entries[key]
+            if self._is_expired(entry, now):
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.semantic_hits += 1
+            logger.debug(f"Semantic cache hit (score={scores[best]:.3f}) for cached question: {key}")
+            return entry['result']
+
+    def put(self, question: str, query_embedding: Optional[np.ndarray], result: Dict[str, Any],
+            generation: Optional[int] = None):
+        """Store a query result; dropped when `generation` predates the last invalidate()"""
+        if not self.enabled:
+            return
+        key = self.normalize(question)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                logger.debug(f"Dropping stale cache entry computed before invalidation: {key}")
+                return
+            if key in self._entries:
+                self._remove(key)
+
+            while len(self._entries) >= self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+            slot = None
+            if self.semantic_enabled and query_embedding is not None:
+                vec = np.asarray(query_embedding, dtype='float32').ravel()
+                norm = np.linalg.norm(vec)
+                if norm > 0:
+                    if self._matrix is None:
+                        self._matrix = np.zeros((self.max_entries, vec.shape[0]), dtype='float32')
+                    slot = self._free_slots.pop()
+                    self._matrix[slot] = vec / norm
+                    self._slot_keys[slot] = key
+
+            self._entries[key] = {'result': result, 'slot': slot, 'created': time.time()}
+
+    def invalidate(self):
+        """Drop every cached answer (called whenever the index changes)"""
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+            self._slot_keys = [None] * self.max_entries
+            self._free_slots = list(range(self.max_entries - 1, -1, -1))
+            self.generation += 1
+            self.invalidations += 1
+        logger.info("Query cache invalidated")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics"""
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            'enabled': self.enabled,
+            'size': len(self._entries),
+            'max_entries': self.max_entries,
+            'exact_hits': self.exact_hits,
+            'semantic_hits': self.semantic_hits,
+            'misses': self.misses,
+            'hit_ratio': round((self.exact_hits + self.semantic_hits) / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations
+        }
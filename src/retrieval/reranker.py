@@ -0,0 +1,185 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
+from src.retrieval.bm25 import chunk_text
+from src.utils.config import Config
+from src.utils.metrics import LatencyHistogram
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class Reranker:
+    """CPU cross-encoder reranking of retrieval candidates.
+
+    - Tắt mặc định (`retrieval.rerank.enabled`); khi bật, app gọi warm_up() lúc khởi động
+      để việc tải model không rơi vào query đầu tiên. Load lỗi → tắt rerank, giữ thứ tự dense
+    - Mọi cặp (query, chunk) chưa có trong cache được chấm trong một lần forward
+    - Điểm được cache LRU theo (query đã chuẩn hoá, chunk id); cache phải được xoá
+      (clear_cache) mỗi khi index đổi vì id có thể được gán lại cho nội dung khác
+    - Budget latency: ước lượng chi phí từ ms/cặp đo được; vượt budget thì chỉ chấm số
+      ứng viên đầu vừa với budget, không đủ top_k thì bỏ qua rerank
+
+    Khi gọi không kèm `query` (hoặc không có config), rerank() giữ hành vi lọc
+    cũ: chỉ giữ kết quả có `distance` < threshold.
+    """
+
+    def __init__(self, config: Optional[Config] = None, threshold: float = 0.5):
+        self.threshold = threshold
+        get = config.get if config is not None else (lambda key, default=None: default)
+
+        self.enabled = bool(config is not None and get('retrieval.rerank.enabled', False))
+        self.model_name = get('retrieval.rerank.model', 'cross-encoder/mmarco-mMiniLMv2-L12-H384-v1')
+        self.device = get('retrieval.rerank.device', 'cpu')
+        # torch.set_num_threads áp dụng cho cả process (cả embedding model), nên chỉ đổi khi
+        # được cấu hình rõ, ví dụ num_threads: 2 cho container giới hạn 2 CPU (docker-compose.yml)
+        self.num_threads = get('retrieval.rerank.num_threads', None)
+        self.max_length = get('retrieval.rerank.max_length', 256)
+        self.candidates = get('retrieval.rerank.candidates', 20)
+        self.budget_ms = get('retrieval.rerank.budget_ms', 200)
+        self.cache_size = get('retrieval.rerank.cache_size', 4096)
+
+        self._model = None
+        self._load_failed = False
+        self._load_lock = threading.Lock()
+        self._cache: "OrderedDict[Tuple[str, Any], float]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        # Trung bình trượt thời gian chấm một cặp (ms), dùng để ước lượng trước khi chạy
+        self._ms_per_pair: Optional[float] = None
+
+        self.latency = LatencyHistogram()
+        self.stats = {'calls': 0, 'reranked': 0, 'cache_hits': 0, 'cache_misses': 0,
+                      'skipped_budget': 0, 'skipped_unavailable': 0}
+
+    # ---------- model ----------
+
+    def _get_model(self):
+        if self._model is not None or self._load_failed:
+            return self._model
+        with self._load_lock:
+            if self._model is None and not self._load_failed:
+                try:
+                    import torch
+                    from sentence_transformers import CrossEncoder
+                    if self.num_threads is not None:
+                        torch.set_num_threads(min(torch.get_num_threads(), int(self.num_threads)))
+                    start = time.perf_counter()
+                    self._model = CrossEncoder(self.model_name, device=self.device, max_length=self.max_length)
+                    logger.info(f"Loaded reranker {self.model_name} in {time.perf_counter() - start:.2f}s "
+                                f"(torch threads={torch.get_num_threads()})")
+                except Exception as e:
+                    logger.warning(f"Reranker unavailable, keeping retrieval order: {e}")
+                    self._load_failed = True
+        return self._model
+
+    def warm_up(self) -> bool:
+        """Load the model and run one tiny prediction so the first query pays no load cost"""
+        if not self.enabled:
+            return False
+        model = self._get_model()
+        if model is None:
+            return False
+        start = time.perf_counter()
+        model.predict([("warm up", "warm up")], batch_size=1, show_progress_bar=False)
+        logger.info(f"Reranker warm-up prediction took {(time.perf_counter() - start) * 1000:.0f}ms")
+        return True
+
+    # ---------- cache ----------
+
+    @staticmethod
+    def _cache_key(query: str, result: Dict[str, Any]) -> Tuple[str, Any]:
+        chunk_id = result.get('vector_id')
+        if chunk_id is None:
+            chunk_id = hashlib.sha1(chunk_text(result).encode('utf-8')).hexdigest()
+        return ' '.join(query.lower().split()), chunk_id
+
+    def _cache_get(self, key) -> Optional[float]:
+        with self._cache_lock:
+            score = self._cache.get(key)
+            if score is not None:
+                self._cache.move_to_end(key)
+            return score
+
+    def clear_cache(self):
+        """Drop all cached scores (chunk ids may now point at different content)"""
+        with self._cache_lock:
+            self._cache.clear()
+
+    def _cache_put(self, key, score: float):
+        with self._cache_lock:
+            self._cache[key] = score
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    # ---------- rerank ----------
+
+    def rerank(self, results: List[Dict[str, Any]], query: Optional[str] = None,
+               top_k: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Rescore candidates with the cross-encoder and return them best first"""
+        if query is None or not self.enabled:
+            if query is None:
+                return [r for r in results if r.get('distance', 0) < self.threshold]
+            return results[:top_k] if top_k else results
+        if not results:
+            return []
+
+        self.stats['calls'] += 1
+        keys = [self._cache_key(query, r) for r in results]
+        scores = [self._cache_get(key) for key in keys]
+        missing = [i for i, score in enumerate(scores) if score is None]
+
+        if missing and self._ms_per_pair:
+            # Vượt budget: chỉ chấm các ứng viên đầu (thứ tự retrieval) vừa với budget
+            affordable = int(self.budget_ms / self._ms_per_pair)
+            if affordable < len(missing):
+                if affordable < (top_k or 1):
+                    self.stats['skipped_budget'] += 1
+                    logger.info(f"Skipping rerank: ~{self._ms_per_pair * len(missing):.0f}ms for "
+                                f"{len(missing)} pairs exceeds budget {self.budget_ms}ms")
+                    return results[:top_k] if top_k else results
+                cutoff = missing[affordable]
+                results, keys, scores = results[:cutoff], keys[:cutoff], scores[:cutoff]
+                missing = missing[:affordable]
+
+        self.stats['cache_hits'] += len(results) - len(missing)
+        self.stats['cache_misses'] += len(missing)
+
+        if missing:
+            model = self._get_model()
+            if model is None:
+                self.stats['skipped_unavailable'] += 1
+                return results[:top_k] if top_k else results
+
+            pairs = [(query, chunk_text(results[i])) for i in missing]
+            start = time.perf_counter()
+            predicted = model.predict(pairs, batch_size=len(pairs), show_progress_bar=False)
+            elapsed = time.perf_counter() - start
+            self.latency.observe(elapsed)
+
+            per_pair = elapsed * 1000 / len(pairs)
+            self._ms_per_pair = per_pair if self._ms_per_pair is None else 0.8 * self._ms_per_pair + 0.2 * per_pair
+            for i, score in zip(missing, predicted):
+                scores[i] = float(score)
+                self._cache_put(keys[i], scores[i])
+
+        self.stats['reranked'] += 1
+        order = sorted(range(len(results)), key=lambda i: scores[i], reverse=True)
+        reranked = [{**results[i], 'rerank_score': scores[i]} for i in order]
+        return reranked[:top_k] if top_k else reranked
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get reranker statistics"""
+        return {
+            'enabled': self.enabled,
+            'model': self.model_name if self.enabled else None,
+            'loaded': self._model is not None,
+            'candidates': self.candidates,
+            'budget_ms': self.budget_ms,
+            'ms_per_pair': round(self._ms_per_pair, 3) if self._ms_per_pair is not None else None,
+            'cache_entries': len(self._cache),
+            'latency': self.latency.snapshot(),
+            **self.stats
+        }
@@ -1,8 +1,11 @@
 import numpy as np
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Optional
 from src.retrieval.vector_store import VectorStore
-from src.ingestion.embedder import Embedder
+from src.retrieval.fusion import FUSION_METHODS, reciprocal_rank_fusion, weighted_fusion
+from src.retrieval.reranker import Reranker
+from src.ingestion.embedder import get_embedder
 from src.utils.config import Config
+from src.utils.tracing import tracer
 from src.utils.logger import setup_logger
 
 logger = setup_logger(__name__)
@@ -10,24 +13,85 @@ logger = setup_logger(__name__)
 class Retriever:
     def __init__(self, config: Config):
         self.config = config
-        self.embedder = Embedder(config)
+        self.embedder = get_embedder(config)
         self.vector_store = VectorStore(config)
         self.top_k = config.get('retrieval.top_k', 2)
         self.score_threshold = config.get('retrieval.score_threshold', 0.5)
+
+        # Hybrid: BM25 + dense, trộn bằng RRF hoặc weighted fusion
+        self.hybrid = config.get('retrieval.hybrid.enabled', True) and self.vector_store.bm25 is not None
+        self.fusion = config.get('retrieval.hybrid.fusion', 'rrf')
+        if self.fusion not in FUSION_METHODS:
+            raise ValueError(f"Unsupported retrieval.hybrid.fusion: {self.fusion} (expected one of {FUSION_METHODS})")
+        self.rrf_k = config.get('retrieval.hybrid.rrf_k', 60)
+        self.dense_weight = config.get('retrieval.hybrid.dense_weight', 0.5)
+        self.candidates = config.get('retrieval.hybrid.candidates', max(20, self.top_k * 5))
+        self.min_bm25_score = config.get('retrieval.hybrid.min_bm25_score', 0.0)
+        # Chunk chỉ có trong BM25 vẫn phải đạt cosine tối thiểu, tránh trả về chunk trùng từ phổ biến
+        self.lexical_score_threshold = config.get('retrieval.hybrid.lexical_score_threshold', self.score_threshold)
+
+        # Rerank: lấy dư ứng viên rồi chấm lại bằng cross-encoder
+        self.reranker = Reranker(config)
     
-    def retrieve(self, query: str) -> List[Dict[str, Any]]:
+    def retrieve(self, query: str, query_embedding: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
         """Retrieve relevant chunks for a query"""
         logger.info(f"Retrieving chunks for query: {query[:100]}...")
         
-        # Generate query embedding
-        query_embedding = self.embedder.embed_texts([query])[0]
+        # Generate query embedding (unless the caller already has one)
+        if query_embedding is None:
+            query_embedding = self.embedder.embed_query(query)
         
+        with tracer.span("retrieve.dense_search"):
+            dense_all = self.vector_store.search_ids(query_embedding, self._dense_limit())
+        return self._rank(query, query_embedding, dense_all)
+
+    def retrieve_batch(self, queries: List[str], query_embeddings: np.ndarray) -> List[Any]:
+        """Retrieve for many queries with one batched FAISS search.
+
+        Trả về list cùng thứ tự với `queries`; phần tử lỗi (fusion/rerank) là
+        Exception thay vì list kết quả để caller báo lỗi theo từng câu hỏi.
+        """
+        logger.info(f"Retrieving chunks for {len(queries)} queries (batched)")
+        with tracer.span("retrieve.dense_search", batch=len(queries)):
+            dense_batch = self.vector_store.search_ids_batch(query_embeddings, self._dense_limit())
+
+        results = []
+        for query, query_embedding, dense_all in zip(queries, query_embeddings, dense_batch):
+            try:
+                results.append(self._rank(query, query_embedding, dense_all))
+            except Exception as e:
+                logger.error(f"Retrieval failed for query {query[:100]!r}: {e}")
+                results.append(e)
+        return results
+
+    def _candidate_limit(self) -> int:
+        return max(self.top_k, self.reranker.candidates) if self.reranker.enabled else self.top_k
+
+    def _dense_limit(self) -> int:
+        limit = self._candidate_limit()
+        return max(limit, self.candidates) if self.hybrid else limit
+
+    def _rank(self, query: str, query_embedding: np.ndarray,
+              dense_all: List[Tuple[int, float]]) -> List[Dict[str, Any]]:
+        """Turn dense hits into the final top_k: optional BM25 fusion, then optional rerank"""
+        limit = self._candidate_limit()
+        if self.hybrid:
+            results = self._retrieve_hybrid(query, query_embedding, limit, dense_all)
+        else:
+            results = self._retrieve_dense(limit, dense_all)
+
+        if self.reranker.enabled and len(results) > 1:
+            with tracer.span("retrieve.rerank", candidates=len(results)):
+                results = self.reranker.rerank(results, query=query, top_k=self.top_k)
+        return results[:self.top_k]
+
+    def _retrieve_dense(self, limit: int, dense_all: List[Tuple[int, float]]) -> List[Dict[str, Any]]:
         # Search in vector store
-        results = self.vector_store.search(query_embedding, self.top_k)
+        results = dense_all[:limit]
         
         # Filter by score threshold
         filtered_results = [
-            (chunk, score) for chunk, score in results 
+            (idx, score) for idx, score in results 
             if score >= self.score_threshold
         ]
         
@@ -36,20 +100,70 @@ class Retriever:
         # Return chunks with scores
         return [
             {
-                **chunk,
+                **self.vector_store.chunks[idx],
+                'vector_id': idx,
                 'retrieval_score': score
             }
-            for chunk, score in filtered_results
+            for idx, score in filtered_results
         ]
     
+    def _retrieve_hybrid(self, query: str, query_embedding: np.ndarray, limit: int,
+                         dense_all: List[Tuple[int, float]]) -> List[Dict[str, Any]]:
+        """Fuse dense and BM25 candidates whose cosine passes the threshold, return the best `limit`"""
+        dense = [(idx, score) for idx, score in dense_all[:self.candidates] if score >= self.score_threshold]
+        with tracer.span("retrieve.bm25"):
+            lexical = [
+                (idx, score) for idx, score in self.vector_store.lexical_search(query, self.candidates)
+                if score > self.min_bm25_score
+            ]
+
+        # retrieval_score vẫn là cosine; chunk chỉ có trong BM25 được tính lại từ vector đã lưu
+        dense_scores = dict(dense_all)
+        missing = [idx for idx, _ in lexical if idx not in dense_scores]
+        dense_scores.update(zip(missing, self.vector_store.similarity(query_embedding, missing)))
+        # BM25 khớp từ phổ biến ("là", "của") với câu hỏi lạc đề: lọc theo cosine trước khi fusion
+        lexical = [(idx, score) for idx, score in lexical if dense_scores[idx] >= self.lexical_score_threshold]
+
+        with tracer.span("retrieve.fusion", method=self.fusion):
+            if self.fusion == 'rrf':
+                fused = reciprocal_rank_fusion([dense, lexical], k=self.rrf_k)
+            else:
+                fused = weighted_fusion([dense, lexical], [self.dense_weight, 1 - self.dense_weight])
+            fused = fused[:limit]
+
+        lexical_scores = dict(lexical)
+
+        logger.info(f"Found {len(fused)} relevant chunks "
+                    f"(dense {len(dense)}, bm25 {len(lexical)}, fusion={self.fusion})")
+        return [
+            {
+                **self.vector_store.chunks[idx],
+                'vector_id': idx,
+                'retrieval_score': dense_scores[idx],
+                'bm25_score': lexical_scores.get(idx, 0.0),
+                'fusion_score': fused_score
+            }
+            for idx, fused_score in fused
+        ]
+
     def load_vector_store(self) -> bool:
         """Load existing vector store"""
+        self.reranker.clear_cache()
         return self.vector_store.load_index()
+
+    def reset(self):
+        """Drop the whole index (memory and disk) together with the scores cached for its chunk ids"""
+        self.vector_store.reset()
+        self.reranker.clear_cache()
     
     def get_stats(self) -> Dict[str, Any]:
         """Get retriever statistics"""
         return {
             **self.vector_store.get_stats(),
             'top_k': self.top_k,
-            'score_threshold': self.score_threshold
+            'score_threshold': self.score_threshold,
+            'lexical_score_threshold': self.lexical_score_threshold if self.hybrid else None,
+            'hybrid': self.hybrid,
+            'fusion': self.fusion if self.hybrid else None,
+            'reranker': self.reranker.get_stats()
         }
\ No newline at end of file
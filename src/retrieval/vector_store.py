@@ -3,7 +3,13 @@ import faiss
 import numpy as np
 import pickle
 import os
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Optional
+from src.retrieval.chunk_store import ChunkStore
+from src.retrieval.bm25 import BM25Index, chunk_text
+from src.retrieval.index_factory import (
+    build_index, normalize_index_type, index_type_of, ideal_nlist, unwrap_index, search_params,
+    has_id_mapping, export_vectors, index_ids, min_training_size
+)
 from src.utils.config import Config
 from src.utils.logger import setup_logger
 
@@ -19,56 +25,267 @@ class VectorStore:
         os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
         
         self.index = None
-        self.chunks = []
+        # Metadata của chunk nằm trong chunk store mmap, không giữ toàn bộ trong RAM
+        self.chunks = ChunkStore(f"{self.index_path}.chunks")
+        self.legacy_chunks_path = f"{self.index_path}.chunks"
+        # Manifest của ingestion (file nguồn → chunk ids), xoá cùng index khi reset
+        self.manifest_path = f"{self.index_path}.manifest.json"
+        # Inverted index BM25 dùng chung id với FAISS, cập nhật cùng lúc với index
+        self.bm25 = None
+        # Bản cũ lưu BM25 thành một file JSON ghi lại toàn bộ mỗi lần commit
+        self.legacy_bm25_path = f"{self.index_path}.bm25.json"
+        self.bm25_path = f"{self.index_path}.bm25.jsonl"
+        if config.get('retrieval.bm25.enabled', True):
+            self.bm25 = BM25Index(
+                self.bm25_path,
+                k1=config.get('retrieval.bm25.k1', 1.5),
+                b=config.get('retrieval.bm25.b', 0.75)
+            )
+
+        # Loại ANN index: flat | ivf_flat | ivf_pq | hnsw ('faiss' = flat)
+        self.index_type = normalize_index_type(config.get('vector_store.type', 'flat'))
+        # Dưới ngưỡng này brute force đủ nhanh và IVF chưa đủ dữ liệu để train
+        self.ann_min_size = config.get('vector_store.ann_min_size', 5000)
+        self.index_params = {
+            'nlist': config.get('vector_store.nlist', None),
+            'nprobe': config.get('vector_store.nprobe', 8),
+            'pq_m': config.get('vector_store.pq_m', 48),
+            'pq_nbits': config.get('vector_store.pq_nbits', 8),
+            'hnsw_m': config.get('vector_store.hnsw_m', 32),
+            'ef_construction': config.get('vector_store.ef_construction', 200),
+            'ef_search': config.get('vector_store.ef_search', 64)
+        }
         self._initialize_index()
     
     def _initialize_index(self):
         """Initialize FAISS index"""
-        self.index = faiss.IndexFlatIP(self.dimension)  # Inner product for cosine similarity
-        logger.info(f"Initialized FAISS index with dimension {self.dimension}")
+        initial_type = self._target_index_type(0)
+        if initial_type in ('ivf_flat', 'ivf_pq'):
+            initial_type = 'flat'  # IVF cần dữ liệu để train, dùng Flat cho tới khi rebuild
+        self.index = build_index(initial_type, self.dimension, params=self.index_params)  # Inner product for cosine similarity
+        logger.info(f"Initialized FAISS {initial_type} index with dimension {self.dimension}")
+
+    def _target_index_type(self, n: int) -> str:
+        # IVF-PQ 8 bit cần ~10k vector để train codebook, cao hơn ann_min_size mặc định
+        min_size = max(self.ann_min_size, min_training_size(self.index_type, self.index_params))
+        return self.index_type if n >= min_size else 'flat'
+
+    def _maybe_rebuild(self) -> bool:
+        """Rebuild the index when the corpus crosses the ANN threshold or outgrows its IVF lists.
+
+        Trả về True nếu index đã được dựng lại.
+        """
+        n = self.index.ntotal
+        current = index_type_of(self.index)
+        target = self._target_index_type(n)
+
+        needs_rebuild = current != target
+        if not needs_rebuild and target in ('ivf_flat', 'ivf_pq') and not self.index_params['nlist']:
+            # Corpus tăng nhiều so với lúc train → số list quá ít, train lại
+            needs_rebuild = unwrap_index(self.index).nlist * 2 < ideal_nlist(n)
+        if not needs_rebuild:
+            return False
+
+        if current == 'ivf_pq':
+            logger.warning("Rebuilding from an IVF-PQ index: vectors are PQ reconstructions (lossy)")
+        logger.info(f"Rebuilding vector index: {current} -> {target} ({n} vectors)")
+        ids, vectors = export_vectors(self.index)
+        self.index = build_index(target, self.dimension, vectors, params=self.index_params, ids=ids)
+        return True
     
-    def add_chunks(self, chunks: List[Dict[str, Any]]):
-        """Add chunks with embeddings to vector store"""
+    # Các field vector không lưu trong metadata store (vector đã nằm trong FAISS index)
+    VECTOR_FIELDS = ('embedding', 'embedding_dimension')
+
+    @classmethod
+    def _strip_vectors(cls, chunk: Dict[str, Any]) -> Dict[str, Any]:
+        return {k: v for k, v in chunk.items() if k not in cls.VECTOR_FIELDS}
+
+    def add_chunks(self, chunks: List[Dict[str, Any]], embeddings: Optional[np.ndarray] = None) -> List[int]:
+        """Add chunks with embeddings to vector store and return their ids.
+
+        Embeddings lấy từ tham số `embeddings` hoặc từ chunk['embedding'];
+        metadata được lưu không kèm vector. Id của chunk là vị trí của nó trong
+        chunk store và cũng là id trong FAISS index.
+        """
         if not chunks:
-            return
+            return []
         
-        embeddings = np.array([chunk['embedding'] for chunk in chunks]).astype('float32')
+        if embeddings is None:
+            embeddings = np.array([chunk['embedding'] for chunk in chunks])
+        embeddings = np.ascontiguousarray(embeddings, dtype='float32')
         
         # Normalize for cosine similarity
         faiss.normalize_L2(embeddings)
         
-        self.index.add(embeddings)
-        self.chunks.extend(chunks)
+        start = len(self.chunks)
+        ids = np.arange(start, start + len(chunks), dtype='int64')
+        self.index.add_with_ids(embeddings, ids)
+        self.chunks.extend(self._strip_vectors(chunk) for chunk in chunks)
+        if self.bm25 is not None:
+            self.bm25.add_chunks(ids.tolist(), chunks)
+        self._maybe_rebuild()
         
-        logger.info(f"Added {len(chunks)} chunks to vector store. Total: {len(self.chunks)}")
+        logger.info(f"Added {len(chunks)} chunks to vector store. Total: {self.chunks.live_count()}")
+        return ids.tolist()
+
+    def remove_ids(self, ids: List[int]) -> int:
+        """Remove chunks by id from the index and tombstone them in the chunk store"""
+        ids = np.array(sorted(set(int(i) for i in ids)), dtype='int64')
+        if len(ids) == 0:
+            return 0
+
+        self._remove_from_index(ids)
+        for i in ids:
+            self.chunks.delete(int(i))
+        logger.info(f"Removed {len(ids)} chunks from vector store. Total: {self.chunks.live_count()}")
+        return len(ids)
+
+    def _remove_from_index(self, ids: np.ndarray):
+        """Remove ids from FAISS and BM25 (id không có trong index được bỏ qua)"""
+        try:
+            self.index.remove_ids(ids)
+        except RuntimeError:
+            # HNSW không hỗ trợ xoá: dựng lại index từ các vector còn lại
+            all_ids, vectors = export_vectors(self.index)
+            keep = ~np.isin(all_ids, ids)
+            self.index = build_index(index_type_of(self.index), self.dimension, vectors[keep],
+                                     params=self.index_params, ids=all_ids[keep])
+        if self.bm25 is not None:
+            for i in ids:
+                self.bm25.remove(int(i))
+
+    def rollback(self, n: int) -> int:
+        """Undo chunks added since the store held `n` chunks (ingest failed before being committed)"""
+        dropped = len(self.chunks) - n
+        if dropped <= 0:
+            return 0
+        self._remove_from_index(np.arange(n, len(self.chunks), dtype='int64'))
+        self.chunks.truncate(n)
+        logger.warning(f"Rolled back {dropped} uncommitted chunks. Total: {self.chunks.live_count()}")
+        return dropped
+
+    def _drop_uncommitted_chunks(self):
+        """Truncate chunk records appended after the last FAISS save (ingest crashed mid-file).
+
+        Chunk store được flush theo batch khi ingest streaming còn FAISS chỉ được lưu
+        lúc commit, nên record có id lớn hơn mọi id trong FAISS là record mồ côi.
+        """
+        ids = index_ids(self.index)
+        committed = int(ids.max()) + 1 if len(ids) else 0
+        orphans = sum(1 for i in range(committed, len(self.chunks)) if not self.chunks.is_deleted(i))
+        if not orphans:
+            return
+        logger.warning(f"Dropping {orphans} chunk records not present in the FAISS index (interrupted ingest)")
+        try:
+            self.chunks.truncate(committed)
+        except OSError as e:
+            # Volume read-only: chỉ bỏ qua các record này trong bộ nhớ
+            logger.warning(f"Could not truncate chunk store: {e}")
+            for i in range(committed, len(self.chunks)):
+                if not self.chunks.is_deleted(i):
+                    self.chunks.delete(i)
+
+    def find_ids_by_source(self, file_path: str) -> Dict[int, Dict[str, Any]]:
+        """Scan the chunk store for live chunks ingested from `file_path` (legacy stores without a manifest)"""
+        target = os.path.normpath(os.path.abspath(file_path))
+        found = {}
+        for i in range(len(self.chunks)):
+            if self.chunks.is_deleted(i):
+                continue
+            chunk = self.chunks[i]
+            source = (chunk.get('metadata') or {}).get('file_path')
+            if source and os.path.normpath(os.path.abspath(source)) == target:
+                found[i] = chunk
+        return found
+
+    def get_embedding(self, idx: int) -> np.ndarray:
+        """Reconstruct the (normalised) stored vector of a chunk from the FAISS index"""
+        return self.index.reconstruct(int(idx))
     
-    def search(self, query_embedding: np.ndarray, top_k: int = 2) -> List[Tuple[Dict[str, Any], float]]:
-        """Search for similar chunks"""
-        if self.index.ntotal == 0:
-            return []
+    def search(self, query_embedding: np.ndarray, top_k: int = 2,
+               nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> List[Tuple[Dict[str, Any], float]]:
+        """Search for similar chunks (nprobe / ef_search override the configured ANN knobs)"""
+        return [
+            (self.chunks[idx], score)
+            for idx, score in self.search_ids(query_embedding, top_k, nprobe=nprobe, ef_search=ef_search)
+        ]
+
+    def search_ids(self, query_embedding: np.ndarray, top_k: int = 2,
+                   nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Dense search returning (chunk_id, cosine score) pairs"""
+        return self.search_ids_batch(np.asarray(query_embedding).reshape(1, -1), top_k,
+                                     nprobe=nprobe, ef_search=ef_search)[0]
+
+    def search_ids_batch(self, query_embeddings: np.ndarray, top_k: int = 2,
+                         nprobe: Optional[int] = None,
+                         ef_search: Optional[int] = None) -> List[List[Tuple[int, float]]]:
+        """One FAISS search over a query matrix; one (chunk_id, score) list per query"""
+        n_queries = len(query_embeddings)
+        if self.index.ntotal == 0 or n_queries == 0:
+            return [[] for _ in range(n_queries)]
         
-        query_embedding = query_embedding.astype('float32').reshape(1, -1)
-        faiss.normalize_L2(query_embedding)
+        query_embeddings = np.array(query_embeddings, dtype='float32').reshape(n_queries, -1)
+        faiss.normalize_L2(query_embeddings)
+
+        # Tham số theo từng lần gọi, không sửa index dùng chung giữa các thread
+        params = search_params(
+            self.index,
+            nprobe=nprobe if nprobe is not None else self.index_params['nprobe'],
+            ef_search=ef_search if ef_search is not None else self.index_params['ef_search']
+        )
         
-        scores, indices = self.index.search(query_embedding, min(top_k, self.index.ntotal))
+        scores, indices = self.index.search(query_embeddings, min(top_k, self.index.ntotal), params=params)
         
         results = []
-        for score, idx in zip(scores[0], indices[0]):
-            if idx != -1:  # Valid index
-                results.append((self.chunks[idx], float(score)))
+        for row_scores, row_indices in zip(scores, indices):
+            results.append([
+                (int(idx), float(score))
+                for score, idx in zip(row_scores, row_indices)
+                if idx != -1  # Valid index
+            ])
         
         return results
+
+    def lexical_search(self, query: str, top_k: int = 10) -> List[Tuple[int, float]]:
+        """BM25 search returning (chunk_id, bm25 score) pairs"""
+        if self.bm25 is None:
+            return []
+        return self.bm25.search(query, top_k)
+
+    def similarity(self, query_embedding: np.ndarray, ids: List[int]) -> List[float]:
+        """Cosine score of the query against stored vectors (cho chunk chỉ được BM25 tìm thấy)"""
+        if not ids:
+            return []
+        query = np.ascontiguousarray(query_embedding, dtype='float32').reshape(1, -1).copy()
+        faiss.normalize_L2(query)
+        vectors = np.vstack([self.get_embedding(i) for i in ids])
+        return (vectors @ query[0]).astype(float).tolist()
     
     def save_index(self):
         """Save FAISS index and chunks to disk"""
         # Save FAISS index
         faiss.write_index(self.index, f"{self.index_path}.faiss")
         
-        # Save chunks
-        with open(f"{self.index_path}.chunks", 'wb') as f:
-            pickle.dump(self.chunks, f)
+        # Save chunks (chỉ append các chunk mới vào chunk store)
+        self.chunks.flush()
+
+        if self.bm25 is not None:
+            # Chỉ append các thay đổi từ lần lưu trước (không ghi gì nếu BM25 không đổi)
+            self.bm25.save()
         
         logger.info(f"Saved vector store to {self.index_path}")
+
+    def reset(self):
+        """Drop all vectors and chunks, in memory and on disk"""
+        self._initialize_index()
+        self.chunks.detach()
+        if self.bm25 is not None:
+            self.bm25.clear()
+        paths = (f"{self.index_path}.faiss", self.chunks.idx_path, self.chunks.dat_path,
+                 self.legacy_chunks_path, self.manifest_path, self.bm25_path, self.legacy_bm25_path)
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
     
     def load_index(self):
             """Load FAISS index and chunks from disk"""
@@ -80,21 +297,92 @@ class VectorStore:
                 self._initialize_index()
                 return False
                 
+            # Index cũ (trước khi có id) → đánh id theo vị trí
+            converted = False
+            if not has_id_mapping(self.index) and self.index.ntotal > 0:
+                logger.info("Migrating FAISS index to id-addressed layout")
+                ids, vectors = export_vectors(self.index)
+                self.index = build_index(index_type_of(self.index), self.dimension, vectors,
+                                         params=self.index_params, ids=ids)
+                converted = True
+
+            # Config có thể đã đổi loại index kể từ lần lưu trước
+            converted = self._maybe_rebuild() or converted
+                
             # Load chunks
-            try:
-                with open(f"{self.index_path}.chunks", 'rb') as f:
-                    self.chunks = pickle.load(f)
+            if self.chunks.load():
+                self._drop_uncommitted_chunks()
                 logger.info(f"Loaded vector store from {self.index_path}. {len(self.chunks)} chunks loaded.")
+                self._load_bm25()
+                if converted:
+                    self._write_converted_index()
                 return True
-            except FileNotFoundError:
-                logger.warning(f"Chunk file not found at {self.index_path}.chunks. Index loaded but no chunks.")
-                self.chunks = []
-                return False
+
+            if os.path.exists(self.legacy_chunks_path):
+                migrated = self._migrate_legacy_pickle()
+                self._load_bm25()
+                if converted:
+                    self._write_converted_index()
+                return migrated
+
+            logger.warning(f"Chunk store not found at {self.index_path}.chunks.*. Index loaded but no chunks.")
+            self.chunks.detach()
+            return False
+
+    def _write_converted_index(self):
+        """Save an index migrated or rebuilt during load so later startups skip the conversion"""
+        try:
+            faiss.write_index(self.index, f"{self.index_path}.faiss")
+            logger.info(f"Saved converted FAISS index to {self.index_path}.faiss")
+        except (OSError, RuntimeError) as e:
+            # Ví dụ volume read-only: vẫn dùng bản đã chuyển đổi trong bộ nhớ
+            logger.warning(f"Could not write converted FAISS index: {e}")
+
+    def _migrate_legacy_pickle(self) -> bool:
+        """Convert a legacy pickled chunk list into the chunk store format"""
+        logger.warning(
+            f"Loading legacy pickle chunk file {self.legacy_chunks_path}; "
+            f"it will be converted to the memory-mapped chunk store"
+        )
+        with open(self.legacy_chunks_path, 'rb') as f:
+            legacy_chunks = pickle.load(f)
+
+        self.chunks.detach()
+        # Bản cũ còn lưu cả vector trong mỗi chunk → bỏ đi khi chuyển đổi
+        self.chunks.extend(self._strip_vectors(chunk) for chunk in legacy_chunks)
+        try:
+            self.chunks.flush()
+            logger.info(f"Migrated {len(self.chunks)} chunks to {self.index_path}.chunks.idx/.dat")
+        except OSError as e:
+            # Ví dụ volume read-only: vẫn dùng bản đã chuyển đổi trong bộ nhớ
+            logger.warning(f"Could not write migrated chunk store: {e}")
+        return True
     
+    def _load_bm25(self):
+        """Load the BM25 index, rebuilding it from the chunk store when missing or out of sync"""
+        if self.bm25 is None:
+            return
+        live_ids = [i for i in range(len(self.chunks)) if not self.chunks.is_deleted(i)]
+        if self.bm25.load() and len(self.bm25) == len(live_ids) and all(i in self.bm25 for i in live_ids):
+            return
+
+        logger.info("Building BM25 index from chunk store")
+        self.bm25.clear()
+        for i in live_ids:
+            self.bm25.add(i, chunk_text(self.chunks[i]))
+        try:
+            self.bm25.save()
+            if os.path.exists(self.legacy_bm25_path):
+                os.remove(self.legacy_bm25_path)
+        except OSError as e:
+            logger.warning(f"Could not write BM25 index: {e}")
+
     def get_stats(self) -> Dict[str, Any]:
         """Get vector store statistics"""
         return {
-            'total_chunks': len(self.chunks),
+            'total_chunks': self.chunks.live_count(),
             'index_size': self.index.ntotal if self.index else 0,
-            'dimension': self.dimension
+            'index_type': index_type_of(self.index) if self.index else None,
+            'dimension': self.dimension,
+            'bm25': self.bm25.get_stats() if self.bm25 is not None else None
         }
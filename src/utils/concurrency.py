@@ -0,0 +1,146 @@
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional
+from src.utils.metrics import LatencyHistogram
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the query queue is full and the request should be rejected (HTTP 429)"""
+
+
+class QueryLimiter:
+    """Bounded admission control: at most `max_concurrent` queries run, `max_queue` may wait"""
+
+    def __init__(self, max_concurrent: int = 4, max_queue: int = 32, queue_timeout_sec: float = 30.0):
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.max_queue = max(0, int(max_queue))
+        self.queue_timeout_sec = float(queue_timeout_sec)
+
+        self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        self.in_flight = 0
+        self.queued = 0
+        self.rejected = 0
+        self.completed = 0
+        self.wait_time = LatencyHistogram()
+
+    async def acquire(self):
+        """Wait for an execution slot, rejecting immediately if the queue is full"""
+        # Chỉ xếp hàng khi không còn slot trống
+        if self._semaphore.locked() and self.queued >= self.max_queue:
+            self.rejected += 1
+            raise QueueFullError(
+                f"Query queue is full ({self.queued} waiting, {self.in_flight} running)"
+            )
+
+        t0 = time.perf_counter()
+        self.queued += 1
+        try:
+            acquired = await self._acquire_within_timeout()
+        finally:
+            self.queued -= 1
+        if not acquired:
+            self.rejected += 1
+            raise QueueFullError(f"Timed out after {self.queue_timeout_sec}s waiting for a query slot")
+
+        self.wait_time.observe(time.perf_counter() - t0)
+        self.in_flight += 1
+
+    async def _acquire_within_timeout(self) -> bool:
+        """Acquire the semaphore within queue_timeout_sec without ever losing a permit.
+
+        Không dùng asyncio.wait_for: trên Python < 3.12 nó có thể huỷ acquire() sau khi
+        permit đã được cấp (timeout trùng lúc slot được release) và permit bị mất vĩnh viễn.
+        """
+        acquire = asyncio.ensure_future(self._semaphore.acquire())
+        try:
+            done, _ = await asyncio.wait({acquire}, timeout=self.queue_timeout_sec)
+        except BaseException:
+            # Request bị huỷ khi đang chờ (client ngắt kết nối)
+            self._abandon(acquire)
+            raise
+        if not done:
+            self._abandon(acquire)
+            return False
+        return True
+
+    def _abandon(self, acquire: "asyncio.Future"):
+        """Give back a permit that was (or is about to be) granted to an abandoned acquire()"""
+        if not acquire.done():
+            acquire.cancel()
+        acquire.add_done_callback(self._release_if_acquired)
+
+    def _release_if_acquired(self, acquire: "asyncio.Future"):
+        if not acquire.cancelled() and acquire.exception() is None:
+            self._semaphore.release()
+
+    def release(self):
+        """Release a slot obtained with acquire()"""
+        self.in_flight -= 1
+        self.completed += 1
+        self._semaphore.release()
+
+    @asynccontextmanager
+    async def slot(self):
+        """Context manager wrapping acquire()/release()"""
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get limiter statistics"""
+        return {
+            'max_concurrent': self.max_concurrent,
+            'max_queue': self.max_queue,
+            'in_flight': self.in_flight,
+            'queue_depth': self.queued,
+            'rejected': self.rejected,
+            'completed': self.completed,
+            'wait_time': self.wait_time.snapshot()
+        }
+
+
+class TokenBucket:
+    """Token-bucket rate limiter shared by threads (acquire) and coroutines (aacquire).
+
+    `rate` token/giây, tích luỹ tối đa `burst` token. Mỗi lần acquire đặt trước
+    một token (số token có thể âm) rồi chờ tới lượt, nên thứ tự được giữ FIFO.
+    rate <= 0 nghĩa là không giới hạn.
+    """
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = float(rate)
+        self.burst = max(1, int(burst if burst is not None else max(1, self.rate)))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.waited = LatencyHistogram()
+
+    def _reserve(self) -> float:
+        """Take one token and return how long the caller must wait for it"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        self.waited.observe(wait)
+        return wait
+
+    def acquire(self):
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def aacquire(self):
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
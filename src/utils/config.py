@@ -26,6 +26,7 @@ class Config:
             'models': {
                 'embedding_model': 'bkai-foundation-models/vietnamese-bi-encoder',
                 'llm_model': 'gemini-2.5-flash',
+                'embedding_backend': os.getenv('EMBEDDING_BACKEND', 'torch'),
                 'device': 'cuda' if os.getenv('CUDA_AVAILABLE', 'false').lower() == 'true' else 'cpu'
             },
             'chunking': {
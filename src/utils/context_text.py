@@ -0,0 +1,104 @@
+"""Prompt-context text shared by ingestion (precompute) and generation (dedup, packing).
+
+Ingest lưu sẵn text đã clean và tập token cùng chunk; prompt template đọc lại
+(hoặc tự tính nếu chunk cũ chưa có) nên cả hai tầng chỉ phụ thuộc module này.
+"""
+import re
+from typing import List, Dict, Any, Tuple, FrozenSet
+
+# Stopwords cho deduplication
+STOPWORDS = frozenset("và hoặc là của các những được từ cho với tại trên dưới trong khi nếu hoặc hay một số".split())
+
+# Field tính sẵn lúc ingest và lưu cùng chunk trong chunk store (xem prepare_context)
+CONTEXT_CLEAN_FIELD = 'context_clean'
+CONTEXT_TOKENS_FIELD = 'context_tokens'
+
+_CITATION_RES = [re.compile(r"\[\s*\d+\s*\]"), re.compile(r"\(\s*\d+\s*\)")]
+_REFERENCE_NUMBER_RE = re.compile(r"(?:(?<=\s)|(?<=\.|,|;|:))\d{1,2}(?=\s|$)")
+_SPACES_RE = re.compile(r"[ \t]+")
+_SPACE_BEFORE_PUNCT_RE = re.compile(r"\s+([,.;:%\)\?])")
+_SPACE_AFTER_PAREN_RE = re.compile(r"(\()\s+")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+_WORD_RE = re.compile(r"\w+")
+
+
+def clean_context(text: str) -> str:
+    """Enhanced context cleaning."""
+    if not text:
+        return ""
+
+    t = text
+
+    # Remove citations
+    for pattern in _CITATION_RES:
+        t = pattern.sub(" ", t)
+
+    # Remove standalone reference numbers (careful with years)
+    t = _REFERENCE_NUMBER_RE.sub(" ", t)
+
+    # Better space normalization
+    t = _SPACES_RE.sub(" ", t)
+    t = _SPACE_BEFORE_PUNCT_RE.sub(r"\1", t)
+    t = _SPACE_AFTER_PAREN_RE.sub(r"\1", t)
+
+    # Better line break handling
+    t = _BLANK_LINES_RE.sub("\n\n", t)
+    t = "\n".join(ln.rstrip() for ln in t.splitlines())
+
+    return t.strip()
+
+
+def tokenize(s: str) -> List[str]:
+    return [w for w in _WORD_RE.findall(s.lower()) if w not in STOPWORDS]
+
+
+def prepare_context(chunk: Dict[str, Any], text: str) -> Dict[str, Any]:
+    """Store the cleaned prompt text and its token set on `chunk` (done once at ingest).
+
+    Chunk tĩnh nên clean + tokenize một lần lúc ingest; lúc query dedup chỉ còn
+    phép giao/hợp tập token đã tính sẵn.
+    """
+    clean = clean_context(text)
+    chunk[CONTEXT_CLEAN_FIELD] = clean
+    chunk[CONTEXT_TOKENS_FIELD] = sorted(set(tokenize(clean)))
+    return chunk
+
+
+def format_table(chunk: Dict[str, Any]) -> str:
+    """Format table content into readable text for embedding and prompts"""
+    title = chunk.get("title", "")
+    columns = chunk.get("columns", [])
+    rows = chunk.get("rows", [])
+
+    lines = [f"Bảng: {title}"]
+    if columns:
+        lines.append(f"Các cột: {', '.join(columns)}")
+    if rows:
+        lines.append("Dữ liệu:")
+        for row in rows:  # Assuming row is a list or dict
+            if isinstance(row, list):
+                lines.append(" | ".join(str(cell) for cell in row))
+            elif isinstance(row, dict):
+                lines.append(" | ".join(f"{k}: {v}" for k, v in row.items()))
+    return "\n".join(lines)
+
+
+def chunk_context(chunk: Dict[str, Any]) -> str:
+    """Text that goes into the prompt for a retrieved chunk"""
+    if chunk.get("type") == "table":
+        return format_table(chunk)
+    return chunk.get("content") or chunk.get("text", "")
+
+
+def prepared_context(chunk: Dict[str, Any]) -> Tuple[str, FrozenSet[str]]:
+    """(cleaned text, token set) of a chunk, computed on the fly when ingest did not store them.
+
+    Chunk index trước khi có field precompute (vd. dữ liệu đóng gói sẵn) vẫn dùng được.
+    """
+    clean = chunk.get(CONTEXT_CLEAN_FIELD)
+    if clean is None:
+        clean = clean_context(chunk_context(chunk))
+    tokens = chunk.get(CONTEXT_TOKENS_FIELD)
+    if tokens is None:
+        tokens = tokenize(clean)
+    return clean, frozenset(tokens)
@@ -0,0 +1,107 @@
+import bisect
+import threading
+from typing import List, Dict, Any, Sequence
+
+# Bucket mặc định (giây) cho latency: từ 1ms tới 60s
+DEFAULT_LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+
+class LatencyHistogram:
+    """Thread-safe cumulative latency histogram with fixed buckets (seconds)"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # bucket cuối là +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        """Record one observation"""
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[idx] += 1
+            self._sum += value
+            self._count += 1
+            if value > self._max:
+                self._max = value
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    @property
+    def total(self) -> float:
+        return self._sum
+
+    def cumulative_counts(self) -> List[int]:
+        """Cumulative counts per bucket, last entry is the +Inf bucket"""
+        with self._lock:
+            counts = list(self._counts)
+        out, running = [], 0
+        for c in counts:
+            running += c
+            out.append(running)
+        return out
+
+    def percentile(self, q: float) -> float:
+        """Approximate percentile (0-100) using the bucket upper bounds"""
+        with self._lock:
+            counts = list(self._counts)
+            total = self._count
+            max_value = self._max
+        if total == 0:
+            return 0.0
+
+        rank = q / 100.0 * total
+        running = 0
+        for i, c in enumerate(counts):
+            running += c
+            if running >= rank and c > 0:
+                return self.buckets[i] if i < len(self.buckets) else max_value
+        return max_value
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Summary for stats endpoints"""
+        count = self._count
+        return {
+            'count': count,
+            'avg_ms': round(self._sum / count * 1000, 2) if count else 0.0,
+            'p50_ms': round(self.percentile(50) * 1000, 2),
+            'p95_ms': round(self.percentile(95) * 1000, 2),
+            'p99_ms': round(self.percentile(99) * 1000, 2),
+            'max_ms': round(self._max * 1000, 2)
+        }
+
+
+def _escape_label(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape_label(v)}"' for k, v in labels.items()) + '}'
+
+
+def render_prometheus(name: str, kind: str, help_text: str, samples: Sequence[Any]) -> str:
+    """Render one metric family in Prometheus text format (0.0.4).
+
+    samples: list (labels dict, value); với kind="histogram" value là LatencyHistogram.
+    """
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        if kind == 'histogram':
+            cumulative = value.cumulative_counts()
+            bounds = [f"{b:g}" for b in value.buckets] + ['+Inf']
+            for le, count in zip(bounds, cumulative):
+                lines.append(f"{name}_bucket{_format_labels({**labels, 'le': le})} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {value.total}")
+            lines.append(f"{name}_count{_format_labels(labels)} {cumulative[-1]}")
+        else:
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
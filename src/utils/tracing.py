@@ -0,0 +1,222 @@
+import os
+import time
+import queue
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Iterator
+from src.utils.metrics import LatencyHistogram
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar('rag_current_span', default=None)
+
+
+class Span:
+    """One timed stage; nested spans share the trace id of the outermost span"""
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'attributes',
+                 'start_unix_ns', 'start_ns', 'end_ns', 'error')
+
+    def __init__(self, name: str, parent: Optional['Span'], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = attributes
+        self.start_unix_ns = time.time_ns()
+        self.start_ns = time.perf_counter_ns()
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    @property
+    def duration_sec(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.perf_counter_ns()
+        return (end - self.start_ns) / 1e9
+
+    @property
+    def duration_ms(self) -> float:
+        return round(self.duration_sec * 1000, 2)
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+class OTLPExporter:
+    """Batching OTLP/HTTP (JSON) span exporter running on a daemon thread.
+
+    Span được đẩy vào hàng đợi có giới hạn (đầy thì bỏ, không chặn request) và
+    gửi theo lô tới collector, vd. http://localhost:4318/v1/traces.
+    """
+
+    def __init__(self, endpoint: str, service_name: str = 'bidv-rag', batch_size: int = 256,
+                 flush_interval_sec: float = 2.0, max_queue: int = 4096, timeout_sec: float = 5.0):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.flush_interval_sec = flush_interval_sec
+        self.timeout_sec = timeout_sec
+        self._queue: "queue.Queue[Span]" = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self.exported = 0
+        self.dropped = 0
+        self.failed = 0
+        self._thread = threading.Thread(target=self._run, name='otlp-exporter', daemon=True)
+        self._thread.start()
+
+    def submit(self, span: Span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def encode(self, spans: List[Span]) -> Dict[str, Any]:
+        """OTLP JSON payload (ExportTraceServiceRequest)"""
+        return {
+            'resourceSpans': [{
+                'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': self.service_name}}]},
+                'scopeSpans': [{
+                    'scope': {'name': 'src.utils.tracing'},
+                    'spans': [{
+                        'traceId': s.trace_id,
+                        'spanId': s.span_id,
+                        **({'parentSpanId': s.parent_id} if s.parent_id else {}),
+                        'name': s.name,
+                        'kind': 1,  # SPAN_KIND_INTERNAL
+                        'startTimeUnixNano': str(s.start_unix_ns),
+                        'endTimeUnixNano': str(s.start_unix_ns + (s.end_ns - s.start_ns)),
+                        'attributes': [{'key': k, 'value': _otlp_value(v)} for k, v in s.attributes.items()],
+                        'status': {'code': 2, 'message': s.error} if s.error else {'code': 1}
+                    } for s in spans]
+                }]
+            }]
+        }
+
+    def _drain(self, block: bool) -> List[Span]:
+        spans = []
+        try:
+            if block:
+                spans.append(self._queue.get(timeout=self.flush_interval_sec))
+            while len(spans) < self.batch_size:
+                spans.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return spans
+
+    def _send(self, spans: List[Span]):
+        import httpx
+        try:
+            response = httpx.post(self.endpoint, json=self.encode(spans), timeout=self.timeout_sec)
+            response.raise_for_status()
+            self.exported += len(spans)
+        except Exception as e:
+            self.failed += len(spans)
+            logger.debug(f"OTLP export of {len(spans)} spans failed: {e}")
+
+    def _run(self):
+        while not self._stop.is_set():
+            spans = self._drain(block=True)
+            if spans:
+                self._send(spans)
+
+    def shutdown(self):
+        """Stop the worker and flush what is still queued"""
+        self._stop.set()
+        self._thread.join(timeout=self.flush_interval_sec + self.timeout_sec)
+        while True:
+            spans = self._drain(block=False)
+            if not spans:
+                break
+            self._send(spans)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {'endpoint': self.endpoint, 'exported': self.exported,
+                'dropped': self.dropped, 'failed': self.failed, 'queued': self._queue.qsize()}
+
+
+class Tracer:
+    """Process-wide span recorder: per-stage latency histograms + optional OTLP export.
+
+    span() luôn đo thời gian (caller dùng span.duration_ms cho timings); khi
+    tắt tracing thì không ghi histogram, không export và không lồng span.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.exporter: Optional[OTLPExporter] = None
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self.errors: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, config) -> 'Tracer':
+        """Apply `tracing.*` settings from Config"""
+        self.enabled = bool(config.get('tracing.enabled', True))
+        otlp_enabled = self.enabled and bool(config.get('tracing.otlp.enabled', False))
+        if otlp_enabled and self.exporter is None:
+            self.exporter = OTLPExporter(
+                endpoint=config.get('tracing.otlp.endpoint', 'http://localhost:4318/v1/traces'),
+                service_name=config.get('tracing.service_name', 'bidv-rag'),
+                batch_size=config.get('tracing.otlp.batch_size', 256),
+                flush_interval_sec=config.get('tracing.otlp.flush_interval_sec', 2.0)
+            )
+            logger.info(f"Exporting spans via OTLP to {self.exporter.endpoint}")
+        elif not otlp_enabled and self.exporter is not None:
+            self.exporter.shutdown()
+            self.exporter = None
+        return self
+
+    def _histogram(self, name: str) -> LatencyHistogram:
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(name, LatencyHistogram())
+        return histogram
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span]:
+        """Time a stage: `with tracer.span("query.embed") as span: ...`"""
+        enabled = self.enabled
+        span = Span(name, _current_span.get() if enabled else None, attributes)
+        token = _current_span.set(span) if enabled else None
+        try:
+            yield span
+        except BaseException as e:
+            span.error = repr(e)
+            raise
+        finally:
+            span.end_ns = time.perf_counter_ns()
+            if enabled:
+                _current_span.reset(token)
+                self._histogram(name).observe(span.duration_sec)
+                if span.error is not None:
+                    with self._lock:
+                        self.errors[name] = self.errors.get(name, 0) + 1
+                if self.exporter is not None:
+                    self.exporter.submit(span)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Per-stage latency snapshots"""
+        return {
+            'enabled': self.enabled,
+            'stages': {name: h.snapshot() for name, h in sorted(self.histograms.items())},
+            'errors': dict(self.errors),
+            'otlp': self.exporter.get_stats() if self.exporter else None
+        }
+
+
+# Tracer dùng chung trong process
+tracer = Tracer()
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
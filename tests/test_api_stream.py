@@ -0,0 +1,191 @@
+import unittest
+import os
+import sys
+import json
+import time
+import asyncio
+import shutil
+import tempfile
+import importlib
+from pathlib import Path
+from unittest import mock
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+sys.path.append(str(Path(__file__).parent))
+
+from fastapi.testclient import TestClient
+from src.generation import postprocess
+from src.generation.llm_client import LLMError
+from src.utils.concurrency import QueryLimiter
+from test_rag_ingestion import HashingBackend, write_config, POLICY
+
+RAW_DELTAS = ["**Phí thường", " niên** thẻ Visa Platinum", " là 1.000.000 VND", " .\nMiễn phí năm đầu", "\n\n\n"]
+
+
+def parse_sse(text: str) -> list:
+    """Split an SSE body into (event, data) pairs, checking the framing of every frame"""
+    assert text.endswith("\n\n"), repr(text[-20:])
+    events = []
+    for frame in text[:-2].split("\n\n"):
+        lines = frame.split("\n")
+        assert len(lines) == 2 and lines[0].startswith("event: ") and lines[1].startswith("data: "), frame
+        events.append((lines[0][len("event: "):], json.loads(lines[1][len("data: "):])))
+    return events
+
+
+class TestQueryStreamEndpoint(unittest.TestCase):
+    """/query/stream qua app_api thật, RAGSystem dùng embedding giả lập và LLM stream giả lập"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.test_dir = tempfile.mkdtemp()
+        cls.cwd = os.getcwd()
+        # app_api đọc config.yaml tương đối với cwd lúc import
+        os.chdir(cls.test_dir)
+        write_config(cls.test_dir)
+        cls.patchers = [mock.patch('src.ingestion.embedder.create_backend', return_value=HashingBackend()),
+                        mock.patch.dict(os.environ, {'GEMINI_API_KEY': 'test-key'})]
+        for patcher in cls.patchers:
+            patcher.start()
+        sys.modules.pop('app_api', None)
+        cls.api = importlib.import_module('app_api')
+        path = os.path.join(cls.test_dir, "policy.txt")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(POLICY)
+        cls.api.rag.ingest_multiple_documents([path])
+        cls.client = TestClient(cls.api.app)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.client.close()
+        for patcher in reversed(cls.patchers):
+            patcher.stop()
+        sys.modules.pop('app_api', None)
+        os.chdir(cls.cwd)
+        shutil.rmtree(cls.test_dir)
+
+    def setUp(self):
+        self.api.rag.query_cache.invalidate()
+        self.generator = self.api.rag.response_generator
+        self.stream_clean = self.generator.stream_clean
+        self.closed = []
+        self.consumed = 0
+
+    def tearDown(self):
+        self.generator.stream_clean = self.stream_clean
+        self.assertEqual(self.api.limiter.in_flight, 0)
+
+    def fake_stream(self, deltas, interval=0.0, error=None):
+        def generate_stream(messages, language="vi", deadline=None):
+            try:
+                for delta in deltas:
+                    time.sleep(interval)
+                    self.consumed += 1
+                    yield delta
+                if error is not None:
+                    raise error
+            finally:
+                self.closed.append(True)
+        return mock.patch.object(self.generator.llm_client, 'generate_stream', side_effect=generate_stream)
+
+    def post_stream(self, question: str) -> list:
+        response = self.client.post("/query/stream", json={"question": question})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/event-stream"))
+        return parse_sse(response.text)
+
+    def test_sse_framing_and_event_order(self):
+        """Test metadata → deltas → done, raw deltas pass through when stream_clean is 'none'"""
+        self.assertEqual(self.generator.stream_clean, 'none')
+        with self.fake_stream(RAW_DELTAS):
+            events = self.post_stream("Phí thường niên thẻ Visa Platinum?")
+
+        names = [name for name, _ in events]
+        self.assertEqual(names[0], "metadata")
+        self.assertEqual(names[-1], "done")
+        self.assertEqual(set(names[1:-1]), {"delta"})
+        self.assertTrue(events[0][1]["contexts"])
+        self.assertIsNone(events[0][1]["cache"])
+        self.assertEqual([data["content"] for _, data in events[1:-1]], RAW_DELTAS)
+        self.assertIn("1.000.000 VND", events[-1][1]["response"])
+        self.assertEqual(self.closed, [True])
+
+        # Lần hai trả từ cache, không gọi LLM
+        with self.fake_stream(["không được gọi"]) as llm:
+            events = self.post_stream("Phí thường niên thẻ Visa Platinum?")
+        llm.assert_not_called()
+        self.assertEqual(events[0][1]["cache"], "exact")
+
+    def test_line_clean_stream_over_endpoint(self):
+        """Test stream_clean='line' emits the same text as postprocess.clean_stream"""
+        self.generator.stream_clean = 'line'
+        with self.fake_stream(RAW_DELTAS):
+            events = self.post_stream("Miễn phí năm đầu?")
+        deltas = [data["content"] for name, data in events if name == "delta"]
+        self.assertEqual("".join(deltas), "".join(postprocess.clean_stream(RAW_DELTAS)))
+        self.assertNotIn("**", "".join(deltas))
+
+    def test_llm_error_becomes_sse_error_event(self):
+        """Test an LLMError mid-stream ends the body with a structured error event"""
+        with self.fake_stream(["Phí"], error=LLMError("deadline", "Request deadline exceeded while streaming")):
+            events = self.post_stream("Lãi suất thẻ tín dụng?")
+        self.assertEqual(events[-1][0], "error")
+        self.assertEqual(events[-1][1]["kind"], "deadline")
+
+    def test_queue_full_returns_429(self):
+        """Test a full admission queue rejects the stream with 429 before any body is sent"""
+        busy = QueryLimiter(max_concurrent=1, max_queue=0)
+        asyncio.run(busy.acquire())
+        with mock.patch.object(self.api, 'limiter', busy), self.fake_stream(["a"]) as llm:
+            response = self.client.post("/query/stream", json={"question": "Phí rút tiền mặt?"})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers["retry-after"], "1")
+        self.assertEqual(busy.get_stats()["rejected"], 1)
+        llm.assert_not_called()
+
+    def disconnect_after(self, n_messages: int):
+        """Run /query/stream through ASGI with a client that goes away after `n_messages` sends"""
+        async def scenario():
+            response = await self.api.query_stream({"question": "Hạn mức tín dụng tối đa?"})
+            self.assertEqual(self.api.limiter.in_flight, 1)
+            sent = []
+
+            async def receive():
+                await asyncio.sleep(10)
+
+            async def send(message):
+                if len(sent) >= n_messages:
+                    raise OSError("client went away")
+                sent.append(message)
+
+            scope = {"type": "http", "asgi": {"spec_version": "2.4"}}
+            with self.assertRaises(Exception):
+                await response(scope, receive, send)
+            return sent
+
+        return asyncio.run(scenario())
+
+    def test_disconnect_before_body_releases_slot(self):
+        """Test a client gone before the first byte frees the limiter slot without calling the LLM"""
+        with self.fake_stream(["a"]) as llm:
+            self.assertEqual(self.disconnect_after(0), [])
+        self.assertEqual(self.api.limiter.in_flight, 0)
+        llm.assert_not_called()
+
+    def test_disconnect_mid_stream_stops_llm_consumption(self):
+        """Test the worker stops reading the LLM stream (generator closed) once the client disconnects"""
+        with self.fake_stream(["a"] * 100, interval=0.01):
+            sent = self.disconnect_after(3)  # response.start, metadata, delta đầu tiên
+            self.assertEqual(self.api.limiter.in_flight, 0)
+            deadline = time.monotonic() + 2
+            while not self.closed and time.monotonic() < deadline:
+                time.sleep(0.01)
+        self.assertEqual(len(sent), 3)
+        self.assertEqual(self.closed, [True])
+        self.assertLess(self.consumed, 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,188 @@
+import unittest
+import os
+import sys
+import tempfile
+import shutil
+import unicodedata
+from pathlib import Path
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+
+import numpy as np
+from src.utils.config import Config
+from src.retrieval.vector_store import VectorStore
+from src.retrieval.bm25 import BM25Index, tokenize, chunk_text
+from src.retrieval.fusion import reciprocal_rank_fusion, weighted_fusion
+
+
+class TestBM25(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.test_dir, "faiss_index.bm25.jsonl")
+        self.chunks = [
+            {"type": "text", "title": "Thẻ tín dụng", "content": "Phí thường niên thẻ Visa Platinum là 1.000.000 VND."},
+            {"type": "text", "title": "Thẻ ghi nợ", "content": "Thẻ ghi nợ nội địa miễn phí thường niên năm đầu."},
+            {"type": "table", "title": "Biểu phí", "columns": ["Mã SP", "Phí"], "rows": [["TGTT-01", "50.000 VND"]]},
+            {"type": "text", "title": "Tiết kiệm", "content": "Lãi suất tiết kiệm kỳ hạn 12 tháng là 4,7%/năm."},
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def build(self) -> BM25Index:
+        index = BM25Index(self.path)
+        index.add_chunks(range(len(self.chunks)), self.chunks)
+        return index
+
+    def test_tokenize_vietnamese(self):
+        """Test NFC normalisation, syllable bigrams and number variants"""
+        decomposed = unicodedata.normalize('NFD', "Thẻ Tín dụng")
+        tokens = tokenize(decomposed)
+        self.assertIn("thẻ", tokens)
+        self.assertIn("thẻ_tín", tokens)
+        self.assertIn("tín_dụng", tokens)
+        self.assertIn("1000000", tokenize("phí 1.000.000 VND"))
+        self.assertIn("tgtt-01", tokenize("Mã TGTT-01"))
+
+    def test_exact_terms_rank_first(self):
+        """Test that product codes, card names and amounts retrieve the right chunk"""
+        index = self.build()
+        self.assertEqual(index.search("phí thẻ Visa Platinum", 1)[0][0], 0)
+        self.assertEqual(index.search("sản phẩm TGTT-01", 1)[0][0], 2)
+        self.assertEqual(index.search("1000000", 1)[0][0], 0)
+        self.assertEqual(index.search("không liên quan xyz", 3), [])
+
+    def test_remove_and_persist(self):
+        """Test that removed documents disappear and the index survives save/load"""
+        index = self.build()
+        index.remove(2)
+        index.save()
+
+        loaded = BM25Index(self.path)
+        self.assertTrue(loaded.load())
+        self.assertEqual(len(loaded), 3)
+        self.assertNotIn(2, loaded)
+        self.assertEqual(loaded.search("TGTT-01", 3), [])
+        self.assertEqual(loaded.search("lãi suất tiết kiệm", 4), index.search("lãi suất tiết kiệm", 4))
+        self.assertEqual(loaded.get_stats(), index.get_stats())
+
+    def test_save_appends_only_changes(self):
+        """Test save() is a no-op without changes and appends just the new operations otherwise"""
+        index = self.build()
+        index.save()
+        with open(self.path, encoding='utf-8') as f:
+            snapshot = f.read()
+        mtime = os.stat(self.path).st_mtime_ns
+        index.save()
+        self.assertEqual(os.stat(self.path).st_mtime_ns, mtime)
+
+        index.remove(0)
+        index.add(4, "Phí rút tiền mặt ATM nội mạng 1.100 VND")
+        index.save()
+        with open(self.path, encoding='utf-8') as f:
+            content = f.read()
+        self.assertTrue(content.startswith(snapshot))
+        self.assertEqual(len(content[len(snapshot):].splitlines()), 2)
+
+        loaded = BM25Index(self.path)
+        self.assertTrue(loaded.load())
+        self.assertFalse(loaded.dirty)
+        self.assertEqual(sorted(loaded.doc_terms), [1, 2, 3, 4])
+        self.assertEqual(loaded.search("ATM nội mạng", 2), index.search("ATM nội mạng", 2))
+
+    def test_log_is_compacted_when_it_grows(self):
+        """Test repeated re-adds rewrite the log instead of growing it without bound"""
+        index = self.build()
+        index.save()
+        for _ in range(10):
+            index.add_chunks(range(len(self.chunks)), self.chunks)
+            index.save()
+        with open(self.path, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        self.assertLessEqual(len(lines) - 1, BM25Index.COMPACT_RATIO * len(self.chunks))
+        loaded = BM25Index(self.path)
+        self.assertTrue(loaded.load())
+        self.assertEqual(loaded.get_stats(), index.get_stats())
+
+    def test_truncated_tail_is_ignored_and_rewritten(self):
+        """Test a half-written last record is skipped on load and the next save rewrites the log"""
+        index = self.build()
+        index.save()
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write('{"add":9,"tf":{"ph')
+        loaded = BM25Index(self.path)
+        self.assertTrue(loaded.load())
+        self.assertEqual(len(loaded), 4)
+        self.assertTrue(loaded.dirty)
+        loaded.save()
+        reloaded = BM25Index(self.path)
+        self.assertTrue(reloaded.load())
+        self.assertEqual(reloaded.get_stats(), index.get_stats())
+
+    def test_chunk_text_includes_table_cells(self):
+        """Test that table chunks are indexed with their header and cells"""
+        self.assertIn("TGTT-01", chunk_text(self.chunks[2]))
+        self.assertIn("Mã SP", chunk_text(self.chunks[2]))
+
+    def test_fusion(self):
+        """Test reciprocal-rank and weighted fusion of dense and lexical rankings"""
+        dense = [(1, 0.9), (2, 0.8), (3, 0.7)]
+        lexical = [(3, 12.0), (4, 8.0)]
+
+        rrf = reciprocal_rank_fusion([dense, lexical], k=60)
+        self.assertEqual(rrf[0][0], 3)  # có mặt trong cả hai danh sách
+        self.assertEqual({doc_id for doc_id, _ in rrf}, {1, 2, 3, 4})
+
+        weighted = weighted_fusion([dense, lexical], [0.5, 0.5])
+        self.assertEqual(weighted[0][0], 3)
+        self.assertAlmostEqual(dict(weighted)[1], 0.5)
+
+    def test_vector_store_keeps_bm25_in_sync(self):
+        """Test that the vector store updates, persists and rebuilds BM25 with shared chunk ids"""
+        config = Config("nonexistent.yaml")
+        config.config['vector_store']['index_path'] = os.path.join(self.test_dir, "faiss_index")
+        config.config['vector_store']['dimension'] = 8
+        rng = np.random.default_rng(0)
+
+        vs = VectorStore(config)
+        ids = vs.add_chunks([dict(c) for c in self.chunks], rng.normal(size=(4, 8)).astype('float32'))
+        vs.remove_ids([ids[1]])
+        vs.save_index()
+        self.assertEqual(vs.lexical_search("TGTT-01", 1)[0][0], ids[2])
+
+        reloaded = VectorStore(config)
+        reloaded.load_index()
+        self.assertEqual(len(reloaded.bm25), 3)
+        self.assertEqual(reloaded.lexical_search("Visa Platinum", 3), vs.lexical_search("Visa Platinum", 3))
+
+        # File BM25 mất → dựng lại từ chunk store
+        os.remove(reloaded.bm25.path)
+        rebuilt = VectorStore(config)
+        rebuilt.load_index()
+        self.assertEqual(rebuilt.bm25.get_stats(), vs.bm25.get_stats())
+        self.assertTrue(os.path.exists(rebuilt.bm25.path))
+
+        # File JSON của bản cũ bị bỏ qua, BM25 dựng lại sang log mới rồi xoá file cũ
+        os.remove(rebuilt.bm25.path)
+        with open(rebuilt.legacy_bm25_path, 'w', encoding='utf-8') as f:
+            f.write('{"version":1,"docs":{}}')
+        migrated = VectorStore(config)
+        migrated.load_index()
+        self.assertEqual(migrated.bm25.get_stats(), vs.bm25.get_stats())
+        self.assertFalse(os.path.exists(migrated.legacy_bm25_path))
+
+        # Cùng số document nhưng id lệch với chunk store → dựng lại
+        stale = BM25Index(migrated.bm25.path)
+        for doc_id in (97, 98, 99):
+            stale.add(doc_id, "không liên quan")
+        stale.save()
+        drifted = VectorStore(config)
+        drifted.load_index()
+        self.assertEqual(drifted.bm25.get_stats(), vs.bm25.get_stats())
+        self.assertNotIn(99, drifted.bm25)
+
+
+if __name__ == '__main__':
+    unittest.main()
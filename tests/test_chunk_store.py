@@ -0,0 +1,129 @@
+import unittest
+import os
+import json
+import sys
+import tempfile
+import shutil
+from pathlib import Path
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+
+from src.retrieval.chunk_store import ChunkStore
+
+
+class TestChunkStore(unittest.TestCase):
+    def setUp(self):
+        """Create a store in a temporary directory"""
+        self.test_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.test_dir, "faiss_index.chunks")
+        self.chunks = [
+            {"type": "text", "title": "Thẻ tín dụng", "content": "Phí thường niên Visa Platinum", "metadata": {"page": 1}},
+            {"type": "table", "title": "Biểu phí", "columns": ["Loại", "Phí"], "rows": [["ATM", "1.100 VND"]], "metadata": {}},
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_flush_and_load_roundtrip(self):
+        """Test that flushed chunks are read back lazily from the mmap"""
+        store = ChunkStore(self.path)
+        store.extend(self.chunks)
+        store.flush()
+
+        loaded = ChunkStore(self.path)
+        self.assertTrue(loaded.load())
+        self.assertEqual(len(loaded), 2)
+        self.assertEqual(loaded[0], self.chunks[0])
+        self.assertEqual(loaded[-1], self.chunks[1])
+        self.assertEqual(list(loaded), self.chunks)
+
+    def test_flush_appends_only_new_chunks(self):
+        """Test that a second flush appends instead of rewriting"""
+        store = ChunkStore(self.path)
+        store.append(self.chunks[0])
+        store.flush()
+        size_before = os.path.getsize(store.dat_path)
+
+        store.append(self.chunks[1])
+        self.assertEqual(len(store), 2)
+        store.flush()
+
+        loaded = ChunkStore(self.path)
+        loaded.load()
+        self.assertEqual(list(loaded), self.chunks)
+        self.assertGreater(os.path.getsize(store.dat_path), size_before)
+
+    def test_unattached_store_overwrites_existing_files(self):
+        """Test that a fresh store replaces files it was not loaded from"""
+        first = ChunkStore(self.path)
+        first.extend(self.chunks)
+        first.flush()
+
+        second = ChunkStore(self.path)
+        second.append(self.chunks[1])
+        second.flush()
+
+        loaded = ChunkStore(self.path)
+        loaded.load()
+        self.assertEqual(list(loaded), [self.chunks[1]])
+
+    def test_delete_tombstones_in_place(self):
+        """Test that deleted slots keep their ids and survive a reload"""
+        store = ChunkStore(self.path)
+        store.extend(self.chunks)
+        store.flush()
+
+        store.delete(0)
+        self.assertTrue(store.is_deleted(0))
+        self.assertEqual(store.live_count(), 1)
+        store.flush()
+
+        loaded = ChunkStore(self.path)
+        loaded.load()
+        self.assertEqual(len(loaded), 2)
+        self.assertTrue(loaded.is_deleted(0))
+        self.assertFalse(loaded.is_deleted(1))
+        self.assertEqual(loaded.live_count(), 1)
+        self.assertEqual(loaded[1], self.chunks[1])
+
+    def test_truncate_drops_uncommitted_tail(self):
+        """Test truncate() cuts persisted and pending records and keeps the tombstone count right"""
+        store = ChunkStore(self.path)
+        store.extend(self.chunks)
+        store.flush()
+        store.delete(1)
+        store.flush()
+        store.append({"type": "text", "content": "chưa commit", "metadata": {}})
+        store.flush()
+        store.append({"type": "text", "content": "đang chờ", "metadata": {}})
+        store.delete(0)
+
+        store.truncate(1)
+        self.assertEqual(len(store), 1)
+        self.assertTrue(store.is_deleted(0))  # tombstone đang chờ của slot < n được giữ
+        self.assertEqual(store.live_count(), 0)
+        store.flush()
+
+        loaded = ChunkStore(self.path)
+        loaded.load()
+        self.assertEqual(len(loaded), 1)
+        self.assertEqual(loaded.live_count(), 0)
+        self.assertEqual(os.path.getsize(loaded.dat_path), len(json.dumps(self.chunks[0], ensure_ascii=False).encode('utf-8')))
+
+        loaded.append(self.chunks[1])
+        loaded.truncate(1)
+        self.assertEqual(len(loaded), 1)
+
+    def test_missing_store_and_index_errors(self):
+        """Test load() on missing files and out-of-range access"""
+        store = ChunkStore(self.path)
+        self.assertFalse(store.load())
+        self.assertEqual(len(store), 0)
+        with self.assertRaises(IndexError):
+            store[0]
+
+
+if __name__ == '__main__':
+    unittest.main()
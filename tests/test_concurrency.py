@@ -0,0 +1,114 @@
+import unittest
+import sys
+import asyncio
+from pathlib import Path
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+
+from src.utils.concurrency import QueryLimiter, QueueFullError
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class TestQueryLimiter(unittest.TestCase):
+    def test_queue_full_rejects_immediately(self):
+        """Test that requests beyond max_concurrent + max_queue get QueueFullError (HTTP 429)"""
+        async def scenario():
+            limiter = QueryLimiter(max_concurrent=1, max_queue=1, queue_timeout_sec=5)
+            await limiter.acquire()
+            waiter = asyncio.ensure_future(limiter.acquire())
+            await asyncio.sleep(0)
+            with self.assertRaises(QueueFullError):
+                await limiter.acquire()
+
+            limiter.release()
+            await waiter
+            limiter.release()
+            return limiter.get_stats()
+
+        stats = run(scenario())
+        self.assertEqual((stats["rejected"], stats["completed"], stats["in_flight"], stats["queue_depth"]), (1, 2, 0, 0))
+
+    def test_queue_timeout(self):
+        """Test that waiting longer than queue_timeout_sec is rejected and leaves no queued request"""
+        async def scenario():
+            limiter = QueryLimiter(max_concurrent=1, max_queue=4, queue_timeout_sec=0.05)
+            await limiter.acquire()
+            with self.assertRaises(QueueFullError):
+                await limiter.acquire()
+            self.assertEqual(limiter.queued, 0)
+            limiter.release()
+            # Permit không bị mất: acquire tiếp theo có slot ngay
+            await asyncio.wait_for(limiter.acquire(), timeout=1)
+            limiter.release()
+            return limiter.get_stats()
+
+        stats = run(scenario())
+        self.assertEqual(stats["rejected"], 1)
+        self.assertEqual(stats["wait_time"]["count"], 2)
+
+    def test_slot_freed_after_exception(self):
+        """Test that slot() releases even when the query raises"""
+        async def scenario():
+            limiter = QueryLimiter(max_concurrent=1, max_queue=0, queue_timeout_sec=1)
+            with self.assertRaises(RuntimeError):
+                async with limiter.slot():
+                    raise RuntimeError("query failed")
+            async with limiter.slot():
+                self.assertEqual(limiter.in_flight, 1)
+            return limiter
+
+        limiter = run(scenario())
+        self.assertEqual((limiter.in_flight, limiter.completed), (0, 2))
+
+    def test_cancelled_waiter_does_not_leak_permit(self):
+        """Test a waiter cancelled right after its slot was granted gives the permit back"""
+        async def scenario():
+            limiter = QueryLimiter(max_concurrent=1, max_queue=4, queue_timeout_sec=5)
+            await limiter.acquire()
+            waiter = asyncio.ensure_future(limiter.acquire())
+            await asyncio.sleep(0.01)
+            limiter.release()  # slot được cấp cho waiter...
+            waiter.cancel()    # ...nhưng request bị huỷ trước khi kịp chạy
+            with self.assertRaises(asyncio.CancelledError):
+                await waiter
+            await asyncio.wait_for(limiter.acquire(), timeout=1)
+            limiter.release()
+            return limiter
+
+        limiter = run(scenario())
+        self.assertEqual((limiter.in_flight, limiter.queued), (0, 0))
+
+    def test_timeouts_racing_releases_keep_every_permit(self):
+        """Test that timeouts firing while slots are being released never lose a permit"""
+        async def scenario():
+            limiter = QueryLimiter(max_concurrent=2, max_queue=64, queue_timeout_sec=0.002)
+            for _ in range(200):
+                await limiter.acquire()
+                await limiter.acquire()
+                waiters = [asyncio.ensure_future(limiter.acquire()) for _ in range(3)]
+                await asyncio.sleep(0.002)
+                limiter.release()
+                limiter.release()
+                for outcome in await asyncio.gather(*waiters, return_exceptions=True):
+                    if outcome is None:
+                        limiter.release()
+                    else:
+                        self.assertIsInstance(outcome, QueueFullError)
+            # Cả hai permit vẫn còn
+            await asyncio.wait_for(limiter.acquire(), timeout=1)
+            await asyncio.wait_for(limiter.acquire(), timeout=1)
+            limiter.release()
+            limiter.release()
+            return limiter.get_stats()
+
+        stats = run(scenario())
+        self.assertEqual((stats["in_flight"], stats["queue_depth"]), (0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
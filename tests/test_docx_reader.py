@@ -0,0 +1,104 @@
+import unittest
+import os
+import re
+import sys
+import tempfile
+import shutil
+from pathlib import Path
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+
+from docx import Document
+from src.utils.config import Config
+from src.ingestion.docx_reader import iter_docx_blocks
+from src.ingestion.document_loader import DocumentLoader
+from src.ingestion.text_splitter import TextSplitter
+
+
+def reference_split(splitter: TextSplitter, file_path: str, metadata: dict) -> list:
+    """Two-pass DOCX splitting as implemented before the single-pass reader"""
+    doc = Document(file_path)
+    chunks, current_title, buffer = [], None, []
+
+    def flush():
+        for chunk_content in splitter.split_paragraph(" ".join(buffer)):
+            chunks.append({"type": "text", "title": current_title or "Untitled",
+                           "content": chunk_content, "metadata": {**metadata, "title": current_title}})
+
+    for para in doc.paragraphs:
+        text = para.text.strip()
+        if not text:
+            continue
+        if re.match(r'^\d+(\.\d+)*\s', text) or text.isupper() or para.style.name.startswith("Heading"):
+            if buffer:
+                flush()
+                buffer = []
+            current_title = text
+        else:
+            buffer.append(text)
+    if buffer:
+        flush()
+    for table in doc.tables:
+        table_chunk = splitter.parse_table(table, context_title=current_title)
+        table_chunk["metadata"] = {**metadata, "title": current_title}
+        chunks.append(table_chunk)
+    return chunks
+
+
+class TestDocxReader(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.test_dir, "policy.docx")
+
+        doc = Document()
+        doc.add_paragraph("Mở đầu không có tiêu đề.")
+        doc.add_heading("Thẻ tín dụng", level=1)
+        doc.add_paragraph("Phí thường niên thẻ Visa Platinum là 1.000.000 VND. Miễn phí năm đầu.")
+        doc.add_paragraph("")
+        doc.add_paragraph("Hạn mức tối đa 500 triệu đồng.")
+        table = doc.add_table(rows=2, cols=2)
+        table.cell(0, 0).text, table.cell(0, 1).text = "Loại", "Phí"
+        table.cell(1, 0).text, table.cell(1, 1).text = " ATM ", "1.100 VND"
+        doc.add_paragraph("1.2 Lãi suất")
+        doc.add_paragraph("Lãi suất 18%/năm.")
+        doc.add_paragraph("ĐIỀU KHOẢN CHUNG")
+        doc.add_paragraph("Áp dụng từ ngày 01/01/2025.")
+        doc.save(self.file_path)
+
+        config = Config("nonexistent.yaml")
+        config.config['chunking'] = {'max_tokens': 8, 'overlap': 3}
+        self.splitter = TextSplitter(config)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_blocks_in_document_order(self):
+        """Test that headings, paragraphs and tables are emitted in body order"""
+        blocks = list(iter_docx_blocks(self.file_path))
+        self.assertEqual(
+            [b["type"] for b in blocks],
+            ["paragraph", "heading", "paragraph", "paragraph", "table",
+             "heading", "paragraph", "heading", "paragraph"]
+        )
+        self.assertEqual(blocks[4]["rows"], [["Loại", "Phí"], ["ATM", "1.100 VND"]])
+
+    def test_single_pass_matches_two_pass_split(self):
+        """Test that splitting the loader's blocks gives the same chunks as re-parsing the file"""
+        metadata = {"file_path": self.file_path, "file_type": "docx"}
+        expected = reference_split(self.splitter, self.file_path, metadata)
+
+        document = DocumentLoader().load_document(self.file_path)
+        from_blocks = self.splitter.split_document(
+            {"file_path": self.file_path, "blocks": document["blocks"], "metadata": metadata}
+        )
+        from_path = self.splitter.split_document({"file_path": self.file_path, "metadata": metadata})
+
+        self.assertEqual(from_blocks, expected)
+        self.assertEqual(from_path, expected)
+        self.assertEqual(document["tables"], [[["Loại", "Phí"], ["ATM", "1.100 VND"]]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+import os
+import sys
+import tempfile
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+
+from src.utils.config import Config
+from src.retrieval.vector_store import VectorStore
+
+INDEX_PATH = os.path.join(project_root, "data", "processed", "embeddings", "faiss_index")
+MODEL_NAME = 'bkai-foundation-models/vietnamese-bi-encoder'
+SAMPLE_SIZE = 32
+
+
+def _model_cached(model_name: str) -> bool:
+    """Chỉ chạy parity test khi model đã có trong cache local (không tải qua mạng trong test)"""
+    try:
+        from huggingface_hub import snapshot_download
+        snapshot_download(model_name, local_files_only=True)
+        return True
+    except Exception:
+        return False
+
+
+class TestEmbeddingBackendParity(unittest.TestCase):
+    """Compare each backend with the fp32 vectors already stored in faiss_index.faiss"""
+
+    @classmethod
+    def setUpClass(cls):
+        if not os.path.exists(f"{INDEX_PATH}.faiss"):
+            raise unittest.SkipTest("faiss_index.faiss not found")
+        if not _model_cached(MODEL_NAME):
+            raise unittest.SkipTest(f"{MODEL_NAME} is not in the local Hugging Face cache")
+
+        config = Config("nonexistent.yaml")
+        config.config['vector_store']['index_path'] = INDEX_PATH
+        vector_store = VectorStore(config)
+        vector_store.load_index()
+
+        cls.onnx_dir = tempfile.mkdtemp()
+        cls.ids = [i for i in range(len(vector_store.chunks)) if not vector_store.chunks.is_deleted(i)][:SAMPLE_SIZE]
+        cls.stored = np.stack([vector_store.get_embedding(i) for i in cls.ids])
+        cls.chunks = [vector_store.chunks[i] for i in cls.ids]
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.onnx_dir, ignore_errors=True)
+
+    def _cosines(self, backend_name: str) -> np.ndarray:
+        from src.ingestion.embedder import Embedder
+        config = Config("nonexistent.yaml")
+        config.config['models']['device'] = 'cpu'
+        config.config['models']['embedding_backend'] = backend_name
+        config.config['models']['onnx_dir'] = self.onnx_dir
+        config.config.setdefault('embedding', {})['cache'] = {'enabled': False}
+        try:
+            embedder = Embedder(config)
+        except ImportError as e:
+            self.skipTest(f"{backend_name} backend unavailable: {e}")
+        embeddings = embedder.embed_texts([embedder.chunk_to_text(c) for c in self.chunks], show_progress_bar=False)
+        return np.sum(embeddings * self.stored, axis=1)
+
+    def test_torch_fp32_matches_index(self):
+        cosines = self._cosines('torch')
+        self.assertGreater(cosines.min(), 0.999)
+
+    def test_onnx_fp32_matches_index(self):
+        cosines = self._cosines('onnx')
+        self.assertGreater(cosines.min(), 0.999)
+
+    def test_int8_backends_agree_with_index(self):
+        for backend_name in ('onnx_int8', 'torch_int8'):
+            with self.subTest(backend=backend_name):
+                cosines = self._cosines(backend_name)
+                # Quantize động int8 lệch nhẹ so với fp32 nhưng phải giữ được hướng vector
+                self.assertGreater(cosines.mean(), 0.98)
+                self.assertGreater(cosines.min(), 0.95)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+import os
+import sys
+import tempfile
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+
+from src.ingestion.embedding_cache import EmbeddingCache
+
+
+class TestEmbeddingCache(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.rng = np.random.default_rng(0)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _cache(self, **kwargs):
+        return EmbeddingCache(self.test_dir, EmbeddingCache.namespace_for("org/model", "torch"), 8, **kwargs)
+
+    def test_put_get_and_hit_ratio(self):
+        """Test that cached rows come back exactly and misses are reported by position"""
+        cache = self._cache()
+        texts = ["Lãi suất tiết kiệm", "Phí thẻ Visa", "Vay mua nhà"]
+        vectors = self.rng.normal(size=(3, 8)).astype('float32')
+        keys = [EmbeddingCache.key(t) for t in texts]
+
+        embeddings, missing = cache.get(keys)
+        self.assertEqual(missing, [0, 1, 2])
+        cache.put(keys[:2], vectors[:2])
+
+        embeddings, missing = cache.get(keys)
+        self.assertEqual(missing, [2])
+        np.testing.assert_array_equal(embeddings[:2], vectors[:2])
+        stats = cache.get_stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (2, 4, 2))
+        self.assertAlmostEqual(stats['hit_ratio'], 2 / 6, places=4)
+
+    def test_key_normalization(self):
+        """Test that NFC/NFD forms and whitespace variants share one key"""
+        nfc = "Tiết kiệm\ncó kỳ hạn"
+        nfd = "Tiết kiệm  có kỳ hạn "
+        self.assertEqual(EmbeddingCache.key(nfc), EmbeddingCache.key(nfd))
+        self.assertNotEqual(EmbeddingCache.key(nfc), EmbeddingCache.key("tiết kiệm có kỳ hạn"))
+
+    def test_persistence_and_concurrent_instances(self):
+        """Test that a second instance (another process) sees rows appended after it opened"""
+        writer = self._cache()
+        reader = self._cache()
+        keys = [EmbeddingCache.key(f"chunk {i}") for i in range(5)]
+        vectors = self.rng.normal(size=(5, 8)).astype('float32')
+
+        writer.put(keys, vectors)
+        writer.put(keys[:2], vectors[:2] + 1)  # key đã có → không ghi lại
+        reader.put(keys[3:], vectors[3:])       # reader refresh trong lock → không ghi trùng
+
+        embeddings, missing = reader.get(keys)
+        self.assertEqual(missing, [])
+        np.testing.assert_array_equal(embeddings, vectors)
+        self.assertEqual(os.path.getsize(writer.keys_path), 5 * EmbeddingCache.KEY_SIZE)
+
+        reopened = self._cache()
+        self.assertEqual(reopened.get_stats()['entries'], 5)
+
+    def test_interrupted_write_is_truncated(self):
+        """Test that vectors written without their keys are overwritten by the next append"""
+        cache = self._cache()
+        keys = [EmbeddingCache.key(f"chunk {i}") for i in range(3)]
+        vectors = self.rng.normal(size=(3, 8)).astype('float32')
+        cache.put(keys[:1], vectors[:1])
+        with open(cache.vec_path, 'ab') as f:
+            f.write(b'\x00' * 13)  # ghi dở của một writer bị kill
+
+        cache.put(keys[1:], vectors[1:])
+        embeddings, missing = self._cache().get(keys)
+        self.assertEqual(missing, [])
+        np.testing.assert_array_equal(embeddings, vectors)
+
+    def test_max_entries(self):
+        """Test that inserts stop once the cache is full"""
+        cache = self._cache(max_entries=2)
+        keys = [EmbeddingCache.key(f"q{i}") for i in range(3)]
+        cache.put(keys, self.rng.normal(size=(3, 8)).astype('float32'))
+        _, missing = cache.get(keys)
+        self.assertEqual(missing, [2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import unittest
+import sys
+import time
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+
+from src.ingestion.embedding_coalescer import EmbeddingCoalescer
+
+
+class FakeEmbedder:
+    """Embedder giả lập: vector của text i là [i, i]; ghi lại kích thước từng batch"""
+
+    def __init__(self, delay: float = 0.0, error: Exception = None):
+        self.delay = delay
+        self.error = error
+        self.batches = []
+
+    def embed_texts(self, texts, show_progress_bar=False):
+        self.batches.append(len(texts))
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return np.array([[float(t), float(t)] for t in texts], dtype='float32')
+
+
+class TestEmbeddingCoalescer(unittest.TestCase):
+    def setUp(self):
+        self.coalescers = []
+
+    def tearDown(self):
+        for coalescer in self.coalescers:
+            coalescer.close()
+
+    def make(self, embedder, **kwargs) -> EmbeddingCoalescer:
+        coalescer = EmbeddingCoalescer(embedder, **kwargs)
+        self.coalescers.append(coalescer)
+        return coalescer
+
+    def test_concurrent_submits_get_their_own_row(self):
+        """Test every caller receives the embedding of its own text, not a neighbour's row"""
+        embedder = FakeEmbedder(delay=0.005)
+        coalescer = self.make(embedder, window_ms=5, max_batch=16)
+        with ThreadPoolExecutor(max_workers=32) as pool:
+            results = list(pool.map(lambda i: (i, coalescer.embed(str(i))), range(200)))
+
+        for i, embedding in results:
+            np.testing.assert_array_equal(embedding, [i, i])
+        stats = coalescer.get_stats()
+        self.assertEqual(stats["items"], 200)
+        self.assertLess(stats["batches"], 200)  # có gom batch
+
+    def test_flush_on_max_wait(self):
+        """Test a lone request is flushed after window_ms instead of waiting for a full batch"""
+        embedder = FakeEmbedder()
+        coalescer = self.make(embedder, window_ms=20, max_batch=64)
+        start = time.perf_counter()
+        np.testing.assert_array_equal(coalescer.embed("7"), [7, 7])
+        elapsed = time.perf_counter() - start
+        self.assertGreaterEqual(elapsed, 0.015)
+        self.assertLess(elapsed, 1.0)
+        self.assertEqual(embedder.batches, [1])
+
+    def test_split_at_max_batch(self):
+        """Test no encode call receives more than max_batch texts"""
+        embedder = FakeEmbedder(delay=0.01)
+        coalescer = self.make(embedder, window_ms=50, max_batch=4)
+        with ThreadPoolExecutor(max_workers=20) as pool:
+            list(pool.map(lambda i: coalescer.embed(str(i)), range(20)))
+        self.assertEqual(sum(embedder.batches), 20)
+        self.assertLessEqual(max(embedder.batches), 4)
+        self.assertEqual(coalescer.get_stats()["max_batch_seen"], max(embedder.batches))
+
+    def test_exception_reaches_every_waiter(self):
+        """Test a failing encode raises in every caller of that batch and the worker keeps running"""
+        embedder = FakeEmbedder(delay=0.01, error=RuntimeError("model failed"))
+        coalescer = self.make(embedder, window_ms=20, max_batch=8)
+
+        def call(i):
+            try:
+                coalescer.embed(str(i))
+            except RuntimeError as e:
+                return str(e)
+
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            self.assertEqual(list(pool.map(call, range(6))), ["model failed"] * 6)
+
+        embedder.error = None
+        np.testing.assert_array_equal(coalescer.embed("3"), [3, 3])
+
+    def test_wrong_row_count_fails_instead_of_hanging(self):
+        """Test an embedder returning too few rows errors every waiter rather than leaving one blocked"""
+        class ShortEmbedder(FakeEmbedder):
+            def embed_texts(self, texts, show_progress_bar=False):
+                return super().embed_texts(texts)[:-1]
+
+        coalescer = self.make(ShortEmbedder(), window_ms=0, max_batch=8)
+        with self.assertRaises(RuntimeError):
+            coalescer.embed("1")
+
+    def test_close_answers_queued_requests_and_does_not_hang(self):
+        """Test close() drains queued requests, joins the worker and rejects new calls"""
+        embedder = FakeEmbedder(delay=0.05)
+        coalescer = self.make(embedder, window_ms=1, max_batch=2)
+        results = {}
+
+        def call(i):
+            results[i] = coalescer.embed(str(i))
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(5)]
+        for t in threads:
+            t.start()
+        time.sleep(0.05)  # cả 5 request đã vào queue
+
+        start = time.perf_counter()
+        coalescer.close()
+        self.assertLess(time.perf_counter() - start, 2.0)
+        for t in threads:
+            t.join(timeout=2)
+        self.assertEqual(sorted(results), list(range(5)))
+        self.assertFalse(coalescer._worker.is_alive())
+        with self.assertRaises(RuntimeError):
+            coalescer.embed("9")
+        coalescer.close()  # gọi lại không lỗi
+
+        # Đóng khi chưa từng dùng cũng không treo
+        unused = self.make(FakeEmbedder())
+        unused.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+import sys
+from pathlib import Path
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+sys.path.append(str(Path(__file__).parent))
+
+from test_rag_ingestion import RAGIngestionTestCase, POLICY
+
+
+class TestHybridRetrieval(RAGIngestionTestCase):
+    def make_hybrid_rag(self):
+        rag = self.make_rag(retrieval__score_threshold=0.3, retrieval__hybrid={'enabled': True})
+        rag.ingest_multiple_documents([self.write_file("policy.txt", POLICY)])
+        self.assertTrue(rag.retriever.hybrid)
+        return rag
+
+    def test_off_topic_query_returns_nothing(self):
+        """Test BM25 matches on common words ("là") do not leak chunks below the cosine threshold"""
+        rag = self.make_hybrid_rag()
+        retriever = rag.retriever
+        query = "Thời tiết hôm nay là gì"
+        # Điều kiện của test: BM25 có khớp (từ "là") nhưng cosine dưới threshold
+        self.assertTrue(retriever.vector_store.lexical_search(query, 5))
+
+        self.assertEqual(retriever.retrieve(query), [])
+
+    def test_on_topic_query_keeps_fused_results(self):
+        """Test relevant chunks still come back with cosine retrieval_score and a BM25 score"""
+        rag = self.make_hybrid_rag()
+        results = rag.retriever.retrieve("Phí thường niên thẻ Visa Platinum")
+        self.assertTrue(results)
+        self.assertIn("Visa Platinum", results[0]["content"])
+        for result in results:
+            self.assertGreaterEqual(result["retrieval_score"], 0.3)
+        self.assertGreater(results[0]["bm25_score"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import unittest
+import os
+import sys
+import tempfile
+import shutil
+from pathlib import Path
+from unittest import mock
+
+import faiss
+import numpy as np
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+
+from src.utils.config import Config
+from src.retrieval.vector_store import VectorStore
+from src.retrieval.index_factory import (
+    build_index, index_type_of, has_id_mapping, index_ids, export_vectors, search_params,
+    min_training_size, normalize_index_type
+)
+
+DIMENSION = 16
+
+
+class TestIndexFactory(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(8)
+        self.vectors = rng.normal(size=(600, DIMENSION)).astype('float32')
+        faiss.normalize_L2(self.vectors)
+        # Id không liên tục như sau khi đã xoá chunk
+        self.ids = np.arange(600, dtype='int64') * 3 + 7
+
+    def build(self, index_type: str) -> faiss.Index:
+        return build_index(index_type, DIMENSION, self.vectors, params={'nlist': 8, 'hnsw_m': 8}, ids=self.ids)
+
+    def test_build_each_type_with_external_ids(self):
+        """Test flat/IVF/HNSW are built with the requested type and answer with external ids"""
+        for index_type in ('flat', 'ivf_flat', 'hnsw'):
+            with self.subTest(index_type=index_type):
+                index = self.build(index_type)
+                self.assertEqual(index_type_of(index), index_type)
+                self.assertTrue(has_id_mapping(index))
+                self.assertEqual(index.ntotal, 600)
+                _, found = index.search(self.vectors[:5], 1, params=search_params(index, nprobe=8, ef_search=64))
+                np.testing.assert_array_equal(found[:, 0], self.ids[:5])
+
+    def test_reconstruct_round_trip(self):
+        """Test export_vectors returns every (id, vector) pair that was added"""
+        for index_type in ('flat', 'ivf_flat', 'hnsw'):
+            with self.subTest(index_type=index_type):
+                index = self.build(index_type)
+                ids, vectors = export_vectors(index)
+                order = np.argsort(ids)
+                np.testing.assert_array_equal(ids[order], self.ids)
+                np.testing.assert_allclose(vectors[order], self.vectors, atol=1e-6)
+                np.testing.assert_allclose(index.reconstruct(int(self.ids[10])), self.vectors[10], atol=1e-6)
+
+    def test_remove_ids(self):
+        """Test removed ids disappear from the index and from search results"""
+        for index_type in ('flat', 'ivf_flat'):
+            with self.subTest(index_type=index_type):
+                index = self.build(index_type)
+                removed = self.ids[:50]
+                self.assertEqual(index.remove_ids(removed), 50)
+                self.assertEqual(index.ntotal, 550)
+                self.assertEqual(set(index_ids(index).tolist()), set(self.ids[50:].tolist()))
+                _, found = index.search(self.vectors[:50], 5, params=search_params(index, nprobe=8))
+                self.assertFalse(set(found.ravel().tolist()) & set(removed.tolist()))
+
+    def test_search_params_do_not_mutate_index(self):
+        """Test per-call nprobe/efSearch leave the shared index untouched"""
+        ivf = self.build('ivf_flat')
+        faiss.extract_index_ivf(ivf).nprobe = 2
+        params = search_params(ivf, nprobe=8)
+        self.assertIsInstance(params, faiss.SearchParametersIVF)
+        full, _ = ivf.search(self.vectors[:20], 5, params=params)
+        self.assertEqual(faiss.extract_index_ivf(ivf).nprobe, 2)
+        # nprobe = nlist quét hết các list: kết quả giống Flat
+        exact, _ = self.build('flat').search(self.vectors[:20], 5)
+        np.testing.assert_allclose(full, exact, atol=1e-5)
+
+        hnsw = self.build('hnsw')
+        self.assertIsInstance(search_params(hnsw, ef_search=16), faiss.SearchParametersHNSW)
+        self.assertIsNone(search_params(self.build('flat'), nprobe=8, ef_search=16))
+
+    def test_ivf_pq_waits_for_enough_training_vectors(self):
+        """Test IVF-PQ is not selected before 39 * 2**pq_nbits vectors exist"""
+        self.assertEqual(min_training_size('ivf_pq', {'pq_nbits': 8}), 9984)
+        self.assertEqual(min_training_size('hnsw'), 0)
+        self.assertEqual(normalize_index_type('IVFPQ'), 'ivf_pq')
+
+        test_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, test_dir)
+        config = Config("nonexistent.yaml")
+        config.config['vector_store'].update({'type': 'ivf_pq', 'dimension': DIMENSION, 'pq_m': 4,
+                                              'index_path': os.path.join(test_dir, 'faiss_index')})
+        store = VectorStore(config)
+        self.assertEqual(store._target_index_type(5000), 'flat')
+        self.assertEqual(store._target_index_type(9984), 'ivf_pq')
+
+    def test_baseline_index_is_converted_once(self):
+        """Test an index saved without ids is migrated on load and written back, not converted every startup"""
+        test_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, test_dir)
+        config = Config("nonexistent.yaml")
+        config.config['vector_store'].update({'type': 'flat', 'dimension': DIMENSION,
+                                              'index_path': os.path.join(test_dir, 'faiss_index')})
+        store = VectorStore(config)
+        store.add_chunks([{"content": f"chunk {i}"} for i in range(20)], self.vectors[:20])
+        store.save_index()
+
+        # Định dạng cũ: IndexFlatIP đánh id theo vị trí
+        baseline = faiss.IndexFlatIP(DIMENSION)
+        baseline.add(self.vectors[:20])
+        faiss.write_index(baseline, f"{store.index_path}.faiss")
+
+        self.assertTrue(VectorStore(config).load_index())
+        self.assertTrue(has_id_mapping(faiss.read_index(f"{store.index_path}.faiss")))
+
+        with mock.patch('src.retrieval.vector_store.export_vectors', side_effect=AssertionError("converted again")):
+            reloaded = VectorStore(config)
+            self.assertTrue(reloaded.load_index())
+        _, found = reloaded.index.search(self.vectors[3:4], 1)
+        self.assertEqual(int(found[0, 0]), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -13,7 +13,7 @@ sys.path.append(ROOT_DIR)
 
 from src.utils.config import Config
 from src.utils.logger import setup_logger
-from src.ingestion.embedder import Embedder
+from src.ingestion.embedder import get_embedder
 from src.retrieval.vector_store import VectorStore
 
 logger = setup_logger(__name__)
@@ -64,18 +64,12 @@ def main():
 
     # Load config, embedder, vector store
     cfg = Config(args.config)
-    embedder = Embedder(cfg)
+    embedder = get_embedder(cfg)
     vs = VectorStore(cfg)
 
     # Optional reset: tạo index mới, xoá file cũ
-    index_path = cfg.get("vector_store.index_path", "D:\\rag-project\\data\\processed\\embeddings\\faiss_index")
     if args.reset:
-        vs._initialize_index()
-        vs.chunks = []
-        for ext in [".faiss", ".chunks"]:
-            p = f"{index_path}{ext}"
-            if os.path.exists(p):
-                os.remove(p)
+        vs.reset()
         logger.info("Đã reset vector store & xoá file index/chunks cũ.")
 
     # Cảnh báo mismatch dimension
@@ -0,0 +1,157 @@
+import unittest
+import os
+import sys
+import time
+import asyncio
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+import httpx
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+
+from src.generation.llm_client import GeminiLLMClient, AsyncGeminiLLMClient, LLMError
+
+
+def _config(**llm):
+    return {
+        "providers": {"gemini": {"GEMINI_API_KEY": "test-key", "GEMINI_BASE_URL": "http://llm.test/v1"}},
+        "generation": {"timeout_sec": 5},
+        "llm": {"http2": False, "backoff_base_sec": 0.01, "backoff_max_sec": 0.02, **llm},
+    }
+
+
+def _completion(text: str) -> httpx.Response:
+    return httpx.Response(200, json={"choices": [{"message": {"role": "assistant", "content": text}}]})
+
+
+class LLMClientTestCase(unittest.TestCase):
+    """GEMINI_* trong môi trường hoặc .env của máy chạy test không được ghi đè config của test"""
+
+    def setUp(self):
+        for patcher in (mock.patch.dict(os.environ, {}, clear=True),
+                        mock.patch('src.generation.llm_client.load_dotenv')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+class _SlowStream:
+    """Stream giả lập của OpenAI SDK: mỗi chunk đến sau `interval` giây"""
+
+    def __init__(self, deltas, interval):
+        self.deltas = deltas
+        self.interval = interval
+        self.closed = False
+
+    def __iter__(self):
+        for delta in self.deltas:
+            time.sleep(self.interval)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=delta))])
+
+    def close(self):
+        self.closed = True
+
+
+class TestGeminiLLMClientStream(LLMClientTestCase):
+    def _client(self, stream):
+        client = GeminiLLMClient(_config())
+        client.client = mock.Mock()
+        client.client.chat.completions.create.return_value = stream
+        return client
+
+    def test_stream_yields_deltas(self):
+        """Test that deltas pass through and the HTTP stream is closed afterwards"""
+        stream = _SlowStream(["Xin ", "chào"], 0)
+        client = self._client(stream)
+        self.assertEqual(list(client.generate_stream("câu hỏi", deadline=time.monotonic() + 5)), ["Xin ", "chào"])
+        self.assertTrue(stream.closed)
+        self.assertLessEqual(client.client.chat.completions.create.call_args.kwargs["timeout"], 5)
+
+    def test_stream_stops_at_deadline(self):
+        """Test that a slow stream is cut off with LLMError(deadline) instead of running past the request deadline"""
+        stream = _SlowStream(["a"] * 50, 0.05)
+        client = self._client(stream)
+        received = []
+        start = time.monotonic()
+        with self.assertRaises(LLMError) as ctx:
+            for delta in client.generate_stream("câu hỏi", deadline=time.monotonic() + 0.3):
+                received.append(delta)
+        self.assertEqual(ctx.exception.kind, "deadline")
+        self.assertLess(time.monotonic() - start, 1.0)
+        self.assertLess(len(received), 50)
+        self.assertTrue(stream.closed)
+
+    def test_expired_deadline_skips_call(self):
+        """Test that no LLM request is sent once the deadline has passed (e.g. spent in the queue)"""
+        client = self._client(_SlowStream(["a"], 0))
+        with self.assertRaises(LLMError):
+            next(client.generate_stream("câu hỏi", deadline=time.monotonic() - 1))
+        client.client.chat.completions.create.assert_not_called()
+
+
+class TestAsyncGeminiLLMClient(LLMClientTestCase):
+    def _client(self, handler, **llm):
+        return AsyncGeminiLLMClient(_config(**llm), transport=httpx.MockTransport(handler))
+
+    def test_retries_transient_errors(self):
+        """Test that 429/5xx are retried with backoff and the final answer is returned"""
+        statuses = [429, 503]
+
+        def handler(request):
+            assert request.headers["authorization"] == "Bearer test-key"
+            assert request.url.path == "/v1/chat/completions"
+            return httpx.Response(statuses.pop(0)) if statuses else _completion(" Xin chào ")
+
+        client = self._client(handler)
+        self.assertEqual(asyncio.run(client.agenerate("câu hỏi")), "Xin chào")
+        stats = client.get_stats()
+        self.assertEqual((stats["attempts"], stats["retries"], stats["errors"]), (3, 2, 0))
+        self.assertEqual(stats["latency"]["count"], 1)
+
+    def test_client_error_is_not_retried(self):
+        """Test that a 4xx surfaces immediately as a structured LLMError"""
+        client = self._client(lambda request: httpx.Response(400, text="bad request"))
+        with self.assertRaises(LLMError) as ctx:
+            asyncio.run(client.agenerate("câu hỏi"))
+        self.assertEqual((ctx.exception.kind, ctx.exception.status, ctx.exception.attempts), ("client", 400, 1))
+        self.assertFalse(ctx.exception.retryable)
+        self.assertEqual(client.get_stats()["errors_by_kind"], {"client": 1})
+
+    def test_deadline_bounds_slow_calls(self):
+        """Test that the per-request deadline caps the call even with retries left"""
+        async def handler(request):
+            await asyncio.sleep(1.0)
+            return _completion("quá muộn")
+
+        client = self._client(handler)
+        start = time.monotonic()
+        with self.assertRaises(LLMError) as ctx:
+            asyncio.run(client.agenerate("câu hỏi", deadline=time.monotonic() + 0.2))
+        self.assertIn(ctx.exception.kind, ("timeout", "deadline"))
+        self.assertLess(time.monotonic() - start, 0.8)
+
+    def test_hedged_request_wins(self):
+        """Test that a second request fires after the p95 latency and the faster one is used"""
+        calls = []
+
+        async def handler(request):
+            calls.append(time.monotonic())
+            await asyncio.sleep(2.0 if len(calls) == 1 else 0.0)
+            return _completion(f"answer {len(calls)}")
+
+        client = self._client(handler, hedge={"enabled": True, "min_samples": 5})
+        for _ in range(5):
+            client.attempt_latency.observe(0.05)
+
+        start = time.monotonic()
+        self.assertEqual(asyncio.run(client.agenerate("câu hỏi")), "answer 2")
+        self.assertLess(time.monotonic() - start, 1.0)
+        stats = client.get_stats()
+        self.assertEqual((stats["hedged"], stats["hedge_wins"]), (1, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
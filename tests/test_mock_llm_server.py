@@ -0,0 +1,80 @@
+import unittest
+import os
+import sys
+import json
+import asyncio
+from pathlib import Path
+from unittest import mock
+
+import httpx
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+sys.path.append(str(Path(project_root) / "scripts"))
+
+from mock_llm_server import create_app, completion_text, parse_latency
+from src.generation.llm_client import AsyncGeminiLLMClient, LLMError
+
+
+def _client(app, **llm):
+    config = {
+        "providers": {"gemini": {"GEMINI_API_KEY": "mock", "GEMINI_BASE_URL": "http://mock/v1"}},
+        "llm": {"http2": False, "backoff_base_sec": 0.001, "backoff_max_sec": 0.002, **llm},
+    }
+    return AsyncGeminiLLMClient(config, transport=httpx.ASGITransport(app=app))
+
+
+class TestMockLLMServer(unittest.TestCase):
+    def setUp(self):
+        # GEMINI_* trong môi trường hoặc .env không được ghi đè base URL của mock
+        for patcher in (mock.patch.dict(os.environ, {}, clear=True),
+                        mock.patch('src.generation.llm_client.load_dotenv')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_deterministic_completion_through_async_client(self):
+        """Test that the mock answers the same question identically via the real client"""
+        client = _client(create_app())
+        first = asyncio.run(client.agenerate("Lãi suất tiết kiệm?"))
+        second = asyncio.run(client.agenerate("Lãi suất tiết kiệm?"))
+        self.assertEqual(first, second)
+        self.assertEqual(first, completion_text([{"role": "user", "content": "Lãi suất tiết kiệm?"}]))
+
+    def test_error_rate_triggers_retries(self):
+        """Test that injected 5xx errors are retried and finally surface as LLMError"""
+        client = _client(create_app(error_rate=1.0, error_statuses=[503]), max_retries=2)
+        with self.assertRaises(LLMError) as ctx:
+            asyncio.run(client.agenerate("câu hỏi"))
+        self.assertEqual((ctx.exception.kind, ctx.exception.attempts), ("server", 3))
+
+    def test_streaming_chunks(self):
+        """Test that the SSE stream is OpenAI-shaped and reassembles into the full answer"""
+        messages = [{"role": "user", "content": "Phí thẻ Visa?"}]
+
+        async def fetch():
+            transport = httpx.ASGITransport(app=create_app(chunk_interval_ms=0, chunk_chars=5))
+            async with httpx.AsyncClient(transport=transport, base_url="http://mock") as http:
+                response = await http.post("/v1/chat/completions", json={"messages": messages, "stream": True})
+                return response.text
+
+        events = [line[len("data: "):] for line in asyncio.run(fetch()).splitlines() if line.startswith("data: ")]
+        self.assertEqual(events[-1], "[DONE]")
+        chunks = [json.loads(e) for e in events[:-1]]
+        text = "".join(c["choices"][0]["delta"].get("content", "") for c in chunks)
+        self.assertEqual(text, completion_text(messages))
+        self.assertEqual(chunks[-1]["choices"][0]["finish_reason"], "stop")
+
+    def test_latency_specs(self):
+        """Test the latency distribution parser"""
+        import random
+        rng = random.Random(1)
+        self.assertEqual(parse_latency("fixed:0.3")(rng), 0.3)
+        self.assertTrue(0.1 <= parse_latency("uniform:0.1,0.2")(rng) <= 0.2)
+        self.assertGreater(parse_latency("lognormal:0.5,0.2")(rng), 0)
+        with self.assertRaises(ValueError):
+            parse_latency("pareto:1")
+
+
+if __name__ == '__main__':
+    unittest.main()
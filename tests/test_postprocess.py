@@ -0,0 +1,79 @@
+import unittest
+import sys
+from pathlib import Path
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+
+from src.generation import postprocess
+from src.utils.tracing import tracer
+
+# (raw LLM output, response sau toàn bộ pipeline, nội dung stream sau clean_stream)
+GOLDEN = [
+    (
+        'Dựa trên thông tin được cung cấp, BIDV có các loại thẻ sau:\n\n* **Thẻ ghi nợ**: rút tiền , thanh toán.\n*   Thẻ tín dụng:hạn mức linh hoạt\n\n\n\nQuý khách hàng có thể đăng ký tại quầy. Quý khách hàng cũng có thể đăng ký online',
+        'BIDV có các loại thẻ sau:\nThẻ ghi nợ: rút tiền, thanh toán.\n- Thẻ tín dụng:hạn mức linh hoạt\nQuý khách hàng có thể đăng ký tại quầy. bạn cũng có thể đăng ký online.',
+        'Dựa trên thông tin được cung cấp, BIDV có các loại thẻ sau:\nThẻ ghi nợ: rút tiền, thanh toán.\n- Thẻ tín dụng:hạn mức linh hoạt\nQuý khách hàng có thể đăng ký tại quầy. Quý khách hàng cũng có thể đăng ký online'
+    ),
+    (
+        'Lãi suất kỳ hạn 12 tháng là 4,8%/năm. Thông tin về kỳ hạn 24 tháng không được cung cấp đầy đủ trong tài liệu. Quý khách hàng lưu ý lãi suất có thể thay đổi',
+        'Lãi suất kỳ hạn 12 tháng là 4,8%/năm. Quý khách vui lòng liên hệ chi nhánh để được tư vấn chi tiết. bạn lưu ý lãi suất có thể thay đổi.',
+        'Lãi suất kỳ hạn 12 tháng là 4,8%/năm. Thông tin về kỳ hạn 24 tháng không được cung cấp đầy đủ trong tài liệu. Quý khách hàng lưu ý lãi suất có thể thay đổi'
+    ),
+    (
+        'Phí rút tiền ATM nội mạng là 1.100 VNĐ/giao dịch.\nCâu hỏi: Phí rút tiền ngoại mạng là bao nhiêu?\na) 3.300 VNĐ\nb) 5.500 VNĐ\nHãy chọn đáp án đúng\nWhat is the fee?',
+        'Phí rút tiền ATM nội mạng là 1.100 VNĐ/giao dịch.',
+        'Phí rút tiền ATM nội mạng là 1.100 VNĐ/giao dịch.\n'
+    ),
+    (
+        '**Thời gian làm việc**\n-   \nThứ 2 - Thứ 6 :  8h00 - 17h00\n- Thứ 7 :8h00 - 12h00\n\n\nTheo thông tin từ tài liệu, chủ nhật nghỉ',
+        'Thời gian làm việc\nThứ 2 - Thứ 6: 8h00 - 17h00\n- Thứ 7:8h00 - 12h00\nchủ nhật nghỉ.',
+        'Thời gian làm việc\nThứ 2 - Thứ 6: 8h00 - 17h00\n- Thứ 7:8h00 - 12h00\nTheo thông tin từ tài liệu, chủ nhật nghỉ'
+    ),
+    (
+        'Xin chào! Tôi có thể giúp gì cho quý khách?',
+        'Xin chào! Tôi có thể giúp gì cho quý khách?',
+        ''
+    ),
+    (
+        'Để vay mua nhà , quý khách hàng cần chuẩn bị:\n1. CMND/CCCD\n2. Giấy tờ chứng minh thu nhập\t\t(bảng lương)\nThủ tục như thế nào? Liên hệ chi nhánh:',
+        'Để vay mua nhà, quý khách hàng cần chuẩn bị:\n1. CMND/CCCD\n2. Giấy tờ chứng minh thu nhập (bảng lương)',
+        'Để vay mua nhà, quý khách hàng cần chuẩn bị:\n1. CMND/CCCD\n2. Giấy tờ chứng minh thu nhập (bảng lương)\n'
+    ),
+
+]
+
+
+class TestPostprocess(unittest.TestCase):
+    def test_golden_responses(self):
+        """Test the full pipeline against recorded outputs"""
+        for raw, expected, _ in GOLDEN:
+            cleaned = postprocess.clean_response(raw) if postprocess.should_clean(raw) else raw
+            self.assertEqual(cleaned, expected, raw)
+
+    def test_golden_stream(self):
+        """Test incremental line cleaning gives the same text however the deltas are cut"""
+        for raw, _, expected in GOLDEN:
+            for size in (1, 7, 64, len(raw)):
+                deltas = [raw[i:i + size] for i in range(0, len(raw), size)]
+                self.assertEqual("".join(postprocess.clean_stream(deltas)), expected, (raw, size))
+
+    def test_question_lines(self):
+        """Test the fused question/option detection"""
+        for line in ("Lãi suất là gì? Xem bên dưới", "Hãy chọn đáp án", "why not", "Phí bao nhiêu?"):
+            self.assertTrue(postprocess.is_question_line(line), line)
+        self.assertEqual(postprocess.remove_generated_questions("a) 3.300 VNĐ\nB. 5.500\nwhatever it is"),
+                         "whatever it is")
+        self.assertFalse(postprocess.is_question_line("Whatever the rate, liên hệ BIDV"))
+
+    def test_step_timings(self):
+        """Test that each pipeline step is timed under its own span"""
+        postprocess.clean_response(GOLDEN[0][0])
+        stages = tracer.get_stats()["stages"]
+        for name, _ in postprocess.STEPS:
+            self.assertIn(f"generate.postprocess.{name}", stages)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+import sys
+from pathlib import Path
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+
+from src.generation.prompt_template import (
+    PromptTemplate, prepare_context, clean_context, CONTEXT_CLEAN_FIELD, CONTEXT_TOKENS_FIELD
+)
+
+CONTEXTS = [
+    "Lãi suất tiền gửi tiết kiệm kỳ hạn 12 tháng tại BIDV là 4,8%/năm [1], áp dụng cho khách hàng cá nhân.",
+    "Lãi suất tiền gửi tiết kiệm kỳ hạn 12 tháng tại BIDV là 4,8%/năm, áp dụng cho khách hàng cá nhân (2).",
+    "Phí rút tiền mặt tại ATM nội mạng BIDV là 1.100 VNĐ cho mỗi giao dịch thành công.",
+    "ngắn",
+    "Khách hàng vay mua nhà cần chuẩn bị CCCD, giấy tờ chứng minh thu nhập và hồ sơ tài sản bảo đảm.",
+    "Giờ làm việc của các chi nhánh BIDV từ thứ Hai đến thứ Sáu, sáng 8h00 - 12h00, chiều 13h00 - 17h00.",
+]
+
+
+class TestPromptTemplate(unittest.TestCase):
+    def setUp(self):
+        self.template = PromptTemplate()
+
+    def test_prepare_context(self):
+        """Test ingest-time precompute stores the cleaned text and sorted token set"""
+        chunk = prepare_context({"content": CONTEXTS[0]}, CONTEXTS[0])
+        self.assertEqual(chunk[CONTEXT_CLEAN_FIELD], clean_context(CONTEXTS[0]))
+        self.assertNotIn("[1]", chunk[CONTEXT_CLEAN_FIELD])
+        tokens = chunk[CONTEXT_TOKENS_FIELD]
+        self.assertEqual(tokens, sorted(set(tokens)))
+        self.assertIn("bidv", tokens)
+        self.assertNotIn("tại", tokens)  # stopword
+
+    def test_dedup_drops_near_duplicates(self):
+        """Test near-duplicate and too-short contexts are skipped, keeping at most 3"""
+        optimized = self.template._optimize_context(CONTEXTS)
+        self.assertEqual(len(optimized), 3)
+        self.assertTrue(optimized[0].startswith("Lãi suất"))
+        self.assertTrue(optimized[1].startswith("Phí rút tiền"))
+        self.assertTrue(optimized[2].startswith("Khách hàng vay"))
+
+    def test_prepared_chunks_match_raw_text(self):
+        """Test chunks with precomputed fields build exactly the same messages as raw text"""
+        prepared = [prepare_context({"content": text}, text) for text in CONTEXTS]
+        query = "Lãi suất tiết kiệm 12 tháng là bao nhiêu?"
+        self.assertEqual(self.template.build_messages(query, prepared),
+                         self.template.build_messages(query, CONTEXTS))
+        mixed = [prepared[0], CONTEXTS[1], prepared[2], CONTEXTS[4]]
+        self.assertEqual(self.template.build_messages(query, mixed),
+                         self.template.build_messages(query, CONTEXTS[:2] + [CONTEXTS[2], CONTEXTS[4]]))
+
+    def test_chunks_without_precomputed_fields(self):
+        """Test chunks indexed before ingest-time precompute are cleaned from their text instead of failing"""
+        query = "Lãi suất tiết kiệm 12 tháng là bao nhiêu?"
+        legacy = [{"type": "text", "content": text, "metadata": {"page": 1}} for text in CONTEXTS]
+        self.assertEqual(self.template.build_messages(query, legacy),
+                         self.template.build_messages(query, CONTEXTS))
+
+        table = {"type": "table", "title": "Biểu phí thẻ", "columns": ["Loại thẻ", "Phí thường niên"],
+                 "rows": [["Visa Platinum", "1.000.000 VND"]]}
+        user = self.template.build_messages("Phí thường niên thẻ Visa Platinum?", [table])[1]["content"]
+        self.assertIn("[Nguồn 1]: Bảng: Biểu phí thẻ", user)
+        self.assertIn("Visa Platinum | 1.000.000 VND", user)
+
+    def test_max_input_contexts(self):
+        """Test contexts beyond the first five are considered when max_input_contexts is raised"""
+        contexts = [CONTEXTS[0]] * 5 + [CONTEXTS[2]]
+        self.assertEqual(len(self.template._optimize_context(contexts)), 1)
+        wide = PromptTemplate(max_input_contexts=20, max_contexts=4)
+        self.assertEqual(len(wide._optimize_context(contexts)), 2)
+        self.assertEqual(len(wide._optimize_context(CONTEXTS)), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import unittest
+import os
+import sys
+import time
+import asyncio
+import tempfile
+import shutil
+import unittest.mock
+from pathlib import Path
+
+import numpy as np
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+sys.path.append(str(Path(__file__).parent))
+
+from src.utils.config import Config
+from src.utils.concurrency import TokenBucket
+from src.retrieval.vector_store import VectorStore
+from test_rag_ingestion import RAGIngestionTestCase, POLICY
+
+
+class TestQueryBatch(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_batched_search_matches_single_searches(self):
+        """Test that one search over the query matrix equals one search per query"""
+        config = Config("nonexistent.yaml")
+        config.config['vector_store']['index_path'] = os.path.join(self.test_dir, "faiss_index")
+        config.config['vector_store']['dimension'] = 16
+        rng = np.random.default_rng(3)
+
+        vs = VectorStore(config)
+        chunks = [{"type": "text", "title": f"Chunk {i}", "content": f"nội dung {i}"} for i in range(50)]
+        vs.add_chunks(chunks, rng.normal(size=(50, 16)).astype('float32'))
+        queries = rng.normal(size=(7, 16)).astype('float32')
+        original = queries.copy()
+
+        batched = vs.search_ids_batch(queries, top_k=5)
+        self.assertEqual(len(batched), 7)
+        for query, hits in zip(queries, batched):
+            single = vs.search_ids(query, top_k=5)
+            self.assertEqual([i for i, _ in hits], [i for i, _ in single])
+            np.testing.assert_allclose([s for _, s in hits], [s for _, s in single], rtol=1e-5)
+        # Không chuẩn hoá tại chỗ ma trận của caller
+        np.testing.assert_array_equal(queries, original)
+
+    def test_token_bucket_rate(self):
+        """Test that the bucket allows a burst, then spaces requests at `rate` per second"""
+        bucket = TokenBucket(rate=50, burst=2)
+        start = time.perf_counter()
+        for _ in range(6):
+            bucket.acquire()
+        elapsed = time.perf_counter() - start
+        self.assertGreaterEqual(elapsed, 4 / 50 * 0.9)  # 2 token có sẵn, 4 token chờ 20ms mỗi token
+
+        async def take(n):
+            for _ in range(n):
+                await bucket.aacquire()
+
+        start = time.perf_counter()
+        asyncio.run(take(3))
+        self.assertGreaterEqual(time.perf_counter() - start, 2 / 50 * 0.9)
+
+    def test_unlimited_bucket(self):
+        """Test that rate <= 0 disables limiting"""
+        bucket = TokenBucket(rate=0)
+        start = time.perf_counter()
+        for _ in range(1000):
+            bucket.acquire()
+        self.assertLess(time.perf_counter() - start, 0.5)
+
+
+
+class TestRAGQueryBatch(RAGIngestionTestCase):
+    def make_batch_rag(self, **overrides):
+        rag = self.make_rag(**overrides)
+        rag.ingest_multiple_documents([self.write_file("policy.txt", POLICY)])
+        return rag
+
+    def test_fan_out_capped_by_max_concurrent_queries(self):
+        """Test that a batch never runs more LLM calls than api.max_concurrent_queries"""
+        rag = self.make_batch_rag(api__max_concurrent_queries=2, query_batch__max_concurrency=8,
+                                  query_batch__rate_limit_per_sec=0)
+        self.assertEqual(rag.batch_concurrency, 2)
+
+        running, peak = [0], [0]
+
+        async def agenerate(messages, language="vi", deadline=None):
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+            await asyncio.sleep(0.02)
+            running[0] -= 1
+            return "Phí thường niên là 1.000.000 VND."
+
+        async def collect():
+            questions = [f"Phí thường niên thẻ Visa {i}?" for i in range(6)]
+            return [item async for item in rag.aquery_batch(questions)]
+
+        with unittest.mock.patch.object(rag.response_generator.async_llm_client, 'agenerate', side_effect=agenerate):
+            items = asyncio.run(collect())
+        self.assertEqual([item["status"] for item in items], ["success"] * 6)
+        self.assertEqual(peak[0], 2)
+
+    def test_rate_limit_shared_across_batches(self):
+        """Test that consecutive batches draw from one token bucket instead of a fresh burst each"""
+        rag = self.make_batch_rag(query_batch__rate_limit_per_sec=20)
+        bucket = rag.batch_bucket
+
+        with unittest.mock.patch.object(rag.response_generator.llm_client, 'generate',
+                                        return_value="Phí thường niên là 1.000.000 VND."):
+            start = time.perf_counter()
+            for batch in range(3):
+                questions = [f"Lãi suất thẻ tín dụng {batch}-{i}?" for i in range(20)]
+                self.assertEqual(len(list(rag.query_batch(questions))), 20)
+            elapsed = time.perf_counter() - start
+
+        self.assertIs(rag.batch_bucket, bucket)
+        self.assertEqual(bucket.waited.count, 60)
+        # burst 20 token có sẵn, 40 lời gọi còn lại phải chờ ở 20/giây
+        self.assertGreaterEqual(elapsed, 40 / 20 * 0.9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+import unittest
+import sys
+import time
+import threading
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+sys.path.append(str(Path(__file__).parent))
+
+from src.utils.config import Config
+from src.retrieval.query_cache import QueryCache
+from test_rag_ingestion import RAGIngestionTestCase, POLICY
+
+
+def make_cache(**cache) -> QueryCache:
+    config = Config("nonexistent.yaml")
+    config.config['cache'] = cache
+    return QueryCache(config)
+
+
+def unit(*values) -> np.ndarray:
+    vec = np.asarray(values, dtype='float32')
+    return vec / np.linalg.norm(vec)
+
+
+class TestQueryCache(unittest.TestCase):
+    def test_exact_hit_normalizes_question(self):
+        """Test that case and whitespace differences still hit the exact tier"""
+        cache = make_cache()
+        cache.put("Phí thường niên  thẻ Visa?", None, {"response": "1.000.000 VND"})
+        self.assertEqual(cache.get("phí thường niên thẻ visa?"), {"response": "1.000.000 VND"})
+        self.assertIsNone(cache.get("Phí rút tiền mặt?"))
+        self.assertEqual(cache.get_stats()["exact_hits"], 1)
+
+    def test_semantic_tier_off_by_default(self):
+        """Test that a near-duplicate embedding is not served unless the semantic tier is enabled"""
+        cache = make_cache()
+        cache.put("Phí thẻ Visa", unit(1, 0, 0), {"response": "a"})
+        self.assertIsNone(cache.get_semantic(unit(1, 0.01, 0)))
+        self.assertEqual(cache.get_stats()["misses"], 1)
+
+    def test_semantic_hit(self):
+        """Test that the semantic tier returns the closest entry above the threshold only"""
+        cache = make_cache(semantic={'enabled': True, 'threshold': 0.95})
+        cache.put("Phí thẻ Visa", unit(1, 0, 0), {"response": "visa"})
+        cache.put("Lãi suất tiết kiệm", unit(0, 1, 0), {"response": "lãi suất"})
+
+        self.assertEqual(cache.get_semantic(unit(1, 0.05, 0)), {"response": "visa"})
+        self.assertIsNone(cache.get_semantic(unit(1, 1, 0)))  # cosine ~0.71
+        self.assertIsNone(cache.get_semantic(np.zeros(3, dtype='float32')))
+        stats = cache.get_stats()
+        self.assertEqual((stats["semantic_hits"], stats["misses"]), (1, 2))
+
+    def test_ttl_expiry(self):
+        """Test that entries older than ttl_sec are dropped on lookup"""
+        cache = make_cache(ttl_sec=10, semantic={'enabled': True})
+        with mock.patch('src.retrieval.query_cache.time.time', return_value=1000.0):
+            cache.put("Phí thẻ Visa", unit(1, 0), {"response": "a"})
+        with mock.patch('src.retrieval.query_cache.time.time', return_value=1005.0):
+            self.assertIsNotNone(cache.get("Phí thẻ Visa"))
+        with mock.patch('src.retrieval.query_cache.time.time', return_value=1011.0):
+            self.assertIsNone(cache.get("Phí thẻ Visa"))
+            self.assertIsNone(cache.get_semantic(unit(1, 0)))
+        self.assertEqual(cache.get_stats()["expirations"], 1)
+        self.assertEqual(cache.get_stats()["size"], 0)
+
+    def test_lru_eviction_reuses_semantic_slots(self):
+        """Test that the least recently used entry is evicted and its embedding slot freed"""
+        cache = make_cache(max_entries=2, semantic={'enabled': True})
+        cache.put("a", unit(1, 0, 0), {"response": "a"})
+        cache.put("b", unit(0, 1, 0), {"response": "b"})
+        cache.get("a")  # "b" giờ là LRU
+        cache.put("c", unit(0, 0, 1), {"response": "c"})
+
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNone(cache.get_semantic(unit(0, 1, 0)))
+        self.assertEqual(cache.get("a"), {"response": "a"})
+        self.assertEqual(cache.get_semantic(unit(0, 0, 1)), {"response": "c"})
+        self.assertEqual(cache.get_stats()["evictions"], 1)
+
+    def test_invalidate_drops_entries_and_stale_puts(self):
+        """Test invalidate() clears both tiers and rejects results computed before it"""
+        cache = make_cache(semantic={'enabled': True})
+        cache.put("a", unit(1, 0), {"response": "a"})
+        generation = cache.generation  # lấy trước khi retrieve, như RAGSystem
+
+        cache.invalidate()
+        self.assertIsNone(cache.get("a"))
+        self.assertIsNone(cache.get_semantic(unit(1, 0)))
+
+        # Kết quả tính trên index cũ về sau invalidate() → bị bỏ
+        cache.put("b", unit(0, 1), {"response": "cũ"}, generation=generation)
+        self.assertIsNone(cache.get("b"))
+        cache.put("b", unit(0, 1), {"response": "mới"}, generation=cache.generation)
+        self.assertEqual(cache.get("b"), {"response": "mới"})
+
+    def test_concurrent_get_and_invalidate(self):
+        """Test semantic lookups racing invalidate() never raise"""
+        cache = make_cache(max_entries=64, semantic={'enabled': True})
+        rng = np.random.default_rng(5)
+        vectors = rng.normal(size=(64, 16)).astype('float32')
+        errors = []
+        stop = threading.Event()
+
+        def reader():
+            try:
+                while not stop.is_set():
+                    for vec in vectors[:8]:
+                        cache.get_semantic(vec)
+                        cache.get("q0")
+            except Exception as e:  # noqa: BLE001 - lỗi bất kỳ là test fail
+                errors.append(e)
+
+        def writer():
+            try:
+                while not stop.is_set():
+                    generation = cache.generation
+                    for i, vec in enumerate(vectors[:8]):
+                        cache.put(f"q{i}", vec, {"response": i}, generation=generation)
+                    cache.invalidate()
+            except Exception as e:  # noqa: BLE001
+                errors.append(e)
+
+        threads = [threading.Thread(target=reader) for _ in range(3)] + [threading.Thread(target=writer)]
+        for t in threads:
+            t.start()
+        time.sleep(0.5)
+        stop.set()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(errors, [])
+        self.assertGreater(cache.get_stats()["invalidations"], 0)
+
+
+
+class TestRAGQueryCache(RAGIngestionTestCase):
+    def make_query_rag(self):
+        rag = self.make_rag()
+        rag.ingest_multiple_documents([self.write_file("policy.txt", POLICY)])
+        return rag
+
+    def test_fallback_answer_is_not_cached(self):
+        """Test the apology returned when the LLM fails is flagged and never stored in the cache"""
+        rag = self.make_query_rag()
+        llm = rag.response_generator.llm_client
+        question = "Phí thường niên thẻ Visa Platinum?"
+
+        with mock.patch.object(llm, 'client') as client:
+            client.chat.completions.create.side_effect = RuntimeError("upstream down")
+            result = rag.query(question)
+            events = list(rag.query_stream(question))
+        self.assertEqual(result["cache"], None)
+        self.assertEqual(events[-1]["event"], "done")
+        self.assertTrue(events[-1]["metadata"]["fallback"])
+        self.assertEqual(rag.query_cache.get_stats()["size"], 0)
+
+        with mock.patch.object(llm, 'generate', return_value="Phí thường niên là 1.000.000 VND.") as generate:
+            self.assertIsNone(rag.query(question)["cache"])
+            self.assertEqual(rag.query(question)["cache"], "exact")
+        generate.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
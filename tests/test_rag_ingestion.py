@@ -0,0 +1,259 @@
+import unittest
+import os
+import sys
+import json
+import uuid
+import zlib
+import tempfile
+import shutil
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import yaml
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+
+from src.rag_system import RAGSystem
+from src.ingestion.manifest import chunk_hash
+from src.retrieval.vector_store import VectorStore
+
+DIMENSION = 64
+
+
+class HashingBackend:
+    """Embedding backend giả lập: bag-of-words băm vào DIMENSION chiều (không cần tải model)"""
+
+    dimension = DIMENSION
+
+    def __init__(self):
+        self.encoded = []
+        self.fail_after = None
+
+    def encode(self, texts, batch_size, show_progress_bar):
+        if self.fail_after is not None and len(self.encoded) >= self.fail_after:
+            raise RuntimeError("embedding backend failed")
+        self.encoded.extend(texts)
+        vectors = np.zeros((len(texts), DIMENSION), dtype='float32')
+        for row, text in zip(vectors, texts):
+            for word in text.lower().split():
+                row[zlib.crc32(word.encode('utf-8')) % DIMENSION] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def memory_bytes(self):
+        return 0
+
+
+def write_config(test_dir: str, **overrides) -> str:
+    config = {
+        'models': {'embedding_model': f'test/hashing-{uuid.uuid4().hex}', 'embedding_backend': 'torch'},
+        'chunking': {'max_tokens': 12, 'overlap': 0},
+        'retrieval': {'top_k': 3, 'score_threshold': 0.1, 'rerank': {'enabled': False}},
+        'vector_store': {'type': 'flat', 'dimension': DIMENSION,
+                         'index_path': os.path.join(test_dir, 'embeddings', 'faiss_index')},
+        'embedding': {'cache': {'enabled': False}},
+        'ingestion': {'embed_batch_size': 2, 'workers': 1},
+        'providers': {'gemini': {'GEMINI_API_KEY': 'test-key', 'GEMINI_BASE_URL': 'http://localhost:9/v1'}},
+    }
+    for key, value in overrides.items():
+        section, name = key.split('__')
+        config.setdefault(section, {})[name] = value
+    path = os.path.join(test_dir, 'config.yaml')
+    with open(path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump(config, f, allow_unicode=True)
+    return path
+
+
+class RAGIngestionTestCase(unittest.TestCase):
+    """RAGSystem thật với embedding backend giả lập, chạy trong thư mục tạm"""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        # _save_chunks ghi vào data/processed/chunks tương đối với cwd
+        os.chdir(self.test_dir)
+        self.backend = HashingBackend()
+        for patcher in (mock.patch('src.ingestion.embedder.create_backend', return_value=self.backend),
+                        mock.patch.dict(os.environ, {'GEMINI_API_KEY': 'test-key'})):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.test_dir)
+
+    def make_rag(self, **overrides) -> RAGSystem:
+        return RAGSystem(write_config(self.test_dir, **overrides))
+
+    def write_file(self, name: str, text: str) -> str:
+        path = os.path.join(self.test_dir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    @staticmethod
+    def live_contents(rag: RAGSystem) -> list:
+        chunks = rag.retriever.vector_store.chunks
+        return [chunks[i]['content'] for i in range(len(chunks)) if not chunks.is_deleted(i)]
+
+
+POLICY = ("Phí thường niên thẻ Visa Platinum là 1.000.000 VND. Miễn phí năm đầu cho khách hàng mới. "
+          "Hạn mức tín dụng tối đa 500 triệu đồng. Lãi suất thẻ tín dụng là 18% mỗi năm. "
+          "Thời gian miễn lãi tối đa 45 ngày. Phí rút tiền mặt là 4% số tiền giao dịch.\n")
+
+
+class TestStreamingIngestion(RAGIngestionTestCase):
+    def test_pipeline_streams_txt_without_loading_whole_file(self):
+        """Test multi-file ingestion streams TXT files instead of calling load_document"""
+        paths = [self.write_file("a.txt", POLICY), self.write_file("b.txt", POLICY.replace("Visa", "Master"))]
+        rag = self.make_rag(ingestion__workers=2)
+        with mock.patch.object(rag.document_loader, 'load_document', side_effect=AssertionError("loaded whole file")):
+            results = rag.ingest_multiple_documents(paths)
+
+        self.assertTrue(all('error' not in r for r in results), results)
+        self.assertTrue(all(r['chunks_created'] > 0 for r in results))
+        self.assertEqual(rag.last_ingestion_stats['processed'], 2)
+        self.assertTrue(os.path.exists(os.path.join("data", "processed", "chunks", "a_chunks.json")))
+
+        reloaded = self.make_rag()
+        self.assertEqual(sorted(self.live_contents(reloaded)), sorted(self.live_contents(rag)))
+
+    def test_failed_stream_rolls_back_flushed_batches(self):
+        """Test an embedding failure mid-file leaves no chunk records behind"""
+        first = self.write_file("a.txt", POLICY)
+        second = self.write_file("b.txt", POLICY.replace("Visa", "Master") * 3)
+        rag = self.make_rag()
+        rag.ingest_multiple_documents([first])
+        vector_store = rag.retriever.vector_store
+        committed = len(vector_store.chunks)
+
+        self.backend.fail_after = len(self.backend.encoded) + 2  # batch thứ hai của file b lỗi
+        results = rag.ingest_multiple_documents([second])
+        self.assertIn('error', results[0])
+        self.assertEqual(len(vector_store.chunks), committed)
+        self.assertEqual(vector_store.index.ntotal, committed)
+        self.assertIsNone(rag.manifest.get(second))
+
+        reloaded = self.make_rag()
+        self.assertEqual(len(reloaded.retriever.vector_store.chunks), committed)
+
+    def test_load_drops_orphan_records_after_crash(self):
+        """Test records flushed to the chunk store but never committed to FAISS are dropped on load"""
+        rag = self.make_rag()
+        rag.ingest_multiple_documents([self.write_file("a.txt", POLICY)])
+        vector_store = rag.retriever.vector_store
+        committed = len(vector_store.chunks)
+
+        # Giả lập crash: batch đã flush vào chunk store nhưng FAISS/manifest chưa lưu
+        orphan = rag.embedder.embed_chunks([{"type": "text", "title": "x", "content": "Phí chuyển tiền liên ngân hàng",
+                                             "metadata": {}}])
+        vector_store.add_chunks(orphan)
+        vector_store.chunks.flush()
+
+        reloaded = VectorStore(rag.config)
+        self.assertTrue(reloaded.load_index())
+        self.assertEqual(len(reloaded.chunks), committed)
+        self.assertEqual(reloaded.chunks.live_count(), reloaded.index.ntotal)
+        self.assertEqual(len(reloaded.bm25), reloaded.index.ntotal)
+
+
+
+class TestIngestionPipeline(RAGIngestionTestCase):
+    def test_parallel_parse_with_one_failing_file(self):
+        """Test two TXT files parsed by the process pool plus one corrupt file: per-file results, one save"""
+        paths = [self.write_file("a.txt", POLICY),
+                 self.write_file("broken.docx", "không phải file docx"),
+                 self.write_file("b.txt", POLICY.replace("Visa", "Master"))]
+        # Tắt streaming để file TXT đi qua ProcessPool ở stage parse
+        rag = self.make_rag(ingestion__workers=2, ingestion__streaming=False)
+        vector_store = rag.retriever.vector_store
+        with mock.patch.object(vector_store, 'save_index', wraps=vector_store.save_index) as save_index, \
+                mock.patch.object(rag, '_ingest_document_stream', side_effect=AssertionError("streamed")):
+            results = rag.ingest_multiple_documents(paths)
+
+        self.assertEqual([r['file_path'] for r in results], paths)
+        self.assertIn('error', results[1])
+        for result in (results[0], results[2]):
+            self.assertNotIn('error', result)
+            self.assertGreater(result['chunks_created'], 0)
+        save_index.assert_called_once()
+
+        stats = rag.last_ingestion_stats
+        self.assertEqual((stats['files'], stats['processed'], stats['failed'], stats['workers']), (3, 2, 1, 2))
+        self.assertEqual(stats['chunks_embedded'], results[0]['chunks_created'] + results[2]['chunks_created'])
+        self.assertEqual(vector_store.index.ntotal, stats['chunks_embedded'])
+        self.assertIsNotNone(rag.manifest.get(paths[0]))
+        self.assertIsNone(rag.manifest.get(paths[1]))
+
+        # Chạy lại: file đã ingest được bỏ qua, file lỗi thử lại và vẫn lỗi, không save index
+        with mock.patch.object(vector_store, 'save_index', wraps=vector_store.save_index) as save_index:
+            results = rag.ingest_multiple_documents(paths)
+        self.assertTrue(results[0]['skipped'] and results[2]['skipped'])
+        self.assertIn('error', results[1])
+        save_index.assert_not_called()
+
+
+
+class TestIncrementalIngestion(RAGIngestionTestCase):
+    def test_reingest_edited_file_embeds_only_changed_chunks(self):
+        """Test editing one sentence re-embeds only that chunk and removes the old version"""
+        path = self.write_file("policy.txt", POLICY)
+        rag = self.make_rag()
+        first = rag.ingest_multiple_documents([path])[0]
+        encoded_before = len(self.backend.encoded)
+        live_before = rag.retriever.vector_store.chunks.live_count()
+
+        self.write_file("policy.txt", POLICY.replace("18% mỗi năm", "20% mỗi năm"))
+        result = rag.ingest_multiple_documents([path])[0]
+
+        self.assertEqual((result['chunks_created'], result['chunks_removed']), (1, 1))
+        self.assertEqual(result['chunks_unchanged'], first['chunks_created'] - 1)
+        new_texts = self.backend.encoded[encoded_before:]
+        self.assertEqual(len(new_texts), 1)
+        self.assertIn("20% mỗi năm", new_texts[0])
+
+        contents = self.live_contents(rag)
+        self.assertEqual(len(contents), live_before)
+        self.assertTrue(any("20% mỗi năm" in c for c in contents))
+        self.assertFalse(any("18% mỗi năm" in c for c in contents))
+        self.assertEqual(rag.retriever.vector_store.index.ntotal, live_before)
+
+        # Reload từ đĩa thấy đúng trạng thái sau khi sửa
+        self.assertEqual(sorted(self.live_contents(self.make_rag())), sorted(contents))
+
+    def test_v1_manifest_is_rebuilt_without_reembedding(self):
+        """Test an old-version manifest falls back to the chunk store and keeps every chunk"""
+        path = self.write_file("policy.txt", POLICY)
+        rag = self.make_rag()
+        rag.ingest_multiple_documents([path])
+        encoded_before = len(self.backend.encoded)
+
+        manifest_path = rag.manifest.path
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        data['version'] = 1
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+
+        reloaded = self.make_rag()
+        self.assertIsNone(reloaded.manifest.get(path))
+        result = reloaded.ingest_multiple_documents([path])[0]
+        self.assertEqual((result['chunks_created'], result['chunks_removed']), (0, 0))
+        self.assertEqual(len(self.backend.encoded), encoded_before)
+        self.assertIsNotNone(reloaded.manifest.get(path))
+
+    def test_chunk_hash_covers_displayed_metadata(self):
+        """Test page/title changes alter the chunk hash while bookkeeping metadata does not"""
+        chunk = {"type": "text", "content": "Phí thường niên", "metadata": {"title": "Thẻ", "page": 1, "chunk_id": 0}}
+        same = {**chunk, "metadata": {**chunk["metadata"], "chunk_id": 7, "file_path": "/tmp/a.pdf"}}
+        self.assertEqual(chunk_hash(chunk), chunk_hash(same))
+        for field, value in (("title", "Thẻ tín dụng"), ("page", 2)):
+            moved = {**chunk, "metadata": {**chunk["metadata"], field: value}}
+            self.assertNotEqual(chunk_hash(chunk), chunk_hash(moved), field)
+
+
+if __name__ == '__main__':
+    unittest.main()
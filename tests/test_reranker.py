@@ -0,0 +1,124 @@
+import unittest
+import sys
+from pathlib import Path
+from unittest import mock
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+sys.path.append(str(Path(__file__).parent))
+
+from src.utils.config import Config
+from src.retrieval.reranker import Reranker
+from test_rag_ingestion import RAGIngestionTestCase, POLICY
+
+
+class KeywordCrossEncoder:
+    """Deterministic cross-encoder stand-in: score = số từ của query có trong chunk"""
+
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, pairs, batch_size=32, show_progress_bar=False):
+        self.calls.append((len(pairs), batch_size))
+        return [float(sum(w in text.lower() for w in query.lower().split())) for query, text in pairs]
+
+
+class TestReranker(unittest.TestCase):
+    def setUp(self):
+        config = Config("nonexistent.yaml")
+        config.config['retrieval']['rerank'] = {'enabled': True, 'budget_ms': 50}
+        self.reranker = Reranker(config)
+        self.model = KeywordCrossEncoder()
+        self.reranker._model = self.model
+        self.candidates = [
+            {"vector_id": 0, "title": "Tiết kiệm", "content": "Lãi suất tiết kiệm 12 tháng", "retrieval_score": 0.9},
+            {"vector_id": 1, "title": "Thẻ", "content": "Phí thường niên thẻ Visa Platinum", "retrieval_score": 0.8},
+            {"vector_id": 2, "title": "Vay", "content": "Vay mua nhà lãi suất ưu đãi", "retrieval_score": 0.7},
+        ]
+
+    def test_legacy_distance_filter_without_query(self):
+        """Test that rerank() without a query keeps only results under the distance threshold"""
+        reranker = Reranker(threshold=0.5)
+        results = reranker.rerank([{"distance": 0.3}, {"distance": 0.6}, {"distance": 0.4}])
+        self.assertEqual([r["distance"] for r in results], [0.3, 0.4])
+
+    def test_rerank_single_batch_and_cache(self):
+        """Test that all pairs are scored in one forward pass and cached per (query, chunk_id)"""
+        results = self.reranker.rerank(self.candidates, query="phí thẻ visa platinum", top_k=2)
+        self.assertEqual(results[0]["vector_id"], 1)
+        self.assertEqual(len(results), 2)
+        self.assertEqual(self.model.calls, [(3, 3)])
+
+        # Cùng query (khác hoa/thường, khoảng trắng) → toàn bộ lấy từ cache
+        self.reranker.rerank(self.candidates, query="Phí  thẻ Visa Platinum", top_k=2)
+        self.assertEqual(len(self.model.calls), 1)
+        self.assertEqual(self.reranker.get_stats()["cache_hits"], 3)
+
+    def test_budget_caps_candidates(self):
+        """Test that a slow model only scores what fits in the latency budget"""
+        self.reranker._ms_per_pair = 20.0  # budget 50ms → 2 cặp
+        results = self.reranker.rerank(self.candidates, query="vay mua nhà", top_k=1)
+        self.assertEqual(self.model.calls[-1][0], 2)
+        self.assertEqual(results[0]["vector_id"], 0)  # ứng viên thứ 3 không được chấm
+
+        self.reranker._ms_per_pair = 100.0
+        results = self.reranker.rerank(self.candidates, query="lãi suất", top_k=2)
+        self.assertEqual([r["vector_id"] for r in results], [0, 1])
+        self.assertEqual(self.reranker.get_stats()["skipped_budget"], 1)
+
+    def test_disabled_by_default(self):
+        """Test the reranker stays off (and never loads a model) unless enabled in config"""
+        reranker = Reranker(Config("nonexistent.yaml"))
+        self.assertFalse(reranker.enabled)
+        self.assertFalse(reranker.warm_up())
+        self.assertIsNone(reranker._model)
+        self.assertEqual(len(reranker.rerank(self.candidates, query="phí thẻ", top_k=2)), 2)
+
+    def test_thread_count_is_opt_in(self):
+        """Test torch threads are only changed when retrieval.rerank.num_threads is configured"""
+        for num_threads, expected_calls in ((None, 0), (2, 1)):
+            with self.subTest(num_threads=num_threads):
+                config = Config("nonexistent.yaml")
+                config.config['retrieval']['rerank'] = {'enabled': True, 'num_threads': num_threads}
+                reranker = Reranker(config)
+                with mock.patch('sentence_transformers.CrossEncoder', return_value=KeywordCrossEncoder()), \
+                        mock.patch('torch.set_num_threads') as set_num_threads:
+                    self.assertTrue(reranker.warm_up())
+                self.assertEqual(set_num_threads.call_count, expected_calls)
+                self.assertEqual(reranker._model.calls, [(1, 1)])
+
+
+
+class TestRerankCacheInvalidation(RAGIngestionTestCase):
+    def test_scores_dropped_when_chunk_ids_change(self):
+        """Test cached scores keyed by chunk id are cleared on commit, rollback and reset"""
+        path = self.write_file("policy.txt", POLICY)
+        rag = self.make_rag(retrieval__rerank={'enabled': True})
+        rag.ingest_multiple_documents([path])
+        retriever = rag.retriever
+        retriever.reranker._model = KeywordCrossEncoder()
+
+        def scored():
+            retriever.retrieve("phí thường niên thẻ visa platinum")
+            return len(retriever.reranker._cache)
+
+        self.assertGreater(scored(), 0)
+        # Rollback: slot id của chunk chưa commit sẽ được cấp lại
+        self.backend.fail_after = len(self.backend.encoded)
+        self.assertIn('error', rag.ingest_multiple_documents([self.write_file("b.txt", POLICY * 2)])[0])
+        self.assertEqual(len(retriever.reranker._cache), 0)
+
+        self.backend.fail_after = None
+        self.assertGreater(scored(), 0)
+        self.write_file("policy.txt", POLICY.replace("18% mỗi năm", "20% mỗi năm"))
+        rag.ingest_multiple_documents([path])
+        self.assertEqual(len(retriever.reranker._cache), 0)
+
+        self.assertGreater(scored(), 0)
+        retriever.reset()
+        self.assertEqual(len(retriever.reranker._cache), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
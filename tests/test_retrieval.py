@@ -6,6 +6,7 @@ import numpy as np
 from pathlib import Path
 import tempfile
 import shutil
+import pickle
 
 # Add the project root to Python path
 project_root = str(Path(__file__).parent.parent)
@@ -14,6 +15,7 @@ sys.path.append(project_root)
 from src.utils.config import Config
 from src.retrieval.retriever import Retriever
 from src.retrieval.vector_store import VectorStore
+from src.retrieval.chunk_store import ChunkStore
 from src.retrieval.reranker import Reranker
 from src.ingestion.embedder import Embedder
 
@@ -83,7 +85,7 @@ class TestRetrieval(unittest.TestCase):
             self.assertIsInstance(chunk, dict)
             self.assertIsInstance(score, float)
             self.assertTrue("text" in chunk)
-            self.assertTrue("embedding" in chunk)
+            self.assertFalse("embedding" in chunk)  # vectors live only in the FAISS index
             self.assertTrue("metadata" in chunk)
 
     def test_save_and_load_index(self):
@@ -105,6 +107,51 @@ class TestRetrieval(unittest.TestCase):
         results = new_vector_store.search(query_embedding, top_k=2)
         self.assertEqual(len(results), 2)
 
+    def test_embedding_reconstructed_from_index(self):
+        """Test that stored vectors are reconstructed from FAISS instead of chunk metadata"""
+        self.vector_store.add_chunks(self.sample_chunks)
+
+        expected = self.sample_chunks[1]["embedding"] / np.linalg.norm(self.sample_chunks[1]["embedding"])
+        np.testing.assert_allclose(self.vector_store.get_embedding(1), expected, rtol=1e-5)
+
+    def test_legacy_chunk_file_migration(self):
+        """Test that legacy pickled chunk files are converted to the chunk store on load"""
+        self.vector_store.add_chunks(self.sample_chunks)
+        self.vector_store.save_index()
+
+        # Simulate a legacy install: pickled list that still stores every vector
+        legacy = [
+            {**chunk, "embedding": chunk["embedding"].tolist(), "embedding_dimension": 768}
+            for chunk in self.sample_chunks
+        ]
+        with open(self.vector_store.legacy_chunks_path, 'wb') as f:
+            pickle.dump(legacy, f)
+        os.remove(self.vector_store.chunks.idx_path)
+        os.remove(self.vector_store.chunks.dat_path)
+
+        new_vector_store = VectorStore(self.config)
+        self.assertTrue(new_vector_store.load_index())
+        self.assertTrue(ChunkStore.exists(new_vector_store.chunks.path))
+        self.assertEqual(len(new_vector_store.chunks), len(self.sample_chunks))
+        for chunk in new_vector_store.chunks:
+            self.assertNotIn("embedding", chunk)
+            self.assertNotIn("embedding_dimension", chunk)
+        os.remove(self.vector_store.legacy_chunks_path)
+
+    def test_remove_ids_keeps_other_ids_stable(self):
+        """Test that removing chunks does not shift the ids of the remaining ones"""
+        ids = self.vector_store.add_chunks(self.sample_chunks)
+        self.assertEqual(ids, [0, 1, 2])
+
+        self.vector_store.remove_ids([1])
+        self.assertEqual(self.vector_store.index.ntotal, 2)
+        self.assertEqual(self.vector_store.get_stats()['total_chunks'], 2)
+
+        query_embedding = self.sample_chunks[2]["embedding"]
+        chunk, score = self.vector_store.search(query_embedding, top_k=1)[0]
+        self.assertEqual(chunk["text"], self.sample_chunks[2]["text"])
+        self.assertAlmostEqual(score, 1.0, places=5)
+
     @patch('src.ingestion.embedder.Embedder.embed_texts')
     def test_retriever_functionality(self, mock_embed):
         """Test retriever's main functionality"""
@@ -0,0 +1,64 @@
+import unittest
+import os
+import sys
+import random
+import tempfile
+import shutil
+from pathlib import Path
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+
+from src.utils.config import Config
+from src.ingestion.document_loader import DocumentLoader
+from src.ingestion.text_splitter import TextSplitter, SENTENCE_BOUNDARY
+
+
+class TestStreamingSplit(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        config = Config("nonexistent.yaml")
+        config.config['chunking'] = {'max_tokens': 12, 'overlap': 4}
+        self.splitter = TextSplitter(config)
+        self.rng = random.Random(12)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def random_text(self, n_words: int) -> str:
+        words = ["thẻ", "phí", "BIDV", "lãi", "suất", "1.000", "VND", "năm", "tài", "khoản"]
+        parts = []
+        for _ in range(n_words):
+            parts.append(self.rng.choice(words))
+            parts.append(self.rng.choice([" ", " ", " ", ". ", "!  ", "? ", ".", "\n", "\n\n", ".\n", ". \n"]))
+        return "".join(parts)
+
+    def test_iter_sentences_matches_whole_string_split(self):
+        """Test that incremental sentence splitting equals splitting the joined text"""
+        for _ in range(200):
+            text = self.random_text(self.rng.randint(0, 60))
+            cuts = sorted(self.rng.sample(range(len(text) + 1), min(len(text) + 1, self.rng.randint(0, 8))))
+            pieces = [text[i:j] for i, j in zip([0] + cuts, cuts + [len(text)])]
+            self.assertEqual(list(self.splitter.iter_sentences(pieces)), SENTENCE_BOUNDARY.split(text))
+
+    def test_streamed_txt_matches_loaded_document(self):
+        """Test that streaming a text file yields the same content and chunks as loading it whole"""
+        file_path = os.path.join(self.test_dir, "policy.txt")
+        with open(file_path, "w", encoding="utf-8") as f:
+            f.write(self.random_text(400))
+
+        loader = DocumentLoader()
+        document = loader.load_document(file_path)
+        metadata, records = loader.stream_document(file_path)
+        records = list(records)
+        self.assertGreater(len(records), 1)
+        self.assertEqual("".join(r["text"] for r in records), document["content"])
+        self.assertEqual(metadata, document["metadata"])
+
+        expected = self.splitter._split_text_document(document["content"], document["metadata"])
+        self.assertEqual(list(self.splitter.split_records(iter(records), metadata)), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+import sys
+import re
+import random
+import unicodedata
+from pathlib import Path
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+
+from src.generation.text_cleaner import TextCleaner
+
+
+def reference_clean_text(s: str) -> str:
+    """Bản TextCleaner.clean_text trước khi tối ưu (duyệt từng ký tự), dùng làm oracle"""
+    if not s:
+        return s
+    s = unicodedata.normalize("NFKC", s)
+    s = s.replace("\\n", "\n")
+    s = s.replace("\\t", "\t")
+    s = s.replace("\r\n", "\n").replace("\r", "\n")
+    s = "".join(TextCleaner.SMART_MAP.get(ch, ch) for ch in s)
+    out = []
+    for ch in s:
+        if ch in TextCleaner.ZERO_WIDTH:
+            continue
+        cat = unicodedata.category(ch)
+        if ch in ("\n", "\t"):
+            out.append(ch)
+        elif cat in ("Cc", "Cf"):
+            continue
+        else:
+            out.append(ch)
+    s = "".join(out)
+    s = re.sub(r"[ \t]+", " ", s)
+    s = re.sub(r"\s+([,.;:%\)\?])", r"\1", s)
+    s = re.sub(r"(\()\s+", r"\1", s)
+    s = re.sub(r"\n{3,}", "\n\n", s)
+    s = "\n".join(ln.rstrip() for ln in s.splitlines())
+    return s.strip()
+
+
+# Các mảnh dễ gây sai khác: khoảng trắng/xuống dòng đủ loại, dấu câu, escape, smart chars,
+# zero-width, control/format chars, ký tự NFKC đổi dạng, tiếng Việt có dấu tổ hợp
+PIECES = [
+    " ", "  ", "\t", " \t ", "\n", "\n\n", "\n\n\n", "\r", "\r\n", "\\n", "\\t", "\\", "n", "t",
+    ",", ".", ";", ":", "%", ")", "?", "(", "!", "-", "'", "\"", "\u2018", "\u2019", "\u201c",
+    "\u201d", "\u2013", "\u2014", "\u2212", "\xa0", "\u2026", "\u200b", "\u200c", "\u200d",
+    "\u2060", "\ufeff", "\xad", "\u202e", "\x00", "\x07", "\x0b", "\x0c", "\x1c", "\x1f", "\x7f",
+    "\x85", "\u2028", "\u2029", "\u3000", "\u2003", "\uff08", "\uff0c", "\ufb01", "\u2460", "a", "B",
+    "7", "BIDV", "lãi suất", "Việt Nam", "e\u0301", "\U0001f600",
+]
+
+
+def random_text(rng: random.Random, max_pieces: int = 40) -> str:
+    return "".join(rng.choice(PIECES) for _ in range(rng.randint(0, max_pieces)))
+
+
+class TestTextCleaner(unittest.TestCase):
+    def test_matches_reference_on_random_text(self):
+        """Property test: byte-identical with the per-character implementation"""
+        rng = random.Random(1234)
+        for _ in range(20000):
+            text = random_text(rng)
+            self.assertEqual(TextCleaner.clean_text(text), reference_clean_text(text), repr(text))
+
+    def test_matches_reference_on_random_code_points(self):
+        """Property test over arbitrary code points (exercises the lazy category table)"""
+        rng = random.Random(42)
+        for _ in range(2000):
+            text = "".join(chr(rng.randrange(0x110000)) if rng.random() < 0.3 else rng.choice(PIECES)
+                           for _ in range(rng.randint(0, 30)))
+            text = text.encode("utf-8", "surrogatepass").decode("utf-8", "replace")
+            self.assertEqual(TextCleaner.clean_text(text), reference_clean_text(text), repr(text))
+
+    def test_step_methods(self):
+        """Test the individual public steps keep their behaviour"""
+        self.assertEqual(TextCleaner.replace_smart_chars("“x”…"), '"x"...')
+        self.assertEqual(TextCleaner.remove_zero_width_and_controls("a\u200b\x00\tb\n\xadc"), "a\tb\nc")
+        self.assertEqual(TextCleaner.normalize_spaces_and_punct("( a\t\t, b )\n\n\n\nc  "), "(a, b)\n\nc")
+
+    def test_cached_clean(self):
+        """Test the memoized variant returns the same text"""
+        text = "  Bạn là trợ lý\u200b ảo của BIDV ,\n\n\n\ntrả lời ngắn gọn .  "
+        self.assertEqual(TextCleaner.clean_text_cached(text), TextCleaner.clean_text(text))
+        self.assertIs(TextCleaner.clean_text_cached(text), TextCleaner.clean_text_cached(text))
+        self.assertEqual(TextCleaner.clean_text(""), "")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+import sys
+import random
+from pathlib import Path
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+
+from src.utils.config import Config
+from src.ingestion.text_splitter import TextSplitter, SENTENCE_BOUNDARY, split_sentences
+
+
+def reference_split_paragraph(text: str, max_tokens: int, overlap: int) -> list:
+    """Sentence packing as implemented before prefix sums (re-counts the overlap every chunk)"""
+    chunks, current, token_count = [], [], 0
+    for sentence in SENTENCE_BOUNDARY.split(text):
+        sentence_tokens = len(sentence.split())
+        if token_count + sentence_tokens > max_tokens and current:
+            chunks.append(" ".join(current))
+            if overlap > 0 and len(current) > 1:
+                overlap_sentences, overlap_tokens = [], 0
+                for s in reversed(current):
+                    s_tokens = len(s.split())
+                    if overlap_tokens + s_tokens <= overlap:
+                        overlap_sentences.insert(0, s)
+                        overlap_tokens += s_tokens
+                    else:
+                        break
+                current = overlap_sentences + [sentence]
+                token_count = overlap_tokens + sentence_tokens
+            else:
+                current = [sentence]
+                token_count = sentence_tokens
+        else:
+            current.append(sentence)
+            token_count += sentence_tokens
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def make_splitter(max_tokens: int, overlap: int, tokenizer: dict = None) -> TextSplitter:
+    config = Config("nonexistent.yaml")
+    config.config['chunking'] = {'max_tokens': max_tokens, 'overlap': overlap}
+    if tokenizer:
+        config.config['chunking']['tokenizer'] = tokenizer
+    return TextSplitter(config)
+
+
+class TestTextSplitter(unittest.TestCase):
+    def setUp(self):
+        self.rng = random.Random(25)
+
+    def random_text(self, n_sentences: int) -> str:
+        words = ["thẻ", "phí", "BIDV", "lãi", "suất", "1.000", "VND", "năm", "tài", "khoản", "\n"]
+        parts = []
+        for _ in range(n_sentences):
+            # Có cả câu rỗng, câu 0 token và câu dài hơn max_tokens
+            n_words = self.rng.choice([0, 1, 2, 3, 5, 8, 13, 40])
+            parts.append(" ".join(self.rng.choice(words) for _ in range(n_words)))
+            parts.append(self.rng.choice([". ", "! ", "?  ", ". ", " "]))
+        return "".join(parts)
+
+    def test_split_sentences_matches_boundary_regex(self):
+        """Test the capture-group segmentation equals splitting on SENTENCE_BOUNDARY"""
+        for _ in range(2000):
+            text = "".join(self.rng.choice("ab .!?\n") for _ in range(self.rng.randint(0, 30)))
+            self.assertEqual(split_sentences(text), SENTENCE_BOUNDARY.split(text))
+
+    def test_word_mode_matches_reference(self):
+        """Test chunk boundaries are identical to the previous packer in word-count mode"""
+        for max_tokens, overlap in [(12, 4), (12, 0), (20, 20), (5, 50), (400, 50), (1, 1)]:
+            splitter = make_splitter(max_tokens, overlap)
+            for _ in range(150):
+                text = self.random_text(self.rng.randint(0, 60))
+                expected = reference_split_paragraph(text, max_tokens, overlap)
+                self.assertEqual(splitter.split_paragraph(text), expected)
+                # Đường streaming (đếm từng câu) cho cùng kết quả
+                self.assertEqual(list(splitter._pack_sentences(SENTENCE_BOUNDARY.split(text))), expected)
+
+    def test_tokenizer_budget(self):
+        """Test chunks respect max_tokens as counted by the configured tokenizer"""
+        splitter = make_splitter(30, 8, tokenizer={'backend': 'estimate'})
+        counter = splitter.token_counter
+        self.assertIsNotNone(counter)
+        text = self.random_text(200)
+        sentences = SENTENCE_BOUNDARY.split(text)
+        self.assertEqual(counter.count_batch(sentences), [counter.count(s) for s in sentences])
+
+        chunks = splitter.split_paragraph(text)
+        self.assertEqual(list(splitter._pack_sentences(sentences)), chunks)
+        longest = max(counter.count(s) for s in sentences)
+        for chunk in chunks:
+            # Như bản cũ: chunk mới = overlap + một câu, câu dài hơn budget không bị cắt
+            self.assertLessEqual(counter.count(chunk), max(30, 8 + longest))
+
+
+if __name__ == '__main__':
+    unittest.main()
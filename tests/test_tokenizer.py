@@ -0,0 +1,117 @@
+import unittest
+import sys
+import os
+import tempfile
+from pathlib import Path
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+
+from src.utils.config import Config
+from src.generation.tokenizer import TokenCounter, get_token_counter
+from src.generation.prompt_template import PromptTemplate
+
+TEXT = ("Lãi suất tiền gửi kỳ hạn 12 tháng là 4,8%/năm. Lãi được trả cuối kỳ. "
+        "Khách hàng có thể rút trước hạn và hưởng lãi không kỳ hạn.\nÁp dụng từ ngày 01/01/2024.")
+
+
+class TestTokenCounter(unittest.TestCase):
+    def setUp(self):
+        self.counter = TokenCounter('estimate')
+
+    def test_trim_at_sentence_boundary(self):
+        """Test trimming keeps whole sentences within the budget"""
+        sentences = self.counter.sentences(TEXT)
+        self.assertEqual("".join(sentences), TEXT)
+        self.assertEqual(len(sentences), 5)  # "\n" là một phần riêng
+
+        budget = self.counter.count(sentences[0] + sentences[1]) + 1
+        trimmed, tokens = self.counter.trim(TEXT, budget)
+        self.assertEqual(trimmed, (sentences[0] + sentences[1]).rstrip())
+        self.assertLessEqual(tokens, budget)
+        self.assertEqual(self.counter.trim(TEXT, 10_000), (TEXT, self.counter.count(TEXT)))
+
+    def test_trim_long_first_sentence(self):
+        """Test a first sentence over budget is cut at a token boundary"""
+        trimmed, tokens = self.counter.trim(TEXT, 5)
+        self.assertTrue(TEXT.startswith(trimmed))
+        self.assertLessEqual(tokens, 5)
+        self.assertGreater(tokens, 0)
+
+    def test_hf_tokenizer_file(self):
+        """Test the `tokenizers` backend counts and cuts with the real vocabulary"""
+        from tokenizers import Tokenizer, models, pre_tokenizers, trainers
+        tokenizer = Tokenizer(models.WordLevel(unk_token="[UNK]"))
+        tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+        tokenizer.train_from_iterator([TEXT], trainers.WordLevelTrainer(special_tokens=["[UNK]"]))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "tokenizer.json")
+            tokenizer.save(path)
+            counter = TokenCounter('hf', path=path)
+
+        self.assertEqual(counter.count(TEXT), len(tokenizer.encode(TEXT).ids))
+        trimmed, tokens = counter.trim(TEXT, 4)
+        self.assertEqual(trimmed, "Lãi suất tiền gửi")
+        self.assertEqual(tokens, 4)
+
+    def test_registry_falls_back_to_estimate(self):
+        """Test a missing tokenizer file degrades to the estimate backend"""
+        config = Config("nonexistent.yaml")
+        config.config["generation"]["tokenizer"] = {"backend": "hf", "path": "/nonexistent/tokenizer.json"}
+        counter = get_token_counter(config)
+        self.assertEqual(counter.backend, "estimate")
+        self.assertIs(get_token_counter(config), counter)
+
+
+class TestTokenBudgetPacking(unittest.TestCase):
+    def setUp(self):
+        self.counter = TokenCounter('estimate')
+        self.contexts = [
+            TEXT,
+            "Phí rút tiền mặt tại ATM nội mạng BIDV là 1.100 VNĐ cho mỗi giao dịch thành công. " * 6,
+            "Giờ làm việc của chi nhánh BIDV từ thứ Hai đến thứ Sáu, sáng 8h00 - 12h00, chiều 13h00 - 17h00.",
+        ]
+
+    def test_budget_is_respected(self):
+        """Test contexts fill the budget in relevance order and the overflow is trimmed at a sentence"""
+        template = PromptTemplate(token_counter=self.counter, token_budget=200)
+        messages = template.build_messages("Lãi suất tiết kiệm 12 tháng?", self.contexts)
+        user = messages[1]["content"]
+        self.assertLessEqual(self.counter.count(user), 200)
+        self.assertIn("[Nguồn 1]: Lãi suất tiền gửi", user)
+        self.assertIn("01/01/2024.\n\n[Nguồn 2]", user)  # context đầu giữ nguyên
+        self.assertIn("[Nguồn 2]: Phí rút tiền", user)
+        self.assertIn("thành công....", user)  # cắt sau dấu chấm của câu trọn vẹn
+        self.assertNotIn("[Nguồn 3]", user)
+        self.assertEqual(template.count_tokens(messages),
+                         self.counter.count(messages[0]["content"]) + self.counter.count(user))
+
+    def test_large_budget_keeps_everything(self):
+        """Test nothing is trimmed when the budget is large enough"""
+        template = PromptTemplate(token_counter=self.counter, token_budget=5000)
+        user = template.build_messages("Phí ATM?", self.contexts)[1]["content"]
+        self.assertNotIn("...", user)
+        self.assertIn("[Nguồn 3]", user)
+
+    def test_long_query_keeps_a_trimmed_context(self):
+        """Test a query that alone exceeds the budget is trimmed so the first context still fits"""
+        template = PromptTemplate(token_counter=self.counter, token_budget=200)
+        query = "Cho tôi hỏi về lãi suất tiết kiệm kỳ hạn 12 tháng tại quầy và trực tuyến. " * 20
+        self.assertGreater(self.counter.count(query), 200)
+
+        user = template.build_messages(query, self.contexts)[1]["content"]
+        self.assertLessEqual(self.counter.count(user), 200)
+        self.assertIn("[Nguồn 1]: Lãi suất tiền gửi", user)
+        self.assertNotIn("Không có thông tin liên quan", user)
+        self.assertIn("CÂU HỎI: Cho tôi hỏi về lãi suất", user)
+        self.assertIn("trực tuyến....", user)  # câu hỏi bị cắt tại ranh giới câu
+
+        # Không có context thì câu hỏi giữ nguyên
+        user = template.build_messages(query, [])[1]["content"]
+        self.assertIn(query.strip(), user)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import unittest
+import sys
+import json
+import time
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+
+# Add the project root to Python path
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+
+from src.utils.config import Config
+from src.utils.metrics import LatencyHistogram, render_prometheus
+from src.utils.tracing import Tracer, OTLPExporter
+
+
+class _Collector(BaseHTTPRequestHandler):
+    payloads = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        _Collector.payloads.append((self.path, json.loads(body)))
+        self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class TestTracing(unittest.TestCase):
+    def setUp(self):
+        self.tracer = Tracer()
+
+    def test_nested_spans_and_histograms(self):
+        """Test that child spans link to their parent and every stage gets a histogram"""
+        with self.tracer.span("query") as root:
+            with self.tracer.span("query.embed") as child:
+                time.sleep(0.002)
+        self.assertEqual(child.trace_id, root.trace_id)
+        self.assertEqual(child.parent_id, root.span_id)
+        self.assertIsNone(root.parent_id)
+        self.assertGreaterEqual(child.duration_ms, 2)
+        self.assertGreaterEqual(root.duration_ms, child.duration_ms)
+        self.assertEqual(set(self.tracer.get_stats()["stages"]), {"query", "query.embed"})
+
+    def test_errors_and_disabled(self):
+        """Test that failing spans are counted, and a disabled tracer only measures durations"""
+        with self.assertRaises(ValueError):
+            with self.tracer.span("query.retrieve"):
+                raise ValueError("boom")
+        self.assertEqual(self.tracer.errors, {"query.retrieve": 1})
+
+        self.tracer.enabled = False
+        with self.tracer.span("query.other") as span:
+            pass
+        self.assertIsNotNone(span.end_ns)
+        self.assertNotIn("query.other", self.tracer.histograms)
+
+    def test_context_propagates_to_executor(self):
+        """Test that copying the context keeps spans in worker threads under the request span"""
+        pool = ThreadPoolExecutor(max_workers=1)
+
+        def work():
+            with self.tracer.span("query.embed") as span:
+                return span
+
+        async def request():
+            with self.tracer.span("query") as root:
+                context = contextvars.copy_context()
+                child = await asyncio.get_running_loop().run_in_executor(pool, context.run, work)
+            return root, child
+
+        root, child = asyncio.run(request())
+        pool.shutdown()
+        self.assertEqual(child.parent_id, root.span_id)
+
+    def test_otlp_export(self):
+        """Test that spans are batched to the collector as OTLP/HTTP JSON"""
+        _Collector.payloads = []
+        server = HTTPServer(("127.0.0.1", 0), _Collector)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        config = Config("nonexistent.yaml")
+        config.config["tracing"] = {"otlp": {"enabled": True, "flush_interval_sec": 0.05,
+                                             "endpoint": f"http://127.0.0.1:{server.server_port}/v1/traces"}}
+        self.tracer.configure(config)
+        self.assertIsInstance(self.tracer.exporter, OTLPExporter)
+        with self.tracer.span("query", cache="miss"):
+            with self.tracer.span("generate.llm"):
+                pass
+        self.tracer.exporter.shutdown()
+        server.shutdown()
+
+        spans = [s for path, payload in _Collector.payloads
+                 for rs in payload["resourceSpans"] for ss in rs["scopeSpans"] for s in ss["spans"]]
+        self.assertEqual({path for path, _ in _Collector.payloads}, {"/v1/traces"})
+        self.assertEqual(sorted(s["name"] for s in spans), ["generate.llm", "query"])
+        by_name = {s["name"]: s for s in spans}
+        self.assertEqual(by_name["generate.llm"]["parentSpanId"], by_name["query"]["spanId"])
+        self.assertEqual(len(by_name["query"]["traceId"]), 32)
+        self.assertIn({"key": "cache", "value": {"stringValue": "miss"}}, by_name["query"]["attributes"])
+        self.assertGreaterEqual(int(by_name["query"]["endTimeUnixNano"]), int(by_name["query"]["startTimeUnixNano"]))
+
+    def test_span_overhead(self):
+        """Test that a span costs microseconds (<1% of a query that takes tens of milliseconds)"""
+        n = 20000
+        start = time.perf_counter()
+        for _ in range(n):
+            with self.tracer.span("bench"):
+                pass
+        per_span = (time.perf_counter() - start) / n
+        self.assertLess(per_span, 50e-6)
+
+    def test_render_prometheus(self):
+        """Test Prometheus text exposition of histograms and counters"""
+        histogram = LatencyHistogram(buckets=(0.1, 1.0))
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        text = render_prometheus("rag_stage_duration_seconds", "histogram", "Stage latency",
+                                 [({"stage": "query.embed"}, histogram)])
+        self.assertIn('# TYPE rag_stage_duration_seconds histogram', text)
+        self.assertIn('rag_stage_duration_seconds_bucket{stage="query.embed",le="0.1"} 1', text)
+        self.assertIn('rag_stage_duration_seconds_bucket{stage="query.embed",le="+Inf"} 2', text)
+        self.assertIn('rag_stage_duration_seconds_count{stage="query.embed"} 2', text)
+
+        text = render_prometheus("rag_llm_errors_total", "counter", "Errors", [({"kind": 'a"b'}, 3)])
+        self.assertIn('rag_llm_errors_total{kind="a\\"b"} 3', text)
+
+
+if __name__ == '__main__':
+    unittest.main()